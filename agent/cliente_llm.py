@@ -0,0 +1,549 @@
+"""
+Cliente resiliente para chamadas ao modelo de linguagem.
+
+Este módulo concentra a política de chamadas ao LLM usada pelos nós do grafo:
+
+- Limitação de taxa no cliente (token bucket) para requisições/min e tokens/min
+- Novas tentativas com backoff exponencial e jitter para erros transitórios
+- Prazo por chamada e prazo total por invocação
+- Disjuntor (circuit breaker) que falha rápido enquanto o provedor está instável,
+  servindo do cache de respostas quando a mesma requisição já foi respondida
+- Gravação e reprodução das respostas em cassetes (LLM_CASSETES_MODO), para
+  medir o grafo de forma reprodutível sem chamar o provedor
+
+Os limitadores e disjuntores são mantidos por nome de modelo, já que os limites
+do provedor são aplicados por modelo.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from config.configuracoes import (
+    CHAVE_API_OPENAI,
+    TEMPERATURA,
+    LLM_REQUISICOES_POR_MINUTO,
+    LLM_TOKENS_POR_MINUTO,
+    LLM_TOKENS_SAIDA_ESTIMADOS,
+    LLM_MAX_TENTATIVAS,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAXIMO,
+    LLM_TIMEOUT_CHAMADA,
+    LLM_PRAZO_TOTAL,
+    LLM_MAX_CHAMADAS_SIMULTANEAS,
+    LLM_TAMANHO_CACHE,
+    DISJUNTOR_LIMIAR_FALHAS,
+    DISJUNTOR_TEMPO_RECUPERACAO,
+    LLM_CASSETES_MODO
+)
+from agent.gravacao_llm import (
+    MODO_GRAVAR,
+    MODO_REPRODUZIR,
+    ModeloCassete,
+    rmta_latencia_reproducao,
+    rmta_obter_armazem,
+    rmta_reconstruir_resposta
+)
+from agent.templates_prompt import rmta_contar_tokens
+from utils.config_log import rmta_submeter_com_contexto
+from utils.metricas import rmta_incrementar_contador, rmta_definir_medidor, rmta_observar_histograma
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Status HTTP e tipos de exceção considerados transitórios
+STATUS_REPETIVEIS = {408, 409, 429, 500, 502, 503, 504}
+ERROS_REPETIVEIS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutError"}
+
+# Falhas que indicam problema de saúde do provedor e contam para o disjuntor (além dos 5xx)
+STATUS_FALHA_PROVEDOR = {408, 429}
+
+
+class ErroLLM(Exception):
+    """Erro base das chamadas ao modelo de linguagem."""
+
+
+class ErroProvedorIndisponivel(ErroLLM):
+    """O disjuntor está aberto e não há resposta em cache para a requisição."""
+
+
+class ErroPrazoExcedido(ErroLLM):
+    """O prazo da chamada se esgotou antes de obter uma resposta."""
+
+
+class ErroSemResposta(ErroPrazoExcedido):
+    """O provedor não respondeu dentro do tempo limite da tentativa."""
+
+
+class ErroCasseteAusente(ErroLLM):
+    """No modo de reprodução, a requisição não foi gravada em nenhum cassete."""
+
+
+class LimitadorTaxa:
+    """
+    Limitador de taxa com dois token buckets: requisições e tokens por minuto.
+
+    Attributes:
+        requisicoes_por_minuto (float): Capacidade e taxa de reposição de requisições
+        tokens_por_minuto (float): Capacidade e taxa de reposição de tokens
+    """
+
+    def __init__(self, requisicoes_por_minuto: float, tokens_por_minuto: float):
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self.tokens_por_minuto = tokens_por_minuto
+        self._requisicoes = float(requisicoes_por_minuto)
+        self._tokens = float(tokens_por_minuto)
+        self._ultima_reposicao = time.monotonic()
+        self._trava = threading.Lock()
+
+    def _repor(self, agora: float):
+        """Repõe os buckets proporcionalmente ao tempo decorrido."""
+        decorrido = agora - self._ultima_reposicao
+        self._ultima_reposicao = agora
+        self._requisicoes = min(self.requisicoes_por_minuto, self._requisicoes + decorrido * self.requisicoes_por_minuto / 60)
+        self._tokens = min(self.tokens_por_minuto, self._tokens + decorrido * self.tokens_por_minuto / 60)
+
+    def adquirir(self, tokens: int, prazo: float) -> float:
+        """
+        Aguarda até haver capacidade para uma requisição com a quantidade de tokens informada.
+
+        Args:
+            tokens (int): Tokens estimados da requisição (prompt + saída)
+            prazo (float): Instante limite (time.monotonic) para obter a capacidade
+
+        Returns:
+            float: Tempo de espera em segundos
+
+        Raises:
+            ErroPrazoExcedido: Se a capacidade não estiver disponível antes do prazo
+        """
+        tokens = min(tokens, self.tokens_por_minuto)
+        inicio = time.monotonic()
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                self._repor(agora)
+                if self._requisicoes >= 1 and self._tokens >= tokens:
+                    self._requisicoes -= 1
+                    self._tokens -= tokens
+                    return agora - inicio
+                espera = max(
+                    (1 - self._requisicoes) * 60 / self.requisicoes_por_minuto,
+                    (tokens - self._tokens) * 60 / self.tokens_por_minuto
+                )
+            if agora + espera > prazo:
+                raise ErroPrazoExcedido("Limite de taxa do modelo não permite a chamada dentro do prazo.")
+            time.sleep(espera)
+
+
+class DisjuntorCircuito:
+    """
+    Disjuntor com os estados fechado, aberto e meio-aberto.
+
+    Após um número de falhas consecutivas, o disjuntor abre e rejeita chamadas
+    até o tempo de recuperação. Depois disso, permite uma chamada de teste
+    (meio-aberto): sucesso fecha o disjuntor, falha o abre novamente.
+
+    Attributes:
+        nome (str): Nome do recurso protegido, usado nas métricas
+        limiar_falhas (int): Falhas consecutivas que abrem o disjuntor
+        tempo_recuperacao (float): Segundos em aberto antes da chamada de teste
+    """
+
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    MEIO_ABERTO = "meio_aberto"
+
+    def __init__(self, nome: str, limiar_falhas: int, tempo_recuperacao: float):
+        self.nome = nome
+        self.limiar_falhas = limiar_falhas
+        self.tempo_recuperacao = tempo_recuperacao
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._trava = threading.Lock()
+
+    def permitir(self) -> bool:
+        """
+        Indica se uma chamada pode ser feita agora.
+
+        Returns:
+            bool: True se a chamada é permitida
+        """
+        with self._trava:
+            if self.estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_recuperacao:
+                self._mudar_estado(self.MEIO_ABERTO)
+            if self.estado == self.FECHADO:
+                return True
+            if self.estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        """Registra uma chamada bem-sucedida, fechando o disjuntor."""
+        with self._trava:
+            self._falhas = 0
+            self._teste_em_andamento = False
+            if self.estado != self.FECHADO:
+                self._mudar_estado(self.FECHADO)
+
+    def registrar_falha(self):
+        """Registra uma chamada que falhou após esgotar as tentativas."""
+        with self._trava:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self.estado == self.MEIO_ABERTO or self._falhas >= self.limiar_falhas:
+                self._aberto_em = time.monotonic()
+                self._mudar_estado(self.ABERTO)
+
+    def liberar_teste(self):
+        """Encerra uma chamada que falhou por motivo alheio à saúde do provedor, sem mudar o estado."""
+        with self._trava:
+            self._teste_em_andamento = False
+
+    def _mudar_estado(self, estado: str):
+        """Altera o estado e publica a mudança nos logs e nas métricas."""
+        logger.warning("Disjuntor do modelo %s: %s -> %s", self.nome, self.estado, estado)
+        self.estado = estado
+        rmta_definir_medidor(
+            "sql_agent_llm_disjuntor_aberto",
+            1 if estado == self.ABERTO else 0,
+            {"modelo": self.nome}
+        )
+
+
+class _CacheRespostas:
+    """Cache LRU de respostas do modelo, indexado pelo conteúdo das mensagens."""
+
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self._itens: "OrderedDict[str, Any]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave: str):
+        with self._trava:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave: str, resposta):
+        with self._trava:
+            self._itens[chave] = resposta
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+
+_trava_registro = threading.Lock()
+_limitadores: Dict[str, LimitadorTaxa] = {}
+_disjuntores: Dict[str, DisjuntorCircuito] = {}
+_cache_respostas = _CacheRespostas(LLM_TAMANHO_CACHE)
+_executor_chamadas = ThreadPoolExecutor(max_workers=LLM_MAX_CHAMADAS_SIMULTANEAS, thread_name_prefix="sql_agent_llm")
+
+
+def rmta_obter_limitador(nome_modelo: str) -> LimitadorTaxa:
+    """Retorna o limitador de taxa do modelo, criando-o se necessário."""
+    with _trava_registro:
+        if nome_modelo not in _limitadores:
+            _limitadores[nome_modelo] = LimitadorTaxa(LLM_REQUISICOES_POR_MINUTO, LLM_TOKENS_POR_MINUTO)
+        return _limitadores[nome_modelo]
+
+
+def rmta_obter_disjuntor(nome_modelo: str) -> DisjuntorCircuito:
+    """Retorna o disjuntor do modelo, criando-o se necessário."""
+    with _trava_registro:
+        if nome_modelo not in _disjuntores:
+            _disjuntores[nome_modelo] = DisjuntorCircuito(nome_modelo, DISJUNTOR_LIMIAR_FALHAS, DISJUNTOR_TEMPO_RECUPERACAO)
+        return _disjuntores[nome_modelo]
+
+
+def rmta_obter_modelo(nome_modelo: str, url_base: Optional[str] = None):
+    """
+    Cria (uma vez por modelo) o cliente de chat sem novas tentativas internas.
+    
+    As novas tentativas e o tempo limite são controlados por rmta_invocar_modelo.
+    No modo de reprodução dos cassetes, retorna um substituto que não exige a
+    chave da API.
+
+    Args:
+        nome_modelo (str): Nome do modelo no provedor
+        url_base (Optional[str]): URL de um endpoint compatível com a API da OpenAI
+            (ex.: um servidor local); None usa o endpoint padrão
+
+    Returns:
+        ChatOpenAI: Cliente do modelo
+    """
+    if LLM_CASSETES_MODO == MODO_REPRODUZIR:
+        return ModeloCassete(nome_modelo)
+    return _criar_cliente_modelo(nome_modelo, url_base)
+
+
+@lru_cache(maxsize=None)
+def _criar_cliente_modelo(nome_modelo: str, url_base: Optional[str]):
+    """Cria o cliente ChatOpenAI do modelo (em cache por modelo e endpoint)."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        api_key=CHAVE_API_OPENAI,
+        model=nome_modelo,
+        base_url=url_base,
+        temperature=TEMPERATURA,
+        timeout=LLM_TIMEOUT_CHAMADA,
+        max_retries=0
+    )
+
+
+def _chave_cache(nome_modelo: str, mensagens: List[Any]) -> str:
+    """Calcula a chave de cache de uma requisição a partir do modelo e das mensagens."""
+    hash_mensagens = hashlib.sha256(nome_modelo.encode("utf-8"))
+    for mensagem in mensagens:
+        hash_mensagens.update(b"\x00" + type(mensagem).__name__.encode("utf-8") + b"\x00")
+        hash_mensagens.update(str(mensagem.content).encode("utf-8"))
+    return hash_mensagens.hexdigest()
+
+
+def rmta_erro_repetivel(erro: Exception) -> bool:
+    """
+    Indica se um erro do provedor é transitório e pode ser repetido.
+
+    Args:
+        erro (Exception): Erro levantado pela chamada ao modelo
+
+    Returns:
+        bool: True para limites de taxa, timeouts, falhas de conexão e erros 5xx
+    """
+    if isinstance(erro, (ErroPrazoExcedido, TimeoutError, FuturoTimeoutError)):
+        return True
+    if getattr(erro, "status_code", None) in STATUS_REPETIVEIS:
+        return True
+    return any(classe.__name__ in ERROS_REPETIVEIS for classe in type(erro).__mro__)
+
+
+def rmta_falha_do_provedor(erro: Exception) -> bool:
+    """
+    Indica se um erro reflete a saúde do provedor e deve contar para o disjuntor.
+
+    Contam os erros 5xx, 408 e 429, os timeouts e as falhas de conexão. Erros
+    locais (prazo do limitador de taxa, cassete ausente) e erros 4xx da própria
+    requisição (requisição inválida, autenticação) não abrem o disjuntor.
+
+    Args:
+        erro (Exception): Erro levantado pela chamada ao modelo
+
+    Returns:
+        bool: True se o erro indica que o provedor está com problemas
+    """
+    if isinstance(erro, (ErroSemResposta, TimeoutError, FuturoTimeoutError)):
+        return True
+    if isinstance(erro, ErroLLM):
+        return False
+    status = getattr(erro, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in STATUS_FALHA_PROVEDOR
+    return any(classe.__name__ in ERROS_REPETIVEIS for classe in type(erro).__mro__)
+
+
+def _calcular_backoff(tentativa: int) -> float:
+    """Backoff exponencial com jitter completo para a tentativa informada."""
+    return random.uniform(0, min(LLM_BACKOFF_MAXIMO, LLM_BACKOFF_BASE * (2 ** tentativa)))
+
+
+class _ConsumoStream:
+    """
+    Consumo de uma resposta do modelo em streaming, abandonável pela tentativa.
+
+    Quando a tentativa expira, ela abandona o consumo: o texto recebido depois
+    disso não é mais repassado (a nova tentativa recomeça do zero) e o stream
+    do provedor é fechado, liberando a conexão.
+    """
+
+    def __init__(self, modelo, mensagens: List[Any], ao_receber: Callable[[str], None]):
+        self._modelo = modelo
+        self._mensagens = mensagens
+        self._ao_receber = ao_receber
+        self._abandonado = threading.Event()
+        # Nenhum repasse fica em andamento depois que abandonar() retorna
+        self._trava = threading.Lock()
+        self._stream = None
+
+    def executar(self):
+        """
+        Consome o stream, repassando o texto acumulado a cada pedaço.
+
+        Returns:
+            Any: Resposta completa (soma dos pedaços), com content e response_metadata
+
+        Raises:
+            ErroLLM: Se o stream terminar sem nenhum pedaço
+        """
+        resposta = None
+        self._stream = self._modelo.stream(self._mensagens)
+        try:
+            for pedaco in self._stream:
+                resposta = pedaco if resposta is None else resposta + pedaco
+                with self._trava:
+                    if self._abandonado.is_set():
+                        break
+                    self._ao_receber(resposta.content)
+        finally:
+            if self._abandonado.is_set():
+                self._fechar()
+        if resposta is None:
+            raise ErroLLM("O modelo encerrou o stream sem conteúdo.")
+        return resposta
+
+    def abandonar(self):
+        """Descarta o restante do stream e tenta fechá-lo sem esperar o próximo pedaço."""
+        with self._trava:
+            self._abandonado.set()
+        self._fechar()
+
+    def _fechar(self):
+        fechar = getattr(self._stream, "close", None)
+        if fechar is None:
+            return
+        try:
+            fechar()
+        except Exception as e:
+            # Um gerador em execução em outra thread não pode ser fechado: o consumo o fecha no próximo pedaço
+            logger.debug("Stream do modelo não fechado agora: %s", e)
+
+
+def _reproduzir_cassete(chave: str, nome_modelo: str, ao_receber: Optional[Callable[[str], None]]):
+    """
+    Responde a partir do cassete da requisição, aguardando a latência de reprodução.
+
+    Com ao_receber, o texto completo é repassado uma única vez, ao fim da latência.
+
+    Raises:
+        ErroCasseteAusente: Se a requisição não foi gravada
+    """
+    rotulos = {"modelo": nome_modelo}
+    cassete = rmta_obter_armazem().obter(chave)
+    if cassete is None:
+        rmta_incrementar_contador("sql_agent_llm_cassetes_total", rotulos={**rotulos, "resultado": "ausente"})
+        raise ErroCasseteAusente(f"Nenhum cassete gravado para a requisição {chave[:12]} ao modelo {nome_modelo}.")
+    latencia = rmta_latencia_reproducao(cassete)
+    if latencia > 0:
+        time.sleep(latencia)
+    resposta = rmta_reconstruir_resposta(cassete)
+    if ao_receber is not None:
+        ao_receber(resposta.content)
+    rmta_incrementar_contador("sql_agent_llm_cassetes_total", rotulos={**rotulos, "resultado": "reproduzida"})
+    return resposta
+
+
+def _gravar_cassete(chave: str, nome_modelo: str, mensagens: List[Any], resposta, latencia: float) -> None:
+    """Grava o cassete da resposta; uma falha de disco não afeta a chamada."""
+    try:
+        rmta_obter_armazem().gravar(chave, nome_modelo, mensagens, resposta, latencia)
+        rmta_incrementar_contador("sql_agent_llm_cassetes_total", rotulos={"modelo": nome_modelo, "resultado": "gravada"})
+    except Exception as e:
+        logger.warning("Erro ao gravar o cassete da requisição ao modelo %s: %s", nome_modelo, e)
+
+
+def rmta_invocar_modelo(modelo, mensagens: List[Any], prazo_total: Optional[float] = None,
+                        ao_receber: Optional[Callable[[str], None]] = None):
+    """
+    Invoca o modelo aplicando limite de taxa, novas tentativas, prazos e disjuntor.
+
+    Com ao_receber, a resposta é lida em streaming (se o modelo suportar) e o
+    texto acumulado é repassado a cada pedaço, permitindo iniciar trabalho antes
+    do fim da resposta. Uma nova tentativa recomeça o texto acumulado do zero, e
+    o stream da tentativa expirada deixa de chamar ao_receber.
+
+    Args:
+        modelo: Cliente do modelo (qualquer objeto com invoke(mensagens) e model_name)
+        mensagens (List[Any]): Mensagens a enviar
+        prazo_total (Optional[float]): Prazo total em segundos (padrão LLM_PRAZO_TOTAL)
+        ao_receber (Optional[Callable[[str], None]]): Função chamada com o texto acumulado
+            a cada pedaço recebido em streaming
+
+    Returns:
+        Any: Resposta do modelo (ou do cache, se o disjuntor estiver aberto, ou do
+        cassete, no modo de reprodução)
+
+    Raises:
+        ErroCasseteAusente: No modo de reprodução, se a requisição não foi gravada
+        ErroProvedorIndisponivel: Se o disjuntor estiver aberto e não houver cache
+        ErroPrazoExcedido: Se o prazo total se esgotar
+        Exception: O último erro do provedor, se não for repetível ou esgotar as tentativas
+    """
+    nome_modelo = getattr(modelo, "model_name", None) or type(modelo).__name__
+    rotulos = {"modelo": nome_modelo}
+    chave = _chave_cache(nome_modelo, mensagens)
+    if LLM_CASSETES_MODO == MODO_REPRODUZIR:
+        return _reproduzir_cassete(chave, nome_modelo, ao_receber)
+    disjuntor = rmta_obter_disjuntor(nome_modelo)
+
+    if not disjuntor.permitir():
+        resposta = _cache_respostas.obter(chave)
+        if resposta is not None:
+            logger.warning("Disjuntor aberto para %s; servindo resposta do cache", nome_modelo)
+            rmta_incrementar_contador("sql_agent_llm_cache_servidas_total", rotulos=rotulos)
+            return resposta
+        rmta_incrementar_contador("sql_agent_llm_chamadas_total", rotulos={**rotulos, "resultado": "rejeitada"})
+        raise ErroProvedorIndisponivel(f"Provedor do modelo {nome_modelo} indisponível no momento.")
+
+    prazo = time.monotonic() + (prazo_total if prazo_total is not None else LLM_PRAZO_TOTAL)
+    tokens = sum(rmta_contar_tokens(str(m.content)) for m in mensagens) + LLM_TOKENS_SAIDA_ESTIMADOS
+    limitador = rmta_obter_limitador(nome_modelo)
+
+    tentativa = 0
+    while True:
+        try:
+            espera = limitador.adquirir(tokens, prazo)
+            rmta_observar_histograma("sql_agent_llm_espera_limite_segundos", espera, rotulos)
+
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                raise ErroPrazoExcedido("Prazo da chamada ao modelo esgotado.")
+            inicio_chamada = time.monotonic()
+            consumo = None
+            if ao_receber is not None and hasattr(modelo, "stream"):
+                # Cada tentativa tem o próprio consumo, abandonado se ela expirar
+                consumo = _ConsumoStream(modelo, mensagens, ao_receber)
+                futuro = rmta_submeter_com_contexto(_executor_chamadas, consumo.executar)
+            else:
+                futuro = rmta_submeter_com_contexto(_executor_chamadas, modelo.invoke, mensagens)
+            try:
+                resposta = futuro.result(timeout=min(LLM_TIMEOUT_CHAMADA, restante))
+            except FuturoTimeoutError:
+                futuro.cancel()
+                if consumo is not None:
+                    consumo.abandonar()
+                raise ErroSemResposta(f"O modelo não respondeu em {min(LLM_TIMEOUT_CHAMADA, restante):.1f}s.")
+
+            disjuntor.registrar_sucesso()
+            _cache_respostas.guardar(chave, resposta)
+            if LLM_CASSETES_MODO == MODO_GRAVAR:
+                _gravar_cassete(chave, nome_modelo, mensagens, resposta, time.monotonic() - inicio_chamada)
+            rmta_incrementar_contador("sql_agent_llm_chamadas_total", rotulos={**rotulos, "resultado": "sucesso"})
+            return resposta
+        except Exception as e:
+            tentativa += 1
+            rmta_incrementar_contador("sql_agent_llm_falhas_total", rotulos={**rotulos, "erro": type(e).__name__})
+            espera_backoff = _calcular_backoff(tentativa)
+            pode_repetir = (
+                rmta_erro_repetivel(e)
+                and tentativa < LLM_MAX_TENTATIVAS
+                and time.monotonic() + espera_backoff < prazo
+            )
+            if not pode_repetir:
+                if rmta_falha_do_provedor(e):
+                    disjuntor.registrar_falha()
+                else:
+                    disjuntor.liberar_teste()
+                rmta_incrementar_contador("sql_agent_llm_chamadas_total", rotulos={**rotulos, "resultado": "falha"})
+                logger.error("Chamada ao modelo %s falhou após %s tentativa(s): %s", nome_modelo, tentativa, e)
+                raise
+            logger.warning("Erro transitório do modelo %s (%s); nova tentativa em %.2fs", nome_modelo, e, espera_backoff)
+            time.sleep(espera_backoff)
@@ -0,0 +1,483 @@
+"""
+Escalonador das etapas do fluxo por inquilino: cotas e fila justa ponderada.
+
+Vários times (inquilinos) compartilham a mesma implantação. Para que um
+inquilino com consultas pesadas não esgote a capacidade dos demais, as chamadas
+ao LLM e as execuções no banco feitas pelos nós passam por este escalonador:
+
+- Cotas por inquilino: tokens de LLM por minuto, execuções simultâneas no
+  banco e tempo total de banco em uma janela (ESCALONADOR_JANELA_TEMPO_BD)
+- Fila justa ponderada (start-time fair queuing) na frente da capacidade de
+  cada recurso: quando ela está toda ocupada, os pedidos em espera são
+  atendidos em proporção ao peso de cada inquilino, com o custo de um pedido
+  estimado pela duração média das últimas etapas do mesmo inquilino
+- O tempo de espera na fila fica em estado["tempo_execucao"]["espera_fila"]
+  (somado entre as etapas e incluído no tempo de cada uma)
+
+Cota esgotada ou espera acima de ESCALONADOR_TIMEOUT_FILA geram
+ErroCotaExcedida, que os nós registram em estado["erro"] e
+estado["cota_excedida"]. O inquilino vem de estado["inquilino"], definido na
+criação do estado a partir do contexto atual (rmta_contexto_inquilino; a API
+usa o cabeçalho X-Tenant-Id). Como o cabeçalho não é autenticado, apenas
+inquilinos configurados em ESCALONADOR_COTAS são distinguidos; os demais
+valores contam como INQUILINO_PADRAO, e o estado dos inquilinos inativos é
+descartado. Os limites valem por processo.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from config.configuracoes import (
+    ESCALONADOR_BD_SIMULTANEAS,
+    ESCALONADOR_COTAS,
+    ESCALONADOR_EXECUCOES_BD,
+    ESCALONADOR_JANELA_TEMPO_BD,
+    ESCALONADOR_LLM_SIMULTANEAS,
+    ESCALONADOR_PESO,
+    ESCALONADOR_TEMPO_BD,
+    ESCALONADOR_TIMEOUT_FILA,
+    ESCALONADOR_TOKENS_MINUTO,
+    INQUILINO_PADRAO
+)
+from utils.metricas import rmta_incrementar_contador, rmta_observar_histograma
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Recursos escalonados
+RECURSO_LLM = "llm"
+RECURSO_BD = "bd"
+_NOMES_RECURSOS = {RECURSO_LLM: "modelo de linguagem", RECURSO_BD: "banco de dados"}
+
+# Peso da duração mais recente na média usada como custo estimado de um pedido
+_FATOR_MEDIA_CUSTO = 0.2
+_CUSTO_INICIAL = 1.0  # segundos, antes da primeira etapa do inquilino
+
+# Intervalo entre as remoções do consumo e do custo médio de inquilinos inativos
+_INTERVALO_LIMPEZA = 60.0  # segundos
+
+# Inquilino da requisição em andamento no contexto atual (thread ou tarefa)
+_inquilino: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("inquilino", default=None)
+
+
+class ErroCotaExcedida(Exception):
+    """
+    Cota do inquilino esgotada, ou espera na fila acima do limite.
+
+    Attributes:
+        detalhes (Dict[str, Any]): Inquilino, recurso, motivo e segundos até poder tentar de novo
+    """
+
+    def __init__(self, mensagem: str, inquilino: str, recurso: str, motivo: str, tentar_novamente_em: float):
+        super().__init__(mensagem)
+        self.detalhes = {
+            "inquilino": inquilino,
+            "recurso": recurso,
+            "motivo": motivo,
+            "tentar_novamente_em": round(tentar_novamente_em, 1)
+        }
+
+
+class CotaInquilino(NamedTuple):
+    """Peso na fila justa e limites de um inquilino (0 = sem limite)."""
+    peso: float
+    tokens_minuto: int
+    execucoes_bd: int
+    tempo_bd: float
+
+
+def rmta_obter_inquilino() -> str:
+    """
+    Retorna o inquilino do contexto atual.
+
+    Returns:
+        str: Inquilino da requisição, ou INQUILINO_PADRAO fora de um contexto
+    """
+    return _inquilino.get() or INQUILINO_PADRAO
+
+
+@contextmanager
+def rmta_contexto_inquilino(inquilino: Optional[str]) -> Iterator[str]:
+    """
+    Define o inquilino das consultas processadas dentro do bloco.
+
+    Args:
+        inquilino (Optional[str]): Identificador do inquilino; None ou um inquilino
+            sem entrada em ESCALONADOR_COTAS usa INQUILINO_PADRAO
+
+    Yields:
+        str: Inquilino em vigor
+    """
+    token = _inquilino.set(inquilino if inquilino in ESCALONADOR_COTAS else INQUILINO_PADRAO)
+    try:
+        yield _inquilino.get()
+    finally:
+        _inquilino.reset(token)
+
+
+class _JanelaConsumo:
+    """Consumo (tokens ou segundos) registrado nos últimos `duracao` segundos."""
+
+    def __init__(self, duracao: float):
+        self.duracao = duracao
+        self._registros: Deque[Tuple[float, float]] = deque()
+        self._total = 0.0
+
+    def _expirar(self, agora: float) -> None:
+        while self._registros and self._registros[0][0] <= agora - self.duracao:
+            self._total -= self._registros.popleft()[1]
+
+    def total(self, agora: float) -> float:
+        self._expirar(agora)
+        return self._total
+
+    def adicionar(self, agora: float, valor: float) -> None:
+        self._expirar(agora)
+        self._registros.append((agora, valor))
+        self._total += valor
+
+    def liberacao(self, agora: float, limite: float) -> float:
+        """Segundos até o consumo na janela ficar abaixo do limite."""
+        total = self.total(agora)
+        espera = 0.0
+        for instante, valor in self._registros:
+            if total < limite:
+                break
+            total -= valor
+            espera = instante + self.duracao - agora
+        return max(espera, 0.0)
+
+
+class _Pedido:
+    """Pedido aguardando uma vaga em uma FilaJusta."""
+
+    __slots__ = ("inquilino", "inicio_virtual", "sequencia", "limite", "concedido")
+
+    def __init__(self, inquilino: str, inicio_virtual: float, sequencia: int, limite: int):
+        self.inquilino = inquilino
+        self.inicio_virtual = inicio_virtual
+        self.sequencia = sequencia
+        self.limite = limite
+        self.concedido = False
+
+
+class FilaJusta:
+    """
+    Vagas de um recurso distribuídas entre inquilinos por start-time fair queuing.
+
+    Cada pedido recebe um instante virtual de início, max(tempo virtual atual,
+    fim virtual do pedido anterior do mesmo inquilino), e avança o fim virtual
+    do inquilino em custo / peso. Com as vagas ocupadas, a próxima vaga livre
+    vai ao pedido em espera de menor início virtual cujo inquilino esteja
+    abaixo do seu limite de vagas simultâneas. Um inquilino que envia mais
+    pedidos que os demais só avança o próprio relógio virtual, sem atrasar os
+    outros além da sua parte proporcional ao peso.
+
+    Attributes:
+        nome (str): Recurso controlado (RECURSO_LLM ou RECURSO_BD)
+        capacidade (int): Vagas simultâneas do recurso, somando todos os inquilinos
+    """
+
+    def __init__(self, nome: str, capacidade: int):
+        self.nome = nome
+        self.capacidade = max(1, capacidade)
+        self._condicao = threading.Condition()
+        self._tempo_virtual = 0.0
+        self._fim_virtual: Dict[str, float] = {}
+        self._em_uso: Dict[str, int] = {}
+        self._ocupadas = 0
+        self._aguardando: List[_Pedido] = []
+        self._sequencia = itertools.count()
+
+    def _despachar(self) -> None:
+        """Concede as vagas livres aos pedidos elegíveis de menor início virtual."""
+        concedidos = False
+        while self._ocupadas < self.capacidade:
+            elegiveis = [
+                pedido for pedido in self._aguardando
+                if not pedido.limite or self._em_uso.get(pedido.inquilino, 0) < pedido.limite
+            ]
+            if not elegiveis:
+                break
+            pedido = min(elegiveis, key=lambda p: (p.inicio_virtual, p.sequencia))
+            self._aguardando.remove(pedido)
+            pedido.concedido = True
+            self._tempo_virtual = max(self._tempo_virtual, pedido.inicio_virtual)
+            self._ocupadas += 1
+            self._em_uso[pedido.inquilino] = self._em_uso.get(pedido.inquilino, 0) + 1
+            concedidos = True
+        if concedidos:
+            self._condicao.notify_all()
+
+    def adquirir(self, inquilino: str, peso: float, custo: float, limite: int, timeout: float) -> float:
+        """
+        Aguarda uma vaga para o inquilino.
+
+        Args:
+            inquilino (str): Inquilino do pedido
+            peso (float): Peso do inquilino (parte proporcional da capacidade)
+            custo (float): Duração estimada do pedido, em segundos
+            limite (int): Vagas simultâneas permitidas ao inquilino (0 = sem limite)
+            timeout (float): Espera máxima, em segundos
+
+        Returns:
+            float: Tempo de espera em segundos
+
+        Raises:
+            TimeoutError: Se a vaga não for concedida dentro do timeout
+        """
+        inicio = time.monotonic()
+        with self._condicao:
+            inicio_virtual = max(self._tempo_virtual, self._fim_virtual.get(inquilino, 0.0))
+            fim_virtual = inicio_virtual + custo / max(peso, 1e-6)
+            self._fim_virtual[inquilino] = fim_virtual
+            pedido = _Pedido(inquilino, inicio_virtual, next(self._sequencia), limite)
+            self._aguardando.append(pedido)
+            self._despachar()
+
+            prazo = inicio + timeout
+            while not pedido.concedido:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    self._aguardando.remove(pedido)
+                    # Um pedido desistente não deve atrasar os próximos do mesmo inquilino
+                    if self._fim_virtual.get(inquilino) == fim_virtual:
+                        self._fim_virtual[inquilino] = inicio_virtual
+                    raise TimeoutError(f"Sem vaga de {self.nome} em {timeout:.0f}s")
+                self._condicao.wait(restante)
+        return time.monotonic() - inicio
+
+    def liberar(self, inquilino: str) -> None:
+        """Devolve a vaga do inquilino e a concede ao próximo pedido da fila."""
+        with self._condicao:
+            self._ocupadas -= 1
+            self._em_uso[inquilino] -= 1
+            if not self._em_uso[inquilino]:
+                del self._em_uso[inquilino]
+            self._despachar()
+            if not self._ocupadas:
+                # Fila vazia: o tempo virtual avança até o último fim virtual e nenhum
+                # inquilino fica adiantado, então os fins virtuais podem ser descartados
+                self._tempo_virtual = max([self._tempo_virtual, *self._fim_virtual.values()])
+                self._fim_virtual.clear()
+            else:
+                # Fins virtuais já alcançados não afetam o próximo início virtual
+                self._fim_virtual = {
+                    chave: fim for chave, fim in self._fim_virtual.items() if fim > self._tempo_virtual
+                }
+
+    def em_uso(self, inquilino: str) -> int:
+        """Vagas ocupadas pelo inquilino no momento."""
+        with self._condicao:
+            return self._em_uso.get(inquilino, 0)
+
+
+class Reserva:
+    """
+    Vaga concedida a uma etapa; a etapa informa os tokens consumidos no LLM.
+
+    Attributes:
+        espera (float): Tempo de espera na fila, em segundos
+        tokens (int): Tokens de LLM consumidos (prompt + resposta)
+    """
+
+    def __init__(self, espera: float):
+        self.espera = espera
+        self.tokens = 0
+
+    def consumir_tokens(self, tokens: int) -> None:
+        self.tokens += tokens
+
+
+class Escalonador:
+    """
+    Cotas por inquilino e filas justas dos recursos de LLM e de banco.
+
+    Args:
+        capacidade_llm (int): Chamadas simultâneas ao LLM no processo
+        capacidade_bd (int): Execuções simultâneas no banco no processo
+        cotas (Optional[Dict[str, Dict[str, Any]]]): Peso e limites por inquilino
+            ("peso", "tokens_minuto", "execucoes_bd", "tempo_bd"); os ausentes usam os padrões
+        timeout_fila (float): Espera máxima por uma vaga, em segundos
+    """
+
+    def __init__(self, capacidade_llm: int = ESCALONADOR_LLM_SIMULTANEAS, capacidade_bd: int = ESCALONADOR_BD_SIMULTANEAS,
+                 cotas: Optional[Dict[str, Dict[str, Any]]] = None, timeout_fila: float = ESCALONADOR_TIMEOUT_FILA):
+        self._filas = {RECURSO_LLM: FilaJusta(RECURSO_LLM, capacidade_llm), RECURSO_BD: FilaJusta(RECURSO_BD, capacidade_bd)}
+        self._cotas = ESCALONADOR_COTAS if cotas is None else cotas
+        self.timeout_fila = timeout_fila
+        self._trava = threading.Lock()
+        self._tokens: Dict[str, _JanelaConsumo] = {}
+        self._tempo_bd: Dict[str, _JanelaConsumo] = {}
+        self._custo_medio: Dict[Tuple[str, str], float] = {}
+        self._ultimo_uso: Dict[str, float] = {}
+        self._ultima_limpeza = time.monotonic()
+
+    def cota(self, inquilino: str) -> CotaInquilino:
+        """Peso e limites do inquilino, com os padrões da configuração."""
+        cota = self._cotas.get(inquilino, {})
+        return CotaInquilino(
+            peso=float(cota.get("peso", ESCALONADOR_PESO)),
+            tokens_minuto=int(cota.get("tokens_minuto", ESCALONADOR_TOKENS_MINUTO)),
+            execucoes_bd=int(cota.get("execucoes_bd", ESCALONADOR_EXECUCOES_BD)),
+            tempo_bd=float(cota.get("tempo_bd", ESCALONADOR_TEMPO_BD))
+        )
+
+    def _verificar_cota(self, inquilino: str, recurso: str, cota: CotaInquilino) -> None:
+        """Levanta ErroCotaExcedida se o consumo do inquilino já atingiu o limite do recurso."""
+        agora = time.monotonic()
+        with self._trava:
+            if recurso == RECURSO_LLM and cota.tokens_minuto > 0:
+                janela = self._tokens.get(inquilino)
+                usado = janela.total(agora) if janela else 0
+                if usado >= cota.tokens_minuto:
+                    espera = janela.liberacao(agora, cota.tokens_minuto)
+                    mensagem = (
+                        f"Cota de tokens do LLM excedida para o inquilino '{inquilino}': "
+                        f"{usado:.0f} de {cota.tokens_minuto} tokens no último minuto. "
+                        f"Tente novamente em {espera:.0f}s."
+                    )
+                    raise ErroCotaExcedida(mensagem, inquilino, recurso, "tokens_minuto", espera)
+            if recurso == RECURSO_BD and cota.tempo_bd > 0:
+                janela = self._tempo_bd.get(inquilino)
+                usado = janela.total(agora) if janela else 0
+                if usado >= cota.tempo_bd:
+                    espera = janela.liberacao(agora, cota.tempo_bd)
+                    mensagem = (
+                        f"Cota de tempo de banco excedida para o inquilino '{inquilino}': "
+                        f"{usado:.1f}s de {cota.tempo_bd:g}s nos últimos {ESCALONADOR_JANELA_TEMPO_BD:.0f}s. "
+                        f"Tente novamente em {espera:.0f}s."
+                    )
+                    raise ErroCotaExcedida(mensagem, inquilino, recurso, "tempo_bd", espera)
+
+    def _registrar_consumo(self, inquilino: str, recurso: str, duracao: float, tokens: int) -> None:
+        """Atualiza as janelas de consumo e o custo médio das etapas do inquilino."""
+        agora = time.monotonic()
+        with self._trava:
+            if recurso == RECURSO_LLM and tokens:
+                self._tokens.setdefault(inquilino, _JanelaConsumo(60.0)).adicionar(agora, tokens)
+            elif recurso == RECURSO_BD:
+                self._tempo_bd.setdefault(inquilino, _JanelaConsumo(ESCALONADOR_JANELA_TEMPO_BD)).adicionar(agora, duracao)
+            chave = (recurso, inquilino)
+            anterior = self._custo_medio.get(chave, duracao)
+            self._custo_medio[chave] = anterior + _FATOR_MEDIA_CUSTO * (duracao - anterior)
+            self._ultimo_uso[inquilino] = agora
+            if agora - self._ultima_limpeza >= _INTERVALO_LIMPEZA:
+                self._remover_inativos(agora)
+
+    def _remover_inativos(self, agora: float) -> None:
+        """
+        Descarta o consumo e o custo médio dos inquilinos sem etapas há mais que a maior janela.
+
+        Nesse ponto as janelas do inquilino já estão vazias; só o custo médio volta
+        ao inicial. Deve ser chamado com a trava do escalonador.
+        """
+        self._ultima_limpeza = agora
+        inatividade = max(60.0, ESCALONADOR_JANELA_TEMPO_BD)
+        for inquilino in [nome for nome, ultimo in self._ultimo_uso.items() if agora - ultimo > inatividade]:
+            del self._ultimo_uso[inquilino]
+            self._tokens.pop(inquilino, None)
+            self._tempo_bd.pop(inquilino, None)
+            for recurso in self._filas:
+                self._custo_medio.pop((recurso, inquilino), None)
+
+    @contextmanager
+    def reservar(self, inquilino: str, recurso: str) -> Iterator[Reserva]:
+        """
+        Verifica a cota, aguarda a vaga na fila justa e a mantém durante o bloco.
+
+        Args:
+            inquilino (str): Inquilino da etapa
+            recurso (str): RECURSO_LLM ou RECURSO_BD
+
+        Yields:
+            Reserva: Vaga concedida, com o tempo de espera
+
+        Raises:
+            ErroCotaExcedida: Se a cota estiver esgotada ou a vaga não vier dentro do timeout
+        """
+        cota = self.cota(inquilino)
+        try:
+            self._verificar_cota(inquilino, recurso, cota)
+        except ErroCotaExcedida as e:
+            rmta_incrementar_contador(
+                "sql_agent_cotas_excedidas_total",
+                rotulos={"inquilino": inquilino, "recurso": recurso, "motivo": e.detalhes["motivo"]}
+            )
+            raise
+
+        fila = self._filas[recurso]
+        limite = cota.execucoes_bd if recurso == RECURSO_BD else 0
+        with self._trava:
+            custo = self._custo_medio.get((recurso, inquilino), _CUSTO_INICIAL)
+        try:
+            espera = fila.adquirir(inquilino, cota.peso, custo, limite, self.timeout_fila)
+        except TimeoutError:
+            rmta_incrementar_contador(
+                "sql_agent_cotas_excedidas_total",
+                rotulos={"inquilino": inquilino, "recurso": recurso, "motivo": "espera_fila"}
+            )
+            detalhe = (
+                f" (limite de {limite} execuções simultâneas por inquilino)"
+                if limite and fila.em_uso(inquilino) >= limite else ""
+            )
+            mensagem = (
+                f"Capacidade de {_NOMES_RECURSOS[recurso]} ocupada: o inquilino '{inquilino}' aguardou "
+                f"{self.timeout_fila:.0f}s na fila sem ser atendido{detalhe}. Tente novamente em instantes."
+            )
+            raise ErroCotaExcedida(mensagem, inquilino, recurso, "espera_fila", 1.0) from None
+
+        rmta_observar_histograma("sql_agent_espera_fila_segundos", espera, rotulos={"recurso": recurso})
+        if espera > 0.01:
+            logger.info("Inquilino '%s' aguardou %.3fs na fila de %s", inquilino, espera, recurso)
+        reserva = Reserva(espera)
+        inicio = time.monotonic()
+        try:
+            yield reserva
+        finally:
+            fila.liberar(inquilino)
+            self._registrar_consumo(inquilino, recurso, time.monotonic() - inicio, reserva.tokens)
+
+
+# Escalonador compartilhado pelos nós do processo
+_escalonador = Escalonador()
+
+
+@contextmanager
+def rmta_reservar(estado: Dict[str, Any], recurso: str) -> Iterator[Reserva]:
+    """
+    Reserva o recurso para uma etapa do estado, somando a espera em tempo_execucao["espera_fila"].
+
+    Args:
+        estado (EstadoAgente): Estado da consulta (estado["inquilino"] identifica o inquilino)
+        recurso (str): RECURSO_LLM ou RECURSO_BD
+
+    Yields:
+        Reserva: Vaga concedida; etapas de LLM informam os tokens com consumir_tokens
+
+    Raises:
+        ErroCotaExcedida: Se a cota estiver esgotada ou a vaga não vier dentro do timeout
+    """
+    inquilino = estado.get("inquilino") or rmta_obter_inquilino()
+    with _escalonador.reservar(inquilino, recurso) as reserva:
+        estado["tempo_execucao"] = estado.get("tempo_execucao") or {}
+        estado["tempo_execucao"]["espera_fila"] = estado["tempo_execucao"].get("espera_fila", 0.0) + reserva.espera
+        yield reserva
+
+
+def rmta_registrar_cota_excedida(estado: Dict[str, Any], erro: ErroCotaExcedida) -> None:
+    """
+    Registra no estado uma etapa recusada pelo escalonador.
+
+    Args:
+        estado (EstadoAgente): Estado da consulta
+        erro (ErroCotaExcedida): Erro levantado por rmta_reservar
+    """
+    logger.warning("Etapa recusada pelo escalonador: %s", erro)
+    estado["erro"] = str(erro)
+    estado["cota_excedida"] = erro.detalhes
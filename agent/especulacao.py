@@ -0,0 +1,144 @@
+"""
+Execução especulativa durante o streaming da geração de SQL.
+
+Enquanto o modelo ainda escreve a resposta, o campo "query" do JSON é extraído
+incrementalmente. Assim que a string do SQL se fecha, a validação, o EXPLAIN e
+o checkout de uma conexão do pool começam em segundo plano, sobrepondo-se ao
+restante da resposta (a explicação). Ao fim do stream, o resultado só é
+aproveitado se o SQL final for idêntico ao especulado.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from database.conexao import rmta_obter_conexao_bd
+from utils.config_log import rmta_submeter_com_contexto
+from utils.metricas import rmta_incrementar_contador, rmta_observar_histograma
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# String JSON completa do campo "query" (aspas de fechamento não escapadas)
+PADRAO_CAMPO_QUERY = re.compile(r'"query"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+
+_executor_especulacao = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sql_agent_especulacao")
+
+
+def rmta_extrair_query_parcial(texto: str) -> Optional[str]:
+    """
+    Extrai o valor do campo "query" de um JSON possivelmente incompleto.
+
+    Args:
+        texto (str): Texto acumulado da resposta do modelo
+
+    Returns:
+        Optional[str]: SQL decodificado, ou None se a string ainda não se fechou
+    """
+    correspondencia = PADRAO_CAMPO_QUERY.search(texto)
+    if correspondencia is None:
+        return None
+    try:
+        return json.loads(f'"{correspondencia.group(1)}"')
+    except json.JSONDecodeError:
+        return None
+
+
+def rmta_aquecer_conexao() -> None:
+    """Faz o checkout (e a devolução) de uma conexão do pool, abrindo-a se necessário."""
+    conexao = rmta_obter_conexao_bd()
+    if conexao:
+        conexao.close()
+
+
+class ExecucaoEspeculativa:
+    """
+    Validação especulativa do SQL de uma resposta em streaming.
+
+    Attributes:
+        verificar (Callable[[str], Dict[str, Any]]): Validação completa do SQL (padrões e EXPLAIN)
+        usa_plano (bool): Se a validação executa EXPLAIN (que já faz o checkout de uma conexão)
+        sql (Optional[str]): SQL especulado, quando já extraído
+    """
+
+    def __init__(self, verificar: Callable[[str], Dict[str, Any]], usa_plano: bool):
+        self.verificar = verificar
+        self.usa_plano = usa_plano
+        self.sql: Optional[str] = None
+        self._inicio = 0.0
+        self._futuro = None
+        self._trava = threading.Lock()
+
+    def ao_receber(self, texto: str) -> None:
+        """
+        Recebe o texto acumulado do stream e dispara a especulação quando o SQL se completa.
+
+        Args:
+            texto (str): Texto acumulado da resposta
+        """
+        if self._futuro is not None:
+            return
+        try:
+            sql = rmta_extrair_query_parcial(texto)
+        except Exception as e:
+            logger.debug("Falha ao extrair o SQL parcial: %s", e)
+            return
+        if not sql:
+            return
+        with self._trava:
+            if self._futuro is None:
+                self.sql = sql
+                self._inicio = time.time()
+                self._futuro = rmta_submeter_com_contexto(_executor_especulacao, self._executar, sql)
+                logger.debug("Especulação iniciada durante o stream: %.100s...", sql)
+
+    def _executar(self, sql: str) -> Dict[str, Any]:
+        """Valida o SQL e prepara uma conexão, medindo a duração."""
+        inicio = time.time()
+        validacao = self.verificar(sql)
+        if validacao["is_valid"] and not self.usa_plano:
+            rmta_aquecer_conexao()
+        return {"validacao": validacao, "duracao": time.time() - inicio}
+
+    def concluir(self, sql_final: str) -> Optional[Dict[str, Any]]:
+        """
+        Encerra a especulação ao fim do stream.
+
+        Args:
+            sql_final (str): SQL extraído da resposta completa
+
+        Returns:
+            Optional[Dict[str, Any]]: "sql", "validacao", "antecedencia" (segundos entre o
+            início da especulação e o fim do stream) e "tempo_economizado" (trabalho
+            sobreposto ao stream), ou None se não houve especulação ou o SQL mudou
+        """
+        if self._futuro is None:
+            return None
+
+        fim_stream = time.time()
+        try:
+            resultado = self._futuro.result()
+        except Exception as e:
+            logger.warning("Especulação falhou, validando normalmente: %s", e)
+            rmta_incrementar_contador("sql_agent_especulacao_total", rotulos={"resultado": "falha"})
+            return None
+        espera = time.time() - fim_stream
+
+        if (sql_final or "").strip() != self.sql.strip():
+            logger.info("SQL final difere do especulado; especulação descartada")
+            rmta_incrementar_contador("sql_agent_especulacao_total", rotulos={"resultado": "descartada"})
+            return None
+
+        economizado = max(0.0, resultado["duracao"] - espera)
+        rmta_incrementar_contador("sql_agent_especulacao_total", rotulos={"resultado": "aproveitada"})
+        rmta_observar_histograma("sql_agent_especulacao_economia_segundos", economizado)
+        logger.info("Especulação aproveitada: %.4fs fora do caminho crítico", economizado)
+        return {
+            "sql": self.sql,
+            "validacao": resultado["validacao"],
+            "antecedencia": fim_stream - self._inicio,
+            "tempo_economizado": economizado
+        }
@@ -6,6 +6,10 @@ o estado do agente durante o fluxo de execução do LangGraph.
 """
 from typing import Dict, List, Any, TypedDict, Optional
 
+# Nó de encerramento do grafo; mesmo valor de langgraph.graph.END, definido aqui para
+# que os nós e as funções de decisão não precisem importar o langgraph
+END = "__end__"
+
 class EstadoAgente(TypedDict):
     """
     Representa o estado do agente durante o fluxo de execução.
@@ -15,18 +19,48 @@ class EstadoAgente(TypedDict):
         sql (str): Consulta SQL gerada a partir da pergunta
         validacao (Dict[str, Any]): Resultado da validação da consulta SQL
         resultados (Optional[List[Dict[str, Any]]]): Resultados da consulta SQL
+        tipos_colunas (Optional[Dict[str, str]]): Tipo de cada coluna dos resultados, pelo OID
+            informado pelo banco (database.decodificacao), usado ao montar DataFrames
         explicacao (str): Explicação da consulta SQL gerada
         explicacao_resultados (Optional[str]): Explicação dos resultados da consulta
         erro (Optional[str]): Mensagem de erro, se houver
-        mensagens (List[Dict[str, str]]): Histórico de mensagens trocadas com o LLM
+        mensagens (List[Dict[str, Any]]): Histórico compacto das mensagens trocadas com o LLM
+            (prompts referenciados por ID de template, hash e parâmetros)
         tempo_execucao (Dict[str, float]): Tempos de execução de cada etapa
+        uso_tokens (Dict[str, Dict[str, Any]]): Tokens de prompt (em cache e sem cache) por etapa
+        nivel_modelo (Optional[str]): Nível do roteador que gerou o SQL atual (regras, rapido, completo)
+        parametros_sql (Dict[str, Any]): Valores dos parâmetros nomeados do SQL gerado por template
+        intencao (Optional[Dict[str, Any]]): Intenção reconhecida pelas regras (nome e slots extraídos)
+        contexto_sessao (Optional[Dict[str, str]]): Pergunta e SQL anteriores da sessão, para perguntas de acompanhamento
+        especulacao (Optional[Dict[str, Any]]): Validação feita durante o streaming da geração
+            (SQL, resultado e tempo economizado), reaproveitada se o SQL final for o mesmo
+        subconsultas (List[Dict[str, Any]]): Subconsultas planejadas para uma pergunta composta
+            (pergunta, SQL, parâmetros, nível, resultados e erro de cada ramo)
+        modo_aproximado (bool): Se agregações sobre tabelas grandes podem ser respondidas por amostragem
+        aproximacao (Optional[Dict[str, Any]]): Amostragem usada nos resultados (tabela, método,
+            percentual, confiança e intervalos de cada registro); None para resultados exatos
+        inquilino (str): Inquilino da requisição, usado nas cotas e na fila justa do escalonador
+        cota_excedida (Optional[Dict[str, Any]]): Etapa recusada pelo escalonador (inquilino,
+            recurso, motivo e segundos até poder tentar de novo); None se nenhuma foi recusada
     """
     consulta: str
     sql: str
     validacao: Dict[str, Any]
     resultados: Optional[List[Dict[str, Any]]]
+    tipos_colunas: Optional[Dict[str, str]]
     explicacao: str
     explicacao_resultados: Optional[str]
     erro: Optional[str]
-    mensagens: List[Dict[str, str]]
-    tempo_execucao: Dict[str, float]
\ No newline at end of file
+    mensagens: List[Dict[str, Any]]
+    tempo_execucao: Dict[str, float]
+    uso_tokens: Dict[str, Dict[str, Any]]
+    nivel_modelo: Optional[str]
+    parametros_sql: Dict[str, Any]
+    intencao: Optional[Dict[str, Any]]
+    contexto_sessao: Optional[Dict[str, str]]
+    especulacao: Optional[Dict[str, Any]]
+    subconsultas: List[Dict[str, Any]]
+    modo_aproximado: bool
+    aproximacao: Optional[Dict[str, Any]]
+    inquilino: str
+    cota_excedida: Optional[Dict[str, Any]]
\ No newline at end of file
@@ -6,19 +6,40 @@ do LangGraph que processa a consulta do usuário.
 """
 import logging
 import time
-from langgraph.graph import StateGraph, END
-from agent.estado import EstadoAgente
+import unicodedata
+from agent.escalonador import rmta_obter_inquilino
+from agent.estado import EstadoAgente, END
 from agent.nos import (
     rmta_gerar_sql,
     rmta_validar_sql,
     rmta_executar_sql,
     rmta_explicar_resultados,
+    rmta_escalar_modelo,
+    rmta_decidir_apos_validacao,
     rmta_decidir_proximo_passo
 )
+from agent.subconsultas import (
+    rmta_planejar_consulta,
+    rmta_executar_subconsultas,
+    rmta_decidir_apos_planejamento,
+    rmta_decidir_apos_subconsultas
+)
+from agent.sessoes import (
+    rmta_obter_sessao,
+    rmta_atualizar_sessao,
+    rmta_obter_contexto_sessao,
+    rmta_responder_refinamento
+)
+from utils.coalescencia import GrupoCoalescencia
+from utils.config_log import rmta_contexto_requisicao
+from utils.perfilador import rmta_contexto_perfil, rmta_perfilar_no
 
 # Obter logger
 logger = logging.getLogger('sql_agent')
 
+# Deduplicação de perguntas idênticas em andamento
+_GRUPO_CONSULTAS = GrupoCoalescencia("consulta")
+
 def rmta_criar_fluxo_trabalho():
     """
     Cria o grafo de fluxo de trabalho do SQL Agent.
@@ -29,74 +50,234 @@ def rmta_criar_fluxo_trabalho():
     Returns:
         object: Grafo de fluxo de trabalho compilado
     """
+    from langgraph.graph import StateGraph
+    
     logger.info("Criando grafo de fluxo de trabalho")
     inicio = time.time()
     
     # Definir o grafo
     fluxo_trabalho = StateGraph(EstadoAgente)
     
-    # Adicionar nós
-    fluxo_trabalho.add_node("gerar_sql", rmta_gerar_sql)
-    fluxo_trabalho.add_node("validar_sql", rmta_validar_sql)
-    fluxo_trabalho.add_node("executar_sql", rmta_executar_sql)
-    fluxo_trabalho.add_node("explicar_resultados", rmta_explicar_resultados)
+    # Adicionar nós (perfilados quando a requisição estiver sendo perfilada)
+    nos = {
+        "planejar_consulta": rmta_planejar_consulta,
+        "executar_subconsultas": rmta_executar_subconsultas,
+        "gerar_sql": rmta_gerar_sql,
+        "validar_sql": rmta_validar_sql,
+        "executar_sql": rmta_executar_sql,
+        "explicar_resultados": rmta_explicar_resultados,
+        "escalar_modelo": rmta_escalar_modelo
+    }
+    for nome, funcao in nos.items():
+        fluxo_trabalho.add_node(nome, rmta_perfilar_no(nome, funcao))
     
-    # Definir arestas
+    # Definir arestas: perguntas compostas se dividem em subconsultas paralelas
+    # e voltam a se juntar na explicação dos resultados
+    fluxo_trabalho.add_conditional_edges(
+        "planejar_consulta",
+        rmta_decidir_apos_planejamento,
+        {
+            "gerar_sql": "gerar_sql",
+            "executar_subconsultas": "executar_subconsultas"
+        }
+    )
+    fluxo_trabalho.add_conditional_edges(
+        "executar_subconsultas",
+        rmta_decidir_apos_subconsultas,
+        {
+            "explicar_resultados": "explicar_resultados",
+            END: END
+        }
+    )
     fluxo_trabalho.add_edge("gerar_sql", "validar_sql")
-    fluxo_trabalho.add_edge("validar_sql", "executar_sql")
+    fluxo_trabalho.add_conditional_edges(
+        "validar_sql",
+        rmta_decidir_apos_validacao,
+        {
+            "executar_sql": "executar_sql",
+            "escalar_modelo": "escalar_modelo",
+            END: END
+        }
+    )
     fluxo_trabalho.add_conditional_edges(
         "executar_sql",
         rmta_decidir_proximo_passo,
         {
             "explicar_resultados": "explicar_resultados",
+            "escalar_modelo": "escalar_modelo",
             END: END
         }
     )
+    fluxo_trabalho.add_edge("escalar_modelo", "gerar_sql")
     fluxo_trabalho.add_edge("explicar_resultados", END)
     
     # Definir o nó inicial
-    fluxo_trabalho.set_entry_point("gerar_sql")
+    fluxo_trabalho.set_entry_point("planejar_consulta")
     
     # Compilar o grafo
     grafo_compilado = fluxo_trabalho.compile()
     
     # Registrar tempo de criação
     fim = time.time()
-    logger.debug(f"Grafo de fluxo de trabalho criado em {fim - inicio:.4f}s")
+    logger.debug("Grafo de fluxo de trabalho criado em %.4fs", fim - inicio)
     
     return grafo_compilado
 
-def rmta_processar_consulta(texto_entrada):
+def rmta_criar_estado_inicial(texto_entrada, contexto_sessao=None, aproximado=False):
+    """
+    Cria o estado inicial do agente para uma consulta.
+    
+    Args:
+        texto_entrada (str): Consulta em linguagem natural do usuário
+        contexto_sessao (dict, optional): Pergunta e SQL anteriores da sessão
+        aproximado (bool, optional): Se agregações elegíveis podem ser respondidas por amostragem
+        
+    Returns:
+        EstadoAgente: Estado inicial com todos os campos preenchidos
+    """
+    return {
+        "consulta": texto_entrada,
+        "sql": "",
+        "validacao": {},
+        "resultados": None,
+        "tipos_colunas": None,
+        "explicacao": "",
+        "explicacao_resultados": None,
+        "erro": None,
+        "mensagens": [],
+        "tempo_execucao": {},
+        "uso_tokens": {},
+        "nivel_modelo": None,
+        "parametros_sql": {},
+        "intencao": None,
+        "contexto_sessao": contexto_sessao,
+        "especulacao": None,
+        "subconsultas": [],
+        "modo_aproximado": aproximado,
+        "aproximacao": None,
+        "inquilino": rmta_obter_inquilino(),
+        "cota_excedida": None
+    }
+
+def rmta_normalizar_pergunta(texto_entrada):
+    """
+    Normaliza uma pergunta para identificar requisições equivalentes.
+    
+    Aplica normalização Unicode, ignora maiúsculas/minúsculas, espaços repetidos
+    e a pontuação final.
+    
+    Args:
+        texto_entrada (str): Consulta em linguagem natural do usuário
+        
+    Returns:
+        str: Pergunta normalizada
+    """
+    texto = unicodedata.normalize("NFKC", texto_entrada).casefold()
+    return " ".join(texto.split()).rstrip("?!. ")
+
+def rmta_processar_consulta(texto_entrada, id_sessao=None, aproximado=False, perfilar=False):
     """
     Processa uma consulta em linguagem natural usando o fluxo de trabalho.
     
+    Os registros de log emitidos durante o processamento levam o ID da
+    requisição em andamento (ou um novo ID, se não houver).
+    
+    Args:
+        texto_entrada (str): Consulta em linguagem natural do usuário
+        id_sessao (str, optional): Identificador da sessão de conversa
+        aproximado (bool, optional): Se agregações sobre tabelas grandes podem ser
+            respondidas por amostragem (database.amostragem)
+        perfilar (bool, optional): Perfilar os nós desta consulta (utils.perfilador),
+            além das requisições escolhidas por PERFIL_AMOSTRAGEM
+        
+    Returns:
+        EstadoAgente: Estado final após o processamento da consulta
+    """
+    with rmta_contexto_requisicao(), rmta_contexto_perfil(texto_entrada, forcar=perfilar):
+        return _processar_consulta(texto_entrada, id_sessao, aproximado)
+
+def _processar_consulta(texto_entrada, id_sessao=None, aproximado=False):
+    """
+    Processa uma consulta com coalescência e sessões.
+    
+    Requisições concorrentes do mesmo inquilino com a mesma pergunta normalizada
+    são coalescidas: apenas a primeira executa o fluxo, e as demais recebem uma
+    cópia do mesmo resultado assim que ele fica pronto.
+    
+    Com uma sessão, perguntas que apenas refinam a anterior (filtro, ordenação,
+    limite) são respondidas a partir do resultado anterior, sem o fluxo, e as
+    demais perguntas de acompanhamento recebem a pergunta e o SQL anteriores
+    como contexto.
+    
+    Args:
+        texto_entrada (str): Consulta em linguagem natural do usuário
+        id_sessao (str, optional): Identificador da sessão de conversa
+        aproximado (bool, optional): Se agregações elegíveis podem ser respondidas por amostragem
+        
+    Returns:
+        EstadoAgente: Estado final após o processamento da consulta
+    """
+    inicio_total = time.time()
+    sessao = rmta_obter_sessao(id_sessao) if id_sessao else None
+    contexto_sessao = None
+    
+    if sessao is not None:
+        resultado = rmta_responder_refinamento(sessao, rmta_criar_estado_inicial(texto_entrada))
+        if resultado is not None:
+            resultado["tempo_execucao"]["total"] = time.time() - inicio_total
+            rmta_atualizar_sessao(id_sessao, resultado)
+            return resultado
+        contexto_sessao = rmta_obter_contexto_sessao(sessao, texto_entrada)
+    
+    # Perguntas que dependem do contexto da sessão só são equivalentes dentro da mesma sessão
+    chave = rmta_normalizar_pergunta(texto_entrada)
+    if contexto_sessao is not None:
+        chave = f"{id_sessao}\x00{chave}"
+    if aproximado:
+        chave = f"aproximado\x00{chave}"
+    # Cada inquilino responde pelas próprias execuções (cotas e fila justa)
+    chave = f"{rmta_obter_inquilino()}\x00{chave}"
+    resultado, compartilhado = _GRUPO_CONSULTAS.executar(
+        chave,
+        rmta_executar_fluxo,
+        texto_entrada,
+        contexto_sessao,
+        aproximado
+    )
+    
+    if compartilhado:
+        # Preservar a pergunta original e o tempo percebido por esta requisição
+        resultado["consulta"] = texto_entrada
+        resultado["tempo_execucao"]["total"] = time.time() - inicio_total
+        logger.info("Consulta coalescida com uma execução em andamento: '%s'", texto_entrada)
+    
+    if id_sessao:
+        rmta_atualizar_sessao(id_sessao, resultado)
+    return resultado
+
+def rmta_executar_fluxo(texto_entrada, contexto_sessao=None, aproximado=False):
+    """
+    Executa o fluxo de trabalho para uma consulta, sem coalescência.
+    
     Esta função cria o fluxo de trabalho, define o estado inicial e
     executa o fluxo para processar a consulta do usuário.
     
     Args:
         texto_entrada (str): Consulta em linguagem natural do usuário
+        contexto_sessao (dict, optional): Pergunta e SQL anteriores da sessão
+        aproximado (bool, optional): Se agregações elegíveis podem ser respondidas por amostragem
         
     Returns:
         EstadoAgente: Estado final após o processamento da consulta
     """
-    logger.info(f"Processando consulta: '{texto_entrada}'")
+    logger.info("Processando consulta: '%s'", texto_entrada)
     inicio_total = time.time()
     
     # Criar o fluxo de trabalho
     fluxo_trabalho = rmta_criar_fluxo_trabalho()
     
     # Estado inicial
-    estado_inicial = {
-        "consulta": texto_entrada,
-        "sql": "",
-        "validacao": {},
-        "resultados": None,
-        "explicacao": "",
-        "explicacao_resultados": None,
-        "erro": None,
-        "mensagens": [],
-        "tempo_execucao": {}
-    }
+    estado_inicial = rmta_criar_estado_inicial(texto_entrada, contexto_sessao, aproximado)
     
     # Executar o fluxo
     try:
@@ -107,10 +288,10 @@ def rmta_processar_consulta(texto_entrada):
         tempo_total = fim_total - inicio_total
         resultado["tempo_execucao"]["total"] = tempo_total
         
-        logger.info(f"Consulta processada com sucesso em {tempo_total:.2f}s")
+        logger.info("Consulta processada com sucesso em %.2fs", tempo_total)
         return resultado
     except Exception as e:
-        logger.error(f"Erro ao processar o fluxo: {str(e)}")
+        logger.error("Erro ao processar o fluxo: %s", e)
         
         # Registrar tempo mesmo em caso de erro
         fim_total = time.time()
@@ -121,9 +302,99 @@ def rmta_processar_consulta(texto_entrada):
             "sql": "",
             "validacao": {},
             "resultados": None,
+            "tipos_colunas": None,
             "explicacao": "",
             "explicacao_resultados": None,
             "erro": f"Erro ao processar o fluxo: {str(e)}",
             "mensagens": [],
-            "tempo_execucao": {"total": tempo_total}
-        }
\ No newline at end of file
+            "tempo_execucao": {"total": tempo_total},
+            "uso_tokens": {},
+            "nivel_modelo": None,
+            "parametros_sql": {},
+            "intencao": None,
+            "contexto_sessao": contexto_sessao,
+            "especulacao": None,
+            "subconsultas": [],
+            "modo_aproximado": aproximado,
+            "aproximacao": None,
+            "inquilino": rmta_obter_inquilino(),
+            "cota_excedida": None
+        }
+
+def rmta_refazer_exato(estado):
+    """
+    Refaz de forma exata uma resposta aproximada, reaproveitando o SQL já validado.
+    
+    Apenas a execução e a explicação dos resultados são refeitas; a pergunta
+    não passa de novo pela geração e validação do SQL.
+    
+    Args:
+        estado (EstadoAgente): Estado final de uma resposta aproximada
+        
+    Returns:
+        EstadoAgente: Novo estado com os resultados exatos
+    """
+    inicio = time.time()
+    exato = {
+        **estado,
+        "modo_aproximado": False,
+        "aproximacao": None,
+        "explicacao_resultados": None,
+        "tempo_execucao": dict(estado.get("tempo_execucao") or {})
+    }
+    with rmta_contexto_requisicao():
+        exato = rmta_explicar_resultados(rmta_executar_sql(exato))
+    exato["tempo_execucao"]["refazer_exato"] = time.time() - inicio
+    logger.info("Resposta aproximada refeita de forma exata em %.2fs", exato["tempo_execucao"]["refazer_exato"])
+    return exato
+
+def rmta_processar_consulta_stream(texto_entrada, id_sessao=None, aproximado=False):
+    """
+    Processa uma consulta emitindo o estado ao final de cada nó do fluxo.
+    
+    Usado pelo endpoint de streaming do servidor HTTP para enviar o progresso
+    ao cliente à medida que cada etapa termina. Com uma sessão, refinamentos
+    da pergunta anterior são respondidos direto (apenas a etapa "fim"), como
+    em rmta_processar_consulta.
+    
+    Args:
+        texto_entrada (str): Consulta em linguagem natural do usuário
+        id_sessao (str, optional): Identificador da sessão de conversa
+        aproximado (bool, optional): Se agregações elegíveis podem ser respondidas por amostragem
+        
+    Yields:
+        Tuple[str, EstadoAgente]: Nome da etapa concluída e o estado naquele ponto.
+        O último item tem a etapa "fim" e o estado final.
+    """
+    logger.info("Processando consulta em streaming: '%s'", texto_entrada)
+    inicio_total = time.time()
+    sessao = rmta_obter_sessao(id_sessao) if id_sessao else None
+    contexto_sessao = None
+    
+    if sessao is not None:
+        resultado = rmta_responder_refinamento(sessao, rmta_criar_estado_inicial(texto_entrada))
+        if resultado is not None:
+            resultado["tempo_execucao"]["total"] = time.time() - inicio_total
+            rmta_atualizar_sessao(id_sessao, resultado)
+            yield "fim", resultado
+            return
+        contexto_sessao = rmta_obter_contexto_sessao(sessao, texto_entrada)
+    
+    fluxo_trabalho = rmta_criar_fluxo_trabalho()
+    estado = rmta_criar_estado_inicial(texto_entrada, contexto_sessao, aproximado)
+    
+    try:
+        for evento in fluxo_trabalho.stream(estado):
+            for etapa, estado_etapa in evento.items():
+                estado = estado_etapa
+                if etapa != END:
+                    yield etapa, estado
+    except Exception as e:
+        logger.error("Erro ao processar o fluxo: %s", e)
+        estado = rmta_criar_estado_inicial(texto_entrada, contexto_sessao, aproximado)
+        estado["erro"] = f"Erro ao processar o fluxo: {str(e)}"
+    
+    estado["tempo_execucao"]["total"] = time.time() - inicio_total
+    if id_sessao:
+        rmta_atualizar_sessao(id_sessao, estado)
+    yield "fim", estado
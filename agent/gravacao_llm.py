@@ -0,0 +1,160 @@
+"""
+Gravação e reprodução das chamadas ao modelo de linguagem (cassetes).
+
+No modo "gravar", cada resposta obtida por rmta_invocar_modelo é salva com a
+requisição e a latência original em um cassete endereçado pelo conteúdo: o
+arquivo se chama pelo hash do modelo e das mensagens (o mesmo hash do cache de
+respostas), de modo que a mesma requisição sempre cai no mesmo cassete e
+regravar não duplica nada.
+
+No modo "reproduzir", rmta_invocar_modelo responde a partir dos cassetes, sem
+chamar o provedor (nem exigir a chave da API), aguardando a latência original
+ou a configurada em LLM_CASSETES_LATENCIA. Assim o grafo inteiro, com a execução
+no banco, pode ser medido e perfilado de forma reprodutível e offline.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+from config.configuracoes import LLM_CASSETES_DIRETORIO, LLM_CASSETES_LATENCIA
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+MODO_GRAVAR = "gravar"
+MODO_REPRODUZIR = "reproduzir"
+
+
+class ModeloCassete:
+    """
+    Substituto do cliente do modelo no modo de reprodução.
+
+    Só carrega o nome do modelo, que entra na chave dos cassetes; as respostas
+    vêm do armazém, por isso não há provedor nem chave de API envolvidos.
+    """
+
+    def __init__(self, nome_modelo: str):
+        self.model_name = nome_modelo
+
+    def invoke(self, mensagens: List[Any]):
+        raise RuntimeError(f"O modelo {self.model_name} está em modo de reprodução e só responde a partir dos cassetes.")
+
+
+def rmta_serializar_resposta(resposta) -> Dict[str, Any]:
+    """Extrai da resposta do modelo o conteúdo e os metadados usados pelos nós."""
+    metadados = getattr(resposta, "response_metadata", None)
+    return {
+        "conteudo": str(resposta.content),
+        "metadados": metadados if isinstance(metadados, dict) else {}
+    }
+
+
+def rmta_reconstruir_resposta(cassete: Dict[str, Any]):
+    """Recria a resposta do modelo (AIMessage) a partir de um cassete."""
+    from langchain_core.messages import AIMessage
+
+    resposta = cassete["resposta"]
+    return AIMessage(content=resposta["conteudo"], response_metadata=resposta["metadados"])
+
+
+def rmta_latencia_reproducao(cassete: Dict[str, Any], configuracao: str = LLM_CASSETES_LATENCIA) -> float:
+    """
+    Latência a simular ao reproduzir um cassete.
+
+    Args:
+        cassete (Dict[str, Any]): Cassete com a latência gravada
+        configuracao (str): "original" ou um número fixo de segundos
+
+    Returns:
+        float: Segundos a aguardar antes de entregar a resposta
+    """
+    if configuracao.strip().lower() == "original":
+        return float(cassete.get("latencia", 0.0))
+    return max(0.0, float(configuracao))
+
+
+class ArmazemCassetes:
+    """
+    Cassetes em disco, um arquivo JSON por requisição, nomeado pelo hash do conteúdo.
+
+    Os arquivos ficam em subdiretórios pelos dois primeiros caracteres do hash e
+    são escritos de forma atômica (arquivo temporário + rename), o que permite
+    gravar de várias threads. Os cassetes lidos ficam em memória.
+
+    Attributes:
+        diretorio (str): Diretório raiz dos cassetes
+    """
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        self._lidos: Dict[str, Dict[str, Any]] = {}
+        self._trava = threading.Lock()
+
+    def caminho(self, chave: str) -> str:
+        """Arquivo do cassete de uma chave."""
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.json")
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        """
+        Lê o cassete de uma requisição.
+
+        Args:
+            chave (str): Hash do modelo e das mensagens
+
+        Returns:
+            Optional[Dict[str, Any]]: Cassete, ou None se a requisição não foi gravada
+        """
+        with self._trava:
+            if chave in self._lidos:
+                return self._lidos[chave]
+        try:
+            with open(self.caminho(chave), encoding="utf-8") as arquivo:
+                cassete = json.load(arquivo)
+        except FileNotFoundError:
+            return None
+        with self._trava:
+            self._lidos[chave] = cassete
+        return cassete
+
+    def gravar(self, chave: str, nome_modelo: str, mensagens: List[Any], resposta, latencia: float) -> None:
+        """
+        Grava o cassete de uma requisição respondida.
+
+        Args:
+            chave (str): Hash do modelo e das mensagens
+            nome_modelo (str): Modelo que respondeu
+            mensagens (List[Any]): Mensagens enviadas
+            resposta: Resposta do modelo
+            latencia (float): Segundos entre o envio e a resposta completa
+        """
+        cassete = {
+            "chave": chave,
+            "modelo": nome_modelo,
+            "mensagens": [{"tipo": type(m).__name__, "conteudo": str(m.content)} for m in mensagens],
+            "resposta": rmta_serializar_resposta(resposta),
+            "latencia": latencia
+        }
+        caminho = self.caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+                json.dump(cassete, arquivo, ensure_ascii=False, indent=2)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+        with self._trava:
+            self._lidos[chave] = cassete
+        logger.debug("Cassete gravado para o modelo %s: %s", nome_modelo, chave)
+
+
+_armazem = ArmazemCassetes(LLM_CASSETES_DIRETORIO)
+
+
+def rmta_obter_armazem() -> ArmazemCassetes:
+    """Retorna o armazém de cassetes do processo."""
+    return _armazem
@@ -0,0 +1,396 @@
+"""
+Caminho rápido de NL→SQL por templates, sem chamada ao LLM.
+
+Este módulo implementa o nível mais barato do roteador de modelos. Um
+reconhecedor determinístico identifica as intenções mais comuns em produção
+(maiores clientes por gasto, quem comprou um produto, quem pode comprar um
+produto, listagens), extrai os parâmetros (produtos, categorias, períodos e
+limites) com o auxílio do índice de entidades carregado do banco e os aplica
+a templates SQL parametrizados. Perguntas que não correspondem a nenhuma
+intenção retornam None e seguem para os níveis com LLM.
+"""
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.indice_entidades import rmta_obter_indice_entidades
+from utils.texto import rmta_normalizar_texto, rmta_tokenizar
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12
+}
+
+NUMEROS_POR_EXTENSO = {
+    "um": 1, "dois": 2, "tres": 3, "quatro": 4, "cinco": 5,
+    "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10
+}
+
+LIMITE_PADRAO_RANKING = 5
+
+_NOMES_MESES = "|".join(MESES)
+_DATA = r"(\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2})"
+
+# Expressões de período, na ordem de precedência
+PADROES_PERIODO = [
+    ("intervalo", re.compile(rf"\b(?:entre|de) {_DATA} (?:e|a|ate) {_DATA}")),
+    ("ultimos_dias", re.compile(r"\bnos ultimos (\d+) dias")),
+    ("desde", re.compile(rf"\b(?:desde|a partir de) {_DATA}")),
+    ("mes", re.compile(rf"\b(?:em|de|no mes de|durante) ({_NOMES_MESES})(?: de (\d{{4}}))?")),
+    ("ano", re.compile(r"\b(?:em|no ano de|durante) (\d{4})\b"))
+]
+
+
+def _converter_data(texto: str) -> date:
+    """Converte uma data nos formatos dd/mm/aaaa ou aaaa-mm-dd."""
+    if "/" in texto:
+        return datetime.strptime(texto, "%d/%m/%Y").date()
+    return datetime.strptime(texto, "%Y-%m-%d").date()
+
+
+def rmta_extrair_periodo(texto: str, hoje: Optional[date] = None) -> Tuple[str, Optional[Dict[str, date]]]:
+    """
+    Extrai um período de datas de uma pergunta normalizada.
+
+    Args:
+        texto (str): Pergunta normalizada (sem acentos, minúsculas)
+        hoje (Optional[date]): Data de referência para períodos relativos
+
+    Returns:
+        Tuple[str, Optional[Dict[str, date]]]: Texto sem a expressão de período e
+        o período com "inicio" (inclusive) e "fim" (exclusivo, pode ser None)
+    """
+    hoje = hoje or date.today()
+    for tipo, padrao in PADROES_PERIODO:
+        correspondencia = padrao.search(texto)
+        if not correspondencia:
+            continue
+        try:
+            if tipo == "intervalo":
+                inicio = _converter_data(correspondencia.group(1))
+                fim = _converter_data(correspondencia.group(2)) + timedelta(days=1)
+            elif tipo == "ultimos_dias":
+                inicio = hoje - timedelta(days=int(correspondencia.group(1)))
+                fim = hoje + timedelta(days=1)
+            elif tipo == "desde":
+                inicio, fim = _converter_data(correspondencia.group(1)), None
+            elif tipo == "mes":
+                mes = MESES[correspondencia.group(1)]
+                ano = int(correspondencia.group(2) or hoje.year)
+                inicio = date(ano, mes, 1)
+                fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+            else:
+                ano = int(correspondencia.group(1))
+                inicio, fim = date(ano, 1, 1), date(ano + 1, 1, 1)
+        except ValueError:
+            continue
+        restante = (texto[:correspondencia.start()] + texto[correspondencia.end():]).strip()
+        return " ".join(restante.split()), {"inicio": inicio, "fim": fim}
+    return texto, None
+
+
+def _cobre_termo(termo: str, valores: List[str]) -> bool:
+    """
+    Verifica se os valores resolvidos explicam todas as palavras do termo.
+
+    Palavras que não pertencem a nenhum dos valores (negações, quantidades,
+    uma segunda pergunta) mudam o sentido da pergunta, que então não pode ser
+    atendida pelo template e segue para o LLM.
+    """
+    tokens_valores = {token for valor in valores for token in rmta_tokenizar(valor)}
+    return bool(valores) and set(rmta_tokenizar(termo)) <= tokens_valores
+
+
+def _resolver_itens(termo: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Resolve o termo de uma pergunta em produtos ou, se não houver, em categorias.
+
+    Returns:
+        Optional[Dict[str, List[str]]]: {"produtos": [...]} ou {"categorias": [...]},
+        ou None se o termo não corresponder inteiramente a entidades conhecidas
+    """
+    indice = rmta_obter_indice_entidades()
+    produtos = indice.buscar("produtos", "nome", termo)
+    if _cobre_termo(termo, produtos):
+        return {"produtos": produtos}
+    categorias = indice.buscar("produtos", "categoria", termo)
+    if _cobre_termo(termo, categorias):
+        return {"categorias": categorias}
+    return None
+
+
+def _filtros_transacoes(slots: Dict[str, Any], parametros: Dict[str, Any]) -> List[str]:
+    """Monta as condições de produto, categoria e período sobre transações."""
+    condicoes = []
+    if slots.get("produtos"):
+        condicoes.append("p.nome = ANY(%(produtos)s)")
+        parametros["produtos"] = slots["produtos"]
+    if slots.get("categorias"):
+        condicoes.append("p.categoria = ANY(%(categorias)s)")
+        parametros["categorias"] = slots["categorias"]
+    periodo = slots.get("periodo")
+    if periodo:
+        condicoes.append("t.data_compra >= %(data_inicio)s")
+        parametros["data_inicio"] = periodo["inicio"]
+        if periodo["fim"]:
+            condicoes.append("t.data_compra < %(data_fim)s")
+            parametros["data_fim"] = periodo["fim"]
+    return condicoes
+
+
+def _descrever_filtros(slots: Dict[str, Any]) -> str:
+    """Descreve em português os filtros aplicados, para explicações."""
+    partes = []
+    if slots.get("produtos"):
+        partes.append(f"produtos {', '.join(slots['produtos'])}")
+    if slots.get("categorias"):
+        partes.append(f"categoria {', '.join(slots['categorias'])}")
+    periodo = slots.get("periodo")
+    if periodo:
+        texto = f"a partir de {periodo['inicio'].strftime('%d/%m/%Y')}"
+        if periodo["fim"]:
+            texto += f" e antes de {periodo['fim'].strftime('%d/%m/%Y')}"
+        partes.append(texto)
+    return f" ({'; '.join(partes)})" if partes else ""
+
+
+def _formatar_moeda(valor: Any) -> str:
+    """Formata um valor numérico como moeda brasileira."""
+    texto = f"{float(valor):,.2f}"
+    return "R$ " + texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _listar_nomes(resultados: List[Dict[str, Any]], coluna: str = "nome") -> str:
+    """Lista os valores distintos de uma coluna, na ordem dos resultados."""
+    nomes = list(dict.fromkeys(str(linha[coluna]) for linha in resultados))
+    return ", ".join(nomes)
+
+
+# ---------------------------------------------------------------------------
+# Intenções
+# ---------------------------------------------------------------------------
+
+def _intencao_maiores_clientes(correspondencia: re.Match, periodo: Optional[Dict[str, date]]) -> Optional[Dict[str, Any]]:
+    """Clientes que mais gastaram, com filtros opcionais de categoria/produto e período."""
+    quantidade = correspondencia.group("n")
+    if quantidade:
+        limite = int(quantidade) if quantidade.isdigit() else NUMEROS_POR_EXTENSO[quantidade]
+    else:
+        limite = LIMITE_PADRAO_RANKING
+
+    slots: Dict[str, Any] = {"limite": limite, "periodo": periodo}
+    resto = correspondencia.group("resto").strip()
+    if resto:
+        itens = _resolver_itens(resto)
+        if itens is None:
+            return None
+        slots.update(itens)
+
+    parametros: Dict[str, Any] = {"limite": limite}
+    condicoes = _filtros_transacoes(slots, parametros)
+    sql = (
+        "SELECT c.nome, SUM(t.valor_total) AS total_gasto\n"
+        "FROM clientes c\n"
+        "JOIN transacoes t ON t.cliente_id = c.id\n"
+        + ("JOIN produtos p ON p.id = t.produto_id\n" if slots.get("produtos") or slots.get("categorias") else "")
+        + (f"WHERE {' AND '.join(condicoes)}\n" if condicoes else "")
+        + "GROUP BY c.id, c.nome\n"
+        "ORDER BY total_gasto DESC\n"
+        "LIMIT %(limite)s"
+    )
+    explicacao = f"Soma o valor das transações de cada cliente{_descrever_filtros(slots)} e retorna os {limite} que mais gastaram."
+    return {"sql": sql, "parametros": parametros, "explicacao": explicacao, "slots": slots}
+
+
+def _resumo_maiores_clientes(slots: Dict[str, Any], resultados: List[Dict[str, Any]]) -> str:
+    itens = ", ".join(f"{linha['nome']} ({_formatar_moeda(linha['total_gasto'])})" for linha in resultados)
+    return f"Os {len(resultados)} clientes que mais gastaram{_descrever_filtros(slots)}: {itens}."
+
+
+def _intencao_quem_comprou(correspondencia: re.Match, periodo: Optional[Dict[str, date]]) -> Optional[Dict[str, Any]]:
+    """Clientes que compraram um produto ou produtos de uma categoria."""
+    itens = _resolver_itens(correspondencia.group("termo"))
+    if itens is None:
+        return None
+    slots: Dict[str, Any] = {**itens, "periodo": periodo}
+
+    parametros: Dict[str, Any] = {}
+    condicoes = _filtros_transacoes(slots, parametros)
+    sql = (
+        "SELECT DISTINCT c.nome, c.email\n"
+        "FROM clientes c\n"
+        "JOIN transacoes t ON t.cliente_id = c.id\n"
+        "JOIN produtos p ON p.id = t.produto_id\n"
+        f"WHERE {' AND '.join(condicoes)}\n"
+        "ORDER BY c.nome"
+    )
+    explicacao = f"Junta clientes, transações e produtos e lista os clientes que compraram{_descrever_filtros(slots)}."
+    return {"sql": sql, "parametros": parametros, "explicacao": explicacao, "slots": slots}
+
+
+def _resumo_quem_comprou(slots: Dict[str, Any], resultados: List[Dict[str, Any]]) -> str:
+    return f"{len(resultados)} cliente(s) compraram{_descrever_filtros(slots)}: {_listar_nomes(resultados)}."
+
+
+def _intencao_saldo_suficiente(correspondencia: re.Match, periodo: Optional[Dict[str, date]]) -> Optional[Dict[str, Any]]:
+    """Clientes com saldo suficiente para comprar um produto."""
+    if periodo is not None:
+        return None
+    termo = correspondencia.group("termo")
+    produtos = rmta_obter_indice_entidades().buscar("produtos", "nome", termo)
+    if not _cobre_termo(termo, produtos):
+        return None
+    slots = {"produtos": produtos}
+    sql = (
+        "SELECT c.nome, c.saldo, p.nome AS produto, p.preco\n"
+        "FROM clientes c\n"
+        "JOIN produtos p ON p.nome = ANY(%(produtos)s)\n"
+        "WHERE c.saldo >= p.preco\n"
+        "ORDER BY c.nome, p.preco"
+    )
+    explicacao = f"Compara o saldo de cada cliente com o preço dos {_descrever_filtros(slots).strip(' ()')}."
+    return {"sql": sql, "parametros": {"produtos": produtos}, "explicacao": explicacao, "slots": slots}
+
+
+def _resumo_saldo_suficiente(slots: Dict[str, Any], resultados: List[Dict[str, Any]]) -> str:
+    return (
+        f"{len(set(linha['nome'] for linha in resultados))} cliente(s) têm saldo suficiente para comprar "
+        f"{', '.join(slots['produtos'])}: {_listar_nomes(resultados)}."
+    )
+
+
+def _intencao_fixa(sql: str, explicacao: str) -> Callable:
+    """Cria uma intenção sem parâmetros, com SQL fixo."""
+    def intencao(correspondencia: re.Match, periodo: Optional[Dict[str, date]]) -> Optional[Dict[str, Any]]:
+        if periodo is not None:
+            return None
+        return {"sql": sql, "parametros": {}, "explicacao": explicacao, "slots": {}}
+    return intencao
+
+
+def _resumo_gasto_total(slots: Dict[str, Any], resultados: List[Dict[str, Any]]) -> str:
+    itens = ", ".join(f"{linha['nome']} ({_formatar_moeda(linha['total_gasto'])})" for linha in resultados)
+    return f"Gasto total de {len(resultados)} cliente(s), do maior para o menor: {itens}."
+
+
+def _resumo_listagem(slots: Dict[str, Any], resultados: List[Dict[str, Any]]) -> str:
+    return f"Foram encontrados {len(resultados)} registro(s): {_listar_nomes(resultados)}."
+
+
+_VERBO_LISTAR = r"(?:liste|listar|mostre|mostrar|quais sao)"
+_QUANTIDADE = r"(?P<n>\d+|" + "|".join(NUMEROS_POR_EXTENSO) + r")"
+
+# Intenções: (nome, padrão sobre a pergunta normalizada sem período, construtor, resumo)
+INTENCOES = [
+    (
+        "maiores_clientes",
+        re.compile(
+            rf"^(?:quais (?:sao )?(?:os )?|quem sao os |liste os |mostre os )?(?:top )?(?:{_QUANTIDADE} )?"
+            r"(?:maiores )?clientes (?:que mais (?:gastaram|compraram)|com maior gasto|por gasto)(?P<resto>.*?)\W*$"
+        ),
+        _intencao_maiores_clientes,
+        _resumo_maiores_clientes
+    ),
+    (
+        "quem_comprou",
+        re.compile(r"^(?:quais clientes|que clientes|quem) (?:compraram|comprou) (?P<termo>.+?)\W*$"),
+        _intencao_quem_comprou,
+        _resumo_quem_comprou
+    ),
+    (
+        "saldo_suficiente",
+        re.compile(
+            r"^(?:quem|quais clientes) (?:(?:tem|possui|possuem) saldo (?:suficiente )?para|pode|podem|consegue|conseguem)"
+            r" comprar (?P<termo>.+?)\W*$"
+        ),
+        _intencao_saldo_suficiente,
+        _resumo_saldo_suficiente
+    ),
+    (
+        "gasto_por_cliente",
+        re.compile(r"^quanto cada cliente gastou( no total| ao todo)?\W*$"),
+        _intencao_fixa(
+            "SELECT c.nome, SUM(t.valor_total) AS total_gasto\n"
+            "FROM clientes c\n"
+            "JOIN transacoes t ON t.cliente_id = c.id\n"
+            "GROUP BY c.id, c.nome\n"
+            "ORDER BY total_gasto DESC",
+            "Soma o valor total das transações de cada cliente, do maior para o menor gasto."
+        ),
+        _resumo_gasto_total
+    ),
+    (
+        "listar_clientes",
+        re.compile(rf"^{_VERBO_LISTAR}( todos)? os clientes\W*$"),
+        _intencao_fixa(
+            "SELECT c.id, c.nome, c.email, c.saldo\nFROM clientes c\nORDER BY c.nome",
+            "Lista todos os clientes cadastrados, ordenados pelo nome."
+        ),
+        _resumo_listagem
+    ),
+    (
+        "listar_produtos",
+        re.compile(rf"^{_VERBO_LISTAR}( todos)? os produtos\W*$"),
+        _intencao_fixa(
+            "SELECT p.id, p.nome, p.preco, p.categoria\nFROM produtos p\nORDER BY p.nome",
+            "Lista todos os produtos cadastrados, ordenados pelo nome."
+        ),
+        _resumo_listagem
+    )
+]
+
+_RESUMOS = {nome: resumo for nome, _, _, resumo in INTENCOES}
+
+
+def rmta_gerar_sql_por_regras(consulta: str) -> Optional[Dict[str, Any]]:
+    """
+    Tenta converter a pergunta em SQL parametrizado usando as intenções conhecidas.
+
+    Args:
+        consulta (str): Pergunta em linguagem natural do usuário
+
+    Returns:
+        Optional[Dict[str, Any]]: "sql", "parametros", "explicacao" e "intencao"
+        (nome e slots extraídos), ou None se nenhuma intenção corresponder
+    """
+    texto, periodo = rmta_extrair_periodo(rmta_normalizar_texto(consulta))
+    for nome, padrao, construtor, _ in INTENCOES:
+        correspondencia = padrao.match(texto)
+        if not correspondencia:
+            continue
+        gerado = construtor(correspondencia, periodo)
+        if gerado is None:
+            continue
+        logger.debug("Pergunta atendida pela intenção %s: %s", nome, gerado['slots'])
+        return {
+            "sql": gerado["sql"],
+            "parametros": gerado["parametros"],
+            "explicacao": gerado["explicacao"],
+            "intencao": {"nome": nome, "slots": gerado["slots"]}
+        }
+    return None
+
+
+def rmta_resumir_resultados_intencao(intencao: Dict[str, Any], resultados: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Gera uma explicação determinística dos resultados de uma intenção conhecida.
+
+    Args:
+        intencao (Dict[str, Any]): Nome e slots da intenção reconhecida
+        resultados (List[Dict[str, Any]]): Registros retornados pela consulta
+
+    Returns:
+        Optional[str]: Explicação dos resultados, ou None se a intenção não tiver resumo
+    """
+    resumo = _RESUMOS.get(intencao.get("nome"))
+    if resumo is None:
+        return None
+    try:
+        return resumo(intencao.get("slots", {}), resultados)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Não foi possível resumir os resultados da intenção %s: %s", intencao.get('nome'), e)
+        return None
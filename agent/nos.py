@@ -8,108 +8,101 @@ import re
 import json
 import time
 import logging
-import pandas as pd
-from typing import Dict, Any
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langgraph.graph import END
+from typing import Dict, Any, List, Optional, Tuple
 
-from config.configuracoes import CHAVE_API_OPENAI, MODELO_OPENAI, TEMPERATURA
-from database.conexao import rmta_obter_conexao_bd
-from database.esquema import ESQUEMA_BD
-from agent.estado import EstadoAgente
+from database.conexao import rmta_obter_conexao_bd, rmta_verificar_plano
+from database.decodificacao import rmta_registros, rmta_tipos_colunas
+from database.indice_entidades import rmta_literais_sem_correspondencia, rmta_valores_mencionados
+from database.preparadas import rmta_executar_consulta
+from agent.estado import EstadoAgente, END
+from agent.templates_prompt import (
+    TEMPLATE_GERAR_SQL,
+    TEMPLATE_REFINAR_SQL,
+    TEMPLATE_EXPLICAR_RESULTADOS,
+    rmta_bloco_valores,
+    rmta_contar_tokens,
+    rmta_registrar_uso_prompt
+)
+from agent.cliente_llm import rmta_invocar_modelo
+from agent.escalonador import (
+    RECURSO_BD,
+    RECURSO_LLM,
+    ErroCotaExcedida,
+    rmta_registrar_cota_excedida,
+    rmta_reservar
+)
+from agent.intencoes import rmta_gerar_sql_por_regras, rmta_resumir_resultados_intencao
+from agent.roteador_modelos import (
+    NIVEL_REGRAS,
+    rmta_niveis_a_partir,
+    rmta_proximo_nivel,
+    rmta_obter_modelo_nivel,
+    rmta_registrar_tentativa_nivel
+)
+from agent.registro_mensagens import rmta_registrar_prompt, rmta_registrar_resposta
+from agent.especulacao import ExecucaoEspeculativa
+from config.configuracoes import ESPECULACAO_ATIVA
+from utils.coalescencia import GrupoCoalescencia
 
 # Obter logger
 logger = logging.getLogger('sql_agent')
 
+# Deduplicação de execuções idênticas de SQL em andamento
+_GRUPO_EXECUCAO = GrupoCoalescencia("execucao")
+
+ERRO_FALHA_CONEXAO = "Falha na conexão com o banco de dados."
+
 def rmta_gerar_sql(estado: EstadoAgente) -> EstadoAgente:
     """
     Gera uma consulta SQL a partir de uma pergunta em linguagem natural.
     
-    Esta função utiliza o modelo GPT-4o para converter a pergunta do usuário
-    em uma consulta SQL válida para PostgreSQL, baseada no esquema do banco de dados.
+    Esta função percorre os níveis do roteador de modelos, do mais barato ao
+    mais caro: primeiro a geração por regras, depois o modelo rápido e, por fim,
+    o modelo completo (GPT-4o). Começa no nível indicado em estado["nivel_modelo"]
+    (definido pelo escalonamento) ou no primeiro nível configurado.
     
     Args:
         estado (EstadoAgente): O estado atual do agente contendo a consulta do usuário
         
     Returns:
         EstadoAgente: Estado atualizado com a consulta SQL gerada e sua explicação
-        
-    Raises:
-        Exception: Se ocorrer um erro na geração da consulta SQL
     """
     inicio = time.time()
     consulta = estado["consulta"]
-    logger.info(f"Gerando SQL para a consulta: '{consulta}'")
-    
-    # Prompt do sistema para o modelo
-    prompt_sistema = f"""
-    Você é um especialista em SQL para PostgreSQL. Sua tarefa é converter perguntas feitas em linguagem natural em consultas SQL válidas.
-
-    O banco de dados possui o seguinte esquema:
-    {ESQUEMA_BD}
-
-    Relacionamentos:
-    - Um cliente pode ter várias transações (1 para N)
-    - Cada transação está associada a um produto (N para 1)
-
-    Diretrizes importantes:
-    1. Use JOINs apropriados para relacionar as tabelas
-    2. Use aliases para melhorar a legibilidade (ex: c para clientes)
-    3. Sempre use consultas parametrizadas para evitar SQL injection
-    4. Otimize as consultas para melhor performance
-    5. Inclua comentários explicativos no SQL quando necessário
-    6. Forneça uma explicação clara do que a consulta faz
-    7. Não use funções ou sintaxes específicas que não sejam compatíveis com PostgreSQL
-    8. Sempre retorne resultados significativos e bem formatados
-
-    Exemplos de consultas:
-    1. "Quais clientes compraram um Notebook?" deve gerar uma consulta que junta clientes, transacoes e produtos, filtrando por produtos com nome contendo "Notebook".
-    2. "Quanto cada cliente gastou no total?" deve agrupar transações por cliente e somar os valores.
-    3. "Quem tem saldo suficiente para comprar um Smartphone?" deve comparar o saldo dos clientes com o preço dos smartphones.
-
-    Responda apenas com um JSON no seguinte formato:
-    {{"query": "A consulta SQL aqui", "explanation": "Explicação da consulta aqui"}}
-    """
-    
-    try:
-        modelo = ChatOpenAI(api_key=CHAVE_API_OPENAI, model=MODELO_OPENAI, temperature=TEMPERATURA)
-        
-        mensagens = [
-            SystemMessage(content=prompt_sistema),
-            HumanMessage(content=f"Gere uma consulta SQL para responder à seguinte pergunta: '{consulta}'")
-        ]
-        
-        logger.debug("Enviando requisição para o modelo de linguagem")
-        resposta = modelo.invoke(mensagens)
-        
-        # Extrai o JSON da resposta
-        conteudo = resposta.content
-        try:
-            resultado_json = json.loads(conteudo)
-            sql = resultado_json.get("query", "")
-            explicacao = resultado_json.get("explanation", "")
-        except json.JSONDecodeError:
-            # Tentar extrair JSON se estiver em formato de código
-            logger.warning("Falha ao decodificar JSON diretamente, tentando extrair de bloco de código")
-            json_match = re.search(r'```json\s*(.*?)\s*```', conteudo, re.DOTALL)
-            if json_match:
-                resultado_json = json.loads(json_match.group(1))
-                sql = resultado_json.get("query", "")
-                explicacao = resultado_json.get("explanation", "")
-            else:
-                logger.error("Não foi possível extrair JSON da resposta")
-                sql = ""
-                explicacao = "Erro ao extrair JSON da resposta."
+    logger.info("Gerando SQL para a consulta: '%s'", consulta)
+    
+    ultimo_erro = None
+    for nivel in rmta_niveis_a_partir("gerar_sql", estado.get("nivel_modelo")):
+        inicio_nivel = time.time()
+        if nivel == NIVEL_REGRAS:
+            gerado = rmta_gerar_sql_por_regras(consulta)
+            if gerado is None:
+                continue
+            sql, explicacao = gerado["sql"], gerado["explicacao"]
+            parametros, intencao = gerado["parametros"], gerado["intencao"]
+        else:
+            parametros, intencao = {}, None
+            try:
+                sql, explicacao = rmta_gerar_sql_com_modelo(estado, nivel)
+            except ErroCotaExcedida as e:
+                # Cota do inquilino esgotada: um nível mais caro não resolveria
+                rmta_registrar_cota_excedida(estado, e)
+                estado["tempo_execucao"] = estado.get("tempo_execucao", {})
+                estado["tempo_execucao"]["gerar_sql"] = time.time() - inicio
+                return estado
+            except Exception as e:
+                # Falha do provedor neste nível: tentar o próximo
+                ultimo_erro = e
+                logger.warning("Erro ao gerar SQL no nível %s: %s", nivel, e)
+                rmta_registrar_tentativa_nivel("gerar_sql", nivel, False, time.time() - inicio_nivel)
+                continue
         
         # Atualizar o estado
         estado["sql"] = sql
+        estado["parametros_sql"] = parametros
+        estado["intencao"] = intencao
         estado["explicacao"] = explicacao
-        estado["mensagens"] = estado.get("mensagens", []) + [
-            {"role": "system", "content": prompt_sistema},
-            {"role": "user", "content": f"Gere uma consulta SQL para responder à seguinte pergunta: '{consulta}'"},
-            {"role": "assistant", "content": conteudo}
-        ]
+        estado["nivel_modelo"] = nivel
         
         # Registrar tempo de execução
         fim = time.time()
@@ -117,37 +110,127 @@ def rmta_gerar_sql(estado: EstadoAgente) -> EstadoAgente:
         estado["tempo_execucao"] = estado.get("tempo_execucao", {})
         estado["tempo_execucao"]["gerar_sql"] = tempo_execucao
         
-        logger.info(f"SQL gerado com sucesso em {tempo_execucao:.2f}s: {sql[:100]}...")
+        logger.info("SQL gerado com sucesso no nível %s em %.2fs: %.100s...", nivel, tempo_execucao, sql)
         return estado
-    except Exception as e:
-        logger.error(f"Erro ao gerar SQL: {str(e)}")
-        estado["erro"] = f"Erro ao gerar consulta SQL: {str(e)}"
+    
+    logger.error("Erro ao gerar SQL: %s", ultimo_erro)
+    estado["erro"] = f"Erro ao gerar consulta SQL: {str(ultimo_erro)}"
+    
+    # Registrar tempo mesmo em caso de erro
+    fim = time.time()
+    tempo_execucao = fim - inicio
+    estado["tempo_execucao"] = estado.get("tempo_execucao", {})
+    estado["tempo_execucao"]["gerar_sql"] = tempo_execucao
+    
+    return estado
+
+def rmta_gerar_sql_com_modelo(estado: EstadoAgente, nivel: str) -> Tuple[str, str]:
+    """
+    Gera a consulta SQL com o modelo de linguagem de um nível.
+    
+    Registra no estado as mensagens trocadas e o uso de tokens de prompt.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente contendo a consulta do usuário
+        nivel (str): Nível do roteador (rápido ou completo)
         
-        # Registrar tempo mesmo em caso de erro
-        fim = time.time()
-        tempo_execucao = fim - inicio
-        estado["tempo_execucao"] = estado.get("tempo_execucao", {})
-        estado["tempo_execucao"]["gerar_sql"] = tempo_execucao
+    Returns:
+        Tuple[str, str]: Consulta SQL e explicação extraídas da resposta
         
-        return estado
+    Raises:
+        ErroCotaExcedida: Se o escalonador recusar a chamada ao modelo
+        Exception: Se a chamada ao modelo falhar
+    """
+    consulta = estado["consulta"]
+    
+    # Prompt com prefixo estático pré-compilado e, ao final, a pergunta, os valores do
+    # banco que ela menciona (para o modelo não adivinhar literais) e o contexto da sessão
+    template = TEMPLATE_REFINAR_SQL if estado.get("contexto_sessao") else TEMPLATE_GERAR_SQL
+    parametros_prompt = {
+        "consulta": consulta,
+        "valores_conhecidos": rmta_bloco_valores(rmta_valores_mencionados(consulta)),
+        **(estado.get("contexto_sessao") or {})
+    }
+    prompt_sistema, prompt_usuario = template.renderizar(**parametros_prompt)
+    
+    from langchain_core.messages import HumanMessage, SystemMessage
+    
+    modelo = rmta_obter_modelo_nivel(nivel)
+    mensagens = [
+        SystemMessage(content=prompt_sistema),
+        HumanMessage(content=prompt_usuario)
+    ]
+    
+    # Validar e preparar a execução assim que o campo "query" se completar no stream
+    especulacao = None
+    if ESPECULACAO_ATIVA:
+        especulacao = ExecucaoEspeculativa(
+            lambda sql: rmta_verificar_sql(sql, nivel),
+            usa_plano=rmta_precisa_verificar_plano(nivel)
+        )
+    
+    logger.debug("Enviando requisição para o modelo de linguagem (nível %s)", nivel)
+    with rmta_reservar(estado, RECURSO_LLM) as reserva:
+        resposta = rmta_invocar_modelo(modelo, mensagens, ao_receber=especulacao.ao_receber if especulacao else None)
+        conteudo = resposta.content
+        uso = rmta_registrar_uso_prompt(template, prompt_usuario, resposta)
+        reserva.consumir_tokens(uso["tokens_prompt"] + rmta_contar_tokens(conteudo))
+    
+    # Extrai o JSON da resposta
+    try:
+        resultado_json = json.loads(conteudo)
+        sql = resultado_json.get("query", "")
+        explicacao = resultado_json.get("explanation", "")
+    except json.JSONDecodeError:
+        # Tentar extrair JSON se estiver em formato de código
+        logger.warning("Falha ao decodificar JSON diretamente, tentando extrair de bloco de código")
+        json_match = re.search(r'```json\s*(.*?)\s*```', conteudo, re.DOTALL)
+        if json_match:
+            resultado_json = json.loads(json_match.group(1))
+            sql = resultado_json.get("query", "")
+            explicacao = resultado_json.get("explanation", "")
+        else:
+            logger.error("Não foi possível extrair JSON da resposta")
+            sql = ""
+            explicacao = "Erro ao extrair JSON da resposta."
+    
+    estado["especulacao"] = especulacao.concluir(sql) if especulacao else None
+    
+    estado["mensagens"] = estado.get("mensagens") or []
+    rmta_registrar_prompt(estado["mensagens"], template, parametros_prompt)
+    rmta_registrar_resposta(estado["mensagens"], conteudo)
+    estado["uso_tokens"] = estado.get("uso_tokens") or {}
+    estado["uso_tokens"]["gerar_sql"] = uso
+    
+    return sql, explicacao
 
-def rmta_validar_sql(estado: EstadoAgente) -> EstadoAgente:
+def rmta_precisa_verificar_plano(nivel: Optional[str]) -> bool:
     """
-    Valida a consulta SQL gerada para garantir que seja segura.
+    Indica se o SQL de um nível passa pelo EXPLAIN antes da execução.
     
-    Esta função verifica se a consulta SQL contém comandos perigosos como
-    DROP, DELETE, UPDATE, etc., e se não está vazia.
+    Apenas SQL de modelos que ainda podem escalar é verificado, para escalar
+    antes de executar.
     
     Args:
-        estado (EstadoAgente): O estado atual do agente contendo a consulta SQL
+        nivel (Optional[str]): Nível do roteador que gerou o SQL
         
     Returns:
-        EstadoAgente: Estado atualizado com o resultado da validação
+        bool: True se a validação deve executar o EXPLAIN
     """
-    inicio = time.time()
-    sql = estado["sql"]
-    logger.info(f"Validando consulta SQL: {sql[:100]}...")
+    return nivel not in (None, NIVEL_REGRAS) and rmta_proximo_nivel("gerar_sql", nivel) is not None
+
+def rmta_verificar_sql(sql: str, nivel: Optional[str]) -> Dict[str, Any]:
+    """
+    Verifica se uma consulta SQL é segura e, quando necessário, se o banco consegue planejá-la.
     
+    Args:
+        sql (str): Consulta SQL gerada
+        nivel (Optional[str]): Nível do roteador que gerou o SQL
+        
+    Returns:
+        Dict[str, Any]: Resultado da validação ("is_valid", "message" e, se houver,
+        "literais_sem_correspondencia")
+    """
     # Validação básica para evitar consultas perigosas
     padroes_proibidos = [
         r"DROP\s+",
@@ -165,7 +248,7 @@ def rmta_validar_sql(estado: EstadoAgente) -> EstadoAgente:
     
     for padrao in padroes_proibidos:
         if re.search(padrao, sql, re.IGNORECASE):
-            logger.warning(f"Consulta SQL contém padrão proibido: {padrao}")
+            logger.warning("Consulta SQL contém padrão proibido: %s", padrao)
             resultado_validacao = {
                 "is_valid": False,
                 "message": "Consulta não permitida. Apenas consultas SELECT são permitidas."
@@ -180,11 +263,55 @@ def rmta_validar_sql(estado: EstadoAgente) -> EstadoAgente:
             "message": "A consulta SQL gerada está vazia."
         }
     
+    # Literais que não correspondem a nenhum valor conhecido são apontados (sem invalidar a consulta)
+    if resultado_validacao["is_valid"]:
+        sem_correspondencia = rmta_literais_sem_correspondencia(sql)
+        if sem_correspondencia:
+            resultado_validacao["literais_sem_correspondencia"] = sem_correspondencia
+    
+    # SQL de um modelo mais barato passa pelo EXPLAIN, para escalar antes de executar
+    if resultado_validacao["is_valid"] and rmta_precisa_verificar_plano(nivel):
+        erro_plano = rmta_verificar_plano(sql)
+        if erro_plano:
+            resultado_validacao = {
+                "is_valid": False,
+                "message": f"O banco de dados não conseguiu planejar a consulta: {erro_plano}"
+            }
+    
+    return resultado_validacao
+
+def rmta_validar_sql(estado: EstadoAgente) -> EstadoAgente:
+    """
+    Valida a consulta SQL gerada para garantir que seja segura.
+    
+    Esta função verifica se a consulta SQL contém comandos perigosos como
+    DROP, DELETE, UPDATE, etc., e se não está vazia. Se a mesma consulta já
+    foi validada especulativamente durante o streaming da geração, o resultado
+    é reaproveitado.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente contendo a consulta SQL
+        
+    Returns:
+        EstadoAgente: Estado atualizado com o resultado da validação
+    """
+    inicio = time.time()
+    sql = estado["sql"]
+    logger.info("Validando consulta SQL: %.100s...", sql)
+    
+    especulacao = estado.get("especulacao")
+    if especulacao and especulacao["sql"] == sql:
+        resultado_validacao = especulacao["validacao"]
+        logger.info("Validação reaproveitada da especulação (%.4fs economizados)", especulacao['tempo_economizado'])
+    else:
+        resultado_validacao = rmta_verificar_sql(sql, estado.get("nivel_modelo"))
+    
     estado["validacao"] = resultado_validacao
     
     if not resultado_validacao["is_valid"]:
         estado["erro"] = resultado_validacao["message"]
-        logger.error(f"Validação falhou: {resultado_validacao['message']}")
+        logger.error("Validação falhou: %s", resultado_validacao['message'])
+        rmta_registrar_desfecho_geracao(estado, sucesso=False)
     else:
         logger.info("Consulta SQL validada com sucesso")
     
@@ -201,7 +328,11 @@ def rmta_executar_sql(estado: EstadoAgente) -> EstadoAgente:
     Executa a consulta SQL validada no banco de dados.
     
     Esta função conecta ao banco de dados PostgreSQL, executa a consulta SQL
-    e armazena os resultados no estado do agente.
+    e armazena os resultados no estado do agente. No modo aproximado, agregações
+    elegíveis são executadas em uma amostra da tabela (database.amostragem), e
+    as estimativas e os intervalos de confiança ficam em estado["aproximacao"].
+    A execução ocupa uma vaga do inquilino no escalonador (agent.escalonador);
+    cotas esgotadas são registradas em estado["erro"] e estado["cota_excedida"].
     
     Args:
         estado (EstadoAgente): O estado atual do agente contendo a consulta SQL validada
@@ -214,32 +345,56 @@ def rmta_executar_sql(estado: EstadoAgente) -> EstadoAgente:
     """
     inicio = time.time()
     sql = estado["sql"]
-    logger.info(f"Executando consulta SQL: {sql[:100]}...")
+    parametros = estado.get("parametros_sql") or {}
+    logger.info("Executando consulta SQL: %.100s...", sql)
     
-    conexao = rmta_obter_conexao_bd()
-    if not conexao:
-        estado["erro"] = "Falha na conexão com o banco de dados."
-        logger.error("Falha na conexão com o banco de dados")
+    plano = None
+    estado["aproximacao"] = None
+    if estado.get("modo_aproximado"):
+        from database.amostragem import rmta_planejar_amostragem
         
-        # Registrar tempo mesmo em caso de erro
-        fim = time.time()
-        tempo_execucao = fim - inicio
+        plano, motivo = rmta_planejar_amostragem(sql)
+        if plano is None:
+            logger.info("Consulta executada de forma exata no modo aproximado: %s", motivo)
+        else:
+            logger.info("Consulta executada em uma amostra de %.4g%% da tabela %s", plano.percentual, plano.tabela)
+            sql = plano.sql
+    
+    # Consultas idênticas em andamento do mesmo inquilino (mesmo SQL e mesmos parâmetros)
+    # compartilham uma única execução no banco, reservada no escalonador pela primeira
+    chave = f"{estado.get('inquilino')}\x00{sql.strip()}"
+    if parametros:
+        chave += "\n" + json.dumps(parametros, sort_keys=True, default=str)
+    try:
+        resultados, erro, tipos = _GRUPO_EXECUCAO.executar(chave, _executar_no_banco_escalonado, estado, sql, parametros)[0]
+    except ErroCotaExcedida as e:
+        rmta_registrar_cota_excedida(estado, e)
+        estado["resultados"] = None
+        estado["tipos_colunas"] = None
         estado["tempo_execucao"] = estado.get("tempo_execucao", {})
-        estado["tempo_execucao"]["executar_sql"] = tempo_execucao
-        
+        estado["tempo_execucao"]["executar_sql"] = time.time() - inicio
         return estado
+    if plano is not None and erro is None:
+        from config.configuracoes import AMOSTRAGEM_CONFIANCA
+        from database.amostragem import rmta_ajustar_estimativas
+        
+        resultados, intervalos = rmta_ajustar_estimativas(resultados, plano)
+        estado["aproximacao"] = {
+            "tabela": plano.tabela,
+            "metodo": plano.metodo,
+            "percentual": plano.percentual,
+            "linhas_tabela": plano.linhas_tabela,
+            "confianca": AMOSTRAGEM_CONFIANCA,
+            "sql_amostrado": plano.sql,
+            "intervalos": intervalos
+        }
+    estado["resultados"] = resultados
+    estado["tipos_colunas"] = tipos
+    estado["erro"] = erro
     
-    try:
-        df = pd.read_sql_query(sql, conexao)
-        estado["resultados"] = df.to_dict('records')
-        estado["erro"] = None
-        logger.info(f"Consulta executada com sucesso. {len(df)} registros retornados.")
-    except Exception as e:
-        estado["erro"] = f"Erro ao executar a consulta: {str(e)}"
-        estado["resultados"] = None
-        logger.error(f"Erro ao executar a consulta: {str(e)}")
-    finally:
-        conexao.close()
+    # Falhas de conexão não dizem nada sobre a qualidade do SQL gerado
+    if erro != ERRO_FALHA_CONEXAO:
+        rmta_registrar_desfecho_geracao(estado, sucesso=erro is None)
     
     # Registrar tempo de execução
     fim = time.time()
@@ -249,12 +404,48 @@ def rmta_executar_sql(estado: EstadoAgente) -> EstadoAgente:
     
     return estado
 
+def _executar_no_banco_escalonado(estado: EstadoAgente, sql: str, parametros: Dict[str, Any]):
+    """Executa o SQL no banco com uma vaga do inquilino do estado no escalonador."""
+    with rmta_reservar(estado, RECURSO_BD):
+        if parametros:
+            return rmta_executar_no_banco(sql, parametros)
+        return rmta_executar_no_banco(sql)
+
+def rmta_executar_no_banco(sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[Dict[str, str]]]:
+    """
+    Executa uma consulta SQL no banco de dados e retorna os registros.
+    
+    Args:
+        sql (str): Consulta SQL validada
+        parametros (Optional[Dict[str, Any]]): Valores dos parâmetros nomeados (%(nome)s) do SQL
+        
+    Returns:
+        Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[Dict[str, str]]]: Registros
+        retornados, mensagem de erro (None em caso de sucesso) e o tipo de cada coluna,
+        pelo OID informado no cursor (database.decodificacao)
+    """
+    conexao = rmta_obter_conexao_bd()
+    if not conexao:
+        logger.error("Falha na conexão com o banco de dados")
+        return None, ERRO_FALHA_CONEXAO, None
+    
+    try:
+        descricao, linhas = rmta_executar_consulta(conexao, sql, parametros)
+        logger.info("Consulta executada com sucesso. %s registros retornados.", len(linhas))
+        return rmta_registros([item[0] for item in descricao], linhas), None, rmta_tipos_colunas(descricao)
+    except Exception as e:
+        logger.error("Erro ao executar a consulta: %s", e)
+        return None, f"Erro ao executar a consulta: {str(e)}", None
+    finally:
+        conexao.close()
+
 def rmta_explicar_resultados(estado: EstadoAgente) -> EstadoAgente:
     """
     Explica os resultados da consulta SQL em linguagem natural.
     
-    Esta função utiliza o modelo GPT-4o para gerar uma explicação dos resultados
-    da consulta SQL em linguagem natural, facilitando a compreensão pelo usuário.
+    Esta função utiliza os níveis de LLM do roteador (modelo rápido e, em caso
+    de falha, GPT-4o) para gerar uma explicação dos resultados da consulta SQL
+    em linguagem natural, facilitando a compreensão pelo usuário.
     
     Args:
         estado (EstadoAgente): O estado atual do agente contendo os resultados da consulta
@@ -280,44 +471,66 @@ def rmta_explicar_resultados(estado: EstadoAgente) -> EstadoAgente:
     
     resultados = estado["resultados"]
     sql = estado["sql"]
-    logger.info(f"Explicando resultados da consulta. {len(resultados)} registros para analisar.")
-    
-    prompt_sistema = """
-    Você é um especialista em análise de dados e SQL. Sua tarefa é explicar os resultados de uma consulta SQL
-    de forma clara e concisa. Forneça insights sobre os dados e explique o que os resultados significam no contexto
-    da pergunta original. Seja objetivo e direto.
-    """
+    logger.info("Explicando resultados da consulta. %s registros para analisar.", len(resultados))
+    aproximacao = estado.get("aproximacao")
+    nota_aproximacao = (
+        f"\n\nValores aproximados: estimados a partir de uma amostra de {aproximacao['percentual']:.4g}% "
+        f"da tabela {aproximacao['tabela']}, com intervalos de confiança de {aproximacao['confianca']:.0%}."
+        if aproximacao else ""
+    )
+    
+    # Intenções conhecidas têm uma explicação determinística, sem chamada ao LLM
+    if estado.get("intencao"):
+        resumo = rmta_resumir_resultados_intencao(estado["intencao"], resultados)
+        if resumo is not None:
+            estado["explicacao_resultados"] = resumo + nota_aproximacao
+            estado["tempo_execucao"] = estado.get("tempo_execucao", {})
+            estado["tempo_execucao"]["explicar_resultados"] = time.time() - inicio
+            logger.info("Explicação dos resultados gerada pelo template da intenção %s", estado['intencao']['nome'])
+            return estado
     
     try:
-        modelo = ChatOpenAI(api_key=CHAVE_API_OPENAI, model=MODELO_OPENAI, temperature=TEMPERATURA)
+        parametros_prompt = {"sql": sql, "resultados": json.dumps(resultados, indent=2, default=str)}
+        prompt_sistema, prompt_usuario = TEMPLATE_EXPLICAR_RESULTADOS.renderizar(**parametros_prompt)
         
+        from langchain_core.messages import HumanMessage, SystemMessage
         mensagens = [
             SystemMessage(content=prompt_sistema),
-            HumanMessage(content=f"""
-            Consulta SQL: {sql}
-            
-            Resultados (em formato JSON):
-            {json.dumps(resultados, indent=2)}
-            
-            Por favor, explique estes resultados de forma clara e concisa.
-            """)
+            HumanMessage(content=prompt_usuario)
         ]
         
-        logger.debug("Enviando requisição para o modelo de linguagem")
-        resposta = modelo.invoke(mensagens)
+        # Tentar os níveis do mais barato ao mais caro; escalar apenas em falha
+        resposta = None
+        with rmta_reservar(estado, RECURSO_LLM) as reserva:
+            for nivel in rmta_niveis_a_partir("explicar_resultados", None):
+                inicio_nivel = time.time()
+                try:
+                    logger.debug("Enviando requisição para o modelo de linguagem (nível %s)", nivel)
+                    resposta = rmta_invocar_modelo(rmta_obter_modelo_nivel(nivel), mensagens)
+                    rmta_registrar_tentativa_nivel("explicar_resultados", nivel, True, time.time() - inicio_nivel)
+                    break
+                except Exception as e:
+                    rmta_registrar_tentativa_nivel("explicar_resultados", nivel, False, time.time() - inicio_nivel)
+                    if rmta_proximo_nivel("explicar_resultados", nivel) is None:
+                        raise
+                    logger.warning("Erro ao explicar resultados no nível %s, escalando: %s", nivel, e)
+            uso = rmta_registrar_uso_prompt(TEMPLATE_EXPLICAR_RESULTADOS, prompt_usuario, resposta)
+            reserva.consumir_tokens(uso["tokens_prompt"] + rmta_contar_tokens(resposta.content))
         
         # Adicionar a explicação dos resultados ao estado
-        estado["explicacao_resultados"] = resposta.content
-        estado["mensagens"] = estado.get("mensagens", []) + [
-            {"role": "system", "content": prompt_sistema},
-            {"role": "user", "content": f"Explique os resultados da consulta SQL: {sql}"},
-            {"role": "assistant", "content": resposta.content}
-        ]
+        estado["explicacao_resultados"] = resposta.content + nota_aproximacao
+        estado["mensagens"] = estado.get("mensagens") or []
+        rmta_registrar_prompt(estado["mensagens"], TEMPLATE_EXPLICAR_RESULTADOS, parametros_prompt)
+        rmta_registrar_resposta(estado["mensagens"], resposta.content)
+        estado["uso_tokens"] = estado.get("uso_tokens") or {}
+        estado["uso_tokens"]["explicar_resultados"] = uso
         
         logger.info("Explicação dos resultados gerada com sucesso")
+    except ErroCotaExcedida as e:
+        rmta_registrar_cota_excedida(estado, e)
     except Exception as e:
         estado["erro"] = f"Erro ao explicar resultados: {str(e)}"
-        logger.error(f"Erro ao explicar resultados: {str(e)}")
+        logger.error("Erro ao explicar resultados: %s", e)
     
     # Registrar tempo de execução
     fim = time.time()
@@ -352,9 +565,12 @@ def rmta_decidir_proximo_passo(estado: EstadoAgente) -> str:
         logger.warning("Validação falhou. Encerrando fluxo.")
         return END
     
-    # Se houver erro na execução, encerrar o fluxo
+    # Se houver erro na execução, escalar para um modelo mais forte ou encerrar o fluxo
     if "erro" in estado and estado["erro"]:
-        logger.warning(f"Erro encontrado: {estado['erro']}. Encerrando fluxo.")
+        if rmta_pode_escalar(estado):
+            logger.warning("Erro encontrado: %s. Escalando nível do modelo.", estado['erro'])
+            return "escalar_modelo"
+        logger.warning("Erro encontrado: %s. Encerrando fluxo.", estado['erro'])
         return END
     
     # Se não houver resultados, encerrar o fluxo
@@ -364,4 +580,86 @@ def rmta_decidir_proximo_passo(estado: EstadoAgente) -> str:
     
     # Se chegou até aqui, continuar para explicação dos resultados
     logger.info("Continuando para explicação dos resultados")
-    return "explicar_resultados"
\ No newline at end of file
+    return "explicar_resultados"
+
+def rmta_decidir_apos_validacao(estado: EstadoAgente) -> str:
+    """
+    Decide o próximo passo após a validação da consulta SQL.
+    
+    Consultas válidas seguem para execução. Consultas inválidas escalam para o
+    próximo nível de modelo, se houver, ou encerram o fluxo.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+        
+    Returns:
+        str: Nome do próximo nó ou END para encerrar o fluxo
+    """
+    if estado.get("validacao", {}).get("is_valid"):
+        return "executar_sql"
+    if rmta_pode_escalar(estado):
+        logger.warning("Validação falhou. Escalando nível do modelo.")
+        return "escalar_modelo"
+    logger.warning("Validação falhou. Encerrando fluxo.")
+    return END
+
+def rmta_pode_escalar(estado: EstadoAgente) -> bool:
+    """
+    Indica se a geração de SQL pode ser repetida em um nível de modelo superior.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+        
+    Returns:
+        bool: True se há um próximo nível e a falha não foi de conexão nem de cota
+    """
+    if estado.get("erro") == ERRO_FALHA_CONEXAO or estado.get("cota_excedida"):
+        return False
+    return rmta_proximo_nivel("gerar_sql", estado.get("nivel_modelo")) is not None
+
+def rmta_escalar_modelo(estado: EstadoAgente) -> EstadoAgente:
+    """
+    Prepara o estado para gerar o SQL novamente no próximo nível de modelo.
+    
+    Os tempos da tentativa anterior são preservados com o nível como sufixo
+    (ex.: "gerar_sql[rapido]") para que o escalonamento apareça nas medições.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+        
+    Returns:
+        EstadoAgente: Estado limpo para uma nova geração no próximo nível
+    """
+    nivel_anterior = estado.get("nivel_modelo")
+    proximo = rmta_proximo_nivel("gerar_sql", nivel_anterior)
+    logger.warning("Escalando geração de SQL: %s -> %s (motivo: %s)", nivel_anterior, proximo, estado.get('erro'))
+    
+    tempos = estado.get("tempo_execucao", {})
+    for etapa in ("gerar_sql", "validar_sql", "executar_sql"):
+        if etapa in tempos:
+            tempos[f"{etapa}[{nivel_anterior}]"] = tempos.pop(etapa)
+    
+    estado["nivel_modelo"] = proximo
+    estado["especulacao"] = None
+    estado["sql"] = ""
+    estado["parametros_sql"] = {}
+    estado["intencao"] = None
+    estado["explicacao"] = ""
+    estado["validacao"] = {}
+    estado["resultados"] = None
+    estado["tipos_colunas"] = None
+    estado["erro"] = None
+    return estado
+
+def rmta_registrar_desfecho_geracao(estado: EstadoAgente, sucesso: bool) -> None:
+    """
+    Registra nas estatísticas do roteador se o SQL do nível atual foi aceito.
+    
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+        sucesso (bool): Se o SQL passou pela validação e pela execução
+    """
+    nivel = estado.get("nivel_modelo")
+    if nivel:
+        latencia = estado.get("tempo_execucao", {}).get("gerar_sql", 0.0)
+        rmta_registrar_tentativa_nivel("gerar_sql", nivel, sucesso, latencia)
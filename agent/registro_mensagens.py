@@ -0,0 +1,153 @@
+"""
+Registro compacto das mensagens trocadas com o LLM.
+
+Este módulo mantém o histórico de mensagens do estado do agente sem copiar
+o texto completo dos prompts. Cada mensagem do sistema ou do usuário é
+registrada pelo ID do template, pelo hash do texto renderizado e pelos
+parâmetros usados. Parâmetros e respostas grandes ficam em um armazém
+limitado fora do estado do grafo e são referenciados pelo hash. O texto
+completo só é reconstruído sob demanda (modo debug).
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any
+
+from config.configuracoes import LIMITE_CONTEUDO_INLINE, LIMITE_ARMAZEM_MENSAGENS
+from agent.templates_prompt import TEMPLATES, TemplatePrompt
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Armazém de conteúdos grandes: hash -> texto (LRU limitado)
+_armazem_conteudo: "OrderedDict[str, str]" = OrderedDict()
+_trava_armazem = threading.Lock()
+
+
+def _hash_conteudo(texto: str) -> str:
+    """Calcula o hash curto (16 caracteres hex) de um texto."""
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _armazenar(texto: str) -> Dict[str, str]:
+    """
+    Guarda um conteúdo grande no armazém e retorna sua referência.
+
+    Args:
+        texto (str): Conteúdo a ser armazenado
+
+    Returns:
+        Dict[str, str]: Referência no formato {"ref": hash}
+    """
+    chave = _hash_conteudo(texto)
+    with _trava_armazem:
+        _armazem_conteudo[chave] = texto
+        _armazem_conteudo.move_to_end(chave)
+        while len(_armazem_conteudo) > LIMITE_ARMAZEM_MENSAGENS:
+            _armazem_conteudo.popitem(last=False)
+    return {"ref": chave}
+
+
+def _compactar(valor: Any) -> Any:
+    """Mantém valores pequenos inline e substitui valores grandes por referência."""
+    texto = valor if isinstance(valor, str) else str(valor)
+    if len(texto.encode("utf-8")) <= LIMITE_CONTEUDO_INLINE:
+        return valor
+    return _armazenar(texto)
+
+
+def _expandir(valor: Any) -> Any:
+    """Resolve uma referência do armazém, se houver."""
+    if isinstance(valor, dict) and "ref" in valor:
+        with _trava_armazem:
+            texto = _armazem_conteudo.get(valor["ref"])
+        if texto is None:
+            return f"[conteúdo expirado: {valor['ref']}]"
+        return texto
+    return valor
+
+
+def rmta_registrar_prompt(mensagens: List[Dict[str, Any]], template: TemplatePrompt, parametros: Dict[str, Any]) -> None:
+    """
+    Registra as mensagens de sistema e de usuário de um template no histórico.
+
+    Args:
+        mensagens (List[Dict[str, Any]]): Histórico do estado, alterado no lugar
+        template (TemplatePrompt): Template utilizado na requisição
+        parametros (Dict[str, Any]): Parâmetros usados para renderizar a mensagem do usuário
+    """
+    _, prompt_usuario = template.renderizar(**parametros)
+    mensagens.append({
+        "role": "system",
+        "template_id": template.id,
+        "hash": template.hash_prefixo[:16]
+    })
+    mensagens.append({
+        "role": "user",
+        "template_id": template.id,
+        "hash": _hash_conteudo(prompt_usuario),
+        "parametros": {nome: _compactar(valor) for nome, valor in parametros.items()}
+    })
+
+
+def rmta_registrar_resposta(mensagens: List[Dict[str, Any]], conteudo: str) -> None:
+    """
+    Registra a resposta do modelo no histórico, referenciando-a se for grande.
+
+    Args:
+        mensagens (List[Dict[str, Any]]): Histórico do estado, alterado no lugar
+        conteudo (str): Texto da resposta do modelo
+    """
+    mensagens.append({"role": "assistant", "content": _compactar(conteudo)})
+
+
+def rmta_reidratar_mensagens(mensagens: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Reconstrói o texto completo das mensagens registradas.
+
+    Usado apenas pela aba de Debugging; o estado do grafo continua compacto.
+
+    Args:
+        mensagens (List[Dict[str, Any]]): Histórico compacto do estado
+
+    Returns:
+        List[Dict[str, str]]: Mensagens com "role" e "content" em texto completo
+    """
+    reidratadas = []
+    for msg in mensagens:
+        template = TEMPLATES.get(msg.get("template_id"))
+        if msg["role"] == "system" and template is not None:
+            conteudo = template.sistema
+        elif msg["role"] == "user" and template is not None:
+            parametros = {nome: _expandir(valor) for nome, valor in msg.get("parametros", {}).items()}
+            conteudo = template.renderizar(**parametros)[1]
+        else:
+            conteudo = _expandir(msg.get("content", ""))
+        reidratadas.append({"role": msg["role"], "content": conteudo})
+    return reidratadas
+
+
+def rmta_resumir_mensagem(msg: Dict[str, Any]) -> str:
+    """
+    Gera um resumo curto de uma mensagem compacta para exibição.
+
+    Args:
+        msg (Dict[str, Any]): Mensagem do histórico compacto
+
+    Returns:
+        str: Descrição da mensagem sem reidratar o texto completo
+    """
+    if "template_id" in msg:
+        resumo = f"template={msg['template_id']} hash={msg['hash']}"
+        if msg.get("parametros"):
+            nomes = ", ".join(
+                f"{nome}=<ref {valor['ref']}>" if isinstance(valor, dict) and "ref" in valor else f"{nome}={valor!r}"
+                for nome, valor in msg["parametros"].items()
+            )
+            resumo += f" parametros: {nomes}"
+        return resumo
+    conteudo = msg.get("content", "")
+    if isinstance(conteudo, dict) and "ref" in conteudo:
+        return f"<ref {conteudo['ref']}>"
+    return conteudo
@@ -0,0 +1,155 @@
+"""
+Roteador de níveis de modelo do SQL Agent.
+
+Este módulo define os níveis usados para gerar SQL e explicar resultados,
+do mais barato para o mais caro:
+
+- regras: geração por regras para formatos de pergunta conhecidos (sem LLM)
+- rapido: modelo mais barato, opcionalmente servido por um endpoint local
+- completo: modelo principal (MODELO_OPENAI)
+
+A geração começa sempre no primeiro nível configurado e só escala para o
+próximo quando a validação, o EXPLAIN ou a execução falham. O roteador
+mantém estatísticas de latência e sucesso por etapa e nível.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config.configuracoes import (
+    MODELO_OPENAI,
+    MODELO_OPENAI_RAPIDO,
+    URL_BASE_MODELO_RAPIDO,
+    NIVEIS_GERACAO_SQL,
+    NIVEIS_EXPLICACAO
+)
+from utils.metricas import rmta_incrementar_contador, rmta_observar_histograma
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+NIVEL_REGRAS = "regras"
+NIVEL_RAPIDO = "rapido"
+NIVEL_COMPLETO = "completo"
+
+_trava_estatisticas = threading.Lock()
+_estatisticas: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+
+def rmta_obter_niveis(etapa: str) -> List[str]:
+    """
+    Retorna os níveis configurados para uma etapa, do mais barato ao mais caro.
+
+    Args:
+        etapa (str): "gerar_sql" ou "explicar_resultados"
+
+    Returns:
+        List[str]: Nomes dos níveis em ordem de escalonamento
+    """
+    return list(NIVEIS_GERACAO_SQL if etapa == "gerar_sql" else NIVEIS_EXPLICACAO)
+
+
+def rmta_proximo_nivel(etapa: str, nivel_atual: Optional[str]) -> Optional[str]:
+    """
+    Retorna o nível seguinte ao atual, ou None se o atual já é o último.
+
+    Args:
+        etapa (str): Etapa roteada
+        nivel_atual (Optional[str]): Nível usado na tentativa anterior
+
+    Returns:
+        Optional[str]: Próximo nível ou None
+    """
+    niveis = rmta_obter_niveis(etapa)
+    if nivel_atual not in niveis:
+        return None
+    indice = niveis.index(nivel_atual) + 1
+    return niveis[indice] if indice < len(niveis) else None
+
+
+def rmta_niveis_a_partir(etapa: str, nivel_inicial: Optional[str]) -> List[str]:
+    """
+    Retorna os níveis a tentar a partir do nível informado (inclusive).
+
+    Args:
+        etapa (str): Etapa roteada
+        nivel_inicial (Optional[str]): Primeiro nível a tentar; None para começar do início
+
+    Returns:
+        List[str]: Níveis restantes em ordem
+    """
+    niveis = rmta_obter_niveis(etapa)
+    if nivel_inicial in niveis:
+        return niveis[niveis.index(nivel_inicial):]
+    return niveis
+
+
+def rmta_obter_modelo_nivel(nivel: str):
+    """
+    Retorna o cliente de modelo de um nível de LLM.
+
+    Args:
+        nivel (str): NIVEL_RAPIDO ou NIVEL_COMPLETO
+
+    Returns:
+        ChatOpenAI: Cliente do modelo do nível
+    """
+    from agent.cliente_llm import rmta_obter_modelo
+
+    if nivel == NIVEL_RAPIDO:
+        return rmta_obter_modelo(MODELO_OPENAI_RAPIDO, URL_BASE_MODELO_RAPIDO)
+    return rmta_obter_modelo(MODELO_OPENAI)
+
+
+def rmta_registrar_tentativa_nivel(etapa: str, nivel: str, sucesso: bool, latencia: float) -> None:
+    """
+    Registra o desfecho de uma tentativa em um nível.
+
+    Args:
+        etapa (str): Etapa roteada
+        nivel (str): Nível utilizado
+        sucesso (bool): Se a tentativa foi aceita (sem escalonamento)
+        latencia (float): Duração da tentativa em segundos
+    """
+    with _trava_estatisticas:
+        dados = _estatisticas.setdefault(etapa, {}).setdefault(
+            nivel, {"tentativas": 0, "sucessos": 0, "latencia_total": 0.0, "latencia_maxima": 0.0}
+        )
+        dados["tentativas"] += 1
+        dados["sucessos"] += 1 if sucesso else 0
+        dados["latencia_total"] += latencia
+        dados["latencia_maxima"] = max(dados["latencia_maxima"], latencia)
+
+    rotulos = {"etapa": etapa, "nivel": nivel}
+    rmta_incrementar_contador(
+        "sql_agent_roteador_tentativas_total",
+        rotulos={**rotulos, "resultado": "sucesso" if sucesso else "falha"}
+    )
+    rmta_observar_histograma("sql_agent_roteador_latencia_segundos", latencia, rotulos)
+
+
+def rmta_obter_estatisticas_roteador() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Retorna as estatísticas acumuladas por etapa e nível.
+
+    Returns:
+        Dict[str, Dict[str, Dict[str, float]]]: Tentativas, sucessos, taxa de sucesso,
+        latência média e latência máxima de cada nível
+    """
+    with _trava_estatisticas:
+        resumo = {}
+        for etapa, niveis in _estatisticas.items():
+            resumo[etapa] = {}
+            for nivel, dados in niveis.items():
+                resumo[etapa][nivel] = {
+                    **dados,
+                    "taxa_sucesso": dados["sucessos"] / dados["tentativas"],
+                    "latencia_media": dados["latencia_total"] / dados["tentativas"]
+                }
+        return resumo
+
+
+def rmta_limpar_estatisticas_roteador() -> None:
+    """Remove as estatísticas acumuladas (usado nos testes)."""
+    with _trava_estatisticas:
+        _estatisticas.clear()
@@ -0,0 +1,461 @@
+"""
+Sessões de conversa do SQL Agent.
+
+Este módulo guarda, por sessão, a última pergunta respondida, o SQL usado e
+uma cópia limitada do seu resultado. Perguntas de acompanhamento que apenas
+refinam a anterior ("e só os de Eletrônicos?", "ordene por saldo", "só os 3
+primeiros") são respondidas sem passar pelo LLM: filtrando localmente o
+resultado em cache, quando ele está completo, ou reescrevendo o SQL anterior
+como subconsulta. As demais perguntas de acompanhamento seguem para o fluxo
+completo levando a pergunta e o SQL anteriores como contexto.
+"""
+import json
+import logging
+import operator
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from agent.estado import EstadoAgente
+from agent.intencoes import NUMEROS_POR_EXTENSO
+from agent.escalonador import RECURSO_BD, ErroCotaExcedida, rmta_registrar_cota_excedida, rmta_reservar
+from agent.nos import rmta_executar_no_banco
+from config.configuracoes import SESSAO_TTL, SESSAO_MAX_SESSOES, SESSAO_MAX_LINHAS_CACHE
+from database.decodificacao import rmta_dataframe_de_registros
+from database.indice_entidades import IndiceEntidades, rmta_colunas_indexadas_da_consulta, rmta_obter_indice_entidades
+from utils.texto import rmta_normalizar_texto, rmta_tokenizar
+
+# O pandas só é carregado quando uma sessão guarda ou refina um resultado
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+NIVEL_SESSAO = "sessao"
+
+_QUANTIDADE = r"(\d+|" + "|".join(NUMEROS_POR_EXTENSO) + r")"
+_INICIO = r"^(?:e |mas |agora |entao )?(?:(?:mostre|liste|quero) )?"
+
+PADRAO_LIMITE = re.compile(
+    _INICIO + rf"(?:so |somente |apenas )?(?:os |as )?(?:(?:top|primeiros|primeiras) {_QUANTIDADE}|{_QUANTIDADE} (?:primeiros|primeiras|primeiro|primeira))$"
+)
+PADRAO_ORDENACAO = re.compile(
+    _INICIO + r"(?:ordene|ordenar|ordenado|ordenados|ordenadas|ordenada|classifique)(?: os resultados| o resultado| tudo)? por (?P<coluna>.+?)"
+    r"(?: (?P<direcao>crescente|decrescente|do maior para o menor|do menor para o maior|asc|desc))?$"
+)
+PADRAO_COMPARACAO = re.compile(
+    _INICIO + r"(?:so |somente |apenas )?(?:os |as )?(?:com |que tem |que tenham |cujo |cuja )?(?P<coluna>[a-z_ ]+?)? ?"
+    r"(?P<operador>acima de|mais de|maior que|maiores que|superior a|abaixo de|menos de|menor que|menores que|inferior a|pelo menos|no minimo|no maximo|ate)"
+    r" (?:r\$ ?)?(?P<valor>\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)$"
+)
+PADRAO_FILTRO = re.compile(
+    _INICIO + r"(?:so|somente|apenas) (?:os |as |o |a )?(?:de |da |do |das |dos |com |em )?(?P<termo>.+)$"
+)
+
+# Expressões que indicam que a pergunta depende da anterior
+PADRAO_CONTINUACAO = re.compile(
+    r"^(?:e|mas|agora|entao|so|somente|apenas|ordene|ordenar|filtre|filtrar)\b"
+    r"|\b(?:desses|destes|dessas|destas|deles|delas|esses|estes|essas|estas)\b"
+)
+
+OPERADORES = {
+    "acima de": ">", "mais de": ">", "maior que": ">", "maiores que": ">", "superior a": ">",
+    "abaixo de": "<", "menos de": "<", "menor que": "<", "menores que": "<", "inferior a": "<",
+    "pelo menos": ">=", "no minimo": ">=", "no maximo": "<=", "ate": "<="
+}
+
+_FUNCOES_OPERADORES = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le}
+
+
+class Sessao:
+    """
+    Contexto da última pergunta respondida em uma sessão.
+
+    Attributes:
+        id (str): Identificador da sessão
+        consulta (str): Última pergunta respondida
+        sql (str): SQL que produziu o último resultado
+        parametros_sql (Dict[str, Any]): Parâmetros nomeados do SQL
+        registros (List[Dict[str, Any]]): Primeiras SESSAO_MAX_LINHAS_CACHE linhas do resultado
+        resultado (pd.DataFrame): As mesmas linhas em colunas tipadas, para os refinamentos locais
+        tipos_colunas (Optional[Dict[str, str]]): Tipo de cada coluna, pelo OID (database.decodificacao)
+        completo (bool): Se o resultado em cache contém todas as linhas retornadas
+        atualizado_em (float): Instante do último uso
+    """
+
+    def __init__(self, id: str):
+        import pandas as pd
+
+        self.id = id
+        self.consulta = ""
+        self.sql = ""
+        self.parametros_sql: Dict[str, Any] = {}
+        self.registros: List[Dict[str, Any]] = []
+        self.resultado = pd.DataFrame()
+        self.tipos_colunas: Optional[Dict[str, str]] = None
+        self.completo = False
+        self.atualizado_em = time.time()
+
+
+_sessoes: "OrderedDict[str, Sessao]" = OrderedDict()
+_trava = threading.Lock()
+
+
+def rmta_obter_sessao(id_sessao: str) -> Optional[Sessao]:
+    """
+    Retorna a sessão com o último resultado, se ela existir e não tiver expirado.
+
+    Args:
+        id_sessao (str): Identificador da sessão
+
+    Returns:
+        Optional[Sessao]: Sessão encontrada ou None
+    """
+    with _trava:
+        sessao = _sessoes.get(id_sessao)
+        if sessao is None:
+            return None
+        if time.time() - sessao.atualizado_em > SESSAO_TTL:
+            del _sessoes[id_sessao]
+            return None
+        _sessoes.move_to_end(id_sessao)
+        return sessao
+
+
+def rmta_atualizar_sessao(id_sessao: str, estado: EstadoAgente) -> None:
+    """
+    Guarda na sessão a pergunta, o SQL e o resultado de uma resposta bem-sucedida.
+
+    Respostas com erro não substituem o contexto anterior.
+
+    Args:
+        id_sessao (str): Identificador da sessão
+        estado (EstadoAgente): Estado final da resposta
+    """
+    if estado.get("erro") or not estado.get("sql") or estado.get("resultados") is None:
+        return
+
+    resultados = estado["resultados"]
+    sessao = Sessao(id_sessao)
+    sessao.consulta = estado["consulta"]
+    sessao.sql = "" if estado.get("subconsultas") else estado["sql"]
+    sessao.parametros_sql = dict(estado.get("parametros_sql") or {})
+    sessao.registros = resultados[:SESSAO_MAX_LINHAS_CACHE]
+    sessao.tipos_colunas = estado.get("tipos_colunas")
+    sessao.resultado = rmta_dataframe_de_registros(sessao.registros, sessao.tipos_colunas)
+    # Estimativas de uma amostra não servem de base para refinamentos locais: o SQL é reexecutado
+    sessao.completo = len(resultados) <= SESSAO_MAX_LINHAS_CACHE and not estado.get("aproximacao")
+
+    with _trava:
+        _sessoes[id_sessao] = sessao
+        _sessoes.move_to_end(id_sessao)
+        while len(_sessoes) > SESSAO_MAX_SESSOES:
+            _sessoes.popitem(last=False)
+
+
+def rmta_encerrar_sessao(id_sessao: str) -> None:
+    """
+    Remove uma sessão e o resultado em cache.
+
+    Args:
+        id_sessao (str): Identificador da sessão
+    """
+    with _trava:
+        _sessoes.pop(id_sessao, None)
+
+
+def rmta_obter_contexto_sessao(sessao: Sessao, texto_entrada: str) -> Optional[Dict[str, str]]:
+    """
+    Monta o contexto da pergunta anterior para perguntas de acompanhamento.
+
+    Args:
+        sessao (Sessao): Sessão com a pergunta anterior
+        texto_entrada (str): Nova pergunta do usuário
+
+    Returns:
+        Optional[Dict[str, str]]: "consulta_anterior" e "sql_anterior", ou None se a
+        nova pergunta não parece depender da anterior
+    """
+    if not PADRAO_CONTINUACAO.search(rmta_normalizar_texto(texto_entrada)):
+        return None
+    sql_anterior = sessao.sql
+    if sessao.parametros_sql:
+        sql_anterior += "\n-- Parâmetros: " + json.dumps(sessao.parametros_sql, ensure_ascii=False, default=str)
+    return {"consulta_anterior": sessao.consulta, "sql_anterior": sql_anterior}
+
+
+# ---------------------------------------------------------------------------
+# Interpretação de refinamentos
+# ---------------------------------------------------------------------------
+
+def _converter_quantidade(texto: str) -> int:
+    return int(texto) if texto.isdigit() else NUMEROS_POR_EXTENSO[texto]
+
+
+def _converter_valor(texto: str) -> Optional[Decimal]:
+    """Converte um valor no formato brasileiro (1.000,50) ou simples (1000.5)."""
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+(?:,\d+)?", texto):
+        texto = texto.replace(".", "")
+    try:
+        return Decimal(texto.replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+def _coluna_numerica(serie: "pd.Series") -> bool:
+    """Indica se a coluna contém apenas números (incluindo Decimal, como o PostgreSQL retorna NUMERIC)."""
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(serie):
+        return False
+    if pd.api.types.is_numeric_dtype(serie):
+        return True
+    valores = serie.dropna()
+    return len(valores) > 0 and all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in valores)
+
+
+def _resolver_coluna(resultado: "pd.DataFrame", termo: Optional[str], numerica: bool = False) -> Optional[str]:
+    """
+    Identifica a coluna do resultado mencionada na pergunta.
+
+    Sem termo, e apenas para colunas numéricas, usa a única coluna numérica que
+    não é um identificador.
+    """
+    candidatas = [c for c in resultado.columns if not numerica or _coluna_numerica(resultado[c])]
+    tokens = set(rmta_tokenizar(termo or ""))
+    if tokens:
+        pontuacoes = {c: len(tokens & set(rmta_tokenizar(str(c).replace("_", " ")))) for c in candidatas}
+        melhor = max(pontuacoes.values(), default=0)
+        escolhidas = [c for c, p in pontuacoes.items() if p == melhor and p > 0]
+        return escolhidas[0] if len(escolhidas) == 1 else None
+    if numerica:
+        candidatas = [c for c in candidatas if str(c).lower() != "id" and not str(c).lower().endswith("_id")]
+        return candidatas[0] if len(candidatas) == 1 else None
+    return None
+
+
+def _resolver_filtro(resultado: "pd.DataFrame", termo: str) -> Optional[Dict[str, Any]]:
+    """Procura o termo entre os valores das colunas de texto do resultado."""
+    for coluna in resultado.columns:
+        serie = resultado[coluna].dropna()
+        if serie.empty or not all(isinstance(v, str) for v in serie):
+            continue
+        indice = IndiceEntidades()
+        indice.adicionar("resultado", coluna, serie.unique().tolist())
+        valores = indice.buscar("resultado", coluna, termo)
+        if valores:
+            return {"coluna": coluna, "valores": valores}
+    return None
+
+
+def _resolver_filtro_no_indice(resultado: "pd.DataFrame", sql: str, termo: str) -> Optional[Dict[str, Any]]:
+    """Procura o termo no índice de entidades, na coluna indexada de mesmo nome de uma coluna do resultado."""
+    indice = rmta_obter_indice_entidades()
+    parciais = set(indice.parciais())
+    indexadas = rmta_colunas_indexadas_da_consulta(sql)
+    for coluna in resultado.columns:
+        candidatas = [tabela for tabela, coluna_indexada in indexadas if coluna_indexada == coluna]
+        # Mesmo nome em mais de uma tabela do SQL (ex.: nome de produtos e de clientes): coluna ambígua
+        if len(candidatas) != 1 or f"{candidatas[0]}.{coluna}" in parciais:
+            continue
+        valores = indice.buscar(candidatas[0], coluna, termo)
+        if valores:
+            return {"coluna": coluna, "valores": valores}
+    return None
+
+
+def rmta_interpretar_refinamento(sessao: Sessao, texto_entrada: str) -> Optional[Dict[str, Any]]:
+    """
+    Reconhece uma pergunta que apenas filtra, ordena ou limita o resultado anterior.
+
+    Com o cache incompleto, o termo de um filtro é procurado no índice de
+    entidades (na coluna indexada de mesmo nome, de uma tabela do SQL
+    anterior), e não nas linhas em cache.
+
+    Args:
+        sessao (Sessao): Sessão com o resultado anterior
+        texto_entrada (str): Nova pergunta do usuário
+
+    Returns:
+        Optional[Dict[str, Any]]: Refinamento com "tipo" (limite, ordenacao, comparacao
+        ou filtro), seus argumentos e uma "descricao", ou None se não for um refinamento
+        sobre colunas do resultado anterior
+    """
+    texto = rmta_normalizar_texto(texto_entrada).rstrip("?!. ")
+    resultado = sessao.resultado
+    if resultado.empty:
+        return None
+
+    correspondencia = PADRAO_LIMITE.match(texto)
+    if correspondencia:
+        n = _converter_quantidade(correspondencia.group(1) or correspondencia.group(2))
+        return {"tipo": "limite", "n": n, "descricao": f"apenas as {n} primeiras linhas"}
+
+    correspondencia = PADRAO_ORDENACAO.match(texto)
+    if correspondencia:
+        coluna = _resolver_coluna(resultado, correspondencia.group("coluna"))
+        if coluna is None:
+            return None
+        direcao = correspondencia.group("direcao") or ""
+        ascendente = direcao not in ("decrescente", "do maior para o menor", "desc")
+        return {
+            "tipo": "ordenacao", "coluna": coluna, "ascendente": ascendente,
+            "descricao": f"ordenado por {coluna} ({'crescente' if ascendente else 'decrescente'})"
+        }
+
+    correspondencia = PADRAO_COMPARACAO.match(texto)
+    if correspondencia:
+        coluna = _resolver_coluna(resultado, correspondencia.group("coluna"), numerica=True)
+        valor = _converter_valor(correspondencia.group("valor"))
+        if coluna is None or valor is None:
+            return None
+        operador_sql = OPERADORES[correspondencia.group("operador")]
+        return {
+            "tipo": "comparacao", "coluna": coluna, "operador": operador_sql, "valor": valor,
+            "descricao": f"apenas {coluna} {operador_sql} {valor}"
+        }
+
+    correspondencia = PADRAO_FILTRO.match(texto)
+    if correspondencia:
+        if sessao.completo:
+            filtro = _resolver_filtro(resultado, correspondencia.group("termo"))
+        else:
+            # O cache tem só o início do resultado: os valores vêm do índice de entidades,
+            # para que o filtro reexecutado no banco não perca linhas fora do cache
+            filtro = _resolver_filtro_no_indice(resultado, sessao.sql, correspondencia.group("termo"))
+        if filtro is None:
+            return None
+        return {
+            "tipo": "filtro", **filtro,
+            "descricao": f"apenas {filtro['coluna']} em {', '.join(map(str, filtro['valores']))}"
+        }
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Aplicação dos refinamentos
+# ---------------------------------------------------------------------------
+
+def rmta_aplicar_refinamento_local(resultado: "pd.DataFrame", refinamento: Dict[str, Any]) -> "pd.DataFrame":
+    """
+    Aplica o refinamento ao resultado em cache com operações vetorizadas do pandas.
+
+    Só é equivalente à reexecução no banco quando o resultado em cache está completo.
+
+    Args:
+        resultado (pd.DataFrame): Resultado anterior completo
+        refinamento (Dict[str, Any]): Refinamento interpretado
+
+    Returns:
+        pd.DataFrame: Resultado refinado
+    """
+    import pandas as pd
+
+    tipo = refinamento["tipo"]
+    if tipo == "limite":
+        return resultado.head(refinamento["n"])
+    if tipo == "ordenacao":
+        return resultado.sort_values(refinamento["coluna"], ascending=refinamento["ascendente"], kind="stable", na_position="last")
+    if tipo == "filtro":
+        return resultado[resultado[refinamento["coluna"]].isin(refinamento["valores"])]
+
+    serie = resultado[refinamento["coluna"]]
+    valor = refinamento["valor"]
+    if pd.api.types.is_numeric_dtype(serie):
+        valor = float(valor)
+    mascara = _FUNCOES_OPERADORES[refinamento["operador"]](serie, valor).fillna(False).astype(bool)
+    return resultado[mascara]
+
+
+def rmta_reescrever_sql(sql: str, parametros: Dict[str, Any], refinamento: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reescreve o SQL anterior como subconsulta com o refinamento aplicado.
+
+    Args:
+        sql (str): SQL anterior (já validado)
+        parametros (Dict[str, Any]): Parâmetros nomeados do SQL anterior
+        refinamento (Dict[str, Any]): Refinamento interpretado
+
+    Returns:
+        Dict[str, Any]: "sql" reescrito e "parametros" combinados
+    """
+    base = sql.strip().rstrip(";")
+    if not parametros:
+        # A partir de agora o SQL tem parâmetros: "%" literais precisam de escape
+        base = base.replace("%", "%%")
+    parametros = dict(parametros)
+    nome = f"refinamento_{sum(1 for chave in parametros if chave.startswith('refinamento_'))}"
+    tipo = refinamento["tipo"]
+    coluna = '"' + str(refinamento.get("coluna", "")).replace('"', '""') + '"'
+
+    sql_refinado = f"SELECT *\nFROM (\n{base}\n) AS anterior\n"
+    if tipo == "limite":
+        sql_refinado += f"LIMIT %({nome})s"
+        parametros[nome] = refinamento["n"]
+    elif tipo == "ordenacao":
+        sql_refinado += f"ORDER BY anterior.{coluna} {'ASC' if refinamento['ascendente'] else 'DESC'} NULLS LAST"
+    elif tipo == "filtro":
+        sql_refinado += f"WHERE anterior.{coluna} = ANY(%({nome})s)"
+        parametros[nome] = list(refinamento["valores"])
+    else:
+        sql_refinado += f"WHERE anterior.{coluna} {refinamento['operador']} %({nome})s"
+        parametros[nome] = refinamento["valor"]
+    return {"sql": sql_refinado, "parametros": parametros}
+
+
+def rmta_responder_refinamento(sessao: Sessao, estado: EstadoAgente) -> Optional[EstadoAgente]:
+    """
+    Responde uma pergunta de acompanhamento a partir do resultado anterior da sessão.
+
+    Se o resultado em cache está completo, o refinamento é aplicado localmente;
+    caso contrário, o SQL anterior é reexecutado como subconsulta.
+
+    Args:
+        sessao (Sessao): Sessão com o resultado anterior
+        estado (EstadoAgente): Estado inicial da nova pergunta
+
+    Returns:
+        Optional[EstadoAgente]: Estado final, ou None se a pergunta não é um refinamento
+    """
+    inicio = time.time()
+    refinamento = rmta_interpretar_refinamento(sessao, estado["consulta"])
+    if refinamento is None:
+        return None
+    if not sessao.completo and not sessao.sql:
+        # Resultado mesclado de subconsultas: não há um SQL único para reexecutar
+        return None
+
+    reescrita = rmta_reescrever_sql(sessao.sql, sessao.parametros_sql, refinamento)
+    estado["sql"] = reescrita["sql"]
+    estado["parametros_sql"] = reescrita["parametros"]
+    estado["nivel_modelo"] = NIVEL_SESSAO
+    estado["validacao"] = {"is_valid": True, "message": "Refinamento do SQL anterior já validado"}
+    estado["explicacao"] = f"Refinamento da consulta anterior (\"{sessao.consulta}\"): {refinamento['descricao']}."
+
+    if sessao.completo:
+        refinado = rmta_aplicar_refinamento_local(sessao.resultado, refinamento)
+        # Os registros guardados mantêm os valores do banco (Decimal, date...), como numa reexecução
+        estado["resultados"] = [sessao.registros[posicao] for posicao in refinado.index]
+        estado["tipos_colunas"] = sessao.tipos_colunas
+        estado["tempo_execucao"]["refinamento_local"] = time.time() - inicio
+        logger.info("Refinamento respondido localmente (%s): %s registros", refinamento['tipo'], len(refinado))
+    else:
+        try:
+            with rmta_reservar(estado, RECURSO_BD):
+                estado["resultados"], estado["erro"], estado["tipos_colunas"] = rmta_executar_no_banco(
+                    estado["sql"], estado["parametros_sql"]
+                )
+        except ErroCotaExcedida as e:
+            rmta_registrar_cota_excedida(estado, e)
+        estado["tempo_execucao"]["refinamento_subconsulta"] = time.time() - inicio
+        logger.info("Refinamento respondido por subconsulta (%s)", refinamento['tipo'])
+
+    if not estado["erro"]:
+        estado["explicacao_resultados"] = (
+            f"{len(estado['resultados'])} registro(s) do resultado anterior, {refinamento['descricao']}."
+        )
+    return estado
@@ -0,0 +1,399 @@
+"""
+Decomposição de perguntas compostas em subconsultas paralelas.
+
+Perguntas como "quanto cada cliente gastou e quais clientes compraram um
+Notebook?" costumam virar um único SQL grande, lento ou errado. Este módulo
+contém o nó de planejamento, que divide a pergunta em subperguntas
+independentes, e o nó que executa cada subpergunta em paralelo (geração,
+validação e execução, com escalonamento de nível) usando o pool de conexões,
+mesclando os resultados localmente antes da explicação.
+"""
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.estado import EstadoAgente, END
+from agent.nos import (
+    rmta_gerar_sql,
+    rmta_validar_sql,
+    rmta_executar_sql,
+    rmta_escalar_modelo,
+    rmta_decidir_apos_validacao,
+    rmta_decidir_proximo_passo
+)
+from agent.intencoes import rmta_gerar_sql_por_regras
+from agent.templates_prompt import TEMPLATE_PLANEJAR_CONSULTA, rmta_contar_tokens, rmta_registrar_uso_prompt
+from agent.cliente_llm import rmta_invocar_modelo
+from agent.escalonador import RECURSO_LLM, rmta_reservar
+from agent.roteador_modelos import NIVEL_REGRAS, rmta_obter_niveis, rmta_obter_modelo_nivel
+from agent.registro_mensagens import rmta_registrar_prompt, rmta_registrar_resposta
+from config.configuracoes import PLANEJADOR_ATIVO, SUBCONSULTAS_MAX, SUBCONSULTAS_THREADS
+from utils.config_log import rmta_submeter_com_contexto
+from utils.texto import rmta_normalizar_texto
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+_VERBOS_PERGUNTA = (
+    r"(?:liste|listar|mostre|mostrar|exiba|exibir|traga|informe|calcule|compare|comparar"
+    r"|quais|qual|quem|quanto|quantos|quantas)"
+)
+
+# Pontos em que uma pergunta composta pode ser dividida: ";", "?" seguido de
+# outra frase, ou uma conjunção seguida de um novo verbo/interrogativo
+PADRAO_DIVISAO = re.compile(
+    r"(\s*;\s*"
+    r"|(?<=\?)\s+"
+    rf"|,?\s+(?:e também|e tambem|além disso|alem disso|e)\s+(?={_VERBOS_PERGUNTA}\b))",
+    re.IGNORECASE
+)
+
+# Uma parte só é uma pergunta independente se tiver sujeito próprio (entidade ou
+# "quem"/"cada") ou for um pedido no imperativo; "e quanto gastaram?" se refere
+# ao sujeito da parte anterior
+_PADRAO_SUJEITO = re.compile(
+    r"^(?:liste|listar|mostre|mostrar|exiba|exibir|traga|informe|calcule|compare|comparar)\b"
+    r"|\b(?:quem|cada|clientes?|produtos?|categorias?|transac(?:ao|oes)|vendas?)\b"
+)
+
+
+def _tem_sujeito(parte: str) -> bool:
+    """Verifica se uma parte da pergunta tem sujeito próprio."""
+    return bool(_PADRAO_SUJEITO.search(rmta_normalizar_texto(parte)))
+
+
+def rmta_dividir_pergunta(consulta: str) -> List[str]:
+    """
+    Divide uma pergunta nos pontos em que ela parece conter outra pergunta.
+
+    Partes sem sujeito próprio continuam a parte anterior e não são separadas.
+
+    Args:
+        consulta (str): Pergunta em linguagem natural do usuário
+
+    Returns:
+        List[str]: Partes não vazias da pergunta (uma única parte se não houver divisão)
+    """
+    trechos = PADRAO_DIVISAO.split(consulta)
+    partes = [trechos[0]]
+    for separador, parte in zip(trechos[1::2], trechos[2::2]):
+        if _tem_sujeito(parte):
+            partes.append(parte)
+        else:
+            partes[-1] += separador + parte
+    partes = [parte.strip(" ,") for parte in partes]
+    return [parte for parte in partes if parte]
+
+
+def _planejar_com_modelo(estado: EstadoAgente) -> Tuple[List[str], Optional[List[str]]]:
+    """
+    Pede ao primeiro nível de LLM configurado a divisão da pergunta em subperguntas.
+
+    Returns:
+        Tuple[List[str], Optional[List[str]]]: Subperguntas sugeridas pelo modelo (vazia
+        se não há nível de LLM) e as colunas pelas quais juntar os resultados, se houver
+
+    Raises:
+        Exception: Se a chamada ao modelo falhar ou a resposta não for um JSON válido
+    """
+    niveis = [nivel for nivel in rmta_obter_niveis("gerar_sql") if nivel != NIVEL_REGRAS]
+    if not niveis:
+        return [], None
+
+    parametros_prompt = {"consulta": estado["consulta"]}
+    prompt_sistema, prompt_usuario = TEMPLATE_PLANEJAR_CONSULTA.renderizar(**parametros_prompt)
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+    mensagens = [
+        SystemMessage(content=prompt_sistema),
+        HumanMessage(content=prompt_usuario)
+    ]
+
+    logger.debug("Enviando requisição de planejamento para o modelo de linguagem (nível %s)", niveis[0])
+    with rmta_reservar(estado, RECURSO_LLM) as reserva:
+        resposta = rmta_invocar_modelo(rmta_obter_modelo_nivel(niveis[0]), mensagens)
+        conteudo = resposta.content
+        uso = rmta_registrar_uso_prompt(TEMPLATE_PLANEJAR_CONSULTA, prompt_usuario, resposta)
+        reserva.consumir_tokens(uso["tokens_prompt"] + rmta_contar_tokens(conteudo))
+    correspondencia = re.search(r"\{.*\}", conteudo, re.DOTALL)
+    plano = json.loads(correspondencia.group(0) if correspondencia else conteudo)
+    subconsultas = plano.get("subconsultas", [])
+    chave = plano.get("chave_juncao")
+    if isinstance(chave, str):
+        chave = [chave]
+    chave = [str(coluna).strip() for coluna in chave or [] if str(coluna).strip()] or None
+
+    estado["mensagens"] = estado.get("mensagens") or []
+    rmta_registrar_prompt(estado["mensagens"], TEMPLATE_PLANEJAR_CONSULTA, parametros_prompt)
+    rmta_registrar_resposta(estado["mensagens"], conteudo)
+    estado["uso_tokens"] = estado.get("uso_tokens") or {}
+    estado["uso_tokens"]["planejar_consulta"] = uso
+
+    return [str(subconsulta).strip() for subconsulta in subconsultas if str(subconsulta).strip()], chave
+
+
+def rmta_planejar_consulta(estado: EstadoAgente) -> EstadoAgente:
+    """
+    Decide se a pergunta deve ser dividida em subconsultas independentes.
+
+    Perguntas sem sinal de composição seguem direto para a geração de SQL,
+    sem custo. Nas demais, se todas as partes da divisão textual são
+    reconhecidas pelas regras, o plano é montado sem LLM; caso contrário, e
+    apenas com PLANEJADOR_ATIVO, o modelo mais barato propõe as subperguntas
+    e, opcionalmente, a chave pela qual os resultados devem ser juntados.
+    Sem o planejador ou se ele falhar, a pergunta segue como uma consulta única.
+
+    Args:
+        estado (EstadoAgente): O estado atual do agente contendo a consulta do usuário
+
+    Returns:
+        EstadoAgente: Estado com estado["subconsultas"] preenchido quando houver mais de uma
+    """
+    inicio = time.time()
+    estado["subconsultas"] = []
+
+    partes = rmta_dividir_pergunta(estado["consulta"])
+    if not estado.get("contexto_sessao") and len(partes) > 1:
+        chave = None
+        if all(rmta_gerar_sql_por_regras(parte) is not None for parte in partes):
+            perguntas = partes
+            logger.info("Pergunta dividida por regras em %s subconsultas", len(perguntas))
+        elif not PLANEJADOR_ATIVO:
+            # Sem o planejador, a divisão ambígua não vale uma chamada extra ao LLM no caminho da pergunta
+            perguntas = []
+        else:
+            try:
+                perguntas, chave = _planejar_com_modelo(estado)
+                logger.info("Pergunta dividida pelo modelo em %s subconsultas (chave de junção: %s)", len(perguntas), chave)
+            except Exception as e:
+                logger.warning("Erro ao planejar subconsultas, seguindo com consulta única: %s", e)
+                perguntas = []
+
+        if len(perguntas) > 1:
+            estado["subconsultas"] = [
+                {"pergunta": pergunta, "chave_juncao": chave} for pergunta in perguntas[:SUBCONSULTAS_MAX]
+            ]
+
+    estado["tempo_execucao"] = estado.get("tempo_execucao", {})
+    estado["tempo_execucao"]["planejar_consulta"] = time.time() - inicio
+    return estado
+
+
+def rmta_decidir_apos_planejamento(estado: EstadoAgente) -> str:
+    """
+    Decide entre o fluxo de consulta única e a execução paralela das subconsultas.
+
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+
+    Returns:
+        str: Nome do próximo nó
+    """
+    return "executar_subconsultas" if estado.get("subconsultas") else "gerar_sql"
+
+
+def _criar_estado_ramo(estado: EstadoAgente, pergunta: str) -> EstadoAgente:
+    """
+    Cria o estado isolado de uma subconsulta a partir do estado da pergunta composta.
+
+    Os ramos são sempre exatos: as linhas mescladas não têm como levar a nota
+    da amostra nem os intervalos de confiança de cada ramo.
+    """
+    return {
+        **estado,
+        "consulta": pergunta,
+        "sql": "",
+        "validacao": {},
+        "resultados": None,
+        "tipos_colunas": None,
+        "explicacao": "",
+        "explicacao_resultados": None,
+        "erro": None,
+        "mensagens": [],
+        "tempo_execucao": {},
+        "uso_tokens": {},
+        "nivel_modelo": None,
+        "parametros_sql": {},
+        "intencao": None,
+        "especulacao": None,
+        "subconsultas": [],
+        "modo_aproximado": False,
+        "aproximacao": None,
+        "cota_excedida": None
+    }
+
+
+def rmta_executar_ramo(estado: EstadoAgente, pergunta: str) -> EstadoAgente:
+    """
+    Responde uma subpergunta com os mesmos nós e decisões do fluxo de consulta única.
+
+    Args:
+        estado (EstadoAgente): Estado da pergunta composta
+        pergunta (str): Subpergunta deste ramo
+
+    Returns:
+        EstadoAgente: Estado final do ramo, com SQL, resultados ou erro
+    """
+    ramo = rmta_gerar_sql(_criar_estado_ramo(estado, pergunta))
+    while True:
+        ramo = rmta_validar_sql(ramo)
+        proximo = rmta_decidir_apos_validacao(ramo)
+        if proximo == "executar_sql":
+            ramo = rmta_executar_sql(ramo)
+            proximo = rmta_decidir_proximo_passo(ramo)
+        if proximo != "escalar_modelo":
+            return ramo
+        ramo = rmta_gerar_sql(rmta_escalar_modelo(ramo))
+
+
+def rmta_mesclar_resultados(resultados_ramos: List[List[Dict[str, Any]]],
+                            chave: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Mescla localmente os resultados das subconsultas.
+
+    Por padrão as linhas são empilhadas, com a coluna "subconsulta" indicando
+    o ramo de origem de cada uma (o número do ramo no plano). Os resultados só
+    são unidos (junção externa) pela chave definida no plano, e apenas se
+    todos os ramos com linhas a tiverem; se a junção falhar (ex.: tipos
+    diferentes na chave), as linhas são empilhadas.
+
+    Args:
+        resultados_ramos (List[List[Dict[str, Any]]]): Registros de cada subconsulta,
+            na ordem do plano (vazia para ramos sem linhas ou com erro)
+        chave (Optional[List[str]]): Colunas de junção definidas pelo planejador
+
+    Returns:
+        List[Dict[str, Any]]: Registros mesclados
+    """
+    import pandas as pd
+
+    if len(resultados_ramos) == 1:
+        return resultados_ramos[0]
+    quadros = [
+        (indice, pd.DataFrame.from_records(registros))
+        for indice, registros in enumerate(resultados_ramos, start=1) if registros
+    ]
+    if not quadros:
+        return []
+
+    mesclado = None
+    if chave and len(quadros) > 1 and all(set(chave) <= set(quadro.columns) for _, quadro in quadros):
+        try:
+            mesclado = quadros[0][1]
+            for indice, quadro in quadros[1:]:
+                mesclado = mesclado.merge(quadro, on=chave, how="outer", suffixes=("", f"_{indice}"))
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Não foi possível juntar as subconsultas por %s, empilhando os resultados: %s", chave, e)
+            mesclado = None
+    if mesclado is None:
+        mesclado = pd.concat(
+            [quadro.assign(subconsulta=indice)[["subconsulta", *quadro.columns]] for indice, quadro in quadros],
+            ignore_index=True
+        )
+
+    # Valores ausentes da junção viram None (e não NaN) para serializar como null
+    mesclado = mesclado.astype(object).where(mesclado.notna(), None)
+    return mesclado.to_dict("records")
+
+
+def rmta_executar_subconsultas(estado: EstadoAgente) -> EstadoAgente:
+    """
+    Executa as subconsultas planejadas em paralelo e mescla os resultados.
+
+    Cada ramo roda em uma thread própria e obtém uma conexão do pool. Os tempos
+    de cada ramo são registrados com o sufixo do ramo (ex.: "gerar_sql[subconsulta_1]").
+    Os ramos são executados de forma exata, mesmo no modo aproximado.
+    Ramos com erro não impedem os demais; o estado só recebe erro se todos falharem.
+
+    Args:
+        estado (EstadoAgente): O estado atual do agente com as subconsultas planejadas
+
+    Returns:
+        EstadoAgente: Estado com o SQL de cada ramo, os resultados mesclados e os tempos por ramo
+    """
+    inicio = time.time()
+    perguntas = [subconsulta["pergunta"] for subconsulta in estado["subconsultas"]]
+    chave = estado["subconsultas"][0].get("chave_juncao")
+    logger.info("Executando %s subconsultas em paralelo", len(perguntas))
+
+    def executar(pergunta: str) -> EstadoAgente:
+        inicio_ramo = time.time()
+        ramo = rmta_executar_ramo(estado, pergunta)
+        ramo["tempo_execucao"]["total"] = time.time() - inicio_ramo
+        return ramo
+
+    with ThreadPoolExecutor(max_workers=max(1, min(SUBCONSULTAS_THREADS, len(perguntas))),
+                            thread_name_prefix="subconsulta") as executor:
+        futuros = [rmta_submeter_com_contexto(executor, executar, pergunta) for pergunta in perguntas]
+        ramos = [futuro.result() for futuro in futuros]
+
+    estado["tempo_execucao"] = estado.get("tempo_execucao", {})
+    estado["mensagens"] = estado.get("mensagens") or []
+    estado["uso_tokens"] = estado.get("uso_tokens") or {}
+    estado["subconsultas"] = []
+    trechos_sql, explicacoes, erros = [], [], []
+    for indice, ramo in enumerate(ramos, start=1):
+        sufixo = f"subconsulta_{indice}"
+        for etapa, tempo in ramo["tempo_execucao"].items():
+            estado["tempo_execucao"][f"{etapa}[{sufixo}]"] = tempo
+        for etapa, uso in ramo["uso_tokens"].items():
+            estado["uso_tokens"][f"{etapa}[{sufixo}]"] = uso
+        estado["mensagens"].extend(ramo["mensagens"])
+        estado["subconsultas"].append({
+            "pergunta": ramo["consulta"],
+            "sql": ramo["sql"],
+            "parametros_sql": ramo["parametros_sql"],
+            "nivel_modelo": ramo["nivel_modelo"],
+            "resultados": ramo["resultados"],
+            "tipos_colunas": ramo.get("tipos_colunas"),
+            "erro": ramo["erro"]
+        })
+
+        trechos_sql.append(f"-- Subconsulta {indice}: {ramo['consulta']}\n{ramo['sql']}")
+        if ramo["erro"]:
+            erros.append(f"Subconsulta {indice} (\"{ramo['consulta']}\"): {ramo['erro']}")
+        else:
+            explicacoes.append(f"{indice}. {ramo['explicacao']}")
+
+    inicio_mescla = time.time()
+    estado["resultados"] = rmta_mesclar_resultados(
+        [[] if subconsulta["erro"] else subconsulta["resultados"] or [] for subconsulta in estado["subconsultas"]],
+        chave
+    )
+    # Colunas mescladas (junção ou empilhamento) não têm OID: os tipos vêm dos valores
+    estado["tipos_colunas"] = None
+    estado["tempo_execucao"]["mesclar_resultados"] = time.time() - inicio_mescla
+
+    estado["sql"] = ";\n\n".join(trechos_sql)
+    estado["parametros_sql"] = {}
+    estado["intencao"] = None
+    estado["nivel_modelo"] = ",".join(sorted({ramo["nivel_modelo"] for ramo in ramos if ramo["nivel_modelo"]}))
+    estado["explicacao"] = "A pergunta foi dividida em subconsultas independentes:\n" + "\n".join(explicacoes + erros)
+    estado["validacao"] = {"is_valid": len(erros) < len(ramos), "message": "Subconsultas validadas individualmente"}
+    estado["erro"] = "; ".join(erros) if len(erros) == len(ramos) else None
+    estado["cota_excedida"] = next((ramo["cota_excedida"] for ramo in ramos if ramo.get("cota_excedida")), None)
+    if erros and estado["erro"] is None:
+        logger.warning("%s de %s subconsultas falharam: %s", len(erros), len(ramos), erros)
+
+    estado["tempo_execucao"]["executar_subconsultas"] = time.time() - inicio
+    logger.info("Subconsultas concluídas em %.2fs", estado['tempo_execucao']['executar_subconsultas'])
+    return estado
+
+
+def rmta_decidir_apos_subconsultas(estado: EstadoAgente) -> str:
+    """
+    Decide o próximo passo após a execução das subconsultas.
+
+    Args:
+        estado (EstadoAgente): O estado atual do agente
+
+    Returns:
+        str: "explicar_resultados" se houver resultados mesclados, ou END
+    """
+    if estado.get("erro") or not estado.get("resultados"):
+        logger.warning("Subconsultas sem resultados. Encerrando fluxo.")
+        return END
+    return "explicar_resultados"
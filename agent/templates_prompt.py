@@ -0,0 +1,303 @@
+"""
+Templates de prompt do SQL Agent.
+
+Este módulo centraliza os prompts enviados ao modelo de linguagem. Os blocos
+estáticos (esquema, relacionamentos, diretrizes e exemplos) são compilados uma
+única vez na importação, de modo que o prefixo enviado ao provedor seja idêntico
+byte a byte entre requisições e possa ser reaproveitado pelo cache de prefixo.
+Apenas a parte variável (pergunta, valores do banco, SQL, resultados) é
+anexada ao final.
+"""
+import hashlib
+import logging
+import textwrap
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.configuracoes import (
+    CODIFICACAO_TOKENIZADOR,
+    CACHE_PROMPT_MINIMO_TOKENS,
+    CACHE_PROMPT_INCREMENTO_TOKENS,
+    CACHE_PROMPT_TTL,
+    SUBCONSULTAS_MAX
+)
+from database.esquema import ESQUEMA_BD
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Tokenizador local carregado sob demanda (tiktoken pode precisar baixar a tabela BPE)
+_tokenizador = None
+_tokenizador_carregado = False
+
+# Prefixos já enviados ao provedor: hash -> instante do último envio
+_prefixos_enviados: Dict[str, float] = {}
+_trava_prefixos = threading.Lock()
+
+
+def _compilar_bloco(texto: str) -> str:
+    """Remove a indentação e os espaços das bordas de um bloco de prompt."""
+    return textwrap.dedent(texto).strip()
+
+
+def _hash_texto(texto: str) -> str:
+    """Calcula o hash SHA-256 (hex) dos bytes UTF-8 de um texto."""
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def rmta_contar_tokens(texto: str) -> int:
+    """
+    Conta os tokens de um texto usando o tokenizador local.
+
+    Usa o tiktoken quando disponível. Se o tokenizador não puder ser carregado
+    (por exemplo, sem acesso à tabela BPE), recorre a uma estimativa de
+    aproximadamente 4 bytes por token.
+
+    Args:
+        texto (str): Texto a ser tokenizado
+
+    Returns:
+        int: Número de tokens do texto
+    """
+    global _tokenizador, _tokenizador_carregado
+
+    if not _tokenizador_carregado:
+        _tokenizador_carregado = True
+        try:
+            import tiktoken
+            _tokenizador = tiktoken.get_encoding(CODIFICACAO_TOKENIZADOR)
+        except Exception as e:
+            logger.warning("Tokenizador local indisponível, usando estimativa: %s", e)
+            _tokenizador = None
+
+    if _tokenizador is not None:
+        return len(_tokenizador.encode(texto))
+    return max(1, len(texto.encode("utf-8")) // 4) if texto else 0
+
+
+class TemplatePrompt:
+    """
+    Template de prompt com prefixo estático pré-compilado.
+
+    O prompt do sistema é fixo e calculado uma única vez, junto com seu hash
+    e sua contagem de tokens. A mensagem do usuário é o único trecho variável
+    e é sempre posicionada depois do prefixo.
+
+    Attributes:
+        id (str): Identificador estável do template
+        sistema (str): Prompt do sistema já compilado (prefixo estável)
+        modelo_usuario (str): Modelo da mensagem do usuário com campos nomeados
+        padroes (Dict[str, Any]): Valores dos campos opcionais da mensagem do usuário
+        hash_prefixo (str): Hash SHA-256 do prompt do sistema
+        tokens_prefixo (int): Número de tokens do prompt do sistema
+    """
+
+    def __init__(self, id: str, sistema: str, modelo_usuario: str, padroes: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.sistema = sistema
+        self.modelo_usuario = modelo_usuario
+        self.padroes = padroes or {}
+        self.hash_prefixo = _hash_texto(sistema)
+        self._tokens_prefixo = None
+
+    @property
+    def tokens_prefixo(self) -> int:
+        """Número de tokens do prefixo, calculado uma única vez."""
+        if self._tokens_prefixo is None:
+            self._tokens_prefixo = rmta_contar_tokens(self.sistema)
+        return self._tokens_prefixo
+
+    def renderizar(self, **parametros) -> Tuple[str, str]:
+        """
+        Renderiza o template com os parâmetros informados.
+
+        Args:
+            **parametros: Valores dos campos da mensagem do usuário (os omitidos usam os padrões)
+
+        Returns:
+            Tuple[str, str]: Prompt do sistema (inalterado) e mensagem do usuário
+        """
+        return self.sistema, self.modelo_usuario.format(**{**self.padroes, **parametros})
+
+
+TEMPLATE_GERAR_SQL = TemplatePrompt(
+    id="gerar_sql",
+    sistema=_compilar_bloco("""
+        Você é um especialista em SQL para PostgreSQL. Sua tarefa é converter perguntas feitas em linguagem natural em consultas SQL válidas.
+
+        O banco de dados possui o seguinte esquema:
+        """) + "\n" + ESQUEMA_BD.strip() + "\n\n" + _compilar_bloco("""
+        Relacionamentos:
+        - Um cliente pode ter várias transações (1 para N)
+        - Cada transação está associada a um produto (N para 1)
+
+        Diretrizes importantes:
+        1. Use JOINs apropriados para relacionar as tabelas
+        2. Use aliases para melhorar a legibilidade (ex: c para clientes)
+        3. Sempre use consultas parametrizadas para evitar SQL injection
+        4. Otimize as consultas para melhor performance
+        5. Inclua comentários explicativos no SQL quando necessário
+        6. Forneça uma explicação clara do que a consulta faz
+        7. Não use funções ou sintaxes específicas que não sejam compatíveis com PostgreSQL
+        8. Sempre retorne resultados significativos e bem formatados
+
+        Exemplos de consultas:
+        1. "Quais clientes compraram um Notebook?" deve gerar uma consulta que junta clientes, transacoes e produtos, filtrando por produtos com nome contendo "Notebook".
+        2. "Quanto cada cliente gastou no total?" deve agrupar transações por cliente e somar os valores.
+        3. "Quem tem saldo suficiente para comprar um Smartphone?" deve comparar o saldo dos clientes com o preço dos smartphones.
+
+        Responda apenas com um JSON no seguinte formato:
+        {"query": "A consulta SQL aqui", "explanation": "Explicação da consulta aqui"}
+        """),
+    modelo_usuario="{valores_conhecidos}Gere uma consulta SQL para responder à seguinte pergunta: '{consulta}'",
+    padroes={"valores_conhecidos": ""}
+)
+
+# Perguntas de acompanhamento: mesmo prefixo (e mesmo cache) da geração de SQL,
+# com a pergunta e o SQL anteriores na parte variável
+TEMPLATE_REFINAR_SQL = TemplatePrompt(
+    id="refinar_sql",
+    sistema=TEMPLATE_GERAR_SQL.sistema,
+    modelo_usuario=_compilar_bloco("""
+        Pergunta anterior: '{consulta_anterior}'
+        Consulta SQL anterior:
+        {sql_anterior}
+
+        {valores_conhecidos}Gere uma consulta SQL para responder à seguinte pergunta de acompanhamento, reaproveitando a consulta anterior quando fizer sentido: '{consulta}'
+        """),
+    padroes={"valores_conhecidos": ""}
+)
+
+def rmta_bloco_valores(valores: Dict[str, List[str]]) -> str:
+    """
+    Monta o trecho da mensagem do usuário com os valores do banco mencionados na pergunta.
+
+    Fica na parte variável do prompt, depois do prefixo em cache, e só lista os
+    valores encontrados pelo índice de entidades (não as colunas inteiras).
+
+    Args:
+        valores (Dict[str, List[str]]): Valores por "tabela.coluna"
+
+    Returns:
+        str: Trecho com uma linha por coluna, ou "" se não houver valores
+    """
+    if not valores:
+        return ""
+    linhas = [
+        f"- {coluna}: " + ", ".join("'" + valor.replace("'", "''") + "'" for valor in lista)
+        for coluna, lista in valores.items()
+    ]
+    return "Valores existentes no banco que correspondem à pergunta (use-os exatamente como escritos):\n" + "\n".join(linhas) + "\n\n"
+
+
+TEMPLATE_PLANEJAR_CONSULTA = TemplatePrompt(
+    id="planejar_consulta",
+    sistema=_compilar_bloco("""
+        Você é um especialista em SQL para PostgreSQL. Sua tarefa é decidir se uma pergunta em linguagem natural
+        contém várias perguntas independentes que devem ser respondidas por consultas SQL separadas.
+
+        O banco de dados possui o seguinte esquema:
+        """) + "\n" + ESQUEMA_BD.strip() + "\n\n" + _compilar_bloco("""
+        Diretrizes importantes:
+        1. Divida a pergunta apenas quando as partes puderem ser respondidas de forma independente
+        2. Cada subpergunta deve ser completa e compreensível sem as demais (substitua "cada um", "deles" etc. pelo termo a que se referem)
+        3. Se a pergunta puder ser respondida por uma única consulta simples, retorne apenas a pergunta original
+        4. Nunca retorne mais do que {max_subconsultas} subperguntas
+        5. Informe em "chave_juncao" a coluna que todas as subperguntas retornam e pela qual os resultados devem ser combinados (ex.: "categoria"), ou null para apresentá-los separadamente
+
+        Responda apenas com um JSON no seguinte formato:
+        {{"subconsultas": ["Primeira subpergunta", "Segunda subpergunta"], "chave_juncao": null}}
+        """).format(max_subconsultas=SUBCONSULTAS_MAX),
+    modelo_usuario="Divida a seguinte pergunta em subperguntas independentes: '{consulta}'"
+)
+
+TEMPLATE_EXPLICAR_RESULTADOS = TemplatePrompt(
+    id="explicar_resultados",
+    sistema=_compilar_bloco("""
+        Você é um especialista em análise de dados e SQL. Sua tarefa é explicar os resultados de uma consulta SQL
+        de forma clara e concisa. Forneça insights sobre os dados e explique o que os resultados significam no contexto
+        da pergunta original. Seja objetivo e direto.
+        """),
+    modelo_usuario=_compilar_bloco("""
+        Consulta SQL: {sql}
+
+        Resultados (em formato JSON):
+        {resultados}
+
+        Por favor, explique estes resultados de forma clara e concisa.
+        """)
+)
+
+# Registro dos templates por ID, usado para reidratar o histórico de mensagens
+TEMPLATES: Dict[str, TemplatePrompt] = {
+    TEMPLATE_GERAR_SQL.id: TEMPLATE_GERAR_SQL,
+    TEMPLATE_REFINAR_SQL.id: TEMPLATE_REFINAR_SQL,
+    TEMPLATE_PLANEJAR_CONSULTA.id: TEMPLATE_PLANEJAR_CONSULTA,
+    TEMPLATE_EXPLICAR_RESULTADOS.id: TEMPLATE_EXPLICAR_RESULTADOS
+}
+
+
+def _tokens_cache_provedor(resposta) -> Any:
+    """
+    Extrai do metadado da resposta os tokens de prompt informados pelo provedor.
+
+    Returns:
+        Tuple[int, int] | None: Tokens de prompt e tokens em cache, ou None se
+        o provedor não informou o uso
+    """
+    metadados = getattr(resposta, "response_metadata", None) or {}
+    uso = metadados.get("token_usage") or {}
+    if "prompt_tokens" not in uso:
+        return None
+    detalhes = uso.get("prompt_tokens_details") or {}
+    return uso["prompt_tokens"], detalhes.get("cached_tokens", 0) or 0
+
+
+def rmta_registrar_uso_prompt(template: TemplatePrompt, mensagem_usuario: str, resposta=None) -> Dict[str, Any]:
+    """
+    Calcula o uso de tokens de prompt de uma requisição, separando os tokens em cache.
+
+    Quando o provedor informa os tokens em cache na resposta, esse valor é usado.
+    Caso contrário, o cache é estimado localmente seguindo a regra do provedor:
+    o prefixo só é reaproveitado se já foi enviado dentro do TTL, se o prompt
+    tem pelo menos CACHE_PROMPT_MINIMO_TOKENS tokens e em blocos de
+    CACHE_PROMPT_INCREMENTO_TOKENS tokens.
+
+    Args:
+        template (TemplatePrompt): Template utilizado na requisição
+        mensagem_usuario (str): Mensagem do usuário renderizada
+        resposta: Resposta do modelo (opcional), usada para ler o uso informado
+
+    Returns:
+        Dict[str, Any]: Tokens de prompt totais, em cache, sem cache e a fonte do valor
+    """
+    tokens_prompt = template.tokens_prefixo + rmta_contar_tokens(mensagem_usuario)
+    agora = time.time()
+
+    with _trava_prefixos:
+        ultimo_envio = _prefixos_enviados.get(template.hash_prefixo)
+        _prefixos_enviados[template.hash_prefixo] = agora
+
+    informado = _tokens_cache_provedor(resposta) if resposta is not None else None
+    if informado is not None:
+        tokens_prompt, tokens_cache = informado
+        fonte = "provedor"
+    else:
+        tokens_cache = 0
+        prefixo_quente = ultimo_envio is not None and agora - ultimo_envio <= CACHE_PROMPT_TTL
+        if prefixo_quente and tokens_prompt >= CACHE_PROMPT_MINIMO_TOKENS:
+            blocos = template.tokens_prefixo // CACHE_PROMPT_INCREMENTO_TOKENS
+            tokens_cache = min(blocos * CACHE_PROMPT_INCREMENTO_TOKENS, tokens_prompt)
+        fonte = "estimativa"
+
+    uso = {
+        "template": template.id,
+        "hash_prefixo": template.hash_prefixo[:16],
+        "tokens_prompt": tokens_prompt,
+        "tokens_cache": tokens_cache,
+        "tokens_sem_cache": tokens_prompt - tokens_cache,
+        "fonte": fonte
+    }
+    logger.debug("Uso de prompt (%s): %s", template.id, uso)
+    return uso
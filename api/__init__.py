@@ -0,0 +1 @@
+"""Pacote do servidor HTTP do SQL Agent."""
\ No newline at end of file
@@ -0,0 +1,451 @@
+"""
+Servidor HTTP (ASGI) do SQL Agent.
+
+Este módulo expõe o fluxo de processamento de consultas como um serviço HTTP,
+em paralelo à interface Streamlit, para que o agente possa ser executado atrás
+de um balanceador de carga:
+
+- POST /query: processa uma pergunta e retorna o estado final em JSON
+  ("id_sessao" opcional para perguntas de acompanhamento; "aproximado": true
+  responde agregações sobre tabelas grandes por amostragem), ou no codec binário
+  sem perdas (utils.codec_estado) com "Accept: application/x-sql-agent-estado"
+- POST /batch: processa uma lista de perguntas em paralelo
+- GET|POST /query/stream: emite o progresso de cada etapa via Server-Sent Events
+  (aceita "id_sessao" e "aproximado" como /query)
+- GET /metrics: métricas no formato texto do Prometheus
+- GET /health: verificação de saúde
+
+O cabeçalho X-Tenant-Id identifica o inquilino da requisição, usado nas cotas e
+na fila justa do escalonador (agent.escalonador); valores sem entrada em
+ESCALONADOR_COTAS contam como INQUILINO_PADRAO.
+
+O fluxo é síncrono, então cada consulta roda em um pool de threads com tamanho
+configurável. Quando o pool e a fila de espera estão cheios, novas requisições
+recebem 429 imediatamente, em vez de acumular latência. Com SUPERVISOR_PROCESSOS
+acima de zero, as consultas vão para processos de trabalho (api.supervisor), e
+um SIGHUP reinicia esses processos gradualmente.
+
+Execução: python -m api.servidor
+"""
+import asyncio
+import atexit
+import json
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs
+
+from config.configuracoes import (
+    API_HOST,
+    API_PORTA,
+    API_PROCESSOS,
+    API_THREADS,
+    API_TAMANHO_FILA,
+    API_TIMEOUT,
+    API_TAMANHO_MAXIMO_LOTE,
+    API_TAMANHO_MAXIMO_CORPO,
+    SUPERVISOR_PROCESSOS
+)
+from agent.escalonador import rmta_contexto_inquilino
+from agent.fluxo_trabalho import rmta_processar_consulta, rmta_processar_consulta_stream
+from database.indice_entidades import rmta_obter_indice_entidades
+from utils.codec_estado import TIPO_MIME, rmta_codificar_estado
+from utils.config_log import rmta_contexto_requisicao, rmta_submeter_com_contexto
+from utils.metricas import (
+    rmta_incrementar_contador,
+    rmta_definir_medidor,
+    rmta_observar_histograma,
+    rmta_exportar_metricas
+)
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Rotas atendidas; as demais aparecem nas métricas como "desconhecida"
+ROTAS_CONHECIDAS = {"/health", "/metrics", "/query", "/query/stream", "/batch"}
+
+_executor = None
+_supervisor = None
+_trava_ocupacao = threading.Lock()
+_ocupacao = 0
+
+
+class ErroRequisicao(Exception):
+    """Erro de requisição que deve ser devolvido ao cliente com um status HTTP."""
+
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _obter_executor() -> ThreadPoolExecutor:
+    """Retorna o pool de threads que executa o fluxo, criando-o sob demanda."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="sql_agent_api")
+    return _executor
+
+
+def _obter_supervisor():
+    """Retorna o supervisor dos processos de trabalho, iniciando-o sob demanda."""
+    global _supervisor
+    if _supervisor is None:
+        from api.supervisor import Supervisor
+
+        _supervisor = Supervisor(SUPERVISOR_PROCESSOS)
+        _supervisor.iniciar()
+        atexit.register(_supervisor.encerrar)
+    return _supervisor
+
+
+def _reiniciar_supervisor(*_):
+    """Reinicia gradualmente os processos de trabalho (SIGHUP), sem bloquear o servidor."""
+    if _supervisor is not None:
+        threading.Thread(target=_supervisor.reiniciar, name="sql_agent_reinicio", daemon=True).start()
+
+
+def _reservar_vagas(quantidade: int) -> bool:
+    """
+    Reserva vagas no pool (em execução + fila) para novas consultas.
+
+    Args:
+        quantidade (int): Número de consultas a admitir
+
+    Returns:
+        bool: True se houve capacidade, False se a requisição deve receber 429
+    """
+    global _ocupacao
+    with _trava_ocupacao:
+        if _ocupacao + quantidade > API_THREADS + API_TAMANHO_FILA:
+            return False
+        _ocupacao += quantidade
+        rmta_definir_medidor("sql_agent_api_ocupacao", _ocupacao)
+        return True
+
+
+def _liberar_vaga(*_):
+    """Libera uma vaga do pool quando a consulta termina (mesmo após timeout)."""
+    global _ocupacao
+    with _trava_ocupacao:
+        _ocupacao -= 1
+        rmta_definir_medidor("sql_agent_api_ocupacao", _ocupacao)
+
+
+def _converter_json(valor):
+    """Converte tipos retornados pelo psycopg2 em valores serializáveis em JSON."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def rmta_serializar_json(dados) -> bytes:
+    """
+    Serializa dados em JSON, tratando Decimal e datas vindos do banco.
+
+    Args:
+        dados: Objeto a serializar
+
+    Returns:
+        bytes: JSON codificado em UTF-8
+    """
+    return json.dumps(dados, default=_converter_json, ensure_ascii=False).encode("utf-8")
+
+
+def _submeter(funcao, *args) -> asyncio.Future:
+    """Submete uma função ao pool, liberando a vaga reservada quando ela terminar."""
+    futuro = rmta_submeter_com_contexto(_obter_executor(), funcao, *args)
+    futuro.add_done_callback(_liberar_vaga)
+    return asyncio.wrap_future(futuro)
+
+
+def _submeter_consulta(*args) -> asyncio.Future:
+    """Submete uma consulta ao pool de threads ou, no modo supervisor, aos processos de trabalho."""
+    if SUPERVISOR_PROCESSOS <= 0:
+        return _submeter(rmta_processar_consulta, *args)
+    futuro = _obter_supervisor().submeter(*args)
+    futuro.add_done_callback(_liberar_vaga)
+    return asyncio.wrap_future(futuro)
+
+
+async def _ler_corpo(receive) -> dict:
+    """Lê e decodifica o corpo JSON da requisição."""
+    partes = []
+    tamanho = 0
+    while True:
+        mensagem = await receive()
+        corpo = mensagem.get("body", b"")
+        tamanho += len(corpo)
+        if tamanho > API_TAMANHO_MAXIMO_CORPO:
+            raise ErroRequisicao(413, "Corpo da requisição muito grande.")
+        partes.append(corpo)
+        if not mensagem.get("more_body", False):
+            break
+    if not tamanho:
+        return {}
+    try:
+        dados = json.loads(b"".join(partes))
+    except json.JSONDecodeError:
+        raise ErroRequisicao(400, "Corpo da requisição não é um JSON válido.")
+    if not isinstance(dados, dict):
+        raise ErroRequisicao(400, "O corpo da requisição deve ser um objeto JSON.")
+    return dados
+
+
+def _extrair_pergunta(dados: dict) -> str:
+    """Extrai e valida o campo "pergunta" de uma requisição."""
+    pergunta = dados.get("pergunta")
+    if not isinstance(pergunta, str) or not pergunta.strip():
+        raise ErroRequisicao(400, 'O campo "pergunta" é obrigatório.')
+    return pergunta
+
+
+async def _responder(send, status: int, corpo: bytes, tipo: str = "application/json", cabecalhos=None):
+    """Envia uma resposta HTTP completa."""
+    cabecalhos_resposta = [(b"content-type", tipo.encode()), (b"content-length", str(len(corpo)).encode())]
+    cabecalhos_resposta.extend(cabecalhos or [])
+    await send({"type": "http.response.start", "status": status, "headers": cabecalhos_resposta})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+def _extrair_opcoes(dados: dict):
+    """Extrai e valida os campos opcionais "id_sessao" e "aproximado" de uma requisição."""
+    id_sessao = dados.get("id_sessao")
+    if id_sessao is not None and (not isinstance(id_sessao, str) or not id_sessao.strip()):
+        raise ErroRequisicao(400, 'O campo "id_sessao" deve ser um texto não vazio.')
+    aproximado = dados.get("aproximado", False)
+    if not isinstance(aproximado, bool):
+        raise ErroRequisicao(400, 'O campo "aproximado" deve ser true ou false.')
+    return id_sessao, aproximado
+
+
+async def _rota_query(dados: dict):
+    """Processa uma única pergunta."""
+    pergunta = _extrair_pergunta(dados)
+    id_sessao, aproximado = _extrair_opcoes(dados)
+    if not _reservar_vagas(1):
+        raise ErroRequisicao(429, "Servidor ocupado. Tente novamente em instantes.")
+    try:
+        estado = await asyncio.wait_for(_submeter_consulta(pergunta, id_sessao, aproximado), API_TIMEOUT)
+    except asyncio.TimeoutError:
+        rmta_incrementar_contador("sql_agent_api_timeouts_total", rotulos={"rota": "/query"})
+        raise ErroRequisicao(504, f"Tempo limite de {API_TIMEOUT}s excedido.")
+    return 200, estado
+
+
+async def _rota_batch(dados: dict):
+    """Processa uma lista de perguntas em paralelo, respeitando a capacidade do pool."""
+    perguntas = dados.get("perguntas")
+    if not isinstance(perguntas, list) or not perguntas:
+        raise ErroRequisicao(400, 'O campo "perguntas" deve ser uma lista não vazia.')
+    if len(perguntas) > API_TAMANHO_MAXIMO_LOTE:
+        raise ErroRequisicao(400, f"O lote excede o máximo de {API_TAMANHO_MAXIMO_LOTE} perguntas.")
+    perguntas = [_extrair_pergunta({"pergunta": p}) for p in perguntas]
+
+    if not _reservar_vagas(len(perguntas)):
+        raise ErroRequisicao(429, "Servidor ocupado. Tente novamente em instantes.")
+
+    futuros = [_submeter_consulta(p) for p in perguntas]
+    concluidos, pendentes = await asyncio.wait(futuros, timeout=API_TIMEOUT)
+    if pendentes:
+        rmta_incrementar_contador("sql_agent_api_timeouts_total", len(pendentes), rotulos={"rota": "/batch"})
+
+    resultados = []
+    for pergunta, futuro in zip(perguntas, futuros):
+        if futuro in concluidos:
+            resultados.append(futuro.result())
+        else:
+            resultados.append({"consulta": pergunta, "erro": f"Tempo limite de {API_TIMEOUT}s excedido."})
+    return 200, {"resultados": resultados}
+
+
+async def _rota_stream(dados: dict, send):
+    """
+    Processa uma pergunta emitindo cada etapa concluída como um evento SSE.
+
+    Aceita os mesmos campos de /query. No modo supervisor, os processos de
+    trabalho só devolvem o estado final, então apenas o evento "fim" é emitido.
+    """
+    pergunta = _extrair_pergunta(dados)
+    id_sessao, aproximado = _extrair_opcoes(dados)
+    if not _reservar_vagas(1):
+        raise ErroRequisicao(429, "Servidor ocupado. Tente novamente em instantes.")
+
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue()
+
+    def produzir():
+        try:
+            for etapa, estado in rmta_processar_consulta_stream(pergunta, id_sessao, aproximado):
+                loop.call_soon_threadsafe(fila.put_nowait, (etapa, estado))
+        except Exception as e:
+            logger.error("Erro no streaming da consulta: %s", e)
+            loop.call_soon_threadsafe(fila.put_nowait, ("erro", {"erro": f"Erro ao processar a consulta: {str(e)}"}))
+
+    async def aguardar_supervisor():
+        try:
+            fila.put_nowait(("fim", await _submeter_consulta(pergunta, id_sessao, aproximado)))
+        except Exception as e:
+            logger.error("Erro no streaming da consulta: %s", e)
+            fila.put_nowait(("erro", {"erro": f"Erro ao processar a consulta: {str(e)}"}))
+
+    # Após um timeout, a consulta em andamento termina em segundo plano, como em /query
+    if SUPERVISOR_PROCESSOS > 0:
+        asyncio.ensure_future(aguardar_supervisor())
+    else:
+        _submeter(produzir)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+    })
+
+    limite = loop.time() + API_TIMEOUT
+    while True:
+        restante = limite - loop.time()
+        try:
+            etapa, estado = await asyncio.wait_for(fila.get(), max(restante, 0))
+        except asyncio.TimeoutError:
+            rmta_incrementar_contador("sql_agent_api_timeouts_total", rotulos={"rota": "/query/stream"})
+            evento, dados_evento = "erro", {"erro": f"Tempo limite de {API_TIMEOUT}s excedido."}
+        else:
+            if etapa in ("fim", "erro"):
+                evento, dados_evento = etapa, estado
+            else:
+                evento, dados_evento = "etapa", {
+                    "etapa": etapa,
+                    "sql": estado.get("sql"),
+                    "erro": estado.get("erro"),
+                    "tempo_execucao": estado.get("tempo_execucao")
+                }
+        corpo = b"event: " + evento.encode() + b"\ndata: " + rmta_serializar_json(dados_evento) + b"\n\n"
+        terminou = evento in ("fim", "erro")
+        await send({"type": "http.response.body", "body": corpo, "more_body": not terminou})
+        if terminou:
+            break
+
+
+async def rmta_app(scope, receive, send):
+    """
+    Aplicação ASGI do SQL Agent.
+
+    Args:
+        scope (dict): Escopo ASGI da conexão
+        receive: Canal de recebimento de mensagens ASGI
+        send: Canal de envio de mensagens ASGI
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                # Índice de entidades carregado em segundo plano, antes da primeira pergunta
+                rmta_obter_indice_entidades()
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                if _executor is not None:
+                    _executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    inicio = time.time()
+    metodo = scope["method"]
+    rota = scope["path"]
+    # Caminhos desconhecidos não criam séries novas nas métricas
+    rotulo_rota = rota if rota in ROTAS_CONHECIDAS else "desconhecida"
+    status = 200
+
+    # ID da requisição informado pelo cliente (ou gerado), presente em todos os registros de log
+    cabecalhos_requisicao = dict(scope.get("headers") or [])
+    id_requisicao = cabecalhos_requisicao.get(b"x-request-id", b"").decode("latin-1")[:64] or None
+    # Inquilino das cotas e da fila justa do escalonador (agent.escalonador)
+    inquilino = cabecalhos_requisicao.get(b"x-tenant-id", b"").decode("latin-1").strip()[:64] or None
+
+    # Depois do início da resposta (streaming), um erro só pode encerrar o corpo já aberto
+    resposta = {"iniciada": False, "encerrada": False}
+
+    async def enviar(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["iniciada"] = True
+        elif not mensagem.get("more_body", False):
+            resposta["encerrada"] = True
+        await send(mensagem)
+
+    async def responder_erro(status_erro: int, corpo: bytes, cabecalhos=None):
+        if not resposta["iniciada"]:
+            await _responder(send, status_erro, corpo, cabecalhos=cabecalhos)
+        elif not resposta["encerrada"]:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    with rmta_contexto_requisicao(id_requisicao), rmta_contexto_inquilino(inquilino):
+        try:
+            if rota == "/health" and metodo == "GET":
+                await _responder(send, 200, b'{"status": "ok"}')
+            elif rota == "/metrics" and metodo == "GET":
+                await _responder(send, 200, rmta_exportar_metricas().encode(), "text/plain; version=0.0.4")
+            elif rota == "/query/stream" and metodo in ("GET", "POST"):
+                if metodo == "GET":
+                    parametros = {nome: valores[0] for nome, valores in parse_qs(scope.get("query_string", b"").decode()).items()}
+                    dados = {"pergunta": parametros.get("pergunta", "")}
+                    if "id_sessao" in parametros:
+                        dados["id_sessao"] = parametros["id_sessao"]
+                    if "aproximado" in parametros:
+                        aproximado = parametros["aproximado"].lower()
+                        dados["aproximado"] = {"true": True, "false": False}.get(aproximado, aproximado)
+                else:
+                    dados = await _ler_corpo(receive)
+                await _rota_stream(dados, enviar)
+            elif rota in ("/query", "/batch") and metodo == "POST":
+                dados = await _ler_corpo(receive)
+                manipulador = _rota_query if rota == "/query" else _rota_batch
+                status, resposta = await manipulador(dados)
+                if rota == "/query" and status == 200 and TIPO_MIME in cabecalhos_requisicao.get(b"accept", b"").decode("latin-1"):
+                    # Resultados em Arrow IPC, com Decimal e datas preservados
+                    await _responder(send, status, rmta_codificar_estado(resposta), TIPO_MIME)
+                else:
+                    await _responder(send, status, rmta_serializar_json(resposta))
+            else:
+                status = 404
+                await _responder(send, 404, rmta_serializar_json({"erro": "Rota não encontrada."}))
+        except ErroRequisicao as e:
+            status = e.status
+            cabecalhos = [(b"retry-after", b"1")] if e.status == 429 else None
+            if e.status == 429:
+                rmta_incrementar_contador("sql_agent_api_rejeicoes_total", rotulos={"rota": rotulo_rota})
+            await responder_erro(e.status, rmta_serializar_json({"erro": e.mensagem}), cabecalhos)
+        except Exception as e:
+            status = 500
+            logger.error("Erro interno no servidor HTTP: %s", e)
+            await responder_erro(500, rmta_serializar_json({"erro": "Erro interno do servidor."}))
+        finally:
+            rmta_incrementar_contador("sql_agent_api_requisicoes_total", rotulos={"rota": rotulo_rota, "status": str(status)})
+            rmta_observar_histograma("sql_agent_api_duracao_segundos", time.time() - inicio, rotulos={"rota": rotulo_rota})
+
+
+def rmta_iniciar_servidor():
+    """
+    Inicia o servidor HTTP com o uvicorn.
+
+    O número de processos (API_PROCESSOS) e de threads por processo (API_THREADS)
+    é definido nas configurações. No modo supervisor (SUPERVISOR_PROCESSOS), use um
+    único processo do uvicorn: os processos de trabalho ficam atrás dele.
+    """
+    import uvicorn
+    from utils.config_log import rmta_configurar_logging
+
+    rmta_configurar_logging()
+    if SUPERVISOR_PROCESSOS > 0 and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _reiniciar_supervisor)
+    logger.info("Iniciando servidor HTTP em %s:%s com %s processo(s)", API_HOST, API_PORTA, API_PROCESSOS)
+    uvicorn.run("api.servidor:rmta_app", host=API_HOST, port=API_PORTA, workers=API_PROCESSOS)
+
+
+if __name__ == "__main__":
+    rmta_iniciar_servidor()
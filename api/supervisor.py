@@ -0,0 +1,445 @@
+"""
+Supervisor de processos de trabalho do SQL Agent.
+
+Em um único processo, o fluxo fica limitado pelo GIL na decodificação de JSON,
+na conversão dos resultados e nos resumos, e não usa todos os núcleos. O
+supervisor mantém N processos de trabalho, cada um com sua fila local, e envia
+cada consulta ao processo menos ocupado; perguntas de uma mesma sessão vão
+sempre ao mesmo processo, que guarda o resultado anterior da sessão.
+
+O esquema e o índice de entidades são carregados uma vez pelo supervisor e
+publicados em um instantâneo mapeado em memória, lido por todos os processos.
+Os registros de log dos processos voltam ao supervisor por uma fila e seguem a
+configuração de logging dele, com o ID da requisição original.
+
+Reinícios são graduais: cada processo é substituído por um novo, e o antigo
+conclui a consulta em andamento antes de sair. Processos que morrem são
+substituídos, e apenas as consultas que executavam neles falham.
+
+Execução: SUPERVISOR_PROCESSOS=4 python -m api.servidor
+"""
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from agent.escalonador import rmta_contexto_inquilino, rmta_obter_inquilino
+from config.configuracoes import (
+    LOG_NIVEL,
+    INDICE_ENTIDADES_TTL,
+    SUPERVISOR_MAX_CONSULTAS_PROCESSO,
+    SUPERVISOR_TIMEOUT_ENCERRAMENTO
+)
+from utils.config_log import FiltroIdRequisicao, rmta_obter_id_requisicao
+from utils.instantaneo import rmta_publicar_instantaneo
+from utils.metricas import rmta_incrementar_contador, rmta_definir_medidor
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+INTERVALO_MONITOR = 0.2  # segundos entre verificações dos processos
+_ESPERA_FILA = 0.2  # segundos que um processo aguarda na fila antes de verificar se deve parar
+
+
+class ErroProcessoTrabalho(Exception):
+    """A consulta falhou no processo de trabalho, ou o processo saiu antes de concluí-la."""
+
+
+class _RepassadorRegistros(logging.Handler):
+    """Entrega ao logger do supervisor os registros recebidos dos processos de trabalho."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def _configurar_logging_processo(fila_logs) -> None:
+    """Envia os registros do processo de trabalho ao supervisor, anotados com o ID da requisição."""
+    logger_processo = logging.getLogger('sql_agent')
+    logger_processo.handlers.clear()
+    logger_processo.setLevel(LOG_NIVEL)
+    handler = logging.handlers.QueueHandler(fila_logs)
+    handler.addFilter(FiltroIdRequisicao())
+    logger_processo.addHandler(handler)
+
+
+def _executar_processo(vaga: int, fila, resultados, fila_logs, parar, caminho_instantaneo: Optional[str],
+                       funcao: Callable, max_consultas: int) -> None:
+    """
+    Laço de um processo de trabalho: consome a fila da vaga até ser sinalizado para parar.
+
+    Cada consulta gera uma mensagem "inicio" e uma "fim" na fila de resultados;
+    o resultado vai serializado com pickle, para que um resultado não
+    serializável vire erro da consulta em vez de travar a fila.
+    """
+    _configurar_logging_processo(fila_logs)
+    from database.indice_entidades import rmta_usar_instantaneo_compartilhado
+    from utils.config_log import rmta_contexto_requisicao
+
+    rmta_usar_instantaneo_compartilhado(caminho_instantaneo)
+    pid = os.getpid()
+    logger.info("Processo de trabalho %s iniciado na vaga %s", pid, vaga)
+
+    atendidas = 0
+    while not parar.is_set():
+        try:
+            id_tarefa, argumentos, id_requisicao, inquilino = fila.get(timeout=_ESPERA_FILA)
+        except queue.Empty:
+            continue
+        resultados.put(("inicio", id_tarefa, pid))
+        with rmta_contexto_requisicao(id_requisicao), rmta_contexto_inquilino(inquilino):
+            try:
+                resultados.put(("fim", id_tarefa, pickle.dumps(funcao(*argumentos)), None))
+            except Exception as e:
+                logger.error("Erro no processo de trabalho %s: %s", pid, e)
+                resultados.put(("fim", id_tarefa, None, f"{type(e).__name__}: {e}"))
+        atendidas += 1
+        if max_consultas and atendidas >= max_consultas:
+            break
+    logger.info("Processo de trabalho %s encerrado após %s consultas", pid, atendidas)
+
+
+def _resolver(futuro: Future, resultado: Any = None, erro: Optional[Exception] = None) -> None:
+    """Conclui o futuro, a menos que o cliente já o tenha cancelado (ex.: timeout)."""
+    try:
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+    except InvalidStateError:
+        pass
+
+
+class Supervisor:
+    """
+    Pool de processos de trabalho com filas locais, reinício gradual e instantâneo compartilhado.
+
+    Attributes:
+        processos (int): Número de processos de trabalho
+        caminho_instantaneo (str): Arquivo do instantâneo do esquema e do índice de entidades
+        reinicios (int): Processos substituídos (por falha, reciclagem ou reinício)
+    """
+
+    def __init__(self, processos: int, funcao: Optional[Callable] = None,
+                 max_consultas_processo: int = SUPERVISOR_MAX_CONSULTAS_PROCESSO,
+                 instantaneo: bool = True):
+        """
+        Args:
+            processos (int): Número de processos de trabalho
+            funcao (Optional[Callable]): Função de nível de módulo executada nos processos,
+                chamada com (pergunta, id_sessao, aproximado); None usa rmta_processar_consulta
+            max_consultas_processo (int): Consultas antes de reciclar o processo (0 = nunca)
+            instantaneo (bool): Se publica o instantâneo do esquema e do índice de entidades
+        """
+        if funcao is None:
+            from agent.fluxo_trabalho import rmta_processar_consulta
+            funcao = rmta_processar_consulta
+
+        self.processos = processos
+        self.reinicios = 0
+        self._funcao = funcao
+        self._max_consultas = max_consultas_processo
+        self._contexto = multiprocessing.get_context("spawn")
+        self._diretorio = tempfile.mkdtemp(prefix="sql_agent_supervisor_")
+        self.caminho_instantaneo = os.path.join(self._diretorio, "instantaneo.json")
+        self._publicar = instantaneo
+        self._publicado_em = 0.0
+
+        self._filas = [self._contexto.Queue() for _ in range(processos)]
+        # SimpleQueue: o aviso de início é escrito antes de a consulta rodar, mesmo que o processo morra nela
+        self._resultados = self._contexto.SimpleQueue()
+        self._fila_logs = self._contexto.Queue()
+        self._trabalhadores: List[Any] = [None] * processos
+        self._eventos_parar: List[Any] = [None] * processos
+        self._antigos: List[Any] = []
+        self._pids_mortos: Set[int] = set()
+        self._reenfileiradas: Set[int] = set()
+
+        self._pendentes: Dict[int, Future] = {}
+        self._tarefas: Dict[int, Tuple[Tuple[Any, ...], Optional[str], str]] = {}
+        self._vaga_tarefa: Dict[int, int] = {}
+        self._pid_tarefa: Dict[int, int] = {}
+        self._ocupacao = [0] * processos
+        self._contador = itertools.count(1)
+        self._trava = threading.Lock()
+        self._trava_reinicio = threading.Lock()
+        self._ativo = False
+        self._parar_monitor = threading.Event()
+        self._ouvinte_logs = None
+        self._coletor = None
+        self._monitor = None
+
+    def __enter__(self) -> "Supervisor":
+        self.iniciar()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.encerrar()
+
+    def iniciar(self) -> None:
+        """Publica o instantâneo e inicia os processos de trabalho e as threads de coleta e monitoramento."""
+        self._publicar_instantaneo()
+        self._ouvinte_logs = logging.handlers.QueueListener(self._fila_logs, _RepassadorRegistros())
+        self._ouvinte_logs.start()
+        with self._trava:
+            for vaga in range(self.processos):
+                self._iniciar_processo(vaga)
+            self._ativo = True
+        self._coletor = threading.Thread(target=self._coletar, name="sql_agent_supervisor_coletor", daemon=True)
+        self._coletor.start()
+        self._monitor = threading.Thread(target=self._monitorar, name="sql_agent_supervisor_monitor", daemon=True)
+        self._monitor.start()
+        rmta_definir_medidor("sql_agent_supervisor_processos", self.processos)
+        logger.info("Supervisor iniciado com %s processo(s) de trabalho", self.processos)
+
+    def _publicar_instantaneo(self) -> None:
+        """Publica (ou atualiza) o instantâneo do esquema e do índice de entidades."""
+        if not self._publicar:
+            return
+        from database.indice_entidades import rmta_exportar_instantaneo
+
+        try:
+            tamanho = rmta_publicar_instantaneo(self.caminho_instantaneo, rmta_exportar_instantaneo())
+            logger.info("Instantâneo do esquema e do índice de entidades publicado (%s bytes)", tamanho)
+        except Exception as e:
+            logger.error("Erro ao publicar o instantâneo compartilhado: %s", e)
+        self._publicado_em = time.time()
+
+    def _iniciar_processo(self, vaga: int) -> None:
+        """Inicia um processo de trabalho na vaga (chamado com a trava adquirida)."""
+        parar = self._contexto.Event()
+        processo = self._contexto.Process(
+            target=_executar_processo,
+            args=(
+                vaga,
+                self._filas[vaga],
+                self._resultados,
+                self._fila_logs,
+                parar,
+                self.caminho_instantaneo if self._publicar else None,
+                self._funcao,
+                self._max_consultas
+            ),
+            name=f"sql_agent_trabalho_{vaga}",
+            daemon=True
+        )
+        processo.start()
+        self._trabalhadores[vaga] = processo
+        self._eventos_parar[vaga] = parar
+
+    def _escolher_vaga(self, id_sessao: Optional[str]) -> int:
+        """Vaga fixa para a sessão ou, sem sessão, a vaga com menos consultas pendentes."""
+        if id_sessao:
+            return zlib.crc32(id_sessao.encode("utf-8")) % self.processos
+        return min(range(self.processos), key=self._ocupacao.__getitem__)
+
+    def submeter(self, pergunta: str, id_sessao: Optional[str] = None, aproximado: bool = False) -> Future:
+        """
+        Envia uma consulta a um processo de trabalho.
+
+        O ID da requisição em andamento acompanha a consulta até o processo.
+
+        Args:
+            pergunta (str): Consulta em linguagem natural
+            id_sessao (Optional[str]): Identificador da sessão de conversa
+            aproximado (bool): Se agregações elegíveis podem ser respondidas por amostragem
+
+        Returns:
+            Future: Futuro com o estado final, ou com ErroProcessoTrabalho
+
+        Raises:
+            ErroProcessoTrabalho: Se o supervisor não estiver ativo
+        """
+        futuro = Future()
+        with self._trava:
+            if not self._ativo:
+                raise ErroProcessoTrabalho("Supervisor não está ativo.")
+            vaga = self._escolher_vaga(id_sessao)
+            id_tarefa = next(self._contador)
+            tarefa = ((pergunta, id_sessao, aproximado), rmta_obter_id_requisicao(), rmta_obter_inquilino())
+            self._pendentes[id_tarefa] = futuro
+            self._tarefas[id_tarefa] = tarefa
+            self._vaga_tarefa[id_tarefa] = vaga
+            self._ocupacao[vaga] += 1
+            fila = self._filas[vaga]
+        fila.put((id_tarefa, *tarefa))
+        return futuro
+
+    def _retirar_tarefa(self, id_tarefa: int) -> Optional[Future]:
+        """Remove a tarefa das pendentes (chamado com a trava adquirida)."""
+        futuro = self._pendentes.pop(id_tarefa, None)
+        self._tarefas.pop(id_tarefa, None)
+        self._reenfileiradas.discard(id_tarefa)
+        self._pid_tarefa.pop(id_tarefa, None)
+        vaga = self._vaga_tarefa.pop(id_tarefa, None)
+        if vaga is not None:
+            self._ocupacao[vaga] -= 1
+        return futuro
+
+    def _coletar(self) -> None:
+        """Recebe o início e o fim das consultas e conclui os futuros."""
+        while True:
+            mensagem = self._resultados.get()
+            if mensagem is None:
+                return
+            if mensagem[0] == "inicio":
+                _, id_tarefa, pid = mensagem
+                with self._trava:
+                    futuro = self._pendentes.get(id_tarefa)
+                    # Aviso atrasado de um processo que já morreu: a consulta foi reenfileirada
+                    if futuro is None or pid in self._pids_mortos or futuro.running():
+                        continue
+                    self._pid_tarefa[id_tarefa] = pid
+                    futuro.set_running_or_notify_cancel()
+                continue
+
+            _, id_tarefa, carga, erro = mensagem
+            with self._trava:
+                futuro = self._retirar_tarefa(id_tarefa)
+            if futuro is None:
+                continue
+            if erro is not None:
+                _resolver(futuro, erro=ErroProcessoTrabalho(erro))
+            else:
+                _resolver(futuro, pickle.loads(carga))
+
+    def _tratar_saida(self, processo) -> None:
+        """Falha as consultas que executavam em um processo que saiu com erro (chamado com a trava)."""
+        if processo.exitcode == 0:
+            return
+        logger.warning("Processo de trabalho %s saiu com código %s", processo.pid, processo.exitcode)
+        self._pids_mortos.add(processo.pid)
+        for id_tarefa in [t for t, pid in self._pid_tarefa.items() if pid == processo.pid]:
+            futuro = self._retirar_tarefa(id_tarefa)
+            _resolver(futuro, erro=ErroProcessoTrabalho("O processo de trabalho saiu durante a consulta."))
+
+    def _recriar_fila(self, vaga: int) -> None:
+        """
+        Troca a fila da vaga e reenfileira as consultas que ainda não começaram (chamado com a trava).
+
+        Um processo morto enquanto aguardava na fila pode deixá-la travada, então
+        a vaga passa a usar uma fila nova. Cada consulta é reenfileirada no máximo
+        uma vez, para que uma consulta que derruba o processo não o faça em laço.
+        """
+        self._filas[vaga].cancel_join_thread()
+        self._filas[vaga].close()
+        self._filas[vaga] = self._contexto.Queue()
+        aguardando = [t for t, v in self._vaga_tarefa.items() if v == vaga and t not in self._pid_tarefa]
+        for id_tarefa in aguardando:
+            if id_tarefa in self._reenfileiradas:
+                futuro = self._retirar_tarefa(id_tarefa)
+                _resolver(futuro, erro=ErroProcessoTrabalho("O processo de trabalho saiu durante a consulta."))
+                continue
+            self._reenfileiradas.add(id_tarefa)
+            self._filas[vaga].put((id_tarefa, *self._tarefas[id_tarefa]))
+
+    def _monitorar(self) -> None:
+        """Substitui processos que saíram e atualiza o instantâneo periodicamente."""
+        while not self._parar_monitor.wait(INTERVALO_MONITOR):
+            with self._trava:
+                for processo in [p for p in self._antigos if not p.is_alive()]:
+                    self._tratar_saida(processo)
+                    self._antigos.remove(processo)
+                for vaga, processo in enumerate(self._trabalhadores):
+                    if processo.is_alive() or not self._ativo:
+                        continue
+                    self._tratar_saida(processo)
+                    motivo = "reciclagem" if processo.exitcode == 0 else "falha"
+                    if motivo == "falha":
+                        self._recriar_fila(vaga)
+                    self._iniciar_processo(vaga)
+                    self.reinicios += 1
+                    rmta_incrementar_contador("sql_agent_supervisor_reinicios_total", rotulos={"motivo": motivo})
+                    logger.info("Processo de trabalho da vaga %s substituído (%s)", vaga, motivo)
+            if self._publicar and time.time() - self._publicado_em >= INDICE_ENTIDADES_TTL:
+                self._publicar_instantaneo()
+
+    def reiniciar(self) -> None:
+        """
+        Reinicia os processos de trabalho um a um, sem interromper o atendimento.
+
+        O instantâneo é publicado de novo. Em cada vaga, o novo processo começa
+        a consumir a fila antes de o antigo ser sinalizado; o antigo conclui a
+        consulta em andamento e sai. Se não sair em SUPERVISOR_TIMEOUT_ENCERRAMENTO,
+        é terminado e a consulta dele falha.
+        """
+        with self._trava_reinicio:
+            logger.info("Reinício gradual dos processos de trabalho")
+            self._publicar_instantaneo()
+            for vaga in range(self.processos):
+                with self._trava:
+                    if not self._ativo:
+                        return
+                    antigo, parar = self._trabalhadores[vaga], self._eventos_parar[vaga]
+                    self._iniciar_processo(vaga)
+                    self._antigos.append(antigo)
+                    self.reinicios += 1
+                parar.set()
+                antigo.join(SUPERVISOR_TIMEOUT_ENCERRAMENTO)
+                if antigo.is_alive():
+                    logger.warning("Processo de trabalho %s não saiu a tempo; terminando", antigo.pid)
+                    antigo.terminate()
+                    antigo.join()
+                rmta_incrementar_contador("sql_agent_supervisor_reinicios_total", rotulos={"motivo": "reinicio"})
+
+    def pids(self) -> List[int]:
+        """Retorna os PIDs dos processos de trabalho atuais, por vaga."""
+        with self._trava:
+            return [processo.pid for processo in self._trabalhadores]
+
+    def encerrar(self, timeout: float = SUPERVISOR_TIMEOUT_ENCERRAMENTO) -> None:
+        """
+        Encerra os processos de trabalho após as consultas em andamento.
+
+        Consultas que ainda estavam na fila, ou que não terminaram no prazo,
+        falham com ErroProcessoTrabalho.
+
+        Args:
+            timeout (float): Segundos para os processos concluírem a consulta em andamento
+        """
+        with self._trava:
+            if not self._ativo:
+                return
+            self._ativo = False
+        self._parar_monitor.set()
+        self._monitor.join()
+
+        with self._trava_reinicio:
+            for parar in self._eventos_parar:
+                parar.set()
+            prazo = time.monotonic() + timeout
+            for processo in self._trabalhadores + self._antigos:
+                processo.join(max(0.0, prazo - time.monotonic()))
+                if processo.is_alive():
+                    processo.terminate()
+                    processo.join()
+
+        self._resultados.put(None)
+        self._coletor.join()
+        with self._trava:
+            pendentes = list(self._pendentes.values())
+            self._pendentes.clear()
+            self._tarefas.clear()
+            self._reenfileiradas.clear()
+            self._vaga_tarefa.clear()
+            self._pid_tarefa.clear()
+        for futuro in pendentes:
+            _resolver(futuro, erro=ErroProcessoTrabalho("Supervisor encerrado antes de concluir a consulta."))
+
+        self._ouvinte_logs.stop()
+        for fila in self._filas + [self._fila_logs]:
+            fila.cancel_join_thread()
+            fila.close()
+        self._resultados.close()
+        shutil.rmtree(self._diretorio, ignore_errors=True)
+        rmta_definir_medidor("sql_agent_supervisor_processos", 0)
+        logger.info("Supervisor encerrado (%s pendentes descartadas)", len(pendentes))
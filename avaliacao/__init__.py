@@ -0,0 +1 @@
+"""Pacote de avaliação da geração de SQL do SQL Agent (conjunto de ouro)."""
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Bancos usados pela avaliação: o PostgreSQL local ou um substituto SQLite embutido.
+
+O PostgreSQL (CONFIG_BD, com os dados de exemplo de rmta_configurar_banco_dados)
+é a referência: mesmo dialeto da produção e custo estimado pelo EXPLAIN. O
+substituto SQLite, em memória, recebe o mesmo esquema e os mesmos dados de
+exemplo e permite rodar a avaliação sem servidor (ex.: na integração contínua).
+O SQL é traduzido para o SQLite apenas no necessário para os padrões gerados
+pelo agente (parâmetros nomeados, = ANY(lista), ILIKE e conversões ::tipo);
+funções exclusivas do PostgreSQL falham no substituto, e o SQLite não tem custo
+estimado de plano.
+
+Cada thread da avaliação usa a sua própria conexão.
+"""
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.configuracoes import AVALIACAO_TIMEOUT_CONSULTA
+from database.esquema import SQL_CRIAR_TABELAS, SQL_INSERIR_CLIENTES, SQL_INSERIR_PRODUTOS, SQL_INSERIR_TRANSACOES
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+BANCOS_AVALIACAO = ("postgres", "sqlite")
+
+_PADRAO_ANY = re.compile(r"=\s*ANY\s*\(\s*%\((\w+)\)s\s*\)", re.IGNORECASE)
+_PADRAO_PARAMETRO = re.compile(r"%\((\w+)\)s")
+_PADRAO_CONVERSAO = re.compile(r"::\s*\w+(?:\s*\(\s*\d+\s*(?:,\s*\d+\s*)?\))?")
+_PADRAO_ILIKE = re.compile(r"\bILIKE\b", re.IGNORECASE)
+
+
+def _valor_sqlite(valor: Any) -> Any:
+    """Converte um parâmetro para um tipo aceito pelo sqlite3."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, datetime.date):
+        return valor.isoformat()
+    return valor
+
+
+def rmta_traduzir_para_sqlite(sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Traduz uma consulta do PostgreSQL (estilo psycopg2) para o SQLite.
+
+    Args:
+        sql (str): Consulta com parâmetros %(nome)s
+        parametros (Optional[Dict[str, Any]]): Valores dos parâmetros
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: Consulta com parâmetros :nome e os valores convertidos
+    """
+    parametros = dict(parametros or {})
+    traduzidos: Dict[str, Any] = {}
+
+    def expandir_lista(correspondencia) -> str:
+        nome = correspondencia.group(1)
+        valores = list(parametros.pop(nome, []))
+        nomes = [f"{nome}_{i}" for i in range(len(valores))]
+        traduzidos.update(zip(nomes, valores))
+        return "IN (" + ", ".join(f":{n}" for n in nomes) + ")" if nomes else "IN (NULL)"
+
+    sql = _PADRAO_ANY.sub(expandir_lista, sql)
+    if parametros or traduzidos:
+        # Com parâmetros, o psycopg2 exige % escapado como %%
+        sql = sql.replace("%%", "%")
+    sql = _PADRAO_PARAMETRO.sub(r":\1", sql)
+    sql = _PADRAO_CONVERSAO.sub("", sql)
+    sql = _PADRAO_ILIKE.sub("LIKE", sql)
+    traduzidos.update(parametros)
+    return sql.strip().rstrip(";"), {nome: _valor_sqlite(valor) for nome, valor in traduzidos.items()}
+
+
+class BancoAvaliacao:
+    """Banco em que a avaliação executa o SQL gerado e o de referência."""
+
+    nome = ""
+
+    def __init__(self):
+        self._locais = threading.local()
+        self._conexoes: List[Any] = []
+        self._trava = threading.Lock()
+
+    def _conectar(self):
+        raise NotImplementedError
+
+    def _conexao(self):
+        """Conexão da thread atual, aberta no primeiro uso."""
+        conexao = getattr(self._locais, "conexao", None)
+        if conexao is None:
+            conexao = self._conectar()
+            self._locais.conexao = conexao
+            with self._trava:
+                self._conexoes.append(conexao)
+        return conexao
+
+    def executar(self, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[tuple]]:
+        """Executa a consulta e retorna os nomes das colunas e as linhas."""
+        raise NotImplementedError
+
+    def custo(self, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """Custo total estimado pelo planejador, ou None se o banco não o informa."""
+        return None
+
+    def fechar(self) -> None:
+        """Fecha as conexões abertas pelas threads."""
+        with self._trava:
+            for conexao in self._conexoes:
+                try:
+                    conexao.close()
+                except Exception:
+                    pass
+            self._conexoes.clear()
+
+
+class BancoPostgres(BancoAvaliacao):
+    """PostgreSQL de CONFIG_BD, em conexões somente leitura com tempo limite por consulta."""
+
+    nome = "postgres"
+
+    def _conectar(self):
+        from database.conexao import rmta_abrir_conexao_bd
+
+        conexao = rmta_abrir_conexao_bd()
+        conexao.set_session(readonly=True, autocommit=True)
+        cursor = conexao.cursor()
+        cursor.execute("SET statement_timeout = %s", (int(AVALIACAO_TIMEOUT_CONSULTA * 1000),))
+        cursor.close()
+        return conexao
+
+    def executar(self, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[tuple]]:
+        cursor = self._conexao().cursor()
+        try:
+            cursor.execute(sql, parametros or None)
+            return [descricao[0] for descricao in cursor.description], cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def custo(self, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        cursor = self._conexao().cursor()
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}", parametros or None)
+            plano = cursor.fetchone()[0]
+            return float(plano[0]["Plan"]["Total Cost"])
+        finally:
+            cursor.close()
+
+
+class BancoSqlite(BancoAvaliacao):
+    """Substituto embutido: SQLite em memória com o esquema e os dados de exemplo."""
+
+    nome = "sqlite"
+
+    def _conectar(self):
+        conexao = sqlite3.connect(":memory:", check_same_thread=False)
+        for sql in SQL_CRIAR_TABELAS:
+            conexao.execute(sql.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY"))
+        for sql in (SQL_INSERIR_CLIENTES, SQL_INSERIR_PRODUTOS, SQL_INSERIR_TRANSACOES):
+            conexao.execute(sql)
+        conexao.commit()
+        return conexao
+
+    def executar(self, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[tuple]]:
+        sql, parametros = rmta_traduzir_para_sqlite(sql, parametros)
+        cursor = self._conexao().execute(sql, parametros)
+        try:
+            return [descricao[0] for descricao in cursor.description], cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def rmta_criar_banco_avaliacao(nome: str) -> BancoAvaliacao:
+    """
+    Cria o banco da avaliação pelo nome.
+
+    Args:
+        nome (str): "postgres" ou "sqlite"
+
+    Returns:
+        BancoAvaliacao: Banco pronto para uso (as conexões abrem sob demanda)
+
+    Raises:
+        ValueError: Se o nome não for um dos BANCOS_AVALIACAO
+    """
+    if nome == "postgres":
+        return BancoPostgres()
+    if nome == "sqlite":
+        return BancoSqlite()
+    raise ValueError(f"Banco de avaliação desconhecido: {nome} (use {' ou '.join(BANCOS_AVALIACAO)})")
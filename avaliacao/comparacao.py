@@ -0,0 +1,123 @@
+"""
+Comparação de conjuntos de resultados, sem depender da ordem das linhas.
+
+O SQL gerado e o de referência raramente coincidem no texto: apelidos, ordem
+das colunas e ordem das linhas variam, e o PostgreSQL e o substituto SQLite
+devolvem tipos diferentes (Decimal x float, datetime x texto). A comparação
+normaliza cada coluna (números arredondados, datas em texto ISO), associa cada
+coluna esperada a uma coluna obtida com os mesmos valores e compara as linhas
+como multiconjuntos de hashes, tudo com operações vetorizadas do pandas.
+"""
+import logging
+from typing import List, NamedTuple, Optional
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+
+class ComparacaoResultados(NamedTuple):
+    """Resultado da comparação entre o resultado obtido e o esperado."""
+    igual: bool
+    motivo: Optional[str]
+    linhas_faltando: int
+    linhas_sobrando: int
+
+
+def _normalizar_coluna(serie, casas_decimais: int):
+    """Converte uma coluna em uma forma comparável entre bancos: float arredondado ou texto."""
+    import pandas as pd
+
+    nao_nulos = serie.notna()
+    if pd.api.types.is_bool_dtype(serie):
+        return serie.astype(float)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime("%Y-%m-%d %H:%M:%S").where(nao_nulos, None)
+    numerica = pd.to_numeric(serie, errors="coerce")
+    if nao_nulos.any() and numerica[nao_nulos].notna().all():
+        return numerica.astype(float).round(casas_decimais)
+    texto = serie.astype(str).str.strip()
+    return texto.where(nao_nulos, None)
+
+
+def _normalizar(linhas: List[tuple], colunas: List[str], casas_decimais: int):
+    """Monta um DataFrame com colunas posicionais (0..n-1) já normalizadas."""
+    import pandas as pd
+
+    df = pd.DataFrame.from_records([tuple(linha) for linha in linhas], columns=range(len(colunas)))
+    return pd.DataFrame({i: _normalizar_coluna(df[i], casas_decimais) for i in df.columns})
+
+
+def _assinatura(serie) -> bytes:
+    """Hash dos valores da coluna, independente da ordem das linhas."""
+    import numpy as np
+    import pandas as pd
+
+    return np.sort(pd.util.hash_pandas_object(serie, index=False).to_numpy()).tobytes()
+
+
+def rmta_comparar_resultados(
+    colunas_obtidas: List[str],
+    linhas_obtidas: List[tuple],
+    colunas_esperadas: List[str],
+    linhas_esperadas: List[tuple],
+    ordenado: bool = False,
+    permitir_colunas_extras: bool = True,
+    casas_decimais: int = 2
+) -> ComparacaoResultados:
+    """
+    Compara dois resultados de consulta como multiconjuntos de linhas.
+
+    Os nomes das colunas são ignorados: cada coluna esperada é associada a uma
+    coluna obtida com os mesmos valores (preferindo o mesmo nome e a mesma
+    posição), de modo que apelidos e a ordem do SELECT não importam.
+
+    Args:
+        colunas_obtidas (List[str]): Colunas do resultado do SQL gerado
+        linhas_obtidas (List[tuple]): Linhas do resultado do SQL gerado
+        colunas_esperadas (List[str]): Colunas do resultado do SQL de referência
+        linhas_esperadas (List[tuple]): Linhas do resultado do SQL de referência
+        ordenado (bool): Se a ordem das linhas também deve coincidir (ex.: rankings)
+        permitir_colunas_extras (bool): Se o resultado obtido pode ter colunas além das esperadas
+        casas_decimais (int): Casas decimais consideradas na comparação de números
+
+    Returns:
+        ComparacaoResultados: Se os resultados são iguais, o motivo da diferença e
+        as linhas faltando e sobrando
+    """
+    import pandas as pd
+
+    if len(colunas_obtidas) < len(colunas_esperadas):
+        return ComparacaoResultados(
+            False, f"{len(colunas_obtidas)} coluna(s) obtida(s) para {len(colunas_esperadas)} esperada(s)", 0, 0
+        )
+    if not permitir_colunas_extras and len(colunas_obtidas) != len(colunas_esperadas):
+        return ComparacaoResultados(False, "Colunas além das esperadas", 0, 0)
+
+    obtido = _normalizar(linhas_obtidas, colunas_obtidas, casas_decimais)
+    esperado = _normalizar(linhas_esperadas, colunas_esperadas, casas_decimais)
+
+    # Associar cada coluna esperada a uma coluna obtida com o mesmo multiconjunto de valores;
+    # sem nenhuma, a de mesmo nome ou posição, para que a diferença apareça nas linhas
+    assinaturas = {i: _assinatura(obtido[i]) for i in obtido.columns}
+    nomes_obtidos = [str(nome).lower() for nome in colunas_obtidas]
+    associadas: List[int] = []
+    for j, nome in enumerate(colunas_esperadas):
+        alvo = _assinatura(esperado[j])
+        livres = [i for i in obtido.columns if i not in associadas]
+        candidatas = [i for i in livres if assinaturas[i] == alvo] or livres
+        candidatas.sort(key=lambda i: (nomes_obtidos[i] != str(nome).lower(), i != j))
+        associadas.append(candidatas[0])
+
+    hashes_obtidos = pd.util.hash_pandas_object(obtido[associadas].set_axis(range(len(associadas)), axis=1), index=False)
+    hashes_esperados = pd.util.hash_pandas_object(esperado, index=False)
+    if ordenado:
+        if len(hashes_obtidos) == len(hashes_esperados) and (hashes_obtidos.to_numpy() == hashes_esperados.to_numpy()).all():
+            return ComparacaoResultados(True, None, 0, 0)
+    diferenca = hashes_esperados.value_counts().subtract(hashes_obtidos.value_counts(), fill_value=0)
+    faltando = int(diferenca[diferenca > 0].sum())
+    sobrando = int(-diferenca[diferenca < 0].sum())
+    if faltando or sobrando:
+        return ComparacaoResultados(False, f"{faltando} linha(s) faltando e {sobrando} sobrando", faltando, sobrando)
+    if ordenado:
+        return ComparacaoResultados(False, "Mesmas linhas em outra ordem", 0, 0)
+    return ComparacaoResultados(True, None, 0, 0)
@@ -0,0 +1,336 @@
+"""
+Avaliação da geração de SQL contra o conjunto de ouro.
+
+Para cada caso do conjunto versionado (avaliacao/conjunto_ouro.json), gera o SQL
+da pergunta com rmta_gerar_sql, executa o SQL gerado e o de referência no banco
+escolhido (PostgreSQL local ou o substituto SQLite), compara os resultados sem
+depender da ordem das linhas e compara o custo estimado dos planos e o tempo de
+execução. Os casos rodam em paralelo, cada thread com a sua conexão.
+
+O relatório pode ser salvo e usado como linha de base da próxima execução: a
+avaliação falha se a acurácia cair ou o p95 da latência subir além dos limiares
+configurados, o que permite usá-la como verificação de regressão.
+
+Uso:
+    python -m avaliacao.executor [--banco sqlite] [--nivel regras] [--linha-base base.json] [--salvar relatorio.json]
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from agent.fluxo_trabalho import rmta_criar_estado_inicial
+from agent.nos import rmta_gerar_sql
+from avaliacao.bancos import BANCOS_AVALIACAO, BancoAvaliacao, rmta_criar_banco_avaliacao
+from avaliacao.comparacao import rmta_comparar_resultados
+from config.configuracoes import (
+    AVALIACAO_ACURACIA_MINIMA,
+    AVALIACAO_BANCO,
+    AVALIACAO_CONJUNTO,
+    AVALIACAO_FATOR_CUSTO,
+    AVALIACAO_LIMIAR_ACURACIA,
+    AVALIACAO_LIMIAR_P95,
+    AVALIACAO_REPETICOES,
+    AVALIACAO_THREADS
+)
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Aumentos do p95 abaixo disso são ruído de medição, mesmo que relativamente grandes
+_TOLERANCIA_P95 = 0.05  # segundos
+
+
+class CasoAvaliacao(NamedTuple):
+    """Pergunta do conjunto de ouro com o SQL de referência e o orçamento de latência."""
+    id: str
+    pergunta: str
+    sql_referencia: str
+    orcamento_latencia: float
+    ordenado: bool = False
+
+
+def rmta_carregar_conjunto(caminho: str = AVALIACAO_CONJUNTO) -> Tuple[int, List[CasoAvaliacao]]:
+    """
+    Carrega o conjunto de ouro.
+
+    Args:
+        caminho (str): Arquivo JSON com a versão e os casos
+
+    Returns:
+        Tuple[int, List[CasoAvaliacao]]: Versão do conjunto e os casos
+    """
+    with open(caminho, encoding="utf-8") as arquivo:
+        conjunto = json.load(arquivo)
+    casos = [
+        CasoAvaliacao(
+            id=caso["id"],
+            pergunta=caso["pergunta"],
+            sql_referencia=caso["sql_referencia"],
+            orcamento_latencia=float(caso["orcamento_latencia"]),
+            ordenado=bool(caso.get("ordenado", False))
+        )
+        for caso in conjunto["casos"]
+    ]
+    return conjunto["versao"], casos
+
+
+def _medir(banco: BancoAvaliacao, sql: str, parametros: Dict[str, Any], repeticoes: int):
+    """Executa a consulta repetidas vezes e retorna as colunas, as linhas e a mediana do tempo."""
+    tempos = []
+    for _ in range(max(1, repeticoes)):
+        inicio = time.perf_counter()
+        colunas, linhas = banco.executar(sql, parametros)
+        tempos.append(time.perf_counter() - inicio)
+    return colunas, linhas, statistics.median(tempos)
+
+
+def _custo(banco: BancoAvaliacao, sql: str, parametros: Dict[str, Any]) -> Optional[float]:
+    """Custo estimado do plano, ou None se indisponível."""
+    try:
+        return banco.custo(sql, parametros)
+    except Exception as e:
+        logger.warning("Erro ao obter o custo do plano: %s", e)
+        return None
+
+
+def rmta_avaliar_caso(
+    caso: CasoAvaliacao,
+    banco: BancoAvaliacao,
+    nivel: Optional[str] = None,
+    repeticoes: int = AVALIACAO_REPETICOES
+) -> Dict[str, Any]:
+    """
+    Avalia um caso: gera o SQL, executa-o ao lado do de referência e compara.
+
+    Args:
+        caso (CasoAvaliacao): Caso do conjunto de ouro
+        banco (BancoAvaliacao): Banco em que as consultas são executadas
+        nivel (Optional[str]): Nível do roteador em que a geração começa (None = primeiro nível)
+        repeticoes (int): Execuções de cada consulta; vale a mediana do tempo
+
+    Returns:
+        Dict[str, Any]: Resultado do caso (SQL, acerto, motivo, tempos, custos e orçamento)
+    """
+    resultado: Dict[str, Any] = {
+        "id": caso.id,
+        "sql": None,
+        "nivel": None,
+        "correto": False,
+        "motivo": None,
+        "tempo_geracao": None,
+        "tempo_execucao": None,
+        "tempo_referencia": None,
+        "latencia": None,
+        "dentro_orcamento": False,
+        "custo": None,
+        "custo_referencia": None,
+        "razao_custo": None
+    }
+
+    estado = rmta_criar_estado_inicial(caso.pergunta)
+    if nivel:
+        estado["nivel_modelo"] = nivel
+    inicio = time.perf_counter()
+    estado = rmta_gerar_sql(estado)
+    resultado["tempo_geracao"] = time.perf_counter() - inicio
+    resultado["nivel"] = estado.get("nivel_modelo")
+    if estado.get("erro") or not estado.get("sql"):
+        resultado["motivo"] = estado.get("erro") or "Nenhum SQL gerado"
+        return resultado
+    sql, parametros = estado["sql"], estado.get("parametros_sql") or {}
+    resultado["sql"] = sql
+
+    try:
+        colunas_esperadas, linhas_esperadas, resultado["tempo_referencia"] = _medir(banco, caso.sql_referencia, {}, repeticoes)
+    except Exception as e:
+        resultado["motivo"] = f"Erro no SQL de referência: {e}"
+        return resultado
+    try:
+        colunas, linhas, resultado["tempo_execucao"] = _medir(banco, sql, parametros, repeticoes)
+    except Exception as e:
+        resultado["motivo"] = f"Erro ao executar o SQL gerado: {e}"
+        return resultado
+
+    comparacao = rmta_comparar_resultados(colunas, linhas, colunas_esperadas, linhas_esperadas, ordenado=caso.ordenado)
+    resultado["correto"] = comparacao.igual
+    resultado["motivo"] = comparacao.motivo
+    resultado["latencia"] = resultado["tempo_geracao"] + resultado["tempo_execucao"]
+    resultado["dentro_orcamento"] = resultado["latencia"] <= caso.orcamento_latencia
+
+    resultado["custo"] = _custo(banco, sql, parametros)
+    resultado["custo_referencia"] = _custo(banco, caso.sql_referencia, {})
+    if resultado["custo"] is not None and resultado["custo_referencia"]:
+        resultado["razao_custo"] = resultado["custo"] / resultado["custo_referencia"]
+    return resultado
+
+
+def rmta_resumir(resultados: List[Dict[str, Any]], fator_custo: float = AVALIACAO_FATOR_CUSTO) -> Dict[str, Any]:
+    """
+    Resume os resultados dos casos: acurácia, percentis da latência, orçamentos e custos.
+
+    Args:
+        resultados (List[Dict[str, Any]]): Resultados de rmta_avaliar_caso
+        fator_custo (float): Razão de custo gerado/referência a partir da qual o plano é sinalizado
+
+    Returns:
+        Dict[str, Any]: Resumo da avaliação
+    """
+    import numpy as np
+
+    latencias = [r["latencia"] for r in resultados if r["latencia"] is not None]
+    corretos = sum(1 for r in resultados if r["correto"])
+    return {
+        "casos": len(resultados),
+        "corretos": corretos,
+        "acuracia": corretos / len(resultados) if resultados else 0.0,
+        "latencia_p50": float(np.percentile(latencias, 50)) if latencias else None,
+        "latencia_p95": float(np.percentile(latencias, 95)) if latencias else None,
+        "fora_orcamento": [r["id"] for r in resultados if r["latencia"] is not None and not r["dentro_orcamento"]],
+        "custo_acima": [r["id"] for r in resultados if r["razao_custo"] is not None and r["razao_custo"] > fator_custo]
+    }
+
+
+def rmta_executar_avaliacao(
+    versao: int,
+    casos: List[CasoAvaliacao],
+    banco: BancoAvaliacao,
+    nivel: Optional[str] = None,
+    threads: int = AVALIACAO_THREADS,
+    repeticoes: int = AVALIACAO_REPETICOES
+) -> Dict[str, Any]:
+    """
+    Avalia os casos em paralelo e monta o relatório.
+
+    Args:
+        versao (int): Versão do conjunto de ouro
+        casos (List[CasoAvaliacao]): Casos a avaliar
+        banco (BancoAvaliacao): Banco em que as consultas são executadas
+        nivel (Optional[str]): Nível do roteador em que a geração começa
+        threads (int): Casos avaliados ao mesmo tempo
+        repeticoes (int): Execuções de cada consulta
+
+    Returns:
+        Dict[str, Any]: Relatório com a versão do conjunto, os resultados por caso e o resumo
+    """
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="avaliacao") as executor:
+        resultados = list(executor.map(lambda caso: rmta_avaliar_caso(caso, banco, nivel, repeticoes), casos))
+    logger.info("Avaliação de %d casos concluída em %.2fs", len(casos), time.perf_counter() - inicio)
+    return {
+        "versao": versao,
+        "banco": banco.nome,
+        "nivel": nivel,
+        "resultados": resultados,
+        "resumo": rmta_resumir(resultados)
+    }
+
+
+def rmta_verificar_regressao(
+    relatorio: Dict[str, Any],
+    linha_base: Optional[Dict[str, Any]] = None,
+    limiar_acuracia: float = AVALIACAO_LIMIAR_ACURACIA,
+    limiar_p95: float = AVALIACAO_LIMIAR_P95,
+    acuracia_minima: float = AVALIACAO_ACURACIA_MINIMA
+) -> List[str]:
+    """
+    Compara o relatório com a linha de base e lista as regressões.
+
+    Sem linha de base, só a acurácia mínima é verificada.
+
+    Args:
+        relatorio (Dict[str, Any]): Relatório de rmta_executar_avaliacao
+        linha_base (Optional[Dict[str, Any]]): Relatório salvo de uma execução anterior
+        limiar_acuracia (float): Queda absoluta de acurácia tolerada
+        limiar_p95 (float): Aumento relativo do p95 da latência tolerado
+        acuracia_minima (float): Acurácia mínima quando não há linha de base
+
+    Returns:
+        List[str]: Regressões encontradas (vazia se a avaliação passou)
+    """
+    resumo = relatorio["resumo"]
+    if linha_base is None:
+        if resumo["acuracia"] < acuracia_minima:
+            return [f"Acurácia {resumo['acuracia']:.1%} abaixo do mínimo de {acuracia_minima:.1%}"]
+        return []
+
+    if linha_base.get("versao") != relatorio.get("versao"):
+        logger.warning(
+            "Linha de base da versão %s do conjunto de ouro comparada com a versão %s",
+            linha_base.get("versao"), relatorio.get("versao")
+        )
+
+    regressoes = []
+    base = linha_base["resumo"]
+    if base["acuracia"] - resumo["acuracia"] > limiar_acuracia:
+        corretos_antes = {r["id"] for r in linha_base["resultados"] if r["correto"]}
+        errados_agora = [r["id"] for r in relatorio["resultados"] if not r["correto"] and r["id"] in corretos_antes]
+        regressoes.append(
+            f"Acurácia caiu de {base['acuracia']:.1%} para {resumo['acuracia']:.1%}"
+            + (f" (passaram a falhar: {', '.join(errados_agora)})" if errados_agora else "")
+        )
+    p95_base, p95 = base.get("latencia_p95"), resumo.get("latencia_p95")
+    if p95_base and p95 is not None and p95 - p95_base > max(limiar_p95 * p95_base, _TOLERANCIA_P95):
+        regressoes.append(f"p95 da latência subiu de {p95_base:.3f}s para {p95:.3f}s ({p95 / p95_base - 1:+.0%})")
+    return regressoes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Avalia a geração de SQL contra o conjunto de ouro.")
+    parser.add_argument("--conjunto", default=AVALIACAO_CONJUNTO)
+    parser.add_argument("--banco", default=AVALIACAO_BANCO, choices=BANCOS_AVALIACAO)
+    parser.add_argument("--nivel", default=None, help="nível do roteador em que a geração começa")
+    parser.add_argument("--threads", type=int, default=AVALIACAO_THREADS)
+    parser.add_argument("--repeticoes", type=int, default=AVALIACAO_REPETICOES)
+    parser.add_argument("--linha-base", default=None, help="relatório salvo de uma execução anterior")
+    parser.add_argument("--salvar", default=None, help="arquivo em que o relatório é salvo")
+    argumentos = parser.parse_args()
+
+    versao, casos = rmta_carregar_conjunto(argumentos.conjunto)
+    banco = rmta_criar_banco_avaliacao(argumentos.banco)
+    try:
+        relatorio = rmta_executar_avaliacao(versao, casos, banco, argumentos.nivel, argumentos.threads, argumentos.repeticoes)
+    finally:
+        banco.fechar()
+
+    print(f"{'caso':<26}{'nível':<10}{'ok':<5}{'geração':>10}{'execução':>10}{'referência':>12}{'custo':>8}  motivo")
+    for r in relatorio["resultados"]:
+        tempos = [
+            f"{r[chave] * 1000:.1f}ms" if r[chave] is not None else "-"
+            for chave in ("tempo_geracao", "tempo_execucao", "tempo_referencia")
+        ]
+        custo = f"{r['razao_custo']:.2f}x" if r["razao_custo"] is not None else "-"
+        motivo = (r["motivo"] or "").splitlines()[0] if r["motivo"] else ""
+        print(
+            f"{r['id']:<26}{r['nivel'] or '-':<10}{'sim' if r['correto'] else 'não':<5}"
+            f"{tempos[0]:>10}{tempos[1]:>10}{tempos[2]:>12}{custo:>8}  {motivo}"
+        )
+    resumo = relatorio["resumo"]
+    print(f"\nConjunto v{versao} no banco {relatorio['banco']}: acurácia {resumo['acuracia']:.1%} ({resumo['corretos']}/{resumo['casos']})")
+    if resumo["latencia_p95"] is not None:
+        print(f"Latência p50 {resumo['latencia_p50'] * 1000:.1f}ms, p95 {resumo['latencia_p95'] * 1000:.1f}ms")
+    if resumo["fora_orcamento"]:
+        print(f"Acima do orçamento de latência: {', '.join(resumo['fora_orcamento'])}")
+    if resumo["custo_acima"]:
+        print(f"Plano mais de {AVALIACAO_FATOR_CUSTO:g}x mais caro que o de referência: {', '.join(resumo['custo_acima'])}")
+
+    if argumentos.salvar:
+        with open(argumentos.salvar, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    linha_base = None
+    if argumentos.linha_base:
+        with open(argumentos.linha_base, encoding="utf-8") as arquivo:
+            linha_base = json.load(arquivo)
+    regressoes = rmta_verificar_regressao(relatorio, linha_base)
+    for regressao in regressoes:
+        print(f"REGRESSÃO: {regressao}")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
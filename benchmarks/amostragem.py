@@ -0,0 +1,172 @@
+"""
+Benchmark do modo aproximado (TABLESAMPLE) contra as consultas exatas.
+
+Cria um esquema temporário com os clientes e produtos de exemplo e uma tabela
+transacoes sintética com o número de linhas pedido, executa cada consulta de
+agregação de forma exata e na amostra escolhida por database.amostragem, e
+compara o tempo, o erro relativo das estimativas e a cobertura dos intervalos
+de confiança (fração dos valores exatos dentro do intervalo). O esquema é
+removido ao final.
+
+Requer um PostgreSQL acessível com as configurações de CONFIG_BD.
+
+Uso:
+    python -m benchmarks.amostragem [linhas] [SYSTEM|BERNOULLI]
+"""
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from database.amostragem import (
+    PlanoAmostragem,
+    rmta_ajustar_estimativas,
+    rmta_analisar_agregacao,
+    rmta_escolher_percentual,
+    rmta_reescrever_com_amostra
+)
+from database.conexao import rmta_abrir_conexao_bd
+from database.esquema import SQL_CRIAR_TABELAS, SQL_INSERIR_CLIENTES, SQL_INSERIR_PRODUTOS
+
+ESQUEMA_BENCHMARK = "sql_agent_benchmark_amostragem"
+REPETICOES = 3
+
+CONSULTAS = [
+    "SELECT COUNT(*) FROM transacoes",
+    "SELECT SUM(valor_total) AS total FROM transacoes WHERE quantidade > 1",
+    "SELECT c.nome, SUM(t.valor_total) AS total FROM transacoes t JOIN clientes c ON c.id = t.cliente_id GROUP BY c.nome",
+    "SELECT p.categoria, AVG(t.valor_total) AS media, COUNT(*) AS vendas "
+    "FROM transacoes t JOIN produtos p ON p.id = t.produto_id GROUP BY p.categoria"
+]
+
+_SQL_GERAR_TRANSACOES = """
+WITH total AS (
+    SELECT (SELECT COUNT(*) FROM clientes) AS clientes, (SELECT COUNT(*) FROM produtos) AS produtos
+), gerada AS (
+    SELECT g,
+           1 + floor(random() * total.clientes)::int AS cliente_id,
+           1 + floor(random() * total.produtos)::int AS produto_id,
+           1 + floor(random() * 5)::int AS quantidade
+    FROM generate_series(1, %(linhas)s) AS g, total
+)
+INSERT INTO transacoes (cliente_id, produto_id, data_compra, quantidade, valor_total)
+SELECT gerada.cliente_id, gerada.produto_id, TIMESTAMP '2024-01-01' + (gerada.g %% 365) * INTERVAL '1 day',
+       gerada.quantidade, p.preco * gerada.quantidade
+FROM gerada JOIN produtos p ON p.id = gerada.produto_id
+"""
+
+
+def rmta_preparar_dados(conexao, linhas: int) -> None:
+    """Cria o esquema do benchmark com a tabela transacoes sintética."""
+    cursor = conexao.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA_BENCHMARK} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {ESQUEMA_BENCHMARK}")
+    cursor.execute(f"SET search_path TO {ESQUEMA_BENCHMARK}")
+    for sql in SQL_CRIAR_TABELAS:
+        cursor.execute(sql)
+    cursor.execute(SQL_INSERIR_CLIENTES)
+    cursor.execute(SQL_INSERIR_PRODUTOS)
+    cursor.execute("SELECT setseed(0.42)")
+    cursor.execute(_SQL_GERAR_TRANSACOES, {"linhas": linhas})
+    conexao.commit()
+    cursor.execute("ANALYZE")
+    cursor.close()
+
+
+def _executar(conexao, sql: str) -> Tuple[List[Dict[str, Any]], float]:
+    """Executa a consulta REPETICOES vezes; retorna os registros e a mediana do tempo."""
+    tempos = []
+    for _ in range(REPETICOES):
+        cursor = conexao.cursor()
+        inicio = time.perf_counter()
+        cursor.execute(sql)
+        linhas = cursor.fetchall()
+        tempos.append(time.perf_counter() - inicio)
+        colunas = [descricao[0] for descricao in cursor.description]
+        cursor.close()
+    return [dict(zip(colunas, linha)) for linha in linhas], statistics.median(tempos)
+
+
+def rmta_comparar(conexao, sql: str, metodo: str) -> Dict[str, Any]:
+    """
+    Compara a execução exata e a aproximada de uma consulta.
+
+    Returns:
+        Dict[str, Any]: Tempos, percentual amostrado, maior erro relativo e cobertura dos intervalos
+    """
+    analise, motivo = rmta_analisar_agregacao(sql)
+    if analise is None:
+        return {"sql": sql, "motivo": motivo}
+    cursor = conexao.cursor()
+    cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (analise.tabela,))
+    linhas_tabela = float(cursor.fetchone()[0])
+    cursor.close()
+    percentual = rmta_escolher_percentual(linhas_tabela)
+    if percentual is None:
+        return {"sql": sql, "motivo": "tabela pequena demais para amostrar"}
+
+    plano = PlanoAmostragem(
+        rmta_reescrever_com_amostra(analise, percentual, metodo), analise.tabela, metodo,
+        percentual, linhas_tabela, analise.agregados
+    )
+    exatos, tempo_exato = _executar(conexao, sql)
+    amostrados, tempo_aproximado = _executar(conexao, plano.sql)
+    estimativas, intervalos = rmta_ajustar_estimativas(amostrados, plano)
+
+    colunas_agregadas = {agregado.coluna for agregado in analise.agregados}
+    chave = lambda registro: tuple(v for k, v in registro.items() if k not in colunas_agregadas)
+    por_chave = {chave(registro): (registro, intervalo) for registro, intervalo in zip(estimativas, intervalos)}
+
+    erros, dentro, total = [], 0, 0
+    for exato in exatos:
+        estimado, intervalo = por_chave.get(chave(exato), (None, None))
+        for coluna in colunas_agregadas:
+            total += 1
+            if estimado is None or estimado[coluna] is None or not exato[coluna]:
+                continue
+            erros.append(abs(float(estimado[coluna]) - float(exato[coluna])) / abs(float(exato[coluna])))
+            if intervalo.get(coluna) and float(intervalo[coluna][0]) <= float(exato[coluna]) <= float(intervalo[coluna][1]):
+                dentro += 1
+    return {
+        "sql": sql,
+        "percentual": percentual,
+        "tempo_exato": tempo_exato,
+        "tempo_aproximado": tempo_aproximado,
+        "erro_maximo": max(erros) if erros else None,
+        "erro_medio": statistics.mean(erros) if erros else None,
+        "cobertura": dentro / total if total else None,
+        "grupos": (len(estimativas), len(exatos))
+    }
+
+
+def main() -> int:
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    metodo = sys.argv[2].upper() if len(sys.argv) > 2 else "SYSTEM"
+
+    conexao = rmta_abrir_conexao_bd()
+    try:
+        inicio = time.perf_counter()
+        rmta_preparar_dados(conexao, linhas)
+        print(f"{linhas} transações geradas em {time.perf_counter() - inicio:.1f}s; método {metodo}\n")
+        print(f"{'consulta':<48}{'amostra':>9}{'exato':>10}{'aprox.':>10}{'aceler.':>9}{'erro máx.':>11}{'erro méd.':>11}{'cobert.':>9}{'grupos':>9}")
+        for sql in CONSULTAS:
+            r = rmta_comparar(conexao, sql, metodo)
+            if "motivo" in r:
+                print(f"{sql[:46]:<48}inelegível: {r['motivo']}")
+                continue
+            print(
+                f"{sql[:46]:<48}{r['percentual']:>8.3g}%{r['tempo_exato'] * 1000:>8.0f}ms{r['tempo_aproximado'] * 1000:>8.0f}ms"
+                f"{r['tempo_exato'] / r['tempo_aproximado']:>8.1f}x{r['erro_maximo']:>11.2%}{r['erro_medio']:>11.2%}"
+                f"{r['cobertura']:>9.0%}{r['grupos'][0]:>5}/{r['grupos'][1]}"
+            )
+    finally:
+        conexao.rollback()
+        cursor = conexao.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA_BENCHMARK} CASCADE")
+        conexao.commit()
+        conexao.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
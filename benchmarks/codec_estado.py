@@ -0,0 +1,108 @@
+"""
+Benchmark do codec binário do estado contra JSON.
+
+Gera estados com resultados no formato do psycopg2 (inteiros, texto, Decimal,
+datas e timestamps com fuso) e compara tamanho e vazão de codificação e
+decodificação do codec (Arrow IPC + msgpack) com json.dumps(indent=2), usado
+antes na exportação, e com JSON compacto. O JSON precisa de default=str e não
+faz a ida e volta: Decimal e datas voltam como texto, enquanto o codec recria
+cada Decimal e datetime (ou devolve a tabela Arrow, sem materializar).
+
+Uso:
+    python -m benchmarks.codec_estado [linhas ...]
+"""
+import datetime
+import json
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from utils.codec_estado import rmta_codificar_estado, rmta_decodificar_estado
+
+FUSO = datetime.timezone(datetime.timedelta(hours=-3))
+
+
+def rmta_gerar_estado(linhas: int) -> Dict[str, Any]:
+    """Gera um estado com a quantidade de linhas informada nos resultados."""
+    inicio = datetime.datetime(2024, 1, 1, tzinfo=FUSO)
+    return {
+        "consulta": "Quanto cada cliente gastou por categoria?",
+        "sql": "SELECT c.id, c.nome, p.categoria, t.valor_total, t.data_transacao FROM transacoes t ...",
+        "validacao": {"is_valid": True, "message": "Consulta válida"},
+        "resultados": [
+            {
+                "id": i,
+                "nome": f"Cliente {i % 500}",
+                "categoria": ("Eletrônicos", "Móveis", "Livros")[i % 3],
+                "valor_total": (Decimal(i * 37 % 100000) / 100).quantize(Decimal("0.01")),
+                "saldo": Decimal("1500.00") + i,
+                "data_transacao": inicio + datetime.timedelta(minutes=i),
+                "dia": datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365)
+            }
+            for i in range(linhas)
+        ],
+        "explicacao": "Soma das transações por cliente e categoria.",
+        "erro": None,
+        "mensagens": [],
+        "tempo_execucao": {"gerar_sql": 0.5, "executar_sql": 0.02},
+        "uso_tokens": {},
+        "subconsultas": []
+    }
+
+
+def _medir(funcao: Callable[[], Any], repeticoes: int) -> Tuple[float, Any]:
+    """Retorna o melhor tempo de várias repetições e o último resultado."""
+    melhor, resultado = float("inf"), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def rmta_comparar(linhas: int, repeticoes: int = 5) -> List[Dict[str, Any]]:
+    """
+    Mede tamanho e tempos de cada formato para um estado com o número de linhas informado.
+
+    Returns:
+        List[Dict[str, Any]]: "formato", "bytes", "codificar", "decodificar" (segundos) e
+        "sem_perdas" para cada formato (None quando os resultados não são materializados)
+    """
+    estado = rmta_gerar_estado(linhas)
+    formatos = [
+        ("json indent=2", lambda: json.dumps(estado, indent=2, default=str).encode(), lambda dados: json.loads(dados)),
+        ("json compacto", lambda: json.dumps(estado, separators=(",", ":"), default=str).encode(), lambda dados: json.loads(dados)),
+        ("arrow + msgpack", lambda: rmta_codificar_estado(estado), rmta_decodificar_estado),
+        # Resultados mantidos como pyarrow.Table (sem criar objetos Python por valor)
+        ("arrow sem materializar", lambda: rmta_codificar_estado(estado), lambda dados: rmta_decodificar_estado(dados, materializar=False))
+    ]
+    medicoes = []
+    for nome, codificar, decodificar in formatos:
+        tempo_codificar, dados = _medir(codificar, repeticoes)
+        tempo_decodificar, decodificado = _medir(lambda: decodificar(dados), repeticoes)
+        medicoes.append({
+            "formato": nome,
+            "bytes": len(dados),
+            "codificar": tempo_codificar,
+            "decodificar": tempo_decodificar,
+            "sem_perdas": decodificado == estado if nome != "arrow sem materializar" else None
+        })
+    return medicoes
+
+
+def main() -> int:
+    tamanhos = [int(argumento) for argumento in sys.argv[1:]] or [100, 10000, 100000]
+    print(f"{'linhas':>8}  {'formato':<24}{'tamanho':>12}{'codificar':>12}{'decodificar':>13}{'linhas/s (ida)':>16}  sem perdas")
+    for linhas in tamanhos:
+        for medicao in rmta_comparar(linhas):
+            print(
+                f"{linhas:>8}  {medicao['formato']:<24}{medicao['bytes'] / 1024:>10.1f}KB"
+                f"{medicao['codificar'] * 1000:>10.1f}ms{medicao['decodificar'] * 1000:>11.1f}ms"
+                f"{linhas / medicao['codificar']:>16,.0f}  { {True: 'sim', False: 'não', None: '-'}[medicao['sem_perdas']] }"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
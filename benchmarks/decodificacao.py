@@ -0,0 +1,106 @@
+"""
+Benchmark da decodificação das linhas do banco: pandas contra colunas tipadas.
+
+Gera linhas sintéticas no formato do psycopg2 (tuplas com int, Decimal, float,
+texto, date e datetime, com alguns nulos) e um cursor.description com os OIDs
+de cada coluna, em dois formatos: largo (muitas colunas) e alto (muitas linhas).
+Para cada formato, mede em linhas por segundo:
+
+- registros: from_records + to_dict (caminho antigo do nó de execução) contra
+  rmta_registros, que monta os dicionários direto das tuplas
+- DataFrame: from_records + conversão das colunas Decimal (caminho antigo da
+  interface) contra rmta_dataframe_de_registros e rmta_dataframe_tipado (por OID)
+
+Uso:
+    python -m benchmarks.decodificacao [linhas_largo] [linhas_alto]
+"""
+import datetime
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, List, Tuple
+
+import pandas as pd
+
+from database.decodificacao import rmta_dataframe_de_registros, rmta_dataframe_tipado, rmta_registros
+
+REPETICOES = 3
+
+# (OID, gerador de valores) por tipo de coluna; um a cada 20 valores é nulo
+_GERADORES: List[Tuple[int, Callable[[random.Random], Any]]] = [
+    (23, lambda aleatorio: aleatorio.randint(1, 10_000)),
+    (1700, lambda aleatorio: Decimal(aleatorio.randint(100, 999_999)) / 100),
+    (701, lambda aleatorio: aleatorio.random() * 1000),
+    (25, lambda aleatorio: f"item {aleatorio.randint(1, 500)}"),
+    (1082, lambda aleatorio: datetime.date(2024, 1, 1) + datetime.timedelta(days=aleatorio.randint(0, 365))),
+    (1114, lambda aleatorio: datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=aleatorio.randint(0, 10**7)))
+]
+
+
+def rmta_gerar_linhas(num_colunas: int, num_linhas: int) -> Tuple[List[tuple], List[tuple]]:
+    """Gera o cursor.description (nome, OID) e as linhas sintéticas."""
+    aleatorio = random.Random(42)
+    tipos = [_GERADORES[i % len(_GERADORES)] for i in range(num_colunas)]
+    descricao = [(f"coluna_{i}", oid) for i, (oid, _) in enumerate(tipos)]
+    linhas = [
+        tuple(None if aleatorio.random() < 0.05 else gerar(aleatorio) for _, gerar in tipos)
+        for _ in range(num_linhas)
+    ]
+    return descricao, linhas
+
+
+def _registros_pandas(colunas: List[str], linhas: List[tuple]):
+    return pd.DataFrame.from_records(linhas, columns=colunas).to_dict('records')
+
+
+def _dataframe_pandas(registros):
+    df = pd.DataFrame.from_records(registros)
+    for coluna in df.columns:
+        if df[coluna].dtype == object:
+            valores = df[coluna].dropna()
+            if len(valores) > 0 and all(isinstance(v, Decimal) for v in valores):
+                df[coluna] = pd.to_numeric(df[coluna].astype(float))
+    return df
+
+
+def _medir(funcao: Callable[[], Any]) -> float:
+    """Mediana do tempo de REPETICOES execuções."""
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+
+def rmta_comparar(num_colunas: int, num_linhas: int) -> List[Tuple[str, float]]:
+    """Mede cada caminho de decodificação; retorna (nome, linhas por segundo)."""
+    descricao, linhas = rmta_gerar_linhas(num_colunas, num_linhas)
+    colunas = [nome for nome, _ in descricao]
+    registros = rmta_registros(colunas, linhas)
+    caminhos = [
+        ("registros: pandas", lambda: _registros_pandas(colunas, linhas)),
+        ("registros: tuplas", lambda: rmta_registros(colunas, linhas)),
+        ("DataFrame: pandas", lambda: _dataframe_pandas(registros)),
+        ("DataFrame: registros", lambda: rmta_dataframe_de_registros(registros)),
+        ("DataFrame: OIDs", lambda: rmta_dataframe_tipado(descricao, linhas))
+    ]
+    return [(nome, num_linhas / _medir(funcao)) for nome, funcao in caminhos]
+
+
+def main() -> int:
+    linhas_largo = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    linhas_alto = int(sys.argv[2]) if len(sys.argv) > 2 else 500_000
+
+    for formato, num_colunas, num_linhas in (("largo", 60, linhas_largo), ("alto", 6, linhas_alto)):
+        print(f"\n{formato}: {num_colunas} colunas x {num_linhas} linhas")
+        print(f"{'caminho':<24}{'linhas/s':>14}")
+        for nome, vazao in rmta_comparar(num_colunas, num_linhas):
+            print(f"{nome:<24}{vazao:>14,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Benchmark do tempo de importação dos módulos do SQL Agent.
+
+Cada módulo é importado em um processo novo (importação a frio), várias vezes,
+e a mediana é comparada com o orçamento do módulo. Também verifica que as
+dependências pesadas (pandas, LangGraph, LangChain, Streamlit) não são
+carregadas na importação: elas só devem ser importadas quando usadas.
+
+Uso:
+    python -m benchmarks.importacao [repeticoes]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Orçamento (em segundos) da importação a frio de cada módulo
+ORCAMENTO_IMPORTACAO = {
+    "database.conexao": 0.25,
+    "agent.nos": 0.35,
+    "agent.fluxo_trabalho": 0.40,
+    "api.servidor": 0.50
+}
+
+# Dependências que não podem ser carregadas apenas por importar os módulos acima
+DEPENDENCIAS_PESADAS = ("pandas", "numpy", "langgraph", "langchain_core", "langchain_openai", "streamlit")
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CODIGO_MEDICAO = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+duracao = time.perf_counter() - inicio
+carregadas = [nome for nome in {pesadas!r} if nome in sys.modules]
+print(json.dumps({{"duracao": duracao, "carregadas": carregadas}}))
+"""
+
+
+def rmta_medir_importacao(modulo: str, repeticoes: int = 5) -> Dict[str, Any]:
+    """
+    Mede a importação a frio de um módulo em processos separados.
+
+    Args:
+        modulo (str): Nome do módulo (ex.: "agent.nos")
+        repeticoes (int): Número de processos medidos
+
+    Returns:
+        Dict[str, Any]: "mediana" e "minimo" (segundos) e as dependências pesadas
+        "carregadas" pela importação
+    """
+    codigo = _CODIGO_MEDICAO.format(modulo=modulo, pesadas=DEPENDENCIAS_PESADAS)
+    duracoes = []
+    carregadas: List[str] = []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, "-c", codigo],
+            cwd=_RAIZ,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        medicao = json.loads(saida.stdout.strip().splitlines()[-1])
+        duracoes.append(medicao["duracao"])
+        carregadas = medicao["carregadas"]
+    return {"mediana": statistics.median(duracoes), "minimo": min(duracoes), "carregadas": carregadas}
+
+
+def rmta_verificar_orcamento(repeticoes: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Mede todos os módulos do orçamento.
+
+    Args:
+        repeticoes (int): Número de processos medidos por módulo
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Medição de cada módulo, com "orcamento" e "dentro_orcamento"
+    """
+    medicoes = {}
+    for modulo, orcamento in ORCAMENTO_IMPORTACAO.items():
+        medicao = rmta_medir_importacao(modulo, repeticoes)
+        medicao["orcamento"] = orcamento
+        medicao["dentro_orcamento"] = medicao["mediana"] <= orcamento and not medicao["carregadas"]
+        medicoes[modulo] = medicao
+    return medicoes
+
+
+def main() -> int:
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    medicoes = rmta_verificar_orcamento(repeticoes)
+
+    print(f"{'módulo':<24}{'mediana':>10}{'mínimo':>10}{'orçamento':>11}  pesadas carregadas")
+    for modulo, medicao in medicoes.items():
+        print(
+            f"{modulo:<24}{medicao['mediana']:>9.3f}s{medicao['minimo']:>9.3f}s"
+            f"{medicao['orcamento']:>10.2f}s  {', '.join(medicao['carregadas']) or '-'}"
+        )
+    return 0 if all(medicao["dentro_orcamento"] for medicao in medicoes.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
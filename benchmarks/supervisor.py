@@ -0,0 +1,88 @@
+"""
+Benchmark de vazão do supervisor de processos de trabalho.
+
+Compara a vazão de consultas sintéticas limitadas pelo GIL (decodificação de
+JSON, conversão de registros e resumo, como no pós-processamento do fluxo)
+em threads de um único processo e no supervisor com 1..N processos. Com o
+GIL, as threads não escalam; com o supervisor, a vazão deve crescer quase
+linearmente até o número de núcleos.
+
+Uso:
+    python -m benchmarks.supervisor [consultas] [max_processos]
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from api.supervisor import Supervisor
+
+LINHAS_CONSULTA = 2000  # registros processados por consulta sintética
+
+
+def rmta_consulta_sintetica(pergunta: str, id_sessao: Optional[str] = None, aproximado: bool = False) -> Dict[str, Any]:
+    """
+    Simula o trabalho de CPU de uma consulta: resultado em JSON, conversão e resumo.
+
+    Args:
+        pergunta (str): Pergunta (usada como semente dos valores)
+        id_sessao (Optional[str]): Ignorado; mantém a assinatura de rmta_processar_consulta
+        aproximado (bool): Ignorado; mantém a assinatura de rmta_processar_consulta
+
+    Returns:
+        Dict[str, Any]: Resumo do resultado
+    """
+    semente = len(pergunta)
+    bruto = json.dumps([
+        {"id": i, "cliente": f"Cliente {i % 97}", "valor": str(Decimal(i * semente) / 7), "categoria": f"C{i % 5}"}
+        for i in range(LINHAS_CONSULTA)
+    ])
+    registros = json.loads(bruto)
+    totais: Dict[str, Decimal] = {}
+    for registro in registros:
+        totais[registro["categoria"]] = totais.get(registro["categoria"], Decimal(0)) + Decimal(registro["valor"])
+    return {"consulta": pergunta, "linhas": len(registros), "totais": {k: str(v) for k, v in sorted(totais.items())}}
+
+
+def rmta_medir_threads(threads: int, consultas: int) -> float:
+    """Vazão (consultas/s) com um pool de threads em um único processo."""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        inicio = time.perf_counter()
+        list(executor.map(rmta_consulta_sintetica, [f"pergunta {i}" for i in range(consultas)]))
+        return consultas / (time.perf_counter() - inicio)
+
+
+def rmta_medir_supervisor(processos: int, consultas: int) -> float:
+    """Vazão (consultas/s) com o supervisor, depois de todos os processos estarem prontos."""
+    with Supervisor(processos, funcao=rmta_consulta_sintetica, instantaneo=False) as supervisor:
+        # Aquecimento: garante que todos os processos já importaram os módulos
+        for futuro in [supervisor.submeter(f"aquecimento {i}") for i in range(processos * 2)]:
+            futuro.result()
+        inicio = time.perf_counter()
+        for futuro in [supervisor.submeter(f"pergunta {i}") for i in range(consultas)]:
+            futuro.result()
+        return consultas / (time.perf_counter() - inicio)
+
+
+def main() -> int:
+    consultas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    max_processos = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    base = rmta_medir_threads(1, consultas)
+    print(f"{'modo':<24}{'consultas/s':>12}{'aceleração':>12}{'eficiência':>12}")
+    print(f"{'1 thread':<24}{base:>12.1f}{1.0:>11.2f}x{1.0:>12.0%}")
+    print(f"{f'{max_processos} threads':<24}{rmta_medir_threads(max_processos, consultas):>12.1f}")
+
+    processos = 1
+    while processos <= max_processos:
+        vazao = rmta_medir_supervisor(processos, consultas)
+        print(f"{f'supervisor {processos} proc.':<24}{vazao:>12.1f}{vazao / base:>11.2f}x{vazao / base / processos:>12.0%}")
+        processos *= 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,26 @@ Configurações globais do aplicativo SQL Agent.
 
 Este módulo contém constantes e configurações utilizadas em todo o aplicativo.
 """
+import json
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+
+def _ler_niveis(variavel, padrao, validos):
+    """Lê uma lista de níveis separados por vírgula, rejeitando nomes desconhecidos na inicialização."""
+    niveis = [nivel.strip().lower() for nivel in os.getenv(variavel, padrao).split(",") if nivel.strip()]
+    desconhecidos = [nivel for nivel in niveis if nivel not in validos]
+    if desconhecidos or not niveis:
+        raise ValueError(
+            f"{variavel} inválido: {', '.join(desconhecidos) or 'nenhum nível'}; use {', '.join(validos)}"
+        )
+    return niveis
+
+
 # Configurações do banco de dados
 CONFIG_BD = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -17,16 +31,146 @@ CONFIG_BD = {
     "password": os.getenv("DB_PASSWORD", ""),
     "port": os.getenv("DB_PORT", "5432")
 }
+BD_TAMANHO_POOL = int(os.getenv("BD_TAMANHO_POOL", "10"))  # conexões abertas no máximo por processo
+BD_TIMEOUT_POOL = float(os.getenv("BD_TIMEOUT_POOL", "10"))  # segundos aguardando uma conexão livre
+BD_MAX_DECLARACOES_PREPARADAS = 100  # declarações preparadas mantidas por conexão
+# NUMERIC decodificado como float no cursor (mais rápido, sem a precisão exata do Decimal)
+BD_NUMERIC_COMO_FLOAT = os.getenv("BD_NUMERIC_COMO_FLOAT", "false").lower() in ("1", "true", "sim")
 
 # Configurações da API OpenAI
 CHAVE_API_OPENAI = os.getenv("OPENAI_API_KEY")
 MODELO_OPENAI = "gpt-4o"
 TEMPERATURA = 0.2
 
+# Níveis de modelo: regras -> modelo rápido -> modelo completo (escalonamento só em falha)
+MODELO_OPENAI_RAPIDO = os.getenv("MODELO_OPENAI_RAPIDO", "gpt-4o-mini")
+URL_BASE_MODELO_RAPIDO = os.getenv("URL_BASE_MODELO_RAPIDO") or None  # endpoint compatível com a OpenAI (ex.: local)
+NIVEIS_GERACAO_SQL = _ler_niveis("NIVEIS_GERACAO_SQL", "regras,rapido,completo", ("regras", "rapido", "completo"))
+NIVEIS_EXPLICACAO = _ler_niveis("NIVEIS_EXPLICACAO", "rapido,completo", ("rapido", "completo"))
+
+# Política de chamadas ao modelo (limite de taxa, novas tentativas e disjuntor)
+LLM_REQUISICOES_POR_MINUTO = float(os.getenv("LLM_REQUISICOES_POR_MINUTO", "500"))
+LLM_TOKENS_POR_MINUTO = float(os.getenv("LLM_TOKENS_POR_MINUTO", "30000"))
+LLM_TOKENS_SAIDA_ESTIMADOS = 512  # reserva de tokens de saída por chamada no limitador
+LLM_MAX_TENTATIVAS = int(os.getenv("LLM_MAX_TENTATIVAS", "4"))
+LLM_BACKOFF_BASE = 0.5  # segundos
+LLM_BACKOFF_MAXIMO = 8.0  # segundos
+LLM_TIMEOUT_CHAMADA = float(os.getenv("LLM_TIMEOUT_CHAMADA", "30"))  # segundos por tentativa
+LLM_PRAZO_TOTAL = float(os.getenv("LLM_PRAZO_TOTAL", "60"))  # segundos por invocação, incluindo tentativas
+LLM_MAX_CHAMADAS_SIMULTANEAS = 32
+LLM_TAMANHO_CACHE = 256  # respostas mantidas para servir com o disjuntor aberto
+DISJUNTOR_LIMIAR_FALHAS = int(os.getenv("DISJUNTOR_LIMIAR_FALHAS", "5"))
+DISJUNTOR_TEMPO_RECUPERACAO = float(os.getenv("DISJUNTOR_TEMPO_RECUPERACAO", "30"))  # segundos
+
+# Gravação e reprodução das chamadas ao modelo (cassetes), para medir o grafo sem o provedor
+LLM_CASSETES_MODO = os.getenv("LLM_CASSETES_MODO", "").strip().lower()  # "" (desligado), "gravar" ou "reproduzir"
+LLM_CASSETES_DIRETORIO = os.getenv("LLM_CASSETES_DIRETORIO", "cassetes")
+LLM_CASSETES_LATENCIA = os.getenv("LLM_CASSETES_LATENCIA", "original")  # "original" ou segundos fixos por resposta
+
+# Validação, EXPLAIN e checkout de conexão iniciados durante o streaming da geração de SQL
+ESPECULACAO_ATIVA = os.getenv("ESPECULACAO_ATIVA", "true").lower() == "true"
+
+# Índice de entidades: caminho rápido por templates, valores sugeridos no prompt e checagem dos literais do SQL
+INDICE_ENTIDADES_TTL = float(os.getenv("INDICE_ENTIDADES_TTL", "300"))  # segundos entre recargas (em segundo plano)
+INDICE_ENTIDADES_MAX_VALORES = int(os.getenv("INDICE_ENTIDADES_MAX_VALORES", "10000"))  # por coluna; acima disso, só os mais frequentes
+INDICE_ENTIDADES_SIMILARIDADE = float(os.getenv("INDICE_ENTIDADES_SIMILARIDADE", "0.5"))  # similaridade mínima de trigramas entre palavras
+INDICE_ENTIDADES_VALORES_PROMPT = int(os.getenv("INDICE_ENTIDADES_VALORES_PROMPT", "10"))  # valores por coluna no prompt (0 desliga)
+
+# Perguntas compostas divididas em subconsultas independentes, executadas em paralelo
+PLANEJADOR_ATIVO = os.getenv("PLANEJADOR_ATIVO", "false").lower() == "true"  # planejar pelo LLM as divisões que as regras não resolvem
+SUBCONSULTAS_MAX = int(os.getenv("SUBCONSULTAS_MAX", "4"))  # subconsultas por pergunta
+SUBCONSULTAS_THREADS = int(os.getenv("SUBCONSULTAS_THREADS", "4"))  # subconsultas simultâneas por pergunta
+
+# Configurações das sessões de conversa (perguntas de acompanhamento)
+SESSAO_TTL = float(os.getenv("SESSAO_TTL", "1800"))  # segundos sem uso até a sessão expirar
+SESSAO_MAX_SESSOES = int(os.getenv("SESSAO_MAX_SESSOES", "1000"))
+SESSAO_MAX_LINHAS_CACHE = int(os.getenv("SESSAO_MAX_LINHAS_CACHE", "5000"))  # linhas do último resultado mantidas por sessão
+
+# Configurações de tokenização e cache de prompt
+CODIFICACAO_TOKENIZADOR = os.getenv("CODIFICACAO_TOKENIZADOR", "cl100k_base")
+CACHE_PROMPT_MINIMO_TOKENS = 1024
+CACHE_PROMPT_INCREMENTO_TOKENS = 128
+CACHE_PROMPT_TTL = 300
+
+# Configurações do histórico de mensagens
+LIMITE_CONTEUDO_INLINE = 512  # bytes; conteúdos maiores são guardados fora do estado
+LIMITE_ARMAZEM_MENSAGENS = 256  # número máximo de conteúdos grandes mantidos em memória
+MODO_DEBUG_MENSAGENS = os.getenv("MODO_DEBUG_MENSAGENS", "false").lower() == "true"
+
+# Configurações de visualização: dados enviados ao navegador são reduzidos no servidor
+GRAFICO_MAX_PONTOS = int(os.getenv("GRAFICO_MAX_PONTOS", "1000"))  # pontos por série em linhas e dispersão
+GRAFICO_TOP_N = int(os.getenv("GRAFICO_TOP_N", "20"))  # barras exibidas antes de agrupar o restante em "Outros"
+
+# Configurações de exportação do resultado completo (do banco direto para o disco, em lotes)
+EXPORTACAO_DIRETORIO = os.getenv("EXPORTACAO_DIRETORIO", os.path.join(tempfile.gettempdir(), "sql_agent_exportacoes"))
+EXPORTACAO_TAMANHO_LOTE = int(os.getenv("EXPORTACAO_TAMANHO_LOTE", "10000"))  # linhas por lote (e por grupo de linhas do Parquet)
+EXPORTACAO_TTL = int(os.getenv("EXPORTACAO_TTL", "3600"))  # segundos até um arquivo exportado ser apagado
+
+# Modo aproximado: agregações sobre tabelas grandes executadas em uma amostra (TABLESAMPLE)
+AMOSTRAGEM_TABELAS = [t.strip() for t in os.getenv("AMOSTRAGEM_TABELAS", "transacoes").split(",") if t.strip()]
+AMOSTRAGEM_METODO = os.getenv("AMOSTRAGEM_METODO", "SYSTEM").upper()  # SYSTEM (páginas, mais rápido) ou BERNOULLI (linhas)
+AMOSTRAGEM_LINHAS_MINIMAS = int(os.getenv("AMOSTRAGEM_LINHAS_MINIMAS", "1000000"))  # tabelas menores são lidas por inteiro
+AMOSTRAGEM_LINHAS_ALVO = int(os.getenv("AMOSTRAGEM_LINHAS_ALVO", "200000"))  # linhas esperadas na amostra
+AMOSTRAGEM_CONFIANCA = float(os.getenv("AMOSTRAGEM_CONFIANCA", "0.95"))  # nível dos intervalos de confiança
+AMOSTRAGEM_TTL_ESTATISTICAS = int(os.getenv("AMOSTRAGEM_TTL_ESTATISTICAS", "600"))  # segundos entre leituras de pg_class
+
+# Escalonador por inquilino: cotas e fila justa ponderada na frente do LLM e do banco (limites por processo)
+INQUILINO_PADRAO = os.getenv("INQUILINO_PADRAO", "padrao")  # inquilino de requisições sem X-Tenant-Id
+ESCALONADOR_LLM_SIMULTANEAS = int(os.getenv("ESCALONADOR_LLM_SIMULTANEAS", str(LLM_MAX_CHAMADAS_SIMULTANEAS)))
+ESCALONADOR_BD_SIMULTANEAS = int(os.getenv("ESCALONADOR_BD_SIMULTANEAS", str(BD_TAMANHO_POOL)))
+ESCALONADOR_TIMEOUT_FILA = float(os.getenv("ESCALONADOR_TIMEOUT_FILA", "30"))  # segundos aguardando uma vaga
+ESCALONADOR_PESO = float(os.getenv("ESCALONADOR_PESO", "1"))  # peso padrão de um inquilino na fila justa
+ESCALONADOR_TOKENS_MINUTO = int(os.getenv("ESCALONADOR_TOKENS_MINUTO", "0"))  # tokens de LLM por minuto (0 = sem limite)
+ESCALONADOR_EXECUCOES_BD = int(os.getenv("ESCALONADOR_EXECUCOES_BD", "0"))  # execuções simultâneas no banco (0 = sem limite)
+ESCALONADOR_TEMPO_BD = float(os.getenv("ESCALONADOR_TEMPO_BD", "0"))  # segundos de banco por janela (0 = sem limite)
+ESCALONADOR_JANELA_TEMPO_BD = float(os.getenv("ESCALONADOR_JANELA_TEMPO_BD", "3600"))  # segundos
+# Peso e limites por inquilino, em JSON: {"time-a": {"peso": 2, "tokens_minuto": 50000, "execucoes_bd": 4, "tempo_bd": 600}}
+ESCALONADOR_COTAS = json.loads(os.getenv("ESCALONADOR_COTAS", "{}"))
+
+# Avaliação da geração de SQL contra o conjunto de ouro (python -m avaliacao.executor)
+AVALIACAO_CONJUNTO = os.getenv("AVALIACAO_CONJUNTO", os.path.join("avaliacao", "conjunto_ouro.json"))
+AVALIACAO_BANCO = os.getenv("AVALIACAO_BANCO", "postgres")  # "postgres" (CONFIG_BD) ou "sqlite" (substituto embutido)
+AVALIACAO_THREADS = int(os.getenv("AVALIACAO_THREADS", "4"))  # casos avaliados em paralelo
+AVALIACAO_REPETICOES = int(os.getenv("AVALIACAO_REPETICOES", "3"))  # execuções por consulta; vale a mediana
+AVALIACAO_TIMEOUT_CONSULTA = float(os.getenv("AVALIACAO_TIMEOUT_CONSULTA", "30"))  # segundos por consulta no PostgreSQL
+AVALIACAO_ACURACIA_MINIMA = float(os.getenv("AVALIACAO_ACURACIA_MINIMA", "0.8"))  # sem linha de base
+AVALIACAO_LIMIAR_ACURACIA = float(os.getenv("AVALIACAO_LIMIAR_ACURACIA", "0.02"))  # queda absoluta tolerada
+AVALIACAO_LIMIAR_P95 = float(os.getenv("AVALIACAO_LIMIAR_P95", "0.2"))  # aumento relativo tolerado no p95 da latência
+AVALIACAO_FATOR_CUSTO = float(os.getenv("AVALIACAO_FATOR_CUSTO", "2.0"))  # custo do plano gerado / referência sinalizado
+
+# Configurações de logging (fila com thread de escrita, JSON e rotação por tamanho)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_DIRETORIO = os.getenv("LOG_DIRETORIO", "logs")
+LOG_TAMANHO_MAXIMO = int(os.getenv("LOG_TAMANHO_MAXIMO", str(10 * 1024 * 1024)))  # bytes por arquivo
+LOG_ARQUIVOS_BACKUP = int(os.getenv("LOG_ARQUIVOS_BACKUP", "5"))
+LOG_LIMITE_REGISTROS_SEGUNDO = int(os.getenv("LOG_LIMITE_REGISTROS_SEGUNDO", "200"))  # acima disso, DEBUG/INFO são amostrados
+LOG_TAXA_AMOSTRAGEM = float(os.getenv("LOG_TAXA_AMOSTRAGEM", "0.1"))  # fração de DEBUG/INFO mantida acima do limite
+
+# Perfilador dos nós do grafo (sob demanda por requisição ou 1 a cada N requisições)
+PERFIL_AMOSTRAGEM = int(os.getenv("PERFIL_AMOSTRAGEM", "0"))  # perfilar 1 a cada N requisições (0 = só sob demanda)
+PERFIL_MODO = os.getenv("PERFIL_MODO", "amostragem")  # "amostragem" (pilhas, baixo custo) ou "cprofile" (determinístico)
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.005"))  # segundos entre amostras de pilha
+PERFIL_CAPACIDADE = int(os.getenv("PERFIL_CAPACIDADE", "20"))  # perfis mantidos em memória (os mais recentes)
+
 # Configurações da aplicação
 TITULO_APP = "🤖 SQL Agent Inteligente"
 DESCRICAO_APP = "Faça perguntas em linguagem natural sobre seu banco de dados e obtenha respostas precisas."
 
+# Configurações do servidor HTTP (API)
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORTA = int(os.getenv("API_PORTA", "8000"))
+API_PROCESSOS = int(os.getenv("API_PROCESSOS", "1"))  # processos do uvicorn
+API_THREADS = int(os.getenv("API_THREADS", "8"))  # consultas simultâneas por processo
+API_TAMANHO_FILA = int(os.getenv("API_TAMANHO_FILA", "32"))  # consultas aguardando; acima disso, 429
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "60"))  # segundos por requisição
+API_TAMANHO_MAXIMO_LOTE = int(os.getenv("API_TAMANHO_MAXIMO_LOTE", "20"))
+API_TAMANHO_MAXIMO_CORPO = 1024 * 1024  # bytes
+
+# Supervisor de processos de trabalho atrás de uma fila local (modo do servidor HTTP)
+SUPERVISOR_PROCESSOS = int(os.getenv("SUPERVISOR_PROCESSOS", "0"))  # 0 executa as consultas em threads do próprio processo
+SUPERVISOR_MAX_CONSULTAS_PROCESSO = int(os.getenv("SUPERVISOR_MAX_CONSULTAS_PROCESSO", "0"))  # reciclar após N consultas (0 = nunca)
+SUPERVISOR_TIMEOUT_ENCERRAMENTO = float(os.getenv("SUPERVISOR_TIMEOUT_ENCERRAMENTO", "30"))  # segundos para concluir as consultas em andamento
+
 # Exemplos de consultas para a interface
 EXEMPLOS_CONSULTAS = [
     "Quais clientes compraram um Notebook?",
@@ -0,0 +1,473 @@
+"""
+Respostas aproximadas por amostragem (TABLESAMPLE) para agregações em tabelas grandes.
+
+No modo aproximado, consultas de agregação elegíveis sobre as tabelas de
+AMOSTRAGEM_TABELAS (por padrão, transacoes) são reescritas para ler apenas uma
+amostra da tabela:
+
+    SELECT c.nome, SUM(t.valor_total) AS total
+    FROM transacoes t TABLESAMPLE SYSTEM (2) JOIN clientes c ON ...
+
+O percentual é escolhido pelo tamanho estimado da tabela (pg_class.reltuples),
+para que a amostra tenha cerca de AMOSTRAGEM_LINHAS_ALVO linhas; tabelas com
+menos de AMOSTRAGEM_LINHAS_MINIMAS linhas são lidas por inteiro. Colunas
+auxiliares (soma dos quadrados, desvio padrão) são acrescentadas à consulta
+para calcular os intervalos de confiança, e COUNT e SUM são divididos pela
+fração amostrada (estimador de Horvitz-Thompson). AVG não precisa de escala.
+
+São elegíveis consultas com um único SELECT, sem DISTINCT, HAVING, funções de
+janela ou junções externas, em que cada coluna é uma chave do GROUP BY ou um
+COUNT/SUM/AVG direto (sem expressão em volta). Grupos raros podem não aparecer
+na amostra. Com SYSTEM (páginas inteiras), os intervalos supõem que as linhas
+de uma mesma página não são correlacionadas; BERNOULLI não tem essa ressalva,
+mas lê a tabela inteira.
+"""
+import logging
+import math
+import threading
+import time
+from decimal import Decimal
+from statistics import NormalDist
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config.configuracoes import (
+    AMOSTRAGEM_CONFIANCA,
+    AMOSTRAGEM_LINHAS_ALVO,
+    AMOSTRAGEM_LINHAS_MINIMAS,
+    AMOSTRAGEM_METODO,
+    AMOSTRAGEM_TABELAS,
+    AMOSTRAGEM_TTL_ESTATISTICAS
+)
+from database.conexao import rmta_obter_conexao_bd
+from database.normalizacao_sql import PADRAO_TOKENS_SQL
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Agregações estimáveis a partir de uma amostra
+AGREGACOES_ESTIMAVEIS = {"count", "sum", "avg"}
+
+# Agregações cujo valor na amostra não estima o valor na tabela
+_AGREGACOES_NAO_ESTIMAVEIS = {
+    "min", "max", "string_agg", "array_agg", "json_agg", "jsonb_agg", "bool_and", "bool_or", "every",
+    "stddev", "stddev_samp", "stddev_pop", "variance", "var_samp", "var_pop",
+    "percentile_cont", "percentile_disc", "mode"
+}
+
+# Palavras que impedem a reescrita, com o motivo
+_PALAVRAS_INELEGIVEIS = {
+    "union": "combina várias consultas",
+    "intersect": "combina várias consultas",
+    "except": "combina várias consultas",
+    "with": "usa CTE",
+    "distinct": "DISTINCT não é estimável por amostra",
+    "having": "HAVING filtra os grupos pelo valor exato",
+    "over": "usa funções de janela",
+    "left": "junção externa",
+    "right": "junção externa",
+    "full": "junção externa",
+    "tablesample": "já usa TABLESAMPLE"
+}
+
+# Cláusulas que encerram o FROM
+_CLAUSULAS_APOS_FROM = {"where", "group", "order", "limit", "offset", "fetch", "for"}
+
+# Palavras que podem seguir o nome da tabela e não são um apelido
+_PALAVRAS_APOS_TABELA = {"join", "inner", "cross", "natural", "on", "using", "lateral"} | _CLAUSULAS_APOS_FROM
+
+
+class _Token(NamedTuple):
+    tipo: str
+    texto: str
+    inicio: int
+    fim: int
+
+    @property
+    def nome(self) -> str:
+        """Texto em minúsculas; identificadores entre aspas sem as aspas."""
+        if self.tipo == "identificador_citado":
+            return self.texto[1:-1].replace('""', '"')
+        return self.texto.lower()
+
+
+class Agregado(NamedTuple):
+    """
+    Agregação estimada a partir da amostra.
+
+    Attributes:
+        funcao (str): "count", "sum" ou "avg"
+        argumento (str): Expressão agregada ("*" em COUNT(*))
+        coluna (str): Nome da coluna no resultado
+    """
+    funcao: str
+    argumento: str
+    coluna: str
+
+
+class AnaliseAgregacao(NamedTuple):
+    """
+    Consulta de agregação elegível para amostragem.
+
+    Attributes:
+        sql (str): SQL original, sem ponto e vírgula final
+        tabela (str): Tabela que será amostrada
+        posicao_from (int): Posição do FROM principal no SQL
+        posicao_amostra (int): Posição, após a tabela e o apelido, onde entra o TABLESAMPLE
+        agregados (List[Agregado]): Agregações da lista de colunas
+    """
+    sql: str
+    tabela: str
+    posicao_from: int
+    posicao_amostra: int
+    agregados: List[Agregado]
+
+
+class PlanoAmostragem(NamedTuple):
+    """
+    Consulta reescrita para ler uma amostra da tabela.
+
+    Attributes:
+        sql (str): SQL com TABLESAMPLE e as colunas auxiliares
+        tabela (str): Tabela amostrada
+        metodo (str): SYSTEM ou BERNOULLI
+        percentual (float): Percentual da tabela lido
+        linhas_tabela (Optional[float]): Tamanho estimado da tabela
+        agregados (List[Agregado]): Agregações a escalar
+    """
+    sql: str
+    tabela: str
+    metodo: str
+    percentual: float
+    linhas_tabela: Optional[float]
+    agregados: List[Agregado]
+
+
+def _tokenizar(sql: str) -> Optional[List[_Token]]:
+    """Tokens significativos do SQL (sem comentários e espaços), ou None com dollar-quoting."""
+    tokens = []
+    for correspondencia in PADRAO_TOKENS_SQL.finditer(sql):
+        tipo = correspondencia.lastgroup
+        if tipo in ("comentario", "espaco"):
+            continue
+        if tipo == "dolar":
+            return None
+        tokens.append(_Token(tipo, correspondencia.group(), correspondencia.start(), correspondencia.end()))
+    return tokens
+
+
+def _dividir_itens(tokens: List[_Token]) -> List[List[_Token]]:
+    """Divide a lista de colunas do SELECT nas vírgulas de nível zero."""
+    itens: List[List[_Token]] = [[]]
+    profundidade = 0
+    for token in tokens:
+        if token.texto == "(":
+            profundidade += 1
+        elif token.texto == ")":
+            profundidade -= 1
+        elif token.texto == "," and profundidade == 0:
+            itens.append([])
+            continue
+        itens[-1].append(token)
+    return itens
+
+
+def _chamada_de_agregacao(expressao: List[_Token]) -> bool:
+    """Indica se a expressão é exatamente uma chamada func(...), com o ")" final fechando o "(" inicial."""
+    if len(expressao) < 3 or expressao[1].texto != "(" or expressao[-1].texto != ")":
+        return False
+    profundidade = 0
+    for i, token in enumerate(expressao[1:], 1):
+        if token.texto == "(":
+            profundidade += 1
+        elif token.texto == ")":
+            profundidade -= 1
+            if profundidade == 0:
+                return i == len(expressao) - 1
+    return False
+
+
+def rmta_analisar_agregacao(sql: str, tabelas: Optional[List[str]] = None) -> Tuple[Optional[AnaliseAgregacao], Optional[str]]:
+    """
+    Verifica se uma consulta pode ser respondida por amostragem e localiza os pontos de reescrita.
+
+    Args:
+        sql (str): Consulta SQL validada
+        tabelas (Optional[List[str]]): Tabelas amostráveis (padrão: AMOSTRAGEM_TABELAS)
+
+    Returns:
+        Tuple[Optional[AnaliseAgregacao], Optional[str]]: Análise da consulta e o motivo
+        da inelegibilidade (None se elegível)
+    """
+    tabelas = [tabela.lower() for tabela in (tabelas if tabelas is not None else AMOSTRAGEM_TABELAS)]
+    sql = sql.strip().rstrip(";").rstrip()
+    tokens = _tokenizar(sql)
+    if not tokens or tokens[0].nome != "select":
+        return None, "não é uma consulta SELECT simples"
+
+    nomes = [token.nome if token.tipo == "palavra" else None for token in tokens]
+    if nomes.count("select") > 1:
+        return None, "usa subconsultas"
+    for i, nome in enumerate(nomes):
+        if nome in _PALAVRAS_INELEGIVEIS:
+            return None, _PALAVRAS_INELEGIVEIS[nome]
+        if nome in _AGREGACOES_NAO_ESTIMAVEIS and i + 1 < len(tokens) and tokens[i + 1].texto == "(":
+            return None, f"{nome.upper()} não é estimável por amostra"
+
+    # FROM principal e fim da cláusula FROM (nível zero de parênteses)
+    indice_from = indice_fim_from = None
+    profundidade = 0
+    for i, token in enumerate(tokens):
+        if token.texto == "(":
+            profundidade += 1
+        elif token.texto == ")":
+            profundidade -= 1
+        elif profundidade == 0 and nomes[i] == "from" and indice_from is None:
+            indice_from = i
+        elif profundidade == 0 and indice_from is not None and nomes[i] in _CLAUSULAS_APOS_FROM:
+            indice_fim_from = i
+            break
+    if indice_from is None:
+        return None, "não lê nenhuma tabela"
+    if indice_fim_from is None:
+        indice_fim_from = len(tokens)
+
+    # Lista de colunas: chaves de agrupamento ou agregações diretas
+    agregados = []
+    for item in _dividir_itens(tokens[1:indice_from]):
+        expressao, apelido = item, None
+        if len(item) >= 3 and item[-2].nome == "as":
+            expressao, apelido = item[:-2], item[-1].nome
+        elif len(item) >= 2 and item[-1].tipo in ("palavra", "identificador_citado") and item[-2].texto == ")":
+            expressao, apelido = item[:-1], item[-1].nome
+        if expressao and expressao[0].nome in AGREGACOES_ESTIMAVEIS and _chamada_de_agregacao(expressao):
+            argumento = sql[expressao[1].fim:expressao[-1].inicio].strip()
+            agregados.append(Agregado(expressao[0].nome, argumento, apelido or expressao[0].nome))
+        elif any(
+            token.nome in AGREGACOES_ESTIMAVEIS and j + 1 < len(expressao) and expressao[j + 1].texto == "("
+            for j, token in enumerate(expressao)
+        ):
+            return None, "agregação dentro de uma expressão"
+    if not agregados:
+        return None, "não tem agregações"
+    if len({agregado.coluna for agregado in agregados}) < len(agregados):
+        return None, "colunas agregadas com nomes repetidos"
+
+    # Tabela amostrável no FROM, após FROM, JOIN ou vírgula (com ou sem esquema)
+    ocorrencias = []
+    for i in range(indice_from + 1, indice_fim_from):
+        token = tokens[i]
+        if token.tipo not in ("palavra", "identificador_citado") or token.nome.lower() not in tabelas:
+            continue
+        anterior = i - 1
+        if tokens[anterior].texto == "." and anterior - 2 >= indice_from:
+            anterior -= 2
+        if tokens[anterior].texto == "," or nomes[anterior] in ("from", "join"):
+            ocorrencias.append(i)
+    if not ocorrencias:
+        return None, "não lê uma tabela amostrável"
+    if len(ocorrencias) > 1:
+        return None, "a tabela amostrável aparece mais de uma vez"
+
+    indice_tabela = ocorrencias[0]
+    fim = tokens[indice_tabela].fim
+    seguinte = indice_tabela + 1
+    if seguinte < indice_fim_from and nomes[seguinte] == "as":
+        fim = tokens[seguinte + 1].fim
+    elif seguinte < indice_fim_from and (
+        tokens[seguinte].tipo == "identificador_citado"
+        or (tokens[seguinte].tipo == "palavra" and nomes[seguinte] not in _PALAVRAS_APOS_TABELA)
+    ):
+        fim = tokens[seguinte].fim
+
+    analise = AnaliseAgregacao(sql, tokens[indice_tabela].nome.lower(), tokens[indice_from].inicio, fim, agregados)
+    return analise, None
+
+
+def rmta_reescrever_com_amostra(analise: AnaliseAgregacao, percentual: float, metodo: str = AMOSTRAGEM_METODO,
+                                semente: Optional[int] = None) -> str:
+    """
+    Reescreve a consulta para ler uma amostra da tabela, com as colunas auxiliares dos intervalos.
+
+    Args:
+        analise (AnaliseAgregacao): Consulta analisada por rmta_analisar_agregacao
+        percentual (float): Percentual da tabela a ler (0-100)
+        metodo (str): SYSTEM ou BERNOULLI
+        semente (Optional[int]): Semente do REPEATABLE, para amostras reprodutíveis
+
+    Returns:
+        str: SQL reescrito
+    """
+    auxiliares = []
+    for i, agregado in enumerate(analise.agregados):
+        if agregado.funcao == "sum":
+            auxiliares.append(f'SUM(({agregado.argumento})::float8 * ({agregado.argumento})::float8) AS "__rmta_q{i}"')
+        elif agregado.funcao == "avg":
+            auxiliares.append(f'STDDEV_SAMP(({agregado.argumento})::float8) AS "__rmta_dp{i}"')
+            auxiliares.append(f'COUNT({agregado.argumento}) AS "__rmta_n{i}"')
+
+    amostra = f" TABLESAMPLE {metodo} ({percentual:.6g})"
+    if semente is not None:
+        amostra += f" REPEATABLE ({int(semente)})"
+
+    sql = analise.sql
+    colunas = sql[:analise.posicao_from].rstrip()
+    if auxiliares:
+        colunas += ", " + ", ".join(auxiliares)
+    return colunas + "\n" + sql[analise.posicao_from:analise.posicao_amostra] + amostra + sql[analise.posicao_amostra:]
+
+
+_linhas_tabelas: Dict[str, Tuple[Optional[float], float]] = {}
+_trava_estatisticas = threading.Lock()
+
+
+def rmta_estimar_linhas_tabela(tabela: str) -> Optional[float]:
+    """
+    Retorna o número estimado de linhas de uma tabela (pg_class.reltuples), com cache.
+
+    Args:
+        tabela (str): Nome da tabela
+
+    Returns:
+        Optional[float]: Linhas estimadas, ou None se desconhecido (tabela nunca analisada
+        ou banco indisponível)
+    """
+    with _trava_estatisticas:
+        em_cache = _linhas_tabelas.get(tabela)
+        if em_cache is not None and time.time() - em_cache[1] < AMOSTRAGEM_TTL_ESTATISTICAS:
+            return em_cache[0]
+
+    conexao = rmta_obter_conexao_bd()
+    if not conexao:
+        return None
+    linhas = None
+    try:
+        cursor = conexao.cursor()
+        try:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (tabela,))
+            registro = cursor.fetchone()
+        finally:
+            cursor.close()
+        if registro and registro[0] is not None and registro[0] >= 0:
+            linhas = float(registro[0])
+    except Exception as e:
+        logger.warning("Erro ao estimar o tamanho da tabela %s: %s", tabela, e)
+        return None
+    finally:
+        conexao.close()
+
+    with _trava_estatisticas:
+        _linhas_tabelas[tabela] = (linhas, time.time())
+    return linhas
+
+
+def rmta_escolher_percentual(linhas_tabela: Optional[float]) -> Optional[float]:
+    """
+    Escolhe o percentual da amostra para obter cerca de AMOSTRAGEM_LINHAS_ALVO linhas.
+
+    Args:
+        linhas_tabela (Optional[float]): Tamanho estimado da tabela
+
+    Returns:
+        Optional[float]: Percentual (0-100), ou None se a tabela deve ser lida por inteiro
+    """
+    if linhas_tabela is None or linhas_tabela < AMOSTRAGEM_LINHAS_MINIMAS:
+        return None
+    percentual = 100.0 * AMOSTRAGEM_LINHAS_ALVO / linhas_tabela
+    if percentual >= 50:
+        # Ler metade da tabela não compensa a perda de exatidão
+        return None
+    return max(percentual, 0.01)
+
+
+def rmta_planejar_amostragem(sql: str, metodo: str = AMOSTRAGEM_METODO,
+                             semente: Optional[int] = None) -> Tuple[Optional[PlanoAmostragem], Optional[str]]:
+    """
+    Planeja a execução aproximada de uma consulta.
+
+    Args:
+        sql (str): Consulta SQL validada
+        metodo (str): SYSTEM ou BERNOULLI
+        semente (Optional[int]): Semente do REPEATABLE
+
+    Returns:
+        Tuple[Optional[PlanoAmostragem], Optional[str]]: Plano, ou None e o motivo para
+        executar a consulta exata
+    """
+    analise, motivo = rmta_analisar_agregacao(sql)
+    if analise is None:
+        return None, motivo
+    linhas_tabela = rmta_estimar_linhas_tabela(analise.tabela)
+    percentual = rmta_escolher_percentual(linhas_tabela)
+    if percentual is None:
+        return None, f"a tabela {analise.tabela} é pequena o bastante para a consulta exata"
+    sql_amostrado = rmta_reescrever_com_amostra(analise, percentual, metodo, semente)
+    return PlanoAmostragem(sql_amostrado, analise.tabela, metodo, percentual, linhas_tabela, analise.agregados), None
+
+
+def _no_tipo(original: Any, valor: float) -> Any:
+    """Converte uma estimativa para o tipo do valor retornado pelo banco."""
+    if isinstance(original, int):
+        return int(round(valor))
+    if isinstance(original, Decimal):
+        expoente = original.as_tuple().exponent
+        estimativa = Decimal(repr(valor))
+        return estimativa.quantize(Decimal(1).scaleb(expoente)) if isinstance(expoente, int) else estimativa
+    return valor
+
+
+def rmta_ajustar_estimativas(resultados: List[Dict[str, Any]], plano: PlanoAmostragem,
+                             confianca: float = AMOSTRAGEM_CONFIANCA) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Escala as agregações da amostra para a tabela inteira e calcula os intervalos de confiança.
+
+    COUNT e SUM são divididos pela fração amostrada p, com variância
+    (1 - p) / p² vezes a contagem ou a soma dos quadrados; a variância de AVG é
+    (1 - p) vezes o desvio padrão ao quadrado sobre o número de linhas.
+
+    Args:
+        resultados (List[Dict[str, Any]]): Registros da consulta amostrada
+        plano (PlanoAmostragem): Plano usado na execução
+        confianca (float): Nível de confiança dos intervalos
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: Registros com as estimativas (sem as
+        colunas auxiliares) e, para cada registro, o intervalo [inferior, superior] de cada agregação
+    """
+    fracao = plano.percentual / 100.0
+    z = NormalDist().inv_cdf((1 + confianca) / 2)
+    ajustados, intervalos = [], []
+    for registro in resultados:
+        registro = dict(registro)
+        intervalos_registro: Dict[str, Any] = {}
+        for i, agregado in enumerate(plano.agregados):
+            valor = registro.get(agregado.coluna)
+            quadrados = registro.pop(f"__rmta_q{i}", None)
+            desvio = registro.pop(f"__rmta_dp{i}", None)
+            linhas = registro.pop(f"__rmta_n{i}", None)
+            if valor is None:
+                intervalos_registro[agregado.coluna] = None
+                continue
+
+            observado = float(valor)
+            if agregado.funcao == "avg":
+                estimativa = observado
+                erro_padrao = math.sqrt((1 - fracao) / linhas) * float(desvio) if desvio is not None and linhas else None
+            elif agregado.funcao == "count":
+                estimativa = observado / fracao
+                erro_padrao = math.sqrt(observado * (1 - fracao)) / fracao
+            else:
+                estimativa = observado / fracao
+                erro_padrao = math.sqrt(max(float(quadrados or 0), 0) * (1 - fracao)) / fracao
+
+            registro[agregado.coluna] = valor if agregado.funcao == "avg" else _no_tipo(valor, estimativa)
+            if erro_padrao is None:
+                intervalos_registro[agregado.coluna] = None
+                continue
+            inferior, superior = estimativa - z * erro_padrao, estimativa + z * erro_padrao
+            if agregado.funcao == "count":
+                # Há pelo menos as linhas já vistas na amostra
+                inferior = max(inferior, observado)
+            intervalos_registro[agregado.coluna] = [_no_tipo(valor, inferior), _no_tipo(valor, superior)]
+        ajustados.append(registro)
+        intervalos.append(intervalos_registro)
+    return ajustados, intervalos
@@ -6,8 +6,8 @@ e configurar o esquema inicial com dados de exemplo.
 """
 import logging
 import psycopg2
-import streamlit as st
-from config.configuracoes import CONFIG_BD
+from config.configuracoes import CONFIG_BD, BD_TAMANHO_POOL, BD_TIMEOUT_POOL
+from database.pool import PoolConexoes
 from database.esquema import (
     SQL_CRIAR_TABELAS, 
     SQL_INSERIR_CLIENTES, 
@@ -18,28 +18,67 @@ from database.esquema import (
 # Obter logger
 logger = logging.getLogger('sql_agent')
 
+def rmta_abrir_conexao_bd():
+    """
+    Abre uma nova conexão física com o banco de dados PostgreSQL.
+    
+    Returns:
+        Connection: Objeto de conexão do psycopg2
+    """
+    return psycopg2.connect(
+        host=CONFIG_BD["host"],
+        database=CONFIG_BD["database"],
+        user=CONFIG_BD["user"],
+        password=CONFIG_BD["password"],
+        port=CONFIG_BD["port"]
+    )
+
+_pool = PoolConexoes(rmta_abrir_conexao_bd, BD_TAMANHO_POOL, BD_TIMEOUT_POOL)
+
 def rmta_obter_conexao_bd():
     """
-    Estabelece uma conexão com o banco de dados PostgreSQL.
+    Obtém uma conexão com o banco de dados PostgreSQL a partir do pool.
+    
+    A conexão deve ser fechada com close() ao final do uso, o que a devolve
+    ao pool (com as declarações preparadas nela) em vez de encerrá-la.
     
     Returns:
-        Connection: Objeto de conexão com o PostgreSQL ou None em caso de erro
+        ConexaoPool: Conexão emprestada do pool ou None em caso de erro
     """
     try:
-        conexao = psycopg2.connect(
-            host=CONFIG_BD["host"],
-            database=CONFIG_BD["database"],
-            user=CONFIG_BD["user"],
-            password=CONFIG_BD["password"],
-            port=CONFIG_BD["port"]
-        )
-        logger.info("Conexão com o banco de dados estabelecida com sucesso")
-        return conexao
+        return _pool.obter()
     except Exception as e:
-        logger.error(f"Erro ao conectar ao banco de dados: {e}")
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
+        logger.error("Erro ao conectar ao banco de dados: %s", e)
         return None
 
+def rmta_verificar_plano(sql):
+    """
+    Verifica se o PostgreSQL consegue planejar a consulta, usando EXPLAIN.
+    
+    Detecta erros de sintaxe, tabelas e colunas inexistentes sem executar a consulta.
+    
+    Args:
+        sql (str): Consulta SQL a verificar
+        
+    Returns:
+        str: Mensagem de erro do planejador, ou None se o plano foi gerado
+        (ou se não foi possível conectar, caso em que a verificação é ignorada)
+    """
+    conexao = rmta_obter_conexao_bd()
+    if not conexao:
+        return None
+    
+    try:
+        cursor = conexao.cursor()
+        cursor.execute(f"EXPLAIN {sql}")
+        cursor.fetchall()
+        return None
+    except Exception as e:
+        logger.warning("EXPLAIN falhou: %s", e)
+        return str(e).strip()
+    finally:
+        conexao.close()
+
 def rmta_configurar_banco_dados():
     """
     Configura o banco de dados criando as tabelas e inserindo dados de exemplo.
@@ -61,7 +100,7 @@ def rmta_configurar_banco_dados():
         # Criar tabelas
         for sql in SQL_CRIAR_TABELAS:
             cursor.execute(sql)
-            logger.debug(f"Executado SQL: {sql[:50]}...")
+            logger.debug("Executado SQL: %.50s...", sql)
         
         # Verificar se já existem dados
         cursor.execute("SELECT COUNT(*) FROM clientes")
@@ -82,12 +121,10 @@ def rmta_configurar_banco_dados():
         
         conexao.commit()
         logger.info("Banco de dados configurado com sucesso")
-        st.success("Banco de dados configurado com sucesso!")
         return True
     except Exception as e:
         conexao.rollback()
-        logger.error(f"Erro ao configurar o banco de dados: {e}")
-        st.error(f"Erro ao configurar o banco de dados: {e}")
+        logger.error("Erro ao configurar o banco de dados: %s", e)
         return False
     finally:
         cursor.close()
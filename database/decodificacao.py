@@ -0,0 +1,324 @@
+"""
+Decodificação tipada das linhas retornadas pelo PostgreSQL.
+
+O caminho antigo passava as linhas do psycopg2 por pd.DataFrame.from_records,
+que infere o dtype de cada coluna valor a valor, só para achatá-las de novo em
+dicionários. Aqui cada coluna é montada diretamente no seu tipo:
+
+- Com cursor.description, o tipo vem do OID da coluna (NUMERIC -> float64,
+  TIMESTAMP -> datetime64, INTEGER -> int64...), sem inspecionar os valores
+- Sem OID (ex.: resultados mesclados localmente), o tipo vem do primeiro valor
+  não nulo da coluna
+
+Nos dois casos, a coluna cai para object se algum valor não for do tipo da
+coluna (ex.: um float ou um texto em uma coluna de inteiros), em vez de ser
+convertido em silêncio. O nó de execução recebe os registros direto das
+tuplas, sem DataFrame, e guarda em estado["tipos_colunas"] o tipo de cada
+coluna (rmta_tipos_colunas); a interface, as sessões e as operações locais
+montam o DataFrame com esses tipos (rmta_dataframe_de_registros). Com
+BD_NUMERIC_COMO_FLOAT, o cursor decodifica NUMERIC como float já no psycopg2,
+sem criar um Decimal por valor.
+"""
+import datetime
+import logging
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.configuracoes import BD_NUMERIC_COMO_FLOAT
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Tipos das colunas montadas, pelo OID do tipo no PostgreSQL (pg_type)
+TIPO_BOOLEANO = "booleano"
+TIPO_INTEIRO = "inteiro"
+TIPO_REAL = "real"
+TIPO_DATA = "data"
+TIPO_DATA_HORA = "data_hora"
+TIPO_DATA_HORA_FUSO = "data_hora_fuso"
+TIPO_OBJETO = "objeto"
+
+TIPOS_POR_OID = {
+    16: TIPO_BOOLEANO,
+    20: TIPO_INTEIRO,
+    21: TIPO_INTEIRO,
+    23: TIPO_INTEIRO,
+    700: TIPO_REAL,
+    701: TIPO_REAL,
+    1700: TIPO_REAL,
+    1082: TIPO_DATA,
+    1114: TIPO_DATA_HORA,
+    1184: TIPO_DATA_HORA_FUSO
+}
+
+OID_NUMERIC = 1700
+
+# Tipos Python aceitos em cada tipo de coluna; bool é subclasse de int e datetime
+# de date, por isso a comparação é pelo tipo exato
+_TIPOS_ACEITOS = {
+    TIPO_BOOLEANO: {bool},
+    TIPO_INTEIRO: {int},
+    TIPO_REAL: {float, Decimal, int},
+    TIPO_DATA: {datetime.date},
+    TIPO_DATA_HORA: {datetime.datetime},
+    TIPO_DATA_HORA_FUSO: {datetime.datetime}
+}
+
+
+def _objetos(valores: Sequence[Any]):
+    import numpy as np
+
+    coluna = np.empty(len(valores), dtype=object)
+    coluna[:] = valores
+    return coluna
+
+
+def _booleanos(valores: Sequence[Any]):
+    import numpy as np
+
+    if None in valores:
+        return _objetos(valores)
+    return np.fromiter(valores, dtype=bool, count=len(valores))
+
+
+def _inteiros(valores: Sequence[Any]):
+    import numpy as np
+
+    if None in valores:
+        # Como no pandas: inteiros com nulos viram float64 com NaN
+        return _reais(valores)
+    return np.fromiter(valores, dtype=np.int64, count=len(valores))
+
+
+def _reais(valores: Sequence[Any]):
+    import numpy as np
+
+    nan = float("nan")
+    return np.fromiter((nan if valor is None else valor for valor in valores), dtype=np.float64, count=len(valores))
+
+
+def _contagens(valores: Sequence[Any], contar: Callable[[Any], int], unidade: str):
+    # Datas viram contagens inteiras desde a época; np.array(..., dtype="datetime64")
+    # converte cada objeto date/datetime por um caminho bem mais lento
+    import numpy as np
+
+    nat = np.iinfo(np.int64).min
+    contagens = (nat if valor is None else contar(valor) for valor in valores)
+    return np.fromiter(contagens, dtype=np.int64, count=len(valores)).view(f"datetime64[{unidade}]")
+
+
+_EPOCA_DIAS = datetime.date(1970, 1, 1).toordinal()
+_EPOCA = datetime.datetime(1970, 1, 1)
+_EPOCA_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSSEGUNDO = datetime.timedelta(microseconds=1)
+
+
+def _datas(valores: Sequence[Any]):
+    return _contagens(valores, lambda valor: valor.toordinal() - _EPOCA_DIAS, "D")
+
+
+def _datas_horas(valores: Sequence[Any]):
+    return _contagens(valores, lambda valor: (valor - _EPOCA) // _MICROSSEGUNDO, "us")
+
+
+def _datas_horas_fuso(valores: Sequence[Any]):
+    # numpy não guarda fuso: os instantes são representados em UTC
+    return _contagens(valores, lambda valor: (valor - _EPOCA_UTC) // _MICROSSEGUNDO, "us")
+
+
+_CONSTRUTORES: Dict[str, Callable[[Sequence[Any]], Any]] = {
+    TIPO_BOOLEANO: _booleanos,
+    TIPO_INTEIRO: _inteiros,
+    TIPO_REAL: _reais,
+    TIPO_DATA: _datas,
+    TIPO_DATA_HORA: _datas_horas,
+    TIPO_DATA_HORA_FUSO: _datas_horas_fuso,
+    TIPO_OBJETO: _objetos
+}
+
+
+def rmta_tipo_do_valor(valor: Any) -> str:
+    """
+    Tipo de coluna correspondente a um valor Python vindo do psycopg2.
+
+    Args:
+        valor (Any): Valor não nulo
+
+    Returns:
+        str: Um dos TIPO_*
+    """
+    if isinstance(valor, bool):
+        return TIPO_BOOLEANO
+    if isinstance(valor, int):
+        return TIPO_INTEIRO
+    if isinstance(valor, (float, Decimal)):
+        return TIPO_REAL
+    if isinstance(valor, datetime.datetime):
+        return TIPO_DATA_HORA if valor.tzinfo is None else TIPO_DATA_HORA_FUSO
+    if isinstance(valor, datetime.date):
+        return TIPO_DATA
+    return TIPO_OBJETO
+
+
+def rmta_construir_coluna(valores: Sequence[Any], tipo: Optional[str] = None):
+    """
+    Monta um array numpy tipado com os valores de uma coluna.
+
+    Args:
+        valores (Sequence[Any]): Valores da coluna, com None para nulos
+        tipo (Optional[str]): Um dos TIPO_*; None usa o tipo do primeiro valor não nulo
+
+    Returns:
+        np.ndarray: Coluna no seu dtype (object se algum valor não for do tipo)
+    """
+    if tipo is None:
+        primeiro = next((valor for valor in valores if valor is not None), None)
+        tipo = TIPO_OBJETO if primeiro is None else rmta_tipo_do_valor(primeiro)
+    aceitos = _TIPOS_ACEITOS.get(tipo)
+    if aceitos is not None and not set(map(type, valores)) - {type(None)} <= aceitos:
+        # O numpy converteria os demais valores em silêncio (2.5 -> 2, 2 -> True, "2" -> 2.0)
+        return _objetos(valores)
+    try:
+        return _CONSTRUTORES[tipo](valores)
+    except (TypeError, ValueError, AttributeError, OverflowError):
+        return _objetos(valores)
+
+
+def _oid(descricao) -> Optional[int]:
+    """OID do tipo de um item de cursor.description (None se não informado)."""
+    oid = getattr(descricao, "type_code", None)
+    if oid is None and isinstance(descricao, (tuple, list)) and len(descricao) > 1:
+        oid = descricao[1]
+    return oid if isinstance(oid, int) else None
+
+
+def rmta_tipos_colunas(descricao: Sequence[Any]) -> Dict[str, str]:
+    """
+    Tipo de cada coluna de um resultado, pelo OID informado em cursor.description.
+
+    Args:
+        descricao (Sequence[Any]): cursor.description da consulta
+
+    Returns:
+        Dict[str, str]: TIPO_* por nome de coluna (colunas sem OID ficam de fora)
+    """
+    tipos = {}
+    for item in descricao:
+        oid = _oid(item)
+        if oid is not None:
+            tipos[item[0]] = TIPOS_POR_OID.get(oid, TIPO_OBJETO)
+    return tipos
+
+
+def rmta_colunas_tipadas(descricao: Sequence[Any], linhas: List[tuple]) -> Dict[str, Any]:
+    """
+    Transpõe as linhas de um cursor em colunas tipadas pelo OID de cada coluna.
+
+    Args:
+        descricao (Sequence[Any]): cursor.description da consulta
+        linhas (List[tuple]): Linhas retornadas pelo cursor
+
+    Returns:
+        Dict[str, np.ndarray]: Arrays por nome de coluna, na ordem do SELECT
+    """
+    tipos = rmta_tipos_colunas(descricao)
+    tipadas = {}
+    for indice, item in enumerate(descricao):
+        # Uma lista por coluna: zip(*linhas) fica lento com centenas de milhares de linhas
+        tipadas[item[0]] = rmta_construir_coluna([linha[indice] for linha in linhas], tipos.get(item[0]))
+    return tipadas
+
+
+def rmta_dataframe_tipado(descricao: Sequence[Any], linhas: List[tuple]):
+    """
+    Monta o DataFrame de um resultado a partir das colunas tipadas, sem inferência do pandas.
+
+    Args:
+        descricao (Sequence[Any]): cursor.description da consulta
+        linhas (List[tuple]): Linhas retornadas pelo cursor
+
+    Returns:
+        pd.DataFrame: Resultado com os dtypes dados pelos OIDs
+    """
+    import pandas as pd
+
+    return pd.DataFrame(rmta_colunas_tipadas(descricao, linhas), copy=False)
+
+
+def rmta_dataframe_de_registros(registros: Optional[List[Dict[str, Any]]], tipos: Optional[Dict[str, str]] = None):
+    """
+    Monta o DataFrame de registros (dicionários com as mesmas chaves) coluna a coluna.
+
+    Cada coluna recebe o tipo informado em tipos (o do OID, guardado pelo nó de
+    execução) ou, sem ele, o tipo do seu primeiro valor não nulo; NUMERIC
+    (Decimal) vira float64. Registros com chaves diferentes entre si usam o
+    from_records do pandas.
+
+    Args:
+        registros (Optional[List[Dict[str, Any]]]): Registros de uma consulta
+        tipos (Optional[Dict[str, str]]): TIPO_* por nome de coluna (rmta_tipos_colunas)
+
+    Returns:
+        pd.DataFrame: Resultado em formato tabular
+    """
+    import pandas as pd
+
+    if not registros:
+        return pd.DataFrame()
+    tipos = tipos or {}
+    nomes = list(registros[0])
+    try:
+        colunas = {nome: [registro[nome] for registro in registros] for nome in nomes}
+    except KeyError:
+        return pd.DataFrame.from_records(registros)
+    return pd.DataFrame(
+        {nome: rmta_construir_coluna(valores, tipos.get(nome)) for nome, valores in colunas.items()},
+        columns=nomes,
+        copy=False
+    )
+
+
+def rmta_registros(colunas: List[str], linhas: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Converte as linhas do cursor em registros (dicionários), sem passar por DataFrame.
+
+    Args:
+        colunas (List[str]): Nomes das colunas
+        linhas (List[tuple]): Linhas retornadas pelo cursor
+
+    Returns:
+        List[Dict[str, Any]]: Um dicionário por linha
+    """
+    return [dict(zip(colunas, linha)) for linha in linhas]
+
+
+def rmta_registrar_decodificadores(cursor) -> None:
+    """
+    Registra no cursor os decodificadores por OID que substituem os padrões do psycopg2.
+
+    Com BD_NUMERIC_COMO_FLOAT, NUMERIC é decodificado pelo conversor de float em C
+    do psycopg2 em vez de criar um Decimal por valor (perdendo a precisão exata
+    além de ~15 dígitos). Cursores que não são do psycopg2 ficam como estão.
+
+    Args:
+        cursor: Cursor do psycopg2
+    """
+    if not BD_NUMERIC_COMO_FLOAT:
+        return
+    from psycopg2 import extensions
+
+    if isinstance(cursor, extensions.cursor):
+        extensions.register_type(_tipo_numeric_float(), cursor)
+
+
+_numeric_float = None
+
+
+def _tipo_numeric_float():
+    """Conversor de NUMERIC para float (criado uma vez)."""
+    global _numeric_float
+    if _numeric_float is None:
+        from psycopg2 import extensions
+
+        _numeric_float = extensions.new_type((OID_NUMERIC,), "NUMERIC_FLOAT", extensions.FLOAT)
+    return _numeric_float
@@ -0,0 +1,301 @@
+"""
+Exportação do resultado completo de uma consulta para CSV ou Parquet.
+
+A interface exibe apenas o resultado em memória (estado["resultados"]). Para
+baixar resultados grandes, este módulo executa de novo o SQL validado e grava
+as linhas direto em um arquivo no disco, sem acumulá-las na memória:
+
+- CSV: COPY (SELECT ...) TO STDOUT, com o PostgreSQL gerando o CSV e o
+  psycopg2 repassando cada bloco ao arquivo
+- Parquet: cursor no servidor (cursor nomeado), lido em lotes de
+  EXPORTACAO_TAMANHO_LOTE linhas, cada lote gravado como um grupo de linhas
+
+A memória usada fica limitada a um lote, qualquer que seja o tamanho do
+resultado. A exportação usa uma conexão própria, somente leitura, para não
+ocupar uma conexão do pool durante toda a cópia, e uma vaga de banco do
+inquilino no escalonador (cotas e fila justa), como as execuções do fluxo.
+"""
+import logging
+import os
+import time
+import uuid
+from decimal import Context, Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from agent.escalonador import RECURSO_BD, ErroCotaExcedida, rmta_reservar
+from config.configuracoes import EXPORTACAO_DIRETORIO, EXPORTACAO_TAMANHO_LOTE, EXPORTACAO_TTL
+from database.conexao import rmta_abrir_conexao_bd
+from utils.metricas import rmta_incrementar_contador
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Formatos suportados e seus tipos MIME
+FORMATOS_EXPORTACAO = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+# Escala usada para numeric sem precisão declarada (ex.: SUM e AVG), que o Parquet
+# precisa fixar por coluna
+ESCALA_NUMERIC_LIVRE = 10
+
+# Blocos de CSV entre duas notificações de progresso
+_INTERVALO_PROGRESSO_CSV = 1024 * 1024  # bytes
+
+
+class ErroExportacao(Exception):
+    """A exportação do resultado falhou (formato inválido, banco indisponível ou erro na cópia)."""
+
+
+def _tipo_arrow(descricao) -> Any:
+    """
+    Escolhe o tipo Arrow de uma coluna a partir do OID do tipo no PostgreSQL.
+
+    Args:
+        descricao: Item de cursor.description (nome, OID, ..., precisão, escala, ...)
+
+    Returns:
+        pyarrow.DataType: Tipo da coluna no Parquet (texto para tipos não mapeados)
+    """
+    import pyarrow as pa
+
+    oid, precisao, escala = descricao[1], descricao[4], descricao[5]
+    if oid == 1700:
+        if precisao and escala is not None and 0 < precisao <= 38:
+            return pa.decimal128(precisao, escala)
+        return pa.decimal128(38, ESCALA_NUMERIC_LIVRE)
+    tipos = {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1083: pa.time64("us"),
+        1114: pa.timestamp("us"),
+        1184: pa.timestamp("us", tz="UTC")
+    }
+    return tipos.get(oid, pa.string())
+
+
+def _converter_coluna(valores: List[Any], tipo) -> Any:
+    """Converte os valores de uma coluna do lote em um array Arrow do tipo escolhido."""
+    import pyarrow as pa
+
+    if pa.types.is_string(tipo):
+        valores = [None if valor is None else str(valor) for valor in valores]
+    elif pa.types.is_decimal(tipo) and tipo.precision == 38 and tipo.scale == ESCALA_NUMERIC_LIVRE:
+        expoente = Decimal(1).scaleb(-ESCALA_NUMERIC_LIVRE)
+        contexto = Context(prec=38)
+        valores = [None if valor is None else valor.quantize(expoente, context=contexto) for valor in valores]
+    return pa.array(valores, type=tipo)
+
+
+class _EscritorContagem:
+    """
+    Arquivo repassado ao copy_expert: grava os blocos e conta bytes e linhas.
+
+    O número de linhas é aproximado durante a cópia (campos com quebra de linha
+    contam mais de uma); o total exato vem de cursor.rowcount ao final.
+    """
+
+    def __init__(self, arquivo, progresso: Optional[Callable[[int, int], None]]):
+        self._arquivo = arquivo
+        self._progresso = progresso
+        self._ultimo_aviso = 0
+        self.bytes_escritos = 0
+        self.linhas = -1  # a primeira linha é o cabeçalho
+
+    def write(self, dados: bytes) -> int:
+        self._arquivo.write(dados)
+        self.bytes_escritos += len(dados)
+        self.linhas += dados.count(b"\n")
+        if self._progresso and self.bytes_escritos - self._ultimo_aviso >= _INTERVALO_PROGRESSO_CSV:
+            self._ultimo_aviso = self.bytes_escritos
+            self._progresso(max(self.linhas, 0), self.bytes_escritos)
+        return len(dados)
+
+
+def _exportar_csv(conexao, sql: str, parametros: Optional[Dict[str, Any]], caminho: str,
+                  progresso: Optional[Callable[[int, int], None]]) -> int:
+    """Grava o resultado em CSV com COPY ... TO STDOUT. Retorna o número de linhas."""
+    cursor = conexao.cursor()
+    try:
+        # COPY não aceita parâmetros: os valores são incorporados com o escape do psycopg2
+        consulta = cursor.mogrify(sql, parametros or None).decode("utf-8")
+        with open(caminho, "wb") as arquivo:
+            escritor = _EscritorContagem(arquivo, progresso)
+            cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true)", escritor)
+        return cursor.rowcount if cursor.rowcount >= 0 else max(escritor.linhas, 0)
+    finally:
+        cursor.close()
+
+
+def _exportar_parquet(conexao, sql: str, parametros: Optional[Dict[str, Any]], caminho: str,
+                      progresso: Optional[Callable[[int, int], None]], tamanho_lote: int) -> int:
+    """Grava o resultado em Parquet lendo um cursor no servidor em lotes. Retorna o número de linhas."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cursor = conexao.cursor(name=f"rmta_exportacao_{uuid.uuid4().hex[:8]}")
+    cursor.itersize = tamanho_lote
+    escritor = None
+    linhas = 0
+    try:
+        cursor.execute(sql, parametros or None)
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if escritor is None:
+                # Em cursores nomeados, a descrição só existe após a primeira leitura
+                esquema = pa.schema([(descricao[0], _tipo_arrow(descricao)) for descricao in cursor.description])
+                escritor = pq.ParquetWriter(caminho, esquema)
+            if not lote:
+                break
+            colunas = [
+                _converter_coluna([linha[i] for linha in lote], campo.type)
+                for i, campo in enumerate(esquema)
+            ]
+            escritor.write_table(pa.Table.from_arrays(colunas, schema=esquema), row_group_size=tamanho_lote)
+            linhas += len(lote)
+            if progresso:
+                progresso(linhas, os.path.getsize(caminho))
+        return linhas
+    finally:
+        if escritor is not None:
+            escritor.close()
+        cursor.close()
+
+
+def rmta_limpar_exportacoes(diretorio: str = EXPORTACAO_DIRETORIO, ttl: int = EXPORTACAO_TTL) -> int:
+    """
+    Apaga os arquivos exportados há mais de ttl segundos.
+
+    Args:
+        diretorio (str): Diretório das exportações
+        ttl (int): Idade máxima dos arquivos, em segundos
+
+    Returns:
+        int: Número de arquivos apagados
+    """
+    if not os.path.isdir(diretorio):
+        return 0
+    limite = time.time() - ttl
+    apagados = 0
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        try:
+            if nome.startswith("exportacao_") and os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+                apagados += 1
+        except OSError:
+            continue
+    return apagados
+
+
+def _copiar_resultado(
+    sql: str,
+    parametros: Optional[Dict[str, Any]],
+    formato: str,
+    caminho: str,
+    progresso: Optional[Callable[[int, int], None]],
+    tamanho_lote: int
+) -> int:
+    """
+    Abre uma conexão somente leitura e grava o resultado no arquivo, via um arquivo parcial.
+
+    Returns:
+        int: Número de linhas gravadas
+
+    Raises:
+        ErroExportacao: Se a conexão ou a cópia falharem (o arquivo parcial é apagado)
+    """
+    parcial = caminho + ".parcial"
+    try:
+        conexao = rmta_abrir_conexao_bd()
+    except Exception as e:
+        logger.error("Erro ao conectar ao banco de dados para exportação: %s", e)
+        rmta_incrementar_contador("sql_agent_exportacoes_total", rotulos={"formato": formato, "resultado": "erro"})
+        raise ErroExportacao("Falha na conexão com o banco de dados.") from e
+
+    try:
+        conexao.set_session(readonly=True)
+        if formato == "csv":
+            linhas = _exportar_csv(conexao, sql, parametros, parcial, progresso)
+        else:
+            linhas = _exportar_parquet(conexao, sql, parametros, parcial, progresso, tamanho_lote)
+        os.replace(parcial, caminho)
+        return linhas
+    except Exception as e:
+        logger.error("Erro ao exportar o resultado em %s: %s", formato, e)
+        rmta_incrementar_contador("sql_agent_exportacoes_total", rotulos={"formato": formato, "resultado": "erro"})
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise ErroExportacao(f"Erro ao exportar o resultado: {str(e)}") from e
+    finally:
+        conexao.close()
+
+
+def rmta_exportar_resultado(
+    sql: str,
+    parametros: Optional[Dict[str, Any]] = None,
+    formato: str = "csv",
+    progresso: Optional[Callable[[int, int], None]] = None,
+    diretorio: str = EXPORTACAO_DIRETORIO,
+    tamanho_lote: int = EXPORTACAO_TAMANHO_LOTE
+) -> Dict[str, Any]:
+    """
+    Executa o SQL validado e grava o resultado completo em um arquivo, em streaming.
+
+    Args:
+        sql (str): Consulta SQL validada (a mesma de estado["sql"])
+        parametros (Optional[Dict[str, Any]]): Valores dos parâmetros nomeados (%(nome)s) do SQL
+        formato (str): "csv" ou "parquet"
+        progresso (Optional[Callable[[int, int], None]]): Chamada com (linhas, bytes) gravados
+            até o momento, a cada lote
+        diretorio (str): Diretório onde o arquivo é criado
+        tamanho_lote (int): Linhas lidas do cursor por vez (Parquet)
+
+    Returns:
+        Dict[str, Any]: "caminho", "formato", "tipo_mime", "linhas", "bytes", "tempo"
+        e "espera_fila" (segundos aguardando a vaga de banco)
+
+    Raises:
+        ErroExportacao: Se o formato não for suportado, a cota de banco do inquilino
+            estiver esgotada ou a exportação falhar
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ErroExportacao(f"Formato de exportação não suportado: {formato}")
+
+    inicio = time.time()
+    os.makedirs(diretorio, exist_ok=True)
+    rmta_limpar_exportacoes(diretorio)
+    caminho = os.path.join(diretorio, f"exportacao_{uuid.uuid4().hex}.{formato}")
+    sql = sql.strip().rstrip(";").strip()
+
+    # A cópia ocupa o banco como uma execução do fluxo: vaga e tempo contam na cota do inquilino
+    medicao: Dict[str, Any] = {}
+    try:
+        with rmta_reservar(medicao, RECURSO_BD):
+            linhas = _copiar_resultado(sql, parametros, formato, caminho, progresso, tamanho_lote)
+    except ErroCotaExcedida as e:
+        logger.warning("Exportação recusada pelo escalonador: %s", e)
+        rmta_incrementar_contador("sql_agent_exportacoes_total", rotulos={"formato": formato, "resultado": "erro"})
+        raise ErroExportacao(str(e)) from e
+
+    tamanho = os.path.getsize(caminho)
+    tempo = time.time() - inicio
+    if progresso:
+        progresso(linhas, tamanho)
+    rmta_incrementar_contador("sql_agent_exportacoes_total", rotulos={"formato": formato, "resultado": "sucesso"})
+    logger.info("Resultado exportado em %s: %s linhas, %s bytes em %.4fs", formato, linhas, tamanho, tempo)
+    return {
+        "caminho": caminho,
+        "formato": formato,
+        "tipo_mime": FORMATOS_EXPORTACAO[formato],
+        "linhas": linhas,
+        "bytes": tamanho,
+        "tempo": tempo,
+        "espera_fila": medicao["tempo_execucao"]["espera_fila"]
+    }
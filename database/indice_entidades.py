@@ -0,0 +1,590 @@
+"""
+Índice em memória dos valores de entidades do banco de dados.
+
+Este módulo carrega os nomes de produtos, as categorias e os nomes de clientes
+para a memória e permite localizar rapidamente quais valores são mencionados
+em uma pergunta, por tokens exatos ou, com erros de digitação, por
+similaridade de trigramas. Ele é usado:
+
+- Pelo caminho rápido por templates, que resolve perguntas conhecidas sem chamar o LLM
+- Pela geração de SQL, que envia ao modelo apenas os valores mencionados na pergunta
+- Pela validação, que aponta literais do SQL que não correspondem a nenhum valor
+
+O índice é carregado em segundo plano, sem bloquear as perguntas, e a cada
+recarga só as colunas de tabelas alteradas são consultadas de novo. Colunas
+de alta cardinalidade guardam apenas os valores mais frequentes.
+
+Sob o supervisor de processos, o índice é carregado uma única vez e publicado
+em um instantâneo compartilhado, junto com a impressão digital do esquema; os
+processos de trabalho montam o índice a partir do instantâneo em vez de
+consultar o banco.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from config.configuracoes import (
+    INDICE_ENTIDADES_MAX_VALORES,
+    INDICE_ENTIDADES_SIMILARIDADE,
+    INDICE_ENTIDADES_TTL,
+    INDICE_ENTIDADES_VALORES_PROMPT
+)
+from database.esquema import ESQUEMA_BD
+from utils.instantaneo import InstantaneoMapeado
+from utils.metricas import rmta_incrementar_contador
+from utils.texto import rmta_tokenizar, rmta_trigramas
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+# Colunas indexadas: (tabela, coluna)
+COLUNAS_INDEXADAS = [
+    ("produtos", "nome"),
+    ("produtos", "categoria"),
+    ("clientes", "nome")
+]
+
+# Instantâneos publicados com outro esquema (outra versão do código) são ignorados
+IMPRESSAO_ESQUEMA = hashlib.sha256(ESQUEMA_BD.encode("utf-8")).hexdigest()[:16]
+
+# Tokens mais curtos só correspondem por igualdade ("tv" e "lg" têm poucos trigramas)
+_TAMANHO_MINIMO_APROXIMADO = 4
+
+# Valores mais frequentes primeiro, para que o limite por coluna mantenha os mais úteis
+_SQL_VALORES = (
+    "SELECT {coluna} FROM {tabela} WHERE {coluna} IS NOT NULL "
+    "GROUP BY {coluna} ORDER BY COUNT(*) DESC, {coluna} LIMIT %s"
+)
+
+# Versão de cada tabela: total de linhas inseridas, atualizadas e removidas desde a criação
+_SQL_VERSOES = (
+    "SELECT tabela, (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables "
+    "WHERE relid = to_regclass(tabela)) FROM unnest(%s::text[]) AS tabela"
+)
+
+
+class IndiceEntidades:
+    """
+    Índice de valores distintos de colunas de texto, consultável por tokens.
+
+    Attributes:
+        carregado_em (float): Instante do último carregamento (0 se nunca carregado)
+    """
+
+    def __init__(self):
+        self._tokens_por_valor: Dict[Tuple[str, str], Dict[str, Set[str]]] = {}
+        self._valores_por_token: Dict[Tuple[str, str], Dict[str, Set[str]]] = {}
+        self._tokens_por_trigrama: Dict[Tuple[str, str], Dict[str, Set[str]]] = {}
+        self._parciais: Set[Tuple[str, str]] = set()
+        self._versoes: Dict[Tuple[str, str], Any] = {}
+        self._trava = threading.Lock()
+        self.carregado_em = 0.0
+
+    def adicionar(self, tabela: str, coluna: str, valores: List[str], parcial: bool = False) -> None:
+        """
+        Substitui os valores indexados de uma coluna.
+
+        Apenas os INDICE_ENTIDADES_MAX_VALORES primeiros valores são indexados; a
+        coluna passa então a ser parcial, e a ausência de um valor nela não
+        significa que ele não exista no banco.
+
+        Args:
+            tabela (str): Nome da tabela
+            coluna (str): Nome da coluna
+            valores (List[str]): Valores distintos da coluna, os mais relevantes primeiro
+            parcial (bool): Se os valores já são apenas uma parte dos da coluna
+        """
+        valores = [valor for valor in valores if valor]
+        if len(valores) > INDICE_ENTIDADES_MAX_VALORES:
+            valores = valores[:INDICE_ENTIDADES_MAX_VALORES]
+            parcial = True
+
+        tokens_por_valor = {}
+        valores_por_token: Dict[str, Set[str]] = {}
+        for valor in valores:
+            tokens = set(rmta_tokenizar(valor))
+            tokens_por_valor[valor] = tokens
+            for token in tokens:
+                valores_por_token.setdefault(token, set()).add(valor)
+        tokens_por_trigrama: Dict[str, Set[str]] = {}
+        for token in valores_por_token:
+            for trigrama in rmta_trigramas(token):
+                tokens_por_trigrama.setdefault(trigrama, set()).add(token)
+
+        with self._trava:
+            self._tokens_por_valor[(tabela, coluna)] = tokens_por_valor
+            self._valores_por_token[(tabela, coluna)] = valores_por_token
+            self._tokens_por_trigrama[(tabela, coluna)] = tokens_por_trigrama
+            if parcial:
+                self._parciais.add((tabela, coluna))
+            else:
+                self._parciais.discard((tabela, coluna))
+
+    def carregar(self, conexao) -> None:
+        """
+        Carrega do banco os valores distintos das colunas indexadas cujas tabelas mudaram.
+
+        A versão de cada tabela vem dos contadores de pg_stat_user_tables; colunas
+        de tabelas sem alterações desde a última carga não são consultadas de novo.
+        Sem os contadores, todas as colunas são recarregadas.
+
+        Args:
+            conexao: Conexão com o PostgreSQL
+        """
+        inicio = time.time()
+        recarregadas = 0
+        cursor = conexao.cursor()
+        try:
+            versoes = _versoes_tabelas(conexao, cursor)
+            for tabela, coluna in COLUNAS_INDEXADAS:
+                versao = versoes.get(tabela)
+                if versao is not None and self._versoes.get((tabela, coluna)) == versao:
+                    continue
+                cursor.execute(_SQL_VALORES.format(tabela=tabela, coluna=coluna), (INDICE_ENTIDADES_MAX_VALORES + 1,))
+                self.adicionar(tabela, coluna, [linha[0] for linha in cursor.fetchall()])
+                self._versoes[(tabela, coluna)] = versao
+                recarregadas += 1
+        finally:
+            cursor.close()
+        self.carregado_em = time.time()
+        logger.info(
+            "Índice de entidades carregado em %.4fs (%s de %s colunas recarregadas)",
+            self.carregado_em - inicio, recarregadas, len(COLUNAS_INDEXADAS)
+        )
+
+    def buscar(self, tabela: str, coluna: str, texto: str) -> List[str]:
+        """
+        Retorna os valores da coluna mais bem representados no texto.
+
+        Os valores são pontuados pelo número de tokens em comum com o texto, e
+        apenas os de maior pontuação são retornados. Assim, "notebook" retorna
+        todos os notebooks, e "notebook dell" retorna apenas o da Dell.
+
+        Args:
+            tabela (str): Nome da tabela
+            coluna (str): Nome da coluna
+            texto (str): Trecho da pergunta que menciona a entidade
+
+        Returns:
+            List[str]: Valores originais encontrados, em ordem alfabética
+        """
+        tokens_texto = set(rmta_tokenizar(texto))
+        with self._trava:
+            valores_por_token = self._valores_por_token.get((tabela, coluna), {})
+            tokens_por_valor = self._tokens_por_valor.get((tabela, coluna), {})
+            candidatos = set()
+            for token in tokens_texto:
+                candidatos |= valores_por_token.get(token, set())
+            pontuacoes = {valor: len(tokens_por_valor[valor] & tokens_texto) for valor in candidatos}
+
+        if not pontuacoes:
+            return []
+        maior = max(pontuacoes.values())
+        return sorted(valor for valor, pontuacao in pontuacoes.items() if pontuacao == maior)
+
+    def buscar_aproximado(self, tabela: str, coluna: str, texto: str, limite: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Retorna os valores da coluna mencionados no texto, tolerando erros de digitação.
+
+        Cada token do texto corresponde ao token igual dos valores ou, se tiver ao
+        menos 4 caracteres, aos tokens com similaridade de trigramas de pelo menos
+        INDICE_ENTIDADES_SIMILARIDADE. Cada valor é pontuado pela soma das
+        similaridades dos seus tokens correspondidos.
+
+        Args:
+            tabela (str): Nome da tabela
+            coluna (str): Nome da coluna
+            texto (str): Pergunta ou trecho que menciona a entidade
+            limite (Optional[int]): Número máximo de valores retornados
+
+        Returns:
+            List[Tuple[str, float]]: (valor, pontuação), da maior pontuação para a menor
+        """
+        with self._trava:
+            valores_por_token = self._valores_por_token.get((tabela, coluna), {})
+            tokens_por_trigrama = self._tokens_por_trigrama.get((tabela, coluna), {})
+
+        correspondencias: Dict[str, float] = {}
+        for token in set(rmta_tokenizar(texto)):
+            if token in valores_por_token:
+                correspondencias[token] = 1.0
+            elif len(token) >= _TAMANHO_MINIMO_APROXIMADO:
+                for semelhante, similaridade in _tokens_semelhantes(tokens_por_trigrama, token):
+                    correspondencias[semelhante] = max(correspondencias.get(semelhante, 0.0), similaridade)
+
+        pontuacoes: Dict[str, float] = {}
+        for token, similaridade in correspondencias.items():
+            for valor in valores_por_token[token]:
+                pontuacoes[valor] = pontuacoes.get(valor, 0.0) + similaridade
+        ordenados = sorted(pontuacoes.items(), key=lambda item: (-item[1], item[0]))
+        return ordenados[:limite] if limite else ordenados
+
+    def corresponde(self, tabela: str, coluna: str, literal: str, padrao: bool = False,
+                    sem_caixa: bool = False, transformar: Optional[Callable[[str], str]] = None) -> Optional[bool]:
+        """
+        Indica se algum valor indexado da coluna é igual ao literal ou casa com o padrão LIKE.
+
+        Args:
+            tabela (str): Nome da tabela
+            coluna (str): Nome da coluna
+            literal (str): Literal comparado no SQL
+            padrao (bool): Se o literal é um padrão LIKE (% e _)
+            sem_caixa (bool): Se a comparação ignora maiúsculas e minúsculas (ILIKE)
+            transformar (Optional[Callable[[str], str]]): Função aplicada à coluna no SQL (LOWER/UPPER)
+
+        Returns:
+            Optional[bool]: None se a coluna não foi carregada ou está indexada só em parte
+        """
+        with self._trava:
+            tokens_por_valor = self._tokens_por_valor.get((tabela, coluna))
+            if not tokens_por_valor or (tabela, coluna) in self._parciais:
+                return None
+        valores = map(transformar, tokens_por_valor) if transformar else tokens_por_valor
+        if not padrao and not sem_caixa:
+            if transformar is None:
+                return literal in tokens_por_valor
+            return any(valor == literal for valor in valores)
+        expressao = re.compile(
+            _regex_like(literal) if padrao else re.escape(literal),
+            re.DOTALL | (re.IGNORECASE if sem_caixa else 0)
+        )
+        return any(expressao.fullmatch(valor) for valor in valores)
+
+    def exportar(self) -> Dict[str, List[str]]:
+        """
+        Exporta os valores indexados de cada coluna.
+
+        Returns:
+            Dict[str, List[str]]: Valores ordenados por "tabela.coluna"
+        """
+        with self._trava:
+            return {
+                f"{tabela}.{coluna}": sorted(tokens_por_valor)
+                for (tabela, coluna), tokens_por_valor in self._tokens_por_valor.items()
+            }
+
+    def parciais(self) -> List[str]:
+        """
+        Lista as colunas indexadas só em parte (com mais valores que o limite).
+
+        Returns:
+            List[str]: "tabela.coluna" das colunas parciais, ordenadas
+        """
+        with self._trava:
+            return sorted(f"{tabela}.{coluna}" for tabela, coluna in self._parciais)
+
+    def importar(self, colunas: Dict[str, List[str]], parciais: Optional[List[str]] = None) -> None:
+        """
+        Substitui os valores indexados pelos de uma exportação.
+
+        Args:
+            colunas (Dict[str, List[str]]): Valores por "tabela.coluna", como em exportar()
+            parciais (Optional[List[str]]): Colunas indexadas só em parte, como em parciais()
+        """
+        parciais = set(parciais or [])
+        for chave, valores in colunas.items():
+            tabela, coluna = chave.split(".", 1)
+            self.adicionar(tabela, coluna, valores, parcial=chave in parciais)
+        self.carregado_em = time.time()
+
+    def vazio(self) -> bool:
+        """Indica se nenhum valor foi indexado."""
+        with self._trava:
+            return not any(self._tokens_por_valor.values())
+
+
+def _versoes_tabelas(conexao, cursor) -> Dict[str, Any]:
+    """Versão de cada tabela indexada; vazio se as estatísticas não puderem ser lidas."""
+    tabelas = sorted({tabela for tabela, _ in COLUNAS_INDEXADAS})
+    try:
+        cursor.execute(_SQL_VERSOES, (tabelas,))
+        return {tabela: versao for tabela, versao in cursor.fetchall() if versao is not None}
+    except Exception as e:
+        logger.warning("Estatísticas das tabelas indisponíveis; recarregando todas as colunas: %s", e)
+        conexao.rollback()
+        return {}
+
+
+def _tokens_semelhantes(tokens_por_trigrama: Dict[str, Set[str]], token: str) -> List[Tuple[str, float]]:
+    """Tokens do índice com similaridade de trigramas (Jaccard) acima do limiar."""
+    trigramas = rmta_trigramas(token)
+    comuns: Dict[str, int] = {}
+    for trigrama in trigramas:
+        for candidato in tokens_por_trigrama.get(trigrama, ()):
+            comuns[candidato] = comuns.get(candidato, 0) + 1
+    semelhantes = []
+    for candidato, quantidade in comuns.items():
+        similaridade = quantidade / (len(trigramas) + len(rmta_trigramas(candidato)) - quantidade)
+        if similaridade >= INDICE_ENTIDADES_SIMILARIDADE:
+            semelhantes.append((candidato, similaridade))
+    return semelhantes
+
+
+def _regex_like(padrao: str) -> str:
+    """Converte um padrão LIKE do PostgreSQL (% e _, com \\ como escape) em expressão regular."""
+    partes = []
+    escapado = False
+    for caractere in padrao:
+        if escapado:
+            partes.append(re.escape(caractere))
+            escapado = False
+        elif caractere == "\\":
+            escapado = True
+        elif caractere == "%":
+            partes.append(".*")
+        elif caractere == "_":
+            partes.append(".")
+        else:
+            partes.append(re.escape(caractere))
+    return "".join(partes)
+
+
+_indice = IndiceEntidades()
+_trava_carga = threading.Lock()
+_carga: Optional[threading.Thread] = None
+_instantaneo: Optional[InstantaneoMapeado] = None
+_versao_instantaneo: Optional[float] = None
+
+
+def rmta_exportar_instantaneo() -> Dict[str, Any]:
+    """
+    Monta o instantâneo do esquema e do índice de entidades para os processos de trabalho.
+
+    Aguarda o carregamento do índice, se ele estiver vencido.
+
+    Returns:
+        Dict[str, Any]: "versao", "impressao_esquema", "esquema", "entidades" e "entidades_parciais"
+    """
+    indice = rmta_obter_indice_entidades(aguardar=True)
+    return {
+        "versao": indice.carregado_em,
+        "impressao_esquema": IMPRESSAO_ESQUEMA,
+        "esquema": ESQUEMA_BD,
+        "entidades": indice.exportar(),
+        "entidades_parciais": indice.parciais()
+    }
+
+
+def rmta_usar_instantaneo_compartilhado(caminho: Optional[str]) -> None:
+    """
+    Passa a montar o índice a partir do instantâneo publicado pelo supervisor.
+
+    Args:
+        caminho (Optional[str]): Arquivo do instantâneo; None volta a carregar do banco
+    """
+    global _instantaneo, _versao_instantaneo
+    with _trava_carga:
+        if _instantaneo is not None:
+            _instantaneo.fechar()
+        _instantaneo = InstantaneoMapeado(caminho) if caminho else None
+        _versao_instantaneo = None
+
+
+def _atualizar_do_instantaneo() -> bool:
+    """
+    Atualiza o índice a partir do instantâneo compartilhado, se houver uma versão nova.
+
+    Returns:
+        bool: True se o índice está em dia com um instantâneo compatível
+    """
+    global _versao_instantaneo
+    try:
+        dados = _instantaneo.ler()
+    except Exception as e:
+        logger.warning("Erro ao ler o instantâneo compartilhado: %s", e)
+        return False
+    if dados is None:
+        return False
+    if dados.get("impressao_esquema") != IMPRESSAO_ESQUEMA:
+        logger.warning("Instantâneo compartilhado com outro esquema; carregando o índice do banco")
+        return False
+    if dados["versao"] != _versao_instantaneo:
+        with _trava_carga:
+            if dados["versao"] != _versao_instantaneo:
+                _indice.importar(dados["entidades"], dados.get("entidades_parciais"))
+                _versao_instantaneo = dados["versao"]
+                logger.info("Índice de entidades atualizado a partir do instantâneo compartilhado")
+    return True
+
+
+def _carregar_do_banco() -> None:
+    """Carrega (ou atualiza) o índice a partir do banco; executado em segundo plano."""
+    from database.conexao import rmta_obter_conexao_bd
+
+    conexao = rmta_obter_conexao_bd()
+    if not conexao:
+        # Evitar uma tentativa de conexão a cada pergunta; tentar de novo após o TTL
+        logger.warning("Índice de entidades não carregado: banco de dados indisponível")
+        _indice.carregado_em = time.time()
+        return
+    try:
+        _indice.carregar(conexao)
+    except Exception as e:
+        logger.error("Erro ao carregar o índice de entidades: %s", e)
+        _indice.carregado_em = time.time()
+    finally:
+        conexao.close()
+
+
+def _iniciar_carga() -> threading.Thread:
+    """Inicia a carga do índice em segundo plano, se ainda não houver uma em andamento."""
+    global _carga
+    with _trava_carga:
+        if _carga is None or not _carga.is_alive():
+            _carga = threading.Thread(target=_carregar_do_banco, name="sql_agent_indice_entidades", daemon=True)
+            _carga.start()
+        return _carga
+
+
+def rmta_obter_indice_entidades(aguardar: bool = False) -> IndiceEntidades:
+    """
+    Retorna o índice de entidades, iniciando sua carga em segundo plano se estiver vencido.
+
+    As perguntas não esperam pela carga: até ela terminar, usam o índice atual
+    (vazio na primeira carga, quando seguem para os níveis com LLM). Se o banco
+    não estiver acessível, o índice atual é mantido. Com um instantâneo
+    compartilhado configurado, o índice vem dele enquanto for compatível.
+
+    Args:
+        aguardar (bool): Se deve esperar a carga terminar (publicação do instantâneo)
+
+    Returns:
+        IndiceEntidades: Índice compartilhado do processo
+    """
+    if _instantaneo is not None and _atualizar_do_instantaneo():
+        return _indice
+
+    if time.time() - _indice.carregado_em >= INDICE_ENTIDADES_TTL:
+        carga = _iniciar_carga()
+        if aguardar:
+            carga.join()
+    return _indice
+
+
+def rmta_valores_mencionados(texto: str, limite: int = INDICE_ENTIDADES_VALORES_PROMPT) -> Dict[str, List[str]]:
+    """
+    Localiza em cada coluna indexada os valores mencionados em uma pergunta.
+
+    Apenas os valores de maior pontuação de cada coluna são retornados, para
+    que o prompt receba os valores relevantes e não a coluna inteira.
+
+    Args:
+        texto (str): Pergunta do usuário
+        limite (int): Número máximo de valores por coluna (0 desliga a busca)
+
+    Returns:
+        Dict[str, List[str]]: Valores por "tabela.coluna", só das colunas com correspondência
+    """
+    if limite <= 0:
+        return {}
+    indice = rmta_obter_indice_entidades()
+    mencionados = {}
+    for tabela, coluna in COLUNAS_INDEXADAS:
+        encontrados = indice.buscar_aproximado(tabela, coluna, texto)
+        if encontrados:
+            maior = encontrados[0][1]
+            mencionados[f"{tabela}.{coluna}"] = [valor for valor, pontuacao in encontrados if pontuacao == maior][:limite]
+    return mencionados
+
+
+# Tabela de FROM/JOIN (ou da lista após a vírgula) com o apelido opcional
+_RE_TABELA = re.compile(r"(?:\bFROM|\bJOIN|,)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+
+# Comparação de uma coluna (opcionalmente em LOWER/UPPER) com literais: =, LIKE, ILIKE ou IN (...)
+_RE_COMPARACAO = re.compile(
+    r"(?:\b(LOWER|UPPER)\s*\(\s*)?(?:\b(\w+)\.)?\b(\w+)\s*\)?\s*(=|\bI?LIKE\b|\bIN\b)\s*(\(\s*'.*?\)|'(?:[^']|'')*')",
+    re.IGNORECASE | re.DOTALL
+)
+_RE_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+
+# Palavras que podem seguir o nome da tabela sem serem um apelido
+_PALAVRAS_APOS_TABELA = {
+    "on", "using", "where", "join", "inner", "left", "right", "full", "cross", "natural",
+    "group", "order", "having", "limit", "offset", "union", "except", "intersect", "tablesample"
+}
+
+
+def _tabelas_da_consulta(sql: str) -> Dict[str, str]:
+    """Tabelas indexadas referenciadas no SQL, por nome e por apelido."""
+    tabelas_indexadas = {tabela for tabela, _ in COLUNAS_INDEXADAS}
+    tabelas = {}
+    for tabela, apelido in _RE_TABELA.findall(sql):
+        tabela = tabela.lower()
+        if tabela not in tabelas_indexadas:
+            continue
+        tabelas[tabela] = tabela
+        if apelido and apelido.lower() not in _PALAVRAS_APOS_TABELA:
+            tabelas[apelido.lower()] = tabela
+    return tabelas
+
+
+def rmta_colunas_indexadas_da_consulta(sql: str) -> List[Tuple[str, str]]:
+    """
+    Lista as colunas indexadas das tabelas referenciadas no SQL.
+
+    Args:
+        sql (str): Consulta SQL
+
+    Returns:
+        List[Tuple[str, str]]: (tabela, coluna) na ordem de COLUNAS_INDEXADAS
+    """
+    tabelas = set(_tabelas_da_consulta(sql).values())
+    return [(tabela, coluna) for tabela, coluna in COLUNAS_INDEXADAS if tabela in tabelas]
+
+
+def rmta_literais_sem_correspondencia(sql: str) -> List[Dict[str, Any]]:
+    """
+    Aponta os literais comparados a colunas indexadas que não correspondem a nenhum valor.
+
+    São verificadas as comparações por =, LIKE, ILIKE e IN com literais de texto;
+    colunas não carregadas ou indexadas só em parte não são verificadas. Um
+    literal sem correspondência costuma produzir um resultado vazio (ex.:
+    'Eletronicos' em vez de 'Eletrônicos').
+
+    Args:
+        sql (str): Consulta SQL gerada
+
+    Returns:
+        List[Dict[str, Any]]: "coluna" (tabela.coluna), "literal" e "sugestoes" de cada literal sem correspondência
+    """
+    tabelas = _tabelas_da_consulta(sql)
+    if not tabelas:
+        return []
+    colunas_indexadas = set(COLUNAS_INDEXADAS)
+    indice = rmta_obter_indice_entidades()
+
+    sem_correspondencia = []
+    for funcao, apelido, coluna, operador, literais in _RE_COMPARACAO.findall(sql):
+        coluna = coluna.lower()
+        if apelido:
+            tabela = tabelas.get(apelido.lower())
+        else:
+            candidatas = {tabela for tabela in tabelas.values() if (tabela, coluna) in colunas_indexadas}
+            tabela = candidatas.pop() if len(candidatas) == 1 else None
+        if tabela is None or (tabela, coluna) not in colunas_indexadas:
+            continue
+
+        operador = operador.upper()
+        transformar = {"LOWER": str.lower, "UPPER": str.upper}.get(funcao.upper())
+        for literal in _RE_LITERAL.findall(literais):
+            literal = literal.replace("''", "'")
+            if not literal.strip("%_ "):
+                continue
+            encontrado = indice.corresponde(
+                tabela, coluna, literal, padrao=operador.endswith("LIKE"),
+                sem_caixa=operador == "ILIKE", transformar=transformar
+            )
+            if encontrado is False:
+                termo = literal.replace("%", " ").replace("_", " ")
+                sem_correspondencia.append({
+                    "coluna": f"{tabela}.{coluna}",
+                    "literal": literal,
+                    "sugestoes": [valor for valor, _ in indice.buscar_aproximado(tabela, coluna, termo, limite=3)]
+                })
+    if sem_correspondencia:
+        rmta_incrementar_contador("sql_agent_literais_sem_correspondencia_total", len(sem_correspondencia))
+        logger.warning("Literais do SQL sem correspondência no banco: %s", sem_correspondencia)
+    return sem_correspondencia
@@ -0,0 +1,134 @@
+"""
+Normalização de consultas SQL em parâmetros e impressão digital.
+
+Este módulo transforma o SQL gerado (que embute literais, como
+`nome ILIKE '%Notebook%'`) em uma forma canônica com parâmetros posicionais
+($1, $2, ...) e a lista de valores correspondente. Consultas com o mesmo
+formato e literais diferentes produzem o mesmo texto normalizado e a mesma
+impressão digital, o que permite reutilizar declarações preparadas e planos.
+"""
+import hashlib
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Tokens léxicos do SQL, na ordem em que são reconhecidos
+PADRAO_TOKENS_SQL = re.compile(
+    r"(?P<comentario>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<identificador_citado>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<texto>'(?:[^']|'')*')"
+    r"|(?P<parametro>%\((?P<nome>\w+)\)s)"
+    r"|(?P<percentual>%%)"
+    r"|(?P<dolar>\$\w*\$|\$\d+)"
+    r"|(?P<palavra>[A-Za-z_][A-Za-z0-9_$]*)"
+    r"|(?P<numero>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<operador><=|>=|<>|!=|::|[=<>(),])"
+    r"|(?P<espaco>\s+)"
+    r"|(?P<outro>.)",
+    re.DOTALL
+)
+
+# Tokens após os quais um literal é certamente um valor com tipo inferível pelo PostgreSQL.
+# Fora dessas posições os literais são mantidos: ORDER BY 1 é uma posição de coluna,
+# INTERVAL '30 days' é uma constante tipada e SELECT 'x' não teria tipo definido.
+ANTECESSORES_VALOR = {"=", "<>", "!=", "<", ">", "<=", ">=", "like", "ilike", "limit", "offset", "between"}
+
+
+class ConsultaNormalizada(NamedTuple):
+    """
+    Consulta SQL na forma canônica.
+
+    Attributes:
+        sql (str): SQL com parâmetros posicionais ($1, $2, ...)
+        valores (List[Any]): Valores dos parâmetros, na ordem das posições
+        impressao_digital (str): Hash do formato da consulta (independe dos literais)
+    """
+    sql: str
+    valores: List[Any]
+    impressao_digital: str
+
+
+def _converter_numero(texto: str) -> Any:
+    """Converte um literal numérico sem perder precisão."""
+    if re.fullmatch(r"\d+", texto):
+        return int(texto)
+    return Decimal(texto)
+
+
+def rmta_normalizar_sql(sql: str, parametros: Optional[Dict[str, Any]] = None) -> Optional[ConsultaNormalizada]:
+    """
+    Extrai os literais de uma consulta para parâmetros posicionais.
+
+    Parâmetros nomeados já existentes (%(nome)s) também são convertidos em
+    posições. Literais de texto e números são extraídos apenas em comparações,
+    LIKE/ILIKE, LIMIT/OFFSET, BETWEEN e listas IN, onde são certamente valores.
+
+    Args:
+        sql (str): Consulta SQL original
+        parametros (Optional[Dict[str, Any]]): Valores dos parâmetros nomeados da consulta
+
+    Returns:
+        Optional[ConsultaNormalizada]: Consulta normalizada, ou None se a consulta usa
+        construções que não são normalizadas (strings com escape ou dollar-quoting)
+    """
+    parametros = parametros or {}
+    partes: List[str] = []
+    valores: List[Any] = []
+    posicoes_nomeadas: Dict[str, int] = {}
+    anterior = ""
+    fim_anterior = -1
+    aguardando_and = False
+    pilha_in: List[bool] = []
+
+    for correspondencia in PADRAO_TOKENS_SQL.finditer(sql):
+        tipo = correspondencia.lastgroup
+        token = correspondencia.group()
+
+        if tipo in ("comentario", "espaco"):
+            partes.append(" ")
+            continue
+        if tipo == "dolar":
+            return None
+
+        em_posicao_valor = (
+            anterior in ANTECESSORES_VALOR
+            or (bool(pilha_in) and pilha_in[-1] and anterior in ("(", ","))
+            or (anterior == "and" and aguardando_and)
+        )
+        if tipo == "texto":
+            if anterior == "e" and fim_anterior == correspondencia.start():
+                # String com escape (E'...'): semântica diferente das strings padrão
+                return None
+            if em_posicao_valor:
+                valores.append(token[1:-1].replace("''", "'"))
+                token = f"${len(valores)}"
+        elif tipo == "parametro":
+            nome = correspondencia.group("nome")
+            if nome not in parametros:
+                raise KeyError(f"Parâmetro sem valor: {nome}")
+            if nome not in posicoes_nomeadas:
+                valores.append(parametros[nome])
+                posicoes_nomeadas[nome] = len(valores)
+            token = f"${posicoes_nomeadas[nome]}"
+        elif tipo == "percentual" and parametros:
+            token = "%"
+        elif tipo == "numero":
+            if em_posicao_valor:
+                valores.append(_converter_numero(token))
+                token = f"${len(valores)}"
+        elif token == "(":
+            pilha_in.append(anterior == "in")
+        elif token == ")" and pilha_in:
+            pilha_in.pop()
+
+        partes.append(token)
+        if anterior == "and":
+            aguardando_and = False
+        anterior = correspondencia.group().lower()
+        fim_anterior = correspondencia.end()
+        if anterior == "between":
+            aguardando_and = True
+
+    texto = " ".join("".join(partes).split())
+    impressao_digital = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+    return ConsultaNormalizada(texto, valores, impressao_digital)
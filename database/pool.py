@@ -0,0 +1,147 @@
+"""
+Pool de conexões com o banco de dados PostgreSQL.
+
+Este módulo mantém conexões abertas para reutilização entre consultas,
+evitando o custo de abrir uma conexão (e perder as declarações preparadas)
+a cada pergunta. As conexões são entregues envoltas em um proxy cujo
+close() devolve a conexão ao pool, de modo que o código existente, que
+sempre fecha a conexão ao terminar, continua correto.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from psycopg2 import extensions
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+
+class ErroPoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera do pool."""
+
+
+class _EntradaPool:
+    """Conexão física do pool e as declarações preparadas nela."""
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.declaracoes_preparadas: "OrderedDict[str, str]" = OrderedDict()
+
+
+class ConexaoPool:
+    """
+    Proxy de uma conexão emprestada do pool.
+
+    Repassa todos os atributos para a conexão do psycopg2, exceto close(),
+    que devolve a conexão ao pool em vez de fechá-la.
+
+    Attributes:
+        declaracoes_preparadas (OrderedDict[str, str]): Declarações preparadas na
+            conexão física, por impressão digital da consulta (em ordem de uso)
+    """
+
+    def __init__(self, pool: "PoolConexoes", entrada: _EntradaPool):
+        self._pool = pool
+        self._entrada = entrada
+
+    @property
+    def declaracoes_preparadas(self) -> "OrderedDict[str, str]":
+        return self._entrada.declaracoes_preparadas
+
+    def __getattr__(self, nome):
+        if self._entrada is None:
+            raise AttributeError(f"Conexão já devolvida ao pool (atributo {nome})")
+        return getattr(self._entrada.conexao, nome)
+
+    def close(self) -> None:
+        """Devolve a conexão ao pool. Chamadas repetidas não têm efeito."""
+        if self._entrada is not None:
+            entrada, self._entrada = self._entrada, None
+            self._pool.devolver(entrada)
+
+
+class PoolConexoes:
+    """
+    Pool de conexões limitado, seguro para uso por várias threads.
+
+    Args:
+        fabrica (Callable): Função que abre uma nova conexão física
+        tamanho (int): Número máximo de conexões abertas ao mesmo tempo
+        timeout (float): Segundos aguardando uma conexão livre antes de falhar
+    """
+
+    def __init__(self, fabrica: Callable, tamanho: int, timeout: float):
+        self._fabrica = fabrica
+        self._timeout = timeout
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._trava = threading.Lock()
+        self._livres: List[_EntradaPool] = []
+
+    def obter(self) -> ConexaoPool:
+        """
+        Empresta uma conexão livre, abrindo uma nova se necessário.
+
+        Returns:
+            ConexaoPool: Proxy da conexão; close() a devolve ao pool
+
+        Raises:
+            ErroPoolEsgotado: Se nenhuma conexão ficar livre dentro do timeout
+            Exception: Erros do psycopg2 ao abrir uma nova conexão
+        """
+        if not self._vagas.acquire(timeout=self._timeout):
+            raise ErroPoolEsgotado(f"Nenhuma conexão livre após {self._timeout}s")
+        try:
+            with self._trava:
+                entrada: Optional[_EntradaPool] = self._livres.pop() if self._livres else None
+            if entrada is None:
+                entrada = _EntradaPool(self._fabrica())
+                logger.info("Conexão com o banco de dados estabelecida com sucesso")
+            return ConexaoPool(self, entrada)
+        except Exception:
+            self._vagas.release()
+            raise
+
+    def devolver(self, entrada: _EntradaPool) -> None:
+        """
+        Recebe uma conexão de volta, descartando-a se estiver quebrada.
+
+        Transações deixadas abertas são desfeitas. As declarações preparadas
+        sobrevivem ao ROLLBACK e continuam disponíveis para o próximo uso.
+
+        Args:
+            entrada (_EntradaPool): Conexão física devolvida
+        """
+        try:
+            conexao = entrada.conexao
+            utilizavel = not conexao.closed
+            if utilizavel:
+                status = conexao.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    utilizavel = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conexao.rollback()
+        except Exception as e:
+            logger.warning("Descartando conexão do pool: %s", e)
+            utilizavel = False
+
+        if utilizavel:
+            with self._trava:
+                self._livres.append(entrada)
+        else:
+            try:
+                entrada.conexao.close()
+            except Exception:
+                pass
+        self._vagas.release()
+
+    def fechar(self) -> None:
+        """Fecha todas as conexões livres do pool."""
+        with self._trava:
+            livres, self._livres = self._livres, []
+        for entrada in livres:
+            try:
+                entrada.conexao.close()
+            except Exception:
+                pass
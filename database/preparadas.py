@@ -0,0 +1,133 @@
+"""
+Execução de consultas por declarações preparadas no servidor.
+
+Este módulo executa as consultas na forma normalizada (literais extraídos
+para parâmetros) usando PREPARE/EXECUTE do PostgreSQL. A declaração de cada
+formato de consulta é preparada uma única vez por conexão do pool; execuções
+seguintes do mesmo formato, com quaisquer valores, pulam a análise e o
+planejamento. A taxa de acerto desse cache é exportada nas métricas.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from config.configuracoes import BD_MAX_DECLARACOES_PREPARADAS
+from database.decodificacao import rmta_registrar_decodificadores
+from database.normalizacao_sql import ConsultaNormalizada, rmta_normalizar_sql
+from database.pool import ConexaoPool
+from utils.metricas import rmta_definir_medidor, rmta_incrementar_contador, rmta_obter_contador
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+METRICA_CACHE_PLANOS = "sql_agent_cache_planos_total"
+
+
+def _registrar_cache(resultado: str) -> None:
+    """Atualiza o contador do cache de planos e a taxa de acerto."""
+    rmta_incrementar_contador(METRICA_CACHE_PLANOS, rotulos={"resultado": resultado})
+    acertos = rmta_obter_contador(METRICA_CACHE_PLANOS, {"resultado": "acerto"})
+    total = acertos + rmta_obter_contador(METRICA_CACHE_PLANOS, {"resultado": "falha"})
+    if total:
+        rmta_definir_medidor("sql_agent_cache_planos_taxa_acerto", acertos / total)
+
+
+def rmta_obter_taxa_acerto_planos() -> Optional[float]:
+    """
+    Retorna a fração de execuções que reutilizaram uma declaração já preparada.
+
+    Returns:
+        Optional[float]: Taxa de acerto, ou None se nada foi executado por PREPARE
+    """
+    acertos = rmta_obter_contador(METRICA_CACHE_PLANOS, {"resultado": "acerto"})
+    total = acertos + rmta_obter_contador(METRICA_CACHE_PLANOS, {"resultado": "falha"})
+    return acertos / total if total else None
+
+
+def _executar_direto(cursor, sql: str, parametros: Optional[Dict[str, Any]]) -> None:
+    """Executa a consulta original, sem declaração preparada."""
+    cursor.execute(sql, parametros or None)
+
+
+def rmta_executar_consulta(conexao, sql: str, parametros: Optional[Dict[str, Any]] = None) -> Tuple[List[Any], List[tuple]]:
+    """
+    Executa uma consulta, reutilizando a declaração preparada do seu formato.
+
+    Conexões que não vêm do pool (sem cache de declarações) e consultas que não
+    podem ser normalizadas ou preparadas são executadas diretamente.
+
+    Args:
+        conexao: Conexão com o PostgreSQL (de preferência, emprestada do pool)
+        sql (str): Consulta SQL validada
+        parametros (Optional[Dict[str, Any]]): Valores dos parâmetros nomeados (%(nome)s)
+
+    Returns:
+        Tuple[List[Any], List[tuple]]: cursor.description (nome e OID do tipo de cada
+        coluna) e linhas retornadas
+
+    Raises:
+        psycopg2.Error: Se a execução da consulta falhar
+    """
+    normalizada = rmta_normalizar_sql(sql, parametros) if isinstance(conexao, ConexaoPool) else None
+
+    cursor = conexao.cursor()
+    rmta_registrar_decodificadores(cursor)
+    try:
+        if normalizada is None:
+            _executar_direto(cursor, sql, parametros)
+        else:
+            declaracoes = conexao.declaracoes_preparadas
+            nome = declaracoes.get(normalizada.impressao_digital)
+            if nome is not None:
+                declaracoes.move_to_end(normalizada.impressao_digital)
+                _registrar_cache("acerto")
+            else:
+                nome = _preparar(conexao, cursor, normalizada)
+            if nome is None:
+                _executar_direto(cursor, sql, parametros)
+            else:
+                marcadores = ", ".join(["%s"] * len(normalizada.valores))
+                cursor.execute(f"EXECUTE {nome}" + (f" ({marcadores})" if marcadores else ""), normalizada.valores)
+
+        descricao = list(cursor.description or [])
+        linhas = cursor.fetchall() if descricao else []
+        return descricao, linhas
+    finally:
+        cursor.close()
+
+
+def _preparar(conexao: ConexaoPool, cursor, normalizada: ConsultaNormalizada) -> Optional[str]:
+    """
+    Prepara a declaração de um formato de consulta na conexão.
+
+    Mantém no máximo BD_MAX_DECLARACOES_PREPARADAS por conexão, liberando as
+    usadas há mais tempo com DEALLOCATE.
+
+    Args:
+        conexao (ConexaoPool): Conexão do pool onde a declaração será preparada
+        cursor: Cursor aberto na conexão
+        normalizada (ConsultaNormalizada): Consulta na forma canônica
+
+    Returns:
+        Optional[str]: Nome da declaração, ou None se o PostgreSQL não conseguiu
+        prepará-la (por exemplo, tipo de parâmetro indeterminado)
+    """
+    declaracoes = conexao.declaracoes_preparadas
+    nome = f"rmta_{normalizada.impressao_digital}"
+    try:
+        cursor.execute(f"PREPARE {nome} AS {normalizada.sql}")
+    except psycopg2.Error as e:
+        # A transação abortada precisa ser desfeita antes da execução direta
+        conexao.rollback()
+        logger.debug("Consulta não preparada (%s): %s", normalizada.impressao_digital, e)
+        _registrar_cache("nao_preparavel")
+        return None
+
+    _registrar_cache("falha")
+    declaracoes[normalizada.impressao_digital] = nome
+    while len(declaracoes) > BD_MAX_DECLARACOES_PREPARADAS:
+        _, antiga = declaracoes.popitem(last=False)
+        cursor.execute(f"DEALLOCATE {antiga}")
+    logger.debug("Declaração %s preparada: %.100s", nome, normalizada.sql)
+    return nome
@@ -0,0 +1,161 @@
+"""
+Testes unitários para o modo aproximado (amostragem com TABLESAMPLE).
+
+Este módulo contém testes para a análise de elegibilidade, a reescrita do
+SQL, a escala das estimativas com intervalos de confiança e a execução
+aproximada no nó de execução.
+"""
+import math
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from agent.estado import EstadoAgente
+from agent.fluxo_trabalho import rmta_refazer_exato
+from agent.nos import rmta_executar_sql
+from database.amostragem import (
+    Agregado,
+    PlanoAmostragem,
+    rmta_ajustar_estimativas,
+    rmta_analisar_agregacao,
+    rmta_escolher_percentual,
+    rmta_reescrever_com_amostra
+)
+
+SQL_GASTO = (
+    "SELECT c.nome, SUM(t.valor_total) AS total, COUNT(*) FROM transacoes t "
+    "JOIN clientes c ON c.id = t.cliente_id GROUP BY c.nome ORDER BY total DESC;"
+)
+
+
+class TesteAnaliseAgregacao(unittest.TestCase):
+    """Testes para a elegibilidade e a reescrita das consultas."""
+
+    def test_reescrita_com_apelido_e_juncao(self):
+        """Testa se o TABLESAMPLE entra após o apelido e as colunas auxiliares antes do FROM."""
+        analise, motivo = rmta_analisar_agregacao(SQL_GASTO)
+        self.assertIsNone(motivo)
+        self.assertEqual(analise.tabela, "transacoes")
+        self.assertEqual([a.coluna for a in analise.agregados], ["total", "count"])
+
+        sql = rmta_reescrever_com_amostra(analise, 2, "SYSTEM", semente=7)
+        self.assertIn("FROM transacoes t TABLESAMPLE SYSTEM (2) REPEATABLE (7) JOIN clientes c", sql)
+        self.assertIn('COUNT(*), SUM((t.valor_total)::float8 * (t.valor_total)::float8) AS "__rmta_q0"\nFROM', sql)
+        self.assertTrue(sql.endswith("ORDER BY total DESC"))
+
+    def test_media_com_esquema_e_parametros(self):
+        """Testa AVG (desvio padrão e contagem auxiliares), esquema e parâmetros nomeados."""
+        analise, _ = rmta_analisar_agregacao(
+            "SELECT AVG(valor_total) media FROM public.transacoes WHERE data_transacao > %(desde)s"
+        )
+        sql = rmta_reescrever_com_amostra(analise, 0.5, "BERNOULLI")
+        self.assertIn('STDDEV_SAMP((valor_total)::float8) AS "__rmta_dp0", COUNT(valor_total) AS "__rmta_n0"', sql)
+        self.assertIn("FROM public.transacoes TABLESAMPLE BERNOULLI (0.5) WHERE data_transacao > %(desde)s", sql)
+
+    def test_consultas_inelegiveis(self):
+        """Testa se agregações não estimáveis e construções não suportadas são recusadas."""
+        casos = {
+            "SELECT MAX(valor_total) FROM transacoes": "MAX",
+            "SELECT COUNT(DISTINCT cliente_id) FROM transacoes": "DISTINCT",
+            "SELECT ROUND(SUM(valor_total), 2) FROM transacoes": "expressão",
+            "SELECT c.nome, SUM(t.valor_total) FROM clientes c LEFT JOIN transacoes t ON t.cliente_id = c.id GROUP BY c.nome": "externa",
+            "SELECT cliente_id, SUM(valor_total) FROM transacoes GROUP BY cliente_id HAVING SUM(valor_total) > 100": "HAVING",
+            "SELECT * FROM transacoes": "agregações",
+            "SELECT COUNT(*) FROM produtos": "amostrável",
+            "SELECT COUNT(*) FROM transacoes WHERE cliente_id IN (SELECT id FROM clientes)": "subconsultas"
+        }
+        for sql, trecho in casos.items():
+            analise, motivo = rmta_analisar_agregacao(sql)
+            self.assertIsNone(analise, sql)
+            self.assertIn(trecho, motivo)
+
+    @patch('database.amostragem.AMOSTRAGEM_LINHAS_MINIMAS', 1000000)
+    @patch('database.amostragem.AMOSTRAGEM_LINHAS_ALVO', 200000)
+    def test_percentual_pelo_tamanho_da_tabela(self):
+        """Testa se tabelas pequenas são lidas por inteiro e as grandes têm a amostra do tamanho alvo."""
+        self.assertIsNone(rmta_escolher_percentual(None))
+        self.assertIsNone(rmta_escolher_percentual(500000))
+        self.assertAlmostEqual(rmta_escolher_percentual(10000000), 2.0)
+        self.assertEqual(rmta_escolher_percentual(1e12), 0.01)
+
+
+class TesteEstimativas(unittest.TestCase):
+    """Testes para a escala das agregações e os intervalos de confiança."""
+
+    def test_escala_e_intervalos(self):
+        """Testa COUNT e SUM divididos pela fração amostrada e AVG mantido."""
+        plano = PlanoAmostragem("", "transacoes", "SYSTEM", 10.0, 1e7, [
+            Agregado("sum", "valor", "total"), Agregado("count", "*", "count"), Agregado("avg", "valor", "media")
+        ])
+        registros = [{
+            "nome": "Ana", "total": Decimal("1000.00"), "count": 100, "media": Decimal("10.00"),
+            "__rmta_q0": 20000.0, "__rmta_dp2": 2.0, "__rmta_n2": 100
+        }]
+        ajustados, intervalos = rmta_ajustar_estimativas(registros, plano, confianca=0.95)
+
+        self.assertEqual(ajustados, [{"nome": "Ana", "total": Decimal("10000.00"), "count": 1000, "media": Decimal("10.00")}])
+        margem_soma = 1.959964 * math.sqrt(20000 * 0.9) / 0.1
+        inferior, superior = intervalos[0]["total"]
+        self.assertAlmostEqual(float(inferior), 10000 - margem_soma, places=1)
+        self.assertAlmostEqual(float(superior), 10000 + margem_soma, places=1)
+        self.assertEqual(intervalos[0]["count"][0], 1000 - round(1.959964 * math.sqrt(90) / 0.1))
+        margem_media = 1.959964 * 2.0 * math.sqrt(0.9 / 100)
+        self.assertAlmostEqual(float(intervalos[0]["media"][1]), 10 + margem_media, places=2)
+
+    def test_valores_nulos(self):
+        """Testa se agregações sem valor ficam sem estimativa e sem intervalo."""
+        plano = PlanoAmostragem("", "transacoes", "SYSTEM", 1.0, 1e8, [Agregado("sum", "valor", "sum")])
+        ajustados, intervalos = rmta_ajustar_estimativas([{"sum": None, "__rmta_q0": None}], plano)
+        self.assertEqual((ajustados, intervalos), ([{"sum": None}], [{"sum": None}]))
+
+
+class TesteExecucaoAproximada(unittest.TestCase):
+    """Testes para a execução no modo aproximado."""
+
+    def _criar_estado(self, sql, aproximado=True):
+        return EstadoAgente(
+            consulta="Quanto foi vendido?",
+            sql=sql,
+            validacao={"is_valid": True, "message": "Consulta válida"},
+            resultados=None,
+            erro=None,
+            tempo_execucao={},
+            modo_aproximado=aproximado
+        )
+
+    @patch('database.amostragem.rmta_estimar_linhas_tabela', return_value=1e7)
+    @patch('agent.nos.rmta_executar_no_banco')
+    def test_consulta_elegivel_executada_na_amostra(self, mock_executar, _):
+        """Testa se o SQL amostrado é executado e o estado recebe as estimativas e a aproximação."""
+        mock_executar.return_value = ([{"sum": Decimal("50.00"), "__rmta_q0": 2500.0}], None, None)
+        estado = rmta_executar_sql(self._criar_estado("SELECT SUM(valor_total) FROM transacoes"))
+
+        self.assertIn("TABLESAMPLE SYSTEM (2)", mock_executar.call_args[0][0])
+        self.assertEqual(estado["resultados"], [{"sum": Decimal("2500.00")}])
+        self.assertEqual(estado["aproximacao"]["percentual"], 2.0)
+        self.assertEqual(len(estado["aproximacao"]["intervalos"]), 1)
+
+    @patch('database.amostragem.rmta_estimar_linhas_tabela', return_value=1e7)
+    @patch('agent.nos.rmta_executar_no_banco', return_value=([{"max": 10}], None, None))
+    def test_consulta_inelegivel_executada_exata(self, mock_executar, _):
+        """Testa se consultas inelegíveis rodam sem amostragem e sem aproximação no estado."""
+        estado = rmta_executar_sql(self._criar_estado("SELECT MAX(valor_total) FROM transacoes"))
+        self.assertEqual(mock_executar.call_args[0][0], "SELECT MAX(valor_total) FROM transacoes")
+        self.assertIsNone(estado["aproximacao"])
+
+    @patch('agent.fluxo_trabalho.rmta_explicar_resultados', side_effect=lambda estado: estado)
+    @patch('agent.nos.rmta_executar_no_banco', return_value=([{"sum": Decimal("2512.30")}], None, None))
+    def test_refazer_exato(self, mock_executar, _):
+        """Testa se a resposta aproximada é refeita com o SQL original e sem aproximação."""
+        aproximado = self._criar_estado("SELECT SUM(valor_total) FROM transacoes")
+        aproximado["resultados"] = [{"sum": Decimal("2500.00")}]
+        aproximado["aproximacao"] = {"percentual": 2.0, "intervalos": [{"sum": None}]}
+
+        exato = rmta_refazer_exato(aproximado)
+        self.assertEqual(mock_executar.call_args[0][0], "SELECT SUM(valor_total) FROM transacoes")
+        self.assertEqual(exato["resultados"], [{"sum": Decimal("2512.30")}])
+        self.assertIsNone(exato["aproximacao"])
+        self.assertFalse(exato["modo_aproximado"])
+        self.assertIsNotNone(aproximado["aproximacao"])
+
+if __name__ == '__main__':
+    unittest.main()
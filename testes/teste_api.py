@@ -0,0 +1,175 @@
+"""
+Testes unitários para o servidor HTTP do SQL Agent.
+
+Este módulo contém testes unitários para as rotas da aplicação ASGI,
+chamada diretamente, sem abrir sockets.
+"""
+import asyncio
+import json
+import threading
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from agent.escalonador import rmta_obter_inquilino
+from api import servidor
+from api.servidor import rmta_app
+from utils.codec_estado import TIPO_MIME, rmta_decodificar_estado
+from utils.metricas import rmta_incrementar_contador
+
+
+def rmta_chamar_app(metodo, rota, corpo=None, query_string=b"", cabecalhos=()):
+    """Executa uma requisição na aplicação ASGI e retorna status, cabeçalhos e corpo."""
+    escopo = {"type": "http", "method": metodo, "path": rota, "query_string": query_string, "headers": list(cabecalhos)}
+    entrada = json.dumps(corpo).encode() if corpo is not None else b""
+    enviados = []
+
+    async def receive():
+        return {"type": "http.request", "body": entrada, "more_body": False}
+
+    async def send(mensagem):
+        enviados.append(mensagem)
+
+    asyncio.run(rmta_app(escopo, receive, send))
+    inicio = enviados[0]
+    corpo_resposta = b"".join(m.get("body", b"") for m in enviados[1:])
+    return inicio["status"], dict(inicio["headers"]), corpo_resposta
+
+
+class TesteServidorHTTP(unittest.TestCase):
+    """Testes para as rotas do servidor HTTP."""
+
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_query_sucesso(self, mock_processar):
+        """Testa se /query retorna o estado final serializado, inclusive Decimal."""
+        mock_processar.return_value = {"consulta": "Listar clientes", "resultados": [{"saldo": Decimal("10.50")}], "erro": None}
+
+        status, _, corpo = rmta_chamar_app("POST", "/query", {"pergunta": "Listar clientes"})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(corpo)["resultados"][0]["saldo"], 10.5)
+        mock_processar.assert_called_once_with("Listar clientes", None, False)
+
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_query_codec_binario(self, mock_processar):
+        """Testa se /query responde no codec binário, sem perdas, quando o cliente o aceita."""
+        estado = {"consulta": "Listar clientes", "resultados": [{"saldo": Decimal("10.50")}], "erro": None}
+        mock_processar.return_value = estado
+
+        status, cabecalhos, corpo = rmta_chamar_app(
+            "POST", "/query", {"pergunta": "Listar clientes"}, cabecalhos=[(b"accept", TIPO_MIME.encode())]
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(cabecalhos[b"content-type"].decode(), TIPO_MIME)
+        self.assertEqual(rmta_decodificar_estado(corpo), estado)
+
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_query_inquilino_do_cabecalho(self, mock_processar):
+        """Testa se o cabeçalho X-Tenant-Id de um inquilino configurado chega ao contexto da consulta."""
+        mock_processar.side_effect = lambda *_: {"inquilino": rmta_obter_inquilino(), "erro": None}
+
+        with patch('agent.escalonador.ESCALONADOR_COTAS', {"time-a": {"peso": 2}}):
+            _, _, corpo = rmta_chamar_app("POST", "/query", {"pergunta": "Listar clientes"}, cabecalhos=[(b"x-tenant-id", b"time-a")])
+            self.assertEqual(json.loads(corpo)["inquilino"], "time-a")
+            # Inquilinos sem cota configurada não ganham cotas nem séries de métricas próprias
+            _, _, corpo = rmta_chamar_app("POST", "/query", {"pergunta": "Listar clientes"}, cabecalhos=[(b"x-tenant-id", b"time-z")])
+            self.assertEqual(json.loads(corpo)["inquilino"], "padrao")
+        _, _, corpo = rmta_chamar_app("POST", "/query", {"pergunta": "Listar clientes"})
+        self.assertEqual(json.loads(corpo)["inquilino"], "padrao")
+
+    def test_query_sem_pergunta(self):
+        """Testa se /query rejeita requisições sem o campo pergunta."""
+        status, _, _ = rmta_chamar_app("POST", "/query", {})
+        self.assertEqual(status, 400)
+
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_batch(self, mock_processar):
+        """Testa se /batch processa todas as perguntas do lote."""
+        mock_processar.side_effect = lambda pergunta: {"consulta": pergunta, "erro": None}
+
+        status, _, corpo = rmta_chamar_app("POST", "/batch", {"perguntas": ["a", "b", "c"]})
+        self.assertEqual(status, 200)
+        self.assertEqual([r["consulta"] for r in json.loads(corpo)["resultados"]], ["a", "b", "c"])
+
+    @patch('api.servidor.API_TAMANHO_FILA', 0)
+    @patch('api.servidor.API_THREADS', 1)
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_backpressure_retorna_429(self, mock_processar):
+        """Testa se o servidor responde 429 quando não há vagas no pool."""
+        self.assertTrue(servidor._reservar_vagas(1))
+        try:
+            status, cabecalhos, _ = rmta_chamar_app("POST", "/query", {"pergunta": "Listar clientes"})
+        finally:
+            servidor._liberar_vaga()
+        self.assertEqual(status, 429)
+        self.assertIn(b"retry-after", cabecalhos)
+        mock_processar.assert_not_called()
+
+    @patch('api.servidor.API_TIMEOUT', 0.05)
+    @patch('api.servidor.rmta_processar_consulta')
+    def test_timeout_retorna_504(self, mock_processar):
+        """Testa se consultas que excedem o tempo limite recebem 504."""
+        liberar = threading.Event()
+        mock_processar.side_effect = lambda pergunta, id_sessao=None, aproximado=False: liberar.wait(2)
+
+        try:
+            status, _, _ = rmta_chamar_app("POST", "/query", {"pergunta": "Consulta lenta"})
+        finally:
+            liberar.set()
+        self.assertEqual(status, 504)
+
+    @patch('api.servidor.rmta_processar_consulta_stream')
+    def test_stream_sse(self, mock_stream):
+        """Testa se /query/stream emite um evento por etapa e o evento final."""
+        mock_stream.return_value = iter([
+            ("gerar_sql", {"sql": "SELECT 1", "erro": None, "tempo_execucao": {}}),
+            ("fim", {"consulta": "x", "sql": "SELECT 1", "erro": None})
+        ])
+
+        status, cabecalhos, corpo = rmta_chamar_app("GET", "/query/stream", query_string=b"pergunta=x")
+        self.assertEqual(status, 200)
+        self.assertEqual(cabecalhos[b"content-type"], b"text/event-stream")
+        self.assertIn(b"event: etapa", corpo)
+        self.assertTrue(corpo.rstrip().split(b"\n\n")[-1].startswith(b"event: fim"))
+
+    @patch('api.servidor.rmta_processar_consulta_stream')
+    def test_stream_repassa_sessao_e_erro(self, mock_stream):
+        """Testa se /query/stream aceita os campos de /query e emite "erro" quando a consulta falha."""
+        def falhar(*_):
+            raise RuntimeError("fluxo indisponível")
+            yield
+        mock_stream.side_effect = falhar
+
+        status, _, corpo = rmta_chamar_app("POST", "/query/stream", {"pergunta": "x", "id_sessao": "s1", "aproximado": True})
+        self.assertEqual(status, 200)
+        self.assertTrue(corpo.startswith(b"event: erro"))
+        self.assertIn("fluxo indisponível", json.loads(corpo.split(b"data: ", 1)[1])["erro"])
+        mock_stream.assert_called_once_with("x", "s1", True)
+
+        status, _, _ = rmta_chamar_app("GET", "/query/stream", query_string=b"pergunta=x&aproximado=talvez")
+        self.assertEqual(status, 400)
+
+    @patch('api.servidor.rmta_processar_consulta_stream')
+    def test_stream_erro_apos_inicio_da_resposta(self, mock_stream):
+        """Testa se um erro depois do início do streaming só encerra o corpo, sem uma segunda resposta."""
+        mock_stream.return_value = iter([("gerar_sql", None)])
+        escopo = {"type": "http", "method": "GET", "path": "/query/stream", "query_string": b"pergunta=x", "headers": []}
+        enviados = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(mensagem):
+            enviados.append(mensagem)
+
+        asyncio.run(rmta_app(escopo, receive, send))
+        self.assertEqual([m["type"] for m in enviados], ["http.response.start", "http.response.body"])
+        self.assertFalse(enviados[-1]["more_body"])
+
+    def test_metrics(self):
+        """Testa se /metrics exporta as métricas no formato do Prometheus, com rotas e rótulos controlados."""
+        rmta_chamar_app("GET", "/rota-inexistente")
+        rmta_incrementar_contador("sql_agent_teste_rotulos_total", rotulos={"valor": 'a"b\\c\nd'})
+        status, _, corpo = rmta_chamar_app("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertIn(b'sql_agent_api_requisicoes_total{rota="desconhecida",status="404"}', corpo)
+        self.assertNotIn(b"/rota-inexistente", corpo)
+        self.assertIn(b'sql_agent_teste_rotulos_total{valor="a\\"b\\\\c\\nd"} 1', corpo)
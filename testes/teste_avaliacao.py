@@ -0,0 +1,123 @@
+"""
+Testes unitários para a avaliação contra o conjunto de ouro.
+
+Este módulo contém testes para a comparação de resultados sem depender da
+ordem, a tradução de SQL para o substituto SQLite, a execução da avaliação
+em paralelo e a detecção de regressões em relação à linha de base.
+"""
+import datetime
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from avaliacao.bancos import BancoSqlite, rmta_traduzir_para_sqlite
+from avaliacao.comparacao import rmta_comparar_resultados
+from avaliacao.executor import rmta_carregar_conjunto, rmta_executar_avaliacao, rmta_verificar_regressao
+
+
+class TesteComparacaoResultados(unittest.TestCase):
+    """Testes para a comparação de conjuntos de resultados."""
+
+    def test_ignora_ordem_apelidos_e_tipos(self):
+        """Testa se linhas em outra ordem, colunas renomeadas e Decimal x float são iguais."""
+        comparacao = rmta_comparar_resultados(
+            ["total", "cliente"], [(Decimal("10.00"), "Ana"), (Decimal("5.50"), "Bruno")],
+            ["nome", "total_gasto"], [("Bruno", 5.5), ("Ana", 10.0)]
+        )
+        self.assertTrue(comparacao.igual)
+
+    def test_linhas_faltando_e_sobrando(self):
+        """Testa se a diferença entre os multiconjuntos de linhas é contada."""
+        comparacao = rmta_comparar_resultados(
+            ["nome"], [("Ana",), ("Ana",), ("Carla",)],
+            ["nome"], [("Ana",), ("Bruno",)]
+        )
+        self.assertFalse(comparacao.igual)
+        self.assertEqual((comparacao.linhas_faltando, comparacao.linhas_sobrando), (1, 2))
+
+    def test_datas_e_ordem_exigida(self):
+        """Testa se datas em texto e em datetime coincidem e se a ordem é exigida quando pedida."""
+        data = datetime.datetime(2023, 10, 1, 14, 30)
+        self.assertTrue(rmta_comparar_resultados(["d"], [(data,)], ["d"], [("2023-10-01 14:30:00",)]).igual)
+
+        comparacao = rmta_comparar_resultados(["n"], [(2,), (1,)], ["n"], [(1,), (2,)], ordenado=True)
+        self.assertFalse(comparacao.igual)
+        self.assertEqual(comparacao.motivo, "Mesmas linhas em outra ordem")
+
+
+class TesteBancoSqlite(unittest.TestCase):
+    """Testes para o substituto SQLite."""
+
+    def test_traducao_de_parametros(self):
+        """Testa a expansão de = ANY(lista), os parâmetros nomeados, o ILIKE e as conversões."""
+        sql, parametros = rmta_traduzir_para_sqlite(
+            "SELECT nome FROM produtos WHERE nome ILIKE %(padrao)s AND id = ANY(%(ids)s) AND preco > %(minimo)s::numeric",
+            {"padrao": "note%%", "ids": [1, 2], "minimo": Decimal("10.5")}
+        )
+        self.assertEqual(
+            sql, "SELECT nome FROM produtos WHERE nome LIKE :padrao AND id IN (:ids_0, :ids_1) AND preco > :minimo"
+        )
+        self.assertEqual(parametros, {"padrao": "note%%", "ids_0": 1, "ids_1": 2, "minimo": 10.5})
+
+    def test_referencias_executam_no_substituto(self):
+        """Testa se todo SQL de referência do conjunto de ouro roda no substituto e retorna linhas."""
+        _, casos = rmta_carregar_conjunto()
+        banco = BancoSqlite()
+        try:
+            for caso in casos:
+                with self.subTest(caso=caso.id):
+                    _, linhas = banco.executar(caso.sql_referencia)
+                    self.assertTrue(linhas)
+        finally:
+            banco.fechar()
+
+
+class TesteExecucaoAvaliacao(unittest.TestCase):
+    """Testes para a execução da avaliação e a verificação de regressão."""
+
+    def setUp(self):
+        self.versao, self.casos = rmta_carregar_conjunto()
+        self.banco = BancoSqlite()
+        self.sql_por_pergunta = {caso.pergunta: caso.sql_referencia for caso in self.casos}
+
+    def tearDown(self):
+        self.banco.fechar()
+
+    def _gerar(self, errados=()):
+        """Simula rmta_gerar_sql devolvendo o SQL de referência, exceto para as perguntas em errados."""
+        def gerar(estado):
+            estado["sql"] = self.sql_por_pergunta[estado["consulta"]]
+            if estado["consulta"] in errados:
+                estado["sql"] = "SELECT nome FROM clientes WHERE 1 = 0"
+            estado["nivel_modelo"] = "regras"
+            return estado
+        return gerar
+
+    def test_referencia_tem_acuracia_total(self):
+        """Testa se gerar exatamente o SQL de referência resulta em acurácia 1 e passa sem linha de base."""
+        with patch('avaliacao.executor.rmta_gerar_sql', side_effect=self._gerar()):
+            relatorio = rmta_executar_avaliacao(self.versao, self.casos, self.banco, threads=4, repeticoes=1)
+        self.assertEqual(relatorio["resumo"]["acuracia"], 1.0)
+        self.assertEqual(relatorio["resumo"]["fora_orcamento"], [])
+        self.assertIsNotNone(relatorio["resumo"]["latencia_p95"])
+        self.assertEqual(rmta_verificar_regressao(relatorio), [])
+
+    def test_regressao_de_acuracia_e_latencia(self):
+        """Testa se a queda de acurácia lista os casos que passaram a falhar e se o p95 maior é detectado."""
+        with patch('avaliacao.executor.rmta_gerar_sql', side_effect=self._gerar()):
+            linha_base = rmta_executar_avaliacao(self.versao, self.casos, self.banco, repeticoes=1)
+        errado = self.casos[0]
+        with patch('avaliacao.executor.rmta_gerar_sql', side_effect=self._gerar(errados={errado.pergunta})):
+            relatorio = rmta_executar_avaliacao(self.versao, self.casos, self.banco, repeticoes=1)
+
+        self.assertFalse(next(r for r in relatorio["resultados"] if r["id"] == errado.id)["correto"])
+        regressoes = rmta_verificar_regressao(relatorio, linha_base)
+        self.assertEqual(len(regressoes), 1)
+        self.assertIn(f"passaram a falhar: {errado.id}", regressoes[0])
+
+        linha_base["resumo"]["latencia_p95"] = 0.1
+        relatorio["resumo"]["latencia_p95"] = 0.5
+        self.assertIn("p95 da latência subiu", rmta_verificar_regressao(relatorio, linha_base, limiar_acuracia=1.0)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Testes unitários para o cliente resiliente do modelo de linguagem.
+
+Este módulo contém testes unitários para o limitador de taxa, as novas
+tentativas, os prazos e o disjuntor, usando um modelo simulado local
+que injeta falhas conforme um roteiro.
+"""
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from langchain_core.messages import HumanMessage
+from agent import cliente_llm
+from agent.cliente_llm import (
+    LimitadorTaxa,
+    DisjuntorCircuito,
+    ErroPrazoExcedido,
+    ErroProvedorIndisponivel,
+    rmta_invocar_modelo
+)
+
+
+class ErroStatus(Exception):
+    """Erro simulado do provedor com status HTTP."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ModeloSimulado:
+    """
+    Modelo local que segue um roteiro de falhas.
+
+    Cada item do roteiro é uma exceção a levantar, um número de segundos de
+    atraso antes de responder ou o texto da resposta.
+    """
+
+    def __init__(self, nome, roteiro):
+        self.model_name = nome
+        self.roteiro = list(roteiro)
+        self.chamadas = 0
+
+    def invoke(self, mensagens):
+        self.chamadas += 1
+        passo = self.roteiro.pop(0) if self.roteiro else "ok"
+        if isinstance(passo, Exception):
+            raise passo
+        if isinstance(passo, (int, float)):
+            time.sleep(passo)
+            passo = "lenta"
+        return MagicMock(content=passo)
+
+
+@patch('agent.cliente_llm.LLM_BACKOFF_BASE', 0.001)
+@patch('agent.cliente_llm.LLM_MAX_TENTATIVAS', 3)
+class TesteInvocarModelo(unittest.TestCase):
+    """Testes para a política de chamadas ao modelo."""
+
+    def setUp(self):
+        cliente_llm._disjuntores.clear()
+        cliente_llm._limitadores.clear()
+        self.mensagens = [HumanMessage(content=f"pergunta {self.id()}")]
+
+    def test_repete_erros_transitorios(self):
+        """Testa se erros 429/503 são repetidos até obter resposta."""
+        modelo = ModeloSimulado("simulado-transitorio", [ErroStatus(429), ErroStatus(503), "resposta"])
+
+        resposta = rmta_invocar_modelo(modelo, self.mensagens)
+        self.assertEqual(resposta.content, "resposta")
+        self.assertEqual(modelo.chamadas, 3)
+
+    def test_nao_repete_erro_permanente(self):
+        """Testa se erros não transitórios (ex.: 400) falham sem novas tentativas."""
+        modelo = ModeloSimulado("simulado-permanente", [ErroStatus(400)])
+
+        with self.assertRaises(ErroStatus):
+            rmta_invocar_modelo(modelo, self.mensagens)
+        self.assertEqual(modelo.chamadas, 1)
+
+    @patch('agent.cliente_llm.LLM_TIMEOUT_CHAMADA', 0.05)
+    def test_prazo_por_chamada(self):
+        """Testa se chamadas lentas são interrompidas pelo prazo e repetidas."""
+        modelo = ModeloSimulado("simulado-lento", [0.5, "rapida"])
+
+        resposta = rmta_invocar_modelo(modelo, self.mensagens)
+        self.assertEqual(resposta.content, "rapida")
+
+    @patch('agent.cliente_llm.LLM_TIMEOUT_CHAMADA', 0.05)
+    def test_stream_expirado_e_abandonado(self):
+        """Testa se o stream de uma tentativa expirada para de repassar texto e é fechado."""
+        fechados = []
+
+        class Pedaco:
+            def __init__(self, content):
+                self.content = content
+
+            def __add__(self, outro):
+                return Pedaco(self.content + outro.content)
+
+        class ModeloStream(ModeloSimulado):
+            def stream(self, mensagens):
+                self.chamadas += 1
+                try:
+                    if self.chamadas == 1:
+                        yield Pedaco("SEL")
+                        time.sleep(0.2)
+                        yield Pedaco("ECT antigo")
+                    yield Pedaco("nova")
+                finally:
+                    fechados.append(self.chamadas)
+
+        recebidos = []
+        resposta = rmta_invocar_modelo(ModeloStream("simulado-stream", []), self.mensagens, ao_receber=recebidos.append)
+        time.sleep(0.3)
+        self.assertEqual(resposta.content, "nova")
+        self.assertEqual(recebidos, ["SEL", "nova"])
+        self.assertEqual(sorted(fechados), [2, 2])
+
+    @patch('agent.cliente_llm.DISJUNTOR_LIMIAR_FALHAS', 1)
+    def test_disjuntor_aberto_serve_cache(self):
+        """Testa se o disjuntor aberto falha rápido e serve respostas em cache."""
+        modelo = ModeloSimulado("simulado-disjuntor", ["em cache"] + [ErroStatus(503)] * 3)
+        outras_mensagens = [HumanMessage(content="sem cache")]
+
+        self.assertEqual(rmta_invocar_modelo(modelo, self.mensagens).content, "em cache")
+        with self.assertRaises(ErroStatus):
+            rmta_invocar_modelo(modelo, outras_mensagens)
+
+        self.assertEqual(rmta_invocar_modelo(modelo, self.mensagens).content, "em cache")
+        with self.assertRaises(ErroProvedorIndisponivel):
+            rmta_invocar_modelo(modelo, outras_mensagens)
+        self.assertEqual(modelo.chamadas, 4)
+
+    @patch('agent.cliente_llm.DISJUNTOR_LIMIAR_FALHAS', 1)
+    def test_erros_locais_e_4xx_nao_abrem_disjuntor(self):
+        """Testa se requisição inválida (400) e o prazo do limitador local deixam o disjuntor fechado."""
+        modelo = ModeloSimulado("simulado-4xx", [ErroStatus(400), ErroStatus(401)])
+        for _ in range(2):
+            with self.assertRaises(ErroStatus):
+                rmta_invocar_modelo(modelo, self.mensagens)
+        self.assertEqual(cliente_llm.rmta_obter_disjuntor("simulado-4xx").estado, DisjuntorCircuito.FECHADO)
+
+        cliente_llm._limitadores["simulado-4xx"] = LimitadorTaxa(requisicoes_por_minuto=1, tokens_por_minuto=100000)
+        rmta_invocar_modelo(modelo, self.mensagens)
+        with self.assertRaises(ErroPrazoExcedido):
+            rmta_invocar_modelo(modelo, self.mensagens, prazo_total=0.05)
+        self.assertEqual(cliente_llm.rmta_obter_disjuntor("simulado-4xx").estado, DisjuntorCircuito.FECHADO)
+        self.assertEqual(modelo.chamadas, 3)
+
+
+class TesteLimitadorTaxa(unittest.TestCase):
+    """Testes para o limitador de taxa."""
+
+    def test_limite_de_requisicoes(self):
+        """Testa se o limitador aguarda a reposição quando o bucket esvazia."""
+        limitador = LimitadorTaxa(requisicoes_por_minuto=600, tokens_por_minuto=100000)
+        prazo = time.monotonic() + 5
+        for _ in range(600):
+            limitador.adquirir(1, prazo)
+
+        espera = limitador.adquirir(1, prazo)
+        self.assertGreater(espera, 0.05)
+
+    def test_prazo_excedido(self):
+        """Testa se o limitador falha quando a espera ultrapassa o prazo."""
+        limitador = LimitadorTaxa(requisicoes_por_minuto=60, tokens_por_minuto=100)
+        limitador.adquirir(100, time.monotonic() + 1)
+
+        with self.assertRaises(ErroPrazoExcedido):
+            limitador.adquirir(100, time.monotonic() + 0.1)
+
+
+class TesteDisjuntor(unittest.TestCase):
+    """Testes para as transições de estado do disjuntor."""
+
+    def test_ciclo_de_estados(self):
+        """Testa as transições fechado -> aberto -> meio-aberto -> fechado."""
+        disjuntor = DisjuntorCircuito("teste", limiar_falhas=2, tempo_recuperacao=0.05)
+        disjuntor.registrar_falha()
+        self.assertTrue(disjuntor.permitir())
+        disjuntor.registrar_falha()
+        self.assertEqual(disjuntor.estado, DisjuntorCircuito.ABERTO)
+        self.assertFalse(disjuntor.permitir())
+
+        time.sleep(0.06)
+        self.assertTrue(disjuntor.permitir())
+        self.assertFalse(disjuntor.permitir())
+        disjuntor.registrar_sucesso()
+        self.assertEqual(disjuntor.estado, DisjuntorCircuito.FECHADO)
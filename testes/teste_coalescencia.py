@@ -0,0 +1,104 @@
+"""
+Testes unitários para a coalescência de requisições do SQL Agent.
+
+Este módulo contém testes unitários para a deduplicação de chamadas
+concorrentes idênticas (single-flight).
+"""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from utils.coalescencia import GrupoCoalescencia
+from utils.metricas import rmta_obter_contador
+from agent.fluxo_trabalho import rmta_normalizar_pergunta, rmta_processar_consulta
+
+
+def rmta_disparar_em_paralelo(funcao, argumentos):
+    """Executa a função em uma thread por argumento e retorna os resultados."""
+    resultados = [None] * len(argumentos)
+
+    def executar(i, argumento):
+        resultados[i] = funcao(argumento)
+
+    threads = [threading.Thread(target=executar, args=(i, a)) for i, a in enumerate(argumentos)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+class TesteGrupoCoalescencia(unittest.TestCase):
+    """Testes para o grupo de coalescência."""
+
+    def test_chamadas_concorrentes_executam_uma_vez(self):
+        """Testa se chamadas simultâneas com a mesma chave compartilham a execução."""
+        grupo = GrupoCoalescencia("teste_unico")
+        chamadas = []
+
+        def lenta():
+            chamadas.append(1)
+            time.sleep(0.2)
+            return {"valor": 42}
+
+        resultados = rmta_disparar_em_paralelo(lambda _: grupo.executar("chave", lenta), range(10))
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertTrue(all(r[0] == {"valor": 42} for r in resultados))
+        self.assertEqual(sum(1 for r in resultados if r[1]), 9)
+        self.assertEqual(rmta_obter_contador("sql_agent_coalescencia_compartilhadas_total", {"estagio": "teste_unico"}), 9)
+
+    def test_resultado_compartilhado_e_copia(self):
+        """Testa se cada seguidor recebe uma cópia independente do resultado."""
+        grupo = GrupoCoalescencia("teste_copia")
+        resultados = rmta_disparar_em_paralelo(
+            lambda _: grupo.executar("chave", lambda: time.sleep(0.1) or {"lista": []})[0],
+            range(3)
+        )
+        resultados[0]["lista"].append(1)
+        self.assertEqual(resultados[1]["lista"], [])
+
+    def test_excecao_propagada_aos_seguidores(self):
+        """Testa se a exceção do líder é repassada a todas as chamadas coalescidas."""
+        grupo = GrupoCoalescencia("teste_erro")
+
+        def falha():
+            time.sleep(0.1)
+            raise ValueError("falhou")
+
+        def chamar(_):
+            try:
+                grupo.executar("chave", falha)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(rmta_disparar_em_paralelo(chamar, range(4)), ["falhou"] * 4)
+
+
+class TesteCoalescenciaConsultas(unittest.TestCase):
+    """Testes para a coalescência no processamento de consultas."""
+
+    def test_normalizar_pergunta(self):
+        """Testa se variações de caixa, espaços e pontuação final são equivalentes."""
+        self.assertEqual(
+            rmta_normalizar_pergunta("  Quanto cada  cliente gastou? "),
+            rmta_normalizar_pergunta("quanto cada cliente gastou")
+        )
+
+    @patch('agent.fluxo_trabalho.rmta_executar_fluxo')
+    def test_perguntas_identicas_coalescidas(self, mock_executar):
+        """Testa se perguntas equivalentes simultâneas executam o fluxo uma única vez."""
+        mock_executar.side_effect = lambda texto, contexto_sessao=None, aproximado=False: time.sleep(0.2) or {
+            "consulta": texto, "erro": None, "tempo_execucao": {"total": 0.2}
+        }
+
+        resultados = rmta_disparar_em_paralelo(
+            rmta_processar_consulta,
+            ["Listar clientes?", "listar clientes", "LISTAR CLIENTES"]
+        )
+
+        mock_executar.assert_called_once()
+        self.assertEqual(
+            sorted(r["consulta"] for r in resultados),
+            ["LISTAR CLIENTES", "Listar clientes?", "listar clientes"]
+        )
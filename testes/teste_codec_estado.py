@@ -0,0 +1,103 @@
+"""
+Testes unitários para o codec binário do estado do SQL Agent.
+
+Este módulo contém testes para a ida e volta sem perdas do estado
+(Arrow IPC para os resultados e msgpack para os metadados).
+"""
+import datetime
+import json
+import unittest
+from decimal import Decimal
+from utils.codec_estado import (
+    ErroCodecEstado,
+    rmta_codificar_estado,
+    rmta_decodificar_estado
+)
+
+FUSO = datetime.timezone(datetime.timedelta(hours=-3))
+
+
+def _criar_estado(linhas=3):
+    """Cria um estado com os tipos retornados pelo psycopg2."""
+    return {
+        "consulta": "Quanto cada cliente gastou?",
+        "sql": "SELECT nome, SUM(valor_total) FROM transacoes GROUP BY nome",
+        "validacao": {"is_valid": True, "message": "Consulta válida"},
+        "resultados": [
+            {
+                "id": i,
+                "nome": f"Cliente {i}",
+                "total": Decimal("1500.50") + i,
+                "data": datetime.datetime(2024, 1, 1, 10, 30, tzinfo=FUSO) + datetime.timedelta(days=i),
+                "dia": datetime.date(2024, 1, 1),
+                "ativo": i % 2 == 0,
+                "observacao": None
+            }
+            for i in range(linhas)
+        ],
+        "erro": None,
+        "tempo_execucao": {"gerar_sql": 0.5},
+        "parametros_sql": {"valor": Decimal("100.00"), "desde": datetime.date(2024, 1, 1)},
+        "intencao": {"nome": "gasto_por_cliente", "slots": ("cliente", 1)},
+        "subconsultas": []
+    }
+
+
+class TesteCodecEstado(unittest.TestCase):
+    """Testes para a codificação e decodificação do estado."""
+
+    def test_ida_e_volta_sem_perdas(self):
+        """Testa se Decimal, timestamps com fuso, datas, tuplas e nulos voltam iguais."""
+        estado = _criar_estado()
+        decodificado = rmta_decodificar_estado(rmta_codificar_estado(estado))
+
+        self.assertEqual(decodificado, estado)
+        self.assertEqual(str(decodificado["resultados"][0]["total"]), "1500.50")
+        self.assertEqual(decodificado["resultados"][1]["data"].tzinfo, FUSO)
+        self.assertIsInstance(decodificado["intencao"]["slots"], tuple)
+
+    def test_colunas_que_o_arrow_nao_representa(self):
+        """Testa colunas com tipos mistos, escalas diferentes, fusos diferentes e inteiros grandes."""
+        estado = _criar_estado(0)
+        estado["resultados"] = [
+            {"misto": 1, "escala": Decimal("1.5"), "fuso": datetime.datetime(2024, 1, 1, tzinfo=FUSO), "grande": 2 ** 70},
+            {"misto": "a", "escala": Decimal("2.25"), "fuso": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc), "grande": 1}
+        ]
+        decodificado = rmta_decodificar_estado(rmta_codificar_estado(estado))
+
+        self.assertEqual(decodificado, estado)
+        self.assertEqual(str(decodificado["resultados"][0]["escala"]), "1.5")
+        self.assertEqual(decodificado["resultados"][1]["fuso"].tzinfo, datetime.timezone.utc)
+
+    def test_registros_com_chaves_diferentes_e_subconsultas(self):
+        """Testa resultados não tabulares e os resultados de cada subconsulta."""
+        estado = _criar_estado(2)
+        estado["subconsultas"] = [
+            {"pergunta": "a", "resultados": [{"x": 1}, {"y": 2}]},
+            {"pergunta": "b", "resultados": [{"z": Decimal("3.10")}]},
+            {"pergunta": "c", "resultados": None}
+        ]
+        self.assertEqual(rmta_decodificar_estado(rmta_codificar_estado(estado)), estado)
+
+    def test_resultados_como_tabela_arrow(self):
+        """Testa se, sem materializar, os resultados voltam como tabela Arrow."""
+        estado = _criar_estado(5)
+        tabela = rmta_decodificar_estado(rmta_codificar_estado(estado), materializar=False)["resultados"]
+
+        self.assertEqual(tabela.num_rows, 5)
+        self.assertEqual(tabela.column_names, list(estado["resultados"][0]))
+        self.assertEqual(str(tabela.schema.field("total").type), "decimal128(6, 2)")
+
+    def test_menor_que_json(self):
+        """Testa se o estado codificado é menor que o JSON usado na exportação."""
+        estado = _criar_estado(1000)
+        json_exportado = json.dumps(estado, indent=2, default=str).encode()
+        self.assertLess(len(rmta_codificar_estado(estado)), len(json_exportado) / 2)
+
+    def test_conteudo_invalido(self):
+        """Testa se conteúdo que não é um estado codificado gera ErroCodecEstado."""
+        with self.assertRaises(ErroCodecEstado):
+            rmta_decodificar_estado(b'{"consulta": "x"}')
+
+if __name__ == '__main__':
+    unittest.main()
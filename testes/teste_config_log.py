@@ -0,0 +1,71 @@
+"""
+Testes unitários para a configuração de logging do SQL Agent.
+
+Este módulo contém testes unitários para a fila de registros com thread de
+escrita, o formato JSON com ID da requisição e a amostragem sob alto volume.
+"""
+import io
+import json
+import logging
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from utils import config_log
+from utils.config_log import (
+    FiltroAmostragem,
+    rmta_configurar_logging,
+    rmta_contexto_requisicao,
+    rmta_encerrar_logging,
+    rmta_obter_id_requisicao,
+    rmta_submeter_com_contexto
+)
+
+
+class TesteConfigLog(unittest.TestCase):
+    """Testes para o pipeline de logging."""
+
+    def test_amostragem_preserva_avisos(self):
+        """Testa se, acima do limite, apenas parte dos registros INFO passa e WARNING sempre passa."""
+        filtro = FiltroAmostragem(limite_por_segundo=10, taxa=0.0)
+        registro_info = logging.LogRecord("sql_agent", logging.INFO, __file__, 1, "x", None, None)
+        registro_aviso = logging.LogRecord("sql_agent", logging.WARNING, __file__, 1, "x", None, None)
+
+        aceitos = sum(filtro.filter(registro_info) for _ in range(100))
+        self.assertLessEqual(aceitos, 20)
+        self.assertGreater(filtro.descartados, 0)
+        self.assertTrue(all(filtro.filter(registro_aviso) for _ in range(100)))
+
+    def test_id_requisicao_propagado_para_threads(self):
+        """Testa se o ID da requisição acompanha funções submetidas a outras threads."""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with rmta_contexto_requisicao("req-123"):
+                futuro = rmta_submeter_com_contexto(executor, rmta_obter_id_requisicao)
+                with rmta_contexto_requisicao() as id_mantido:
+                    self.assertEqual(id_mantido, "req-123")
+            self.assertEqual(futuro.result(), "req-123")
+            self.assertIsNone(executor.submit(rmta_obter_id_requisicao).result())
+        self.assertIsNone(rmta_obter_id_requisicao())
+
+    def test_registros_json_pela_thread_de_escrita(self):
+        """Testa se os registros chegam ao arquivo em JSON, com o ID e formatação tardia."""
+        rmta_encerrar_logging()
+        with tempfile.TemporaryDirectory() as diretorio:
+            with patch.object(config_log, "LOG_DIRETORIO", diretorio), patch("sys.stderr", io.StringIO()):
+                logger = rmta_configurar_logging()
+                self.assertIs(rmta_configurar_logging(), logger)
+                with rmta_contexto_requisicao("req-json"):
+                    logger.warning("Consulta %.10s com %d linhas", "SELECT * FROM clientes", 3)
+                rmta_encerrar_logging()
+
+            with open(os.path.join(diretorio, "sql_agent.log"), encoding="utf-8") as arquivo:
+                registros = [json.loads(linha) for linha in arquivo]
+        registro = registros[-1]
+        self.assertEqual(registro["mensagem"], "Consulta SELECT * F com 3 linhas")
+        self.assertEqual(registro["id_requisicao"], "req-json")
+        self.assertEqual(registro["nivel"], "WARNING")
+
+
+if __name__ == '__main__':
+    unittest.main()
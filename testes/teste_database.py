@@ -5,8 +5,13 @@ Este módulo contém testes unitários para as funções de conexão
 e manipulação do banco de dados.
 """
 import unittest
+from decimal import Decimal
 from unittest.mock import patch, MagicMock
+from psycopg2 import extensions
 from database.conexao import rmta_obter_conexao_bd
+from database.normalizacao_sql import rmta_normalizar_sql
+from database.pool import PoolConexoes, ErroPoolEsgotado
+from database.preparadas import rmta_executar_consulta, rmta_obter_taxa_acerto_planos
 
 class TesteConexaoBancoDados(unittest.TestCase):
     """Testes para as funções de conexão com o banco de dados."""
@@ -23,8 +28,8 @@ class TesteConexaoBancoDados(unittest.TestCase):
         mock_connect.assert_called_once()
     
     @patch('psycopg2.connect')
-    @patch('streamlit.error')
-    def test_falha_conexao(self, mock_st_error, mock_connect):
+    @patch('database.conexao.logger')
+    def test_falha_conexao(self, mock_logger, mock_connect):
         """Testa o comportamento quando a conexão falha."""
         # Mock da conexão falhando
         mock_connect.side_effect = Exception("Erro de conexão")
@@ -32,4 +37,91 @@ class TesteConexaoBancoDados(unittest.TestCase):
         conn = rmta_obter_conexao_bd()
         self.assertIsNone(conn)
         mock_connect.assert_called_once()
-        mock_st_error.assert_called_once()
\ No newline at end of file
+        mock_logger.error.assert_called_once()
+
+class TesteNormalizacaoSQL(unittest.TestCase):
+    """Testes para a extração de literais em parâmetros."""
+    
+    def test_mesmo_formato_mesma_impressao_digital(self):
+        """Testa se consultas que diferem só nos literais têm a mesma forma canônica."""
+        a = rmta_normalizar_sql("SELECT nome FROM produtos WHERE nome ILIKE '%Notebook%' AND preco > 100 LIMIT 5")
+        b = rmta_normalizar_sql("SELECT nome FROM produtos WHERE nome ILIKE '%Fone%'  AND preco > 20.5 LIMIT 10")
+        self.assertEqual(a.sql, "SELECT nome FROM produtos WHERE nome ILIKE $1 AND preco > $2 LIMIT $3")
+        self.assertEqual(a.impressao_digital, b.impressao_digital)
+        self.assertEqual(a.valores, ["%Notebook%", 100, 5])
+        self.assertEqual(b.valores, ["%Fone%", Decimal("20.5"), 10])
+    
+    def test_literais_estruturais_mantidos(self):
+        """Testa se posições de coluna e constantes tipadas não viram parâmetros."""
+        normalizada = rmta_normalizar_sql(
+            "SELECT 'total' AS rotulo FROM t WHERE d > CURRENT_DATE - INTERVAL '30 days' "
+            "AND id IN (1, 2) AND v BETWEEN 3 AND 4 ORDER BY 1"
+        )
+        self.assertEqual(
+            normalizada.sql,
+            "SELECT 'total' AS rotulo FROM t WHERE d > CURRENT_DATE - INTERVAL '30 days' "
+            "AND id IN ($1, $2) AND v BETWEEN $3 AND $4 ORDER BY 1"
+        )
+    
+    def test_parametros_nomeados(self):
+        """Testa a conversão de parâmetros nomeados em posicionais."""
+        normalizada = rmta_normalizar_sql(
+            "SELECT * FROM p WHERE nome = ANY(%(produtos)s) OR categoria = ANY(%(produtos)s) LIMIT %(limite)s",
+            {"produtos": ["Notebook"], "limite": 3}
+        )
+        self.assertEqual(normalizada.sql, "SELECT * FROM p WHERE nome = ANY($1) OR categoria = ANY($1) LIMIT $2")
+        self.assertEqual(normalizada.valores, [["Notebook"], 3])
+    
+    def test_string_com_escape_nao_normalizada(self):
+        """Testa se construções não suportadas são executadas como estão."""
+        self.assertIsNone(rmta_normalizar_sql("SELECT * FROM t WHERE nome = E'a\\\\nb'"))
+        self.assertIsNone(rmta_normalizar_sql("SELECT $$texto$$"))
+
+
+class TestePoolDeclaracoesPreparadas(unittest.TestCase):
+    """Testes para o pool de conexões e o cache de declarações preparadas."""
+    
+    def _criar_conexao(self):
+        conexao = MagicMock(closed=0)
+        conexao.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+        cursor = conexao.cursor.return_value
+        cursor.description = [("nome",)]
+        cursor.fetchall.return_value = [("Notebook Dell Inspiron",)]
+        return conexao
+    
+    def test_close_devolve_conexao_ao_pool(self):
+        """Testa se a conexão devolvida é reutilizada no próximo empréstimo."""
+        fabrica = MagicMock(side_effect=self._criar_conexao)
+        pool = PoolConexoes(fabrica, tamanho=2, timeout=0.1)
+        
+        conexao = pool.obter()
+        conexao.close()
+        conexao.close()
+        pool.obter().close()
+        self.assertEqual(fabrica.call_count, 1)
+    
+    def test_pool_esgotado(self):
+        """Testa se o pool falha após o timeout quando todas as conexões estão em uso."""
+        pool = PoolConexoes(self._criar_conexao, tamanho=1, timeout=0.01)
+        pool.obter()
+        with self.assertRaises(ErroPoolEsgotado):
+            pool.obter()
+    
+    def test_formato_repetido_reutiliza_declaracao(self):
+        """Testa se o mesmo formato de consulta é preparado uma única vez por conexão."""
+        fisica = self._criar_conexao()
+        pool = PoolConexoes(lambda: fisica, tamanho=1, timeout=0.1)
+        taxa_inicial = rmta_obter_taxa_acerto_planos()
+        
+        for termo in ("%Notebook%", "%Fone%", "%TV%"):
+            conexao = pool.obter()
+            descricao, linhas = rmta_executar_consulta(conexao, f"SELECT nome FROM produtos WHERE nome ILIKE '{termo}'")
+            conexao.close()
+        
+        self.assertEqual([item[0] for item in descricao], ["nome"])
+        self.assertEqual(linhas, [("Notebook Dell Inspiron",)])
+        comandos = [chamada.args[0] for chamada in fisica.cursor.return_value.execute.call_args_list]
+        self.assertEqual(sum(c.startswith("PREPARE") for c in comandos), 1)
+        self.assertEqual(sum(c.startswith("EXECUTE") for c in comandos), 3)
+        self.assertEqual(fisica.cursor.return_value.execute.call_args.args[1], ["%TV%"])
+        self.assertGreater(rmta_obter_taxa_acerto_planos(), taxa_inicial or 0)
@@ -0,0 +1,112 @@
+"""
+Testes unitários para a decodificação tipada das linhas do banco.
+
+Este módulo contém testes para a montagem das colunas pelo OID do tipo no
+PostgreSQL, pelo primeiro valor não nulo (registros em dicionários) e para
+os registros montados direto das tuplas do cursor.
+"""
+import datetime
+import unittest
+from decimal import Decimal
+import numpy as np
+from database.decodificacao import (
+    TIPO_INTEIRO,
+    TIPO_REAL,
+    rmta_construir_coluna,
+    rmta_dataframe_de_registros,
+    rmta_dataframe_tipado,
+    rmta_registros,
+    rmta_tipos_colunas
+)
+
+FUSO_BRASILIA = datetime.timezone(datetime.timedelta(hours=-3))
+
+# (nome, OID) como em cursor.description: int4, numeric, text, date, timestamp, timestamptz, bool
+DESCRICAO = [("id", 23), ("valor", 1700), ("nome", 25), ("dia", 1082), ("momento", 1114), ("registro", 1184), ("ativo", 16)]
+LINHAS = [
+    (1, Decimal("10.50"), "Ana", datetime.date(2024, 3, 1), datetime.datetime(2024, 3, 1, 12, 30),
+     datetime.datetime(2024, 3, 1, 9, 0, tzinfo=FUSO_BRASILIA), True),
+    (2, None, None, None, None, None, False)
+]
+
+
+class TesteDecodificacao(unittest.TestCase):
+    """Testes para as colunas tipadas."""
+
+    def test_colunas_tipadas_pelo_oid(self):
+        """Testa o dtype de cada coluna pelo OID, com os nulos como NaN/NaT/None."""
+        df = rmta_dataframe_tipado(DESCRICAO, LINHAS)
+        self.assertEqual(list(df.columns), [nome for nome, _ in DESCRICAO])
+        self.assertEqual(df["id"].dtype, np.int64)
+        self.assertEqual(df["valor"].dtype, np.float64)
+        self.assertEqual(df["valor"][0], 10.5)
+        self.assertTrue(np.isnan(df["valor"][1]))
+        self.assertEqual(df["nome"].dtype, object)
+        self.assertIsNone(df["nome"][1])
+        self.assertTrue(all(df[coluna].dtype.kind == "M" for coluna in ("dia", "momento", "registro")))
+        self.assertEqual(str(df["momento"][0]), "2024-03-01 12:30:00")
+        self.assertEqual(str(df["registro"][0]), "2024-03-01 12:00:00")  # convertido para UTC
+        self.assertTrue(df["dia"].isna()[1])
+        self.assertEqual(df["ativo"].dtype, bool)
+        self.assertEqual(rmta_dataframe_tipado(DESCRICAO, []).shape, (0, len(DESCRICAO)))
+
+    def test_nulos_e_valores_fora_do_tipo(self):
+        """Testa inteiros com nulos como float e a queda para object quando um valor não cabe no tipo."""
+        self.assertEqual(rmta_construir_coluna([1, None]).dtype, np.float64)
+        self.assertEqual(rmta_construir_coluna([None, None]).dtype, object)
+        coluna = rmta_construir_coluna([datetime.date(2024, 1, 1), "sem data"])
+        self.assertEqual(coluna.dtype, object)
+        self.assertEqual(list(coluna), [datetime.date(2024, 1, 1), "sem data"])
+
+    def test_tipos_misturados_nao_sao_convertidos(self):
+        """Testa se valores de outro tipo levam a coluna para object em vez de serem convertidos."""
+        for registros, esperados in (
+            ([{"a": 1}, {"a": 2.5}], [1, 2.5]),
+            ([{"a": True}, {"a": 2}], [True, 2]),
+            ([{"a": 1.5}, {"a": "2"}], [1.5, "2"]),
+            ([{"a": 1.5}, {"a": True}], [1.5, True]),
+            ([{"a": datetime.date(2024, 1, 1)}, {"a": datetime.datetime(2024, 1, 2, 10)}],
+             [datetime.date(2024, 1, 1), datetime.datetime(2024, 1, 2, 10)])
+        ):
+            with self.subTest(registros=registros):
+                coluna = rmta_dataframe_de_registros(registros)["a"]
+                self.assertEqual(coluna.dtype, object)
+                self.assertEqual([type(valor) for valor in coluna], [type(valor) for valor in esperados])
+                self.assertEqual(list(coluna), esperados)
+
+        # Pelo OID, um valor fora do tipo declarado também não é convertido
+        self.assertEqual(list(rmta_construir_coluna([1, 2.5], TIPO_INTEIRO)), [1, 2.5])
+        self.assertEqual(rmta_construir_coluna([1, Decimal("2.5"), None], TIPO_REAL).dtype, np.float64)
+
+    def test_dataframe_de_registros(self):
+        """Testa o DataFrame dos registros, tipado pelo primeiro valor não nulo de cada coluna."""
+        registros = rmta_registros([nome for nome, _ in DESCRICAO], LINHAS)
+        df = rmta_dataframe_de_registros(registros)
+        self.assertEqual(dict(df.dtypes), dict(rmta_dataframe_tipado(DESCRICAO, LINHAS).dtypes))
+        self.assertTrue(rmta_dataframe_de_registros([]).empty)
+
+        # Registros com chaves diferentes usam o caminho do pandas
+        df = rmta_dataframe_de_registros([{"a": 1}, {"b": 2}])
+        self.assertEqual(sorted(df.columns), ["a", "b"])
+
+    def test_dataframe_de_registros_pelos_tipos_do_oid(self):
+        """Testa se os tipos guardados pelo OID valem mesmo em colunas só com nulos."""
+        tipos = rmta_tipos_colunas(DESCRICAO)
+        self.assertEqual(tipos["id"], TIPO_INTEIRO)
+        self.assertEqual(tipos["valor"], TIPO_REAL)
+
+        linhas = LINHAS[1:]
+        registros = rmta_registros([nome for nome, _ in DESCRICAO], linhas)
+        df = rmta_dataframe_de_registros(registros, tipos)
+        self.assertEqual(dict(df.dtypes), dict(rmta_dataframe_tipado(DESCRICAO, linhas).dtypes))
+        self.assertEqual(df["valor"].dtype, np.float64)
+        self.assertEqual(rmta_dataframe_de_registros(registros)["valor"].dtype, object)
+
+    def test_registros_sem_dataframe(self):
+        """Testa se os registros mantêm os valores do psycopg2 (Decimal, None, date)."""
+        registros = rmta_registros(["id", "valor", "dia"], [(1, Decimal("2.5"), None)])
+        self.assertEqual(registros, [{"id": 1, "valor": Decimal("2.5"), "dia": None}])
+
+
+if __name__ == '__main__':
+    unittest.main()
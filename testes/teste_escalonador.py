@@ -0,0 +1,176 @@
+"""
+Testes unitários para o escalonador por inquilino.
+
+Este módulo contém testes para a fila justa ponderada, os limites de vagas
+simultâneas, as cotas de tokens e de tempo de banco e o registro das etapas
+recusadas no estado do agente.
+"""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from agent.escalonador import (
+    RECURSO_BD,
+    RECURSO_LLM,
+    ErroCotaExcedida,
+    Escalonador,
+    FilaJusta,
+    rmta_contexto_inquilino
+)
+from agent.estado import EstadoAgente, END
+from agent.fluxo_trabalho import rmta_criar_estado_inicial
+from agent.nos import rmta_decidir_proximo_passo, rmta_executar_sql, rmta_gerar_sql
+
+
+def _ordem_de_atendimento(fila, pedidos):
+    """Enfileira os pedidos (inquilino, peso) atrás de uma vaga ocupada e retorna a ordem em que são atendidos."""
+    ordem = []
+
+    def pedir(inquilino, peso):
+        fila.adquirir(inquilino, peso, 1.0, 0, timeout=5)
+        ordem.append(inquilino)
+        fila.liberar(inquilino)
+
+    fila.adquirir("ocupante", 1.0, 1.0, 0, timeout=5)
+    threads = []
+    for inquilino, peso in pedidos:
+        thread = threading.Thread(target=pedir, args=(inquilino, peso))
+        thread.start()
+        threads.append(thread)
+        # Aguardar o pedido entrar na fila, para que a chegada siga a ordem da lista
+        while len(fila._aguardando) < len(threads):
+            time.sleep(0.001)
+    fila.liberar("ocupante")
+    for thread in threads:
+        thread.join(timeout=5)
+    return ordem
+
+
+class TesteFilaJusta(unittest.TestCase):
+    """Testes para a distribuição das vagas entre inquilinos."""
+
+    def test_inquilino_pesado_nao_passa_a_frente(self):
+        """Testa se o pedido de outro inquilino é atendido antes da rajada de quem chegou primeiro."""
+        ordem = _ordem_de_atendimento(FilaJusta("bd", 1), [("a", 1), ("a", 1), ("a", 1), ("b", 1)])
+        self.assertEqual(ordem, ["a", "b", "a", "a"])
+
+    def test_peso_proporcional(self):
+        """Testa se um inquilino com peso 2 recebe duas vagas para cada uma do inquilino de peso 1."""
+        pedidos = [("a", 1)] * 3 + [("b", 2)] * 4
+        ordem = _ordem_de_atendimento(FilaJusta("bd", 1), pedidos)
+        self.assertEqual(ordem, ["a", "b", "b", "a", "b", "b", "a"])
+
+    def test_limite_de_vagas_por_inquilino(self):
+        """Testa se o inquilino no limite aguarda, sem bloquear os demais, e desiste após o timeout."""
+        fila = FilaJusta("bd", 3)
+        fila.adquirir("a", 1.0, 1.0, 1, timeout=1)
+        with self.assertRaises(TimeoutError):
+            fila.adquirir("a", 1.0, 1.0, 1, timeout=0.05)
+        self.assertLess(fila.adquirir("b", 1.0, 1.0, 1, timeout=1), 0.05)
+        self.assertEqual(fila.em_uso("a"), 1)
+
+    def test_fins_virtuais_descartados(self):
+        """Testa se os fins virtuais dos inquilinos não se acumulam depois que a fila esvazia."""
+        fila = FilaJusta("bd", 2)
+        for indice in range(100):
+            fila.adquirir(f"inquilino-{indice}", 1.0, 1.0, 0, timeout=1)
+            fila.liberar(f"inquilino-{indice}")
+        self.assertEqual(fila._fim_virtual, {})
+        # O próximo pedido começa depois de todo o serviço já concedido
+        fila.adquirir("a", 1.0, 1.0, 0, timeout=1)
+        self.assertEqual(fila._fim_virtual, {"a": 101.0})
+
+
+class TesteCotas(unittest.TestCase):
+    """Testes para as cotas por inquilino."""
+
+    def test_cota_de_tokens_por_minuto(self):
+        """Testa se o inquilino que consumiu a cota é recusado, com o tempo até poder tentar de novo."""
+        escalonador = Escalonador(cotas={"a": {"tokens_minuto": 100}})
+        with escalonador.reservar("a", RECURSO_LLM) as reserva:
+            reserva.consumir_tokens(150)
+
+        with self.assertRaises(ErroCotaExcedida) as contexto:
+            with escalonador.reservar("a", RECURSO_LLM):
+                pass
+        self.assertIn("150 de 100 tokens", str(contexto.exception))
+        self.assertEqual(contexto.exception.detalhes["motivo"], "tokens_minuto")
+        self.assertGreater(contexto.exception.detalhes["tentar_novamente_em"], 55)
+        with escalonador.reservar("b", RECURSO_LLM):
+            pass
+
+    def test_estado_de_inquilinos_inativos_descartado(self):
+        """Testa se o consumo e o custo médio de inquilinos inativos são descartados."""
+        escalonador = Escalonador(cotas={"a": {"tokens_minuto": 100}})
+        with escalonador.reservar("a", RECURSO_LLM) as reserva:
+            reserva.consumir_tokens(10)
+        with escalonador.reservar("b", RECURSO_BD):
+            pass
+        self.assertEqual(set(escalonador._ultimo_uso), {"a", "b"})
+
+        escalonador._remover_inativos(time.monotonic() + 10**6)
+        self.assertEqual((escalonador._tokens, escalonador._tempo_bd, escalonador._custo_medio, escalonador._ultimo_uso),
+                         ({}, {}, {}, {}))
+
+    def test_espera_acima_do_timeout(self):
+        """Testa se a espera por uma vaga além do timeout vira ErroCotaExcedida com o limite do inquilino."""
+        escalonador = Escalonador(cotas={"a": {"execucoes_bd": 1}}, timeout_fila=0.05)
+        with escalonador.reservar("a", RECURSO_BD):
+            with self.assertRaises(ErroCotaExcedida) as contexto:
+                with escalonador.reservar("a", RECURSO_BD):
+                    pass
+        self.assertIn("limite de 1 execuções simultâneas", str(contexto.exception))
+        self.assertEqual(contexto.exception.detalhes["motivo"], "espera_fila")
+
+
+class TesteEtapasEscalonadas(unittest.TestCase):
+    """Testes para as etapas dos nós passando pelo escalonador."""
+
+    def _criar_estado(self, inquilino="a"):
+        return EstadoAgente(
+            consulta="Listar todos os clientes",
+            sql="SELECT * FROM clientes",
+            validacao={"is_valid": True, "message": "Consulta válida"},
+            resultados=None,
+            erro=None,
+            tempo_execucao={},
+            inquilino=inquilino
+        )
+
+    def test_inquilino_do_contexto_no_estado(self):
+        """Testa se o estado inicial recebe o inquilino do contexto, e inquilinos sem cota o padrão."""
+        with patch('agent.escalonador.ESCALONADOR_COTAS', {"time-a": {"peso": 2}}):
+            with rmta_contexto_inquilino("time-a"):
+                self.assertEqual(rmta_criar_estado_inicial("Listar clientes")["inquilino"], "time-a")
+            with rmta_contexto_inquilino("time-inventado"):
+                self.assertEqual(rmta_criar_estado_inicial("Listar clientes")["inquilino"], "padrao")
+        self.assertEqual(rmta_criar_estado_inicial("Listar clientes")["inquilino"], "padrao")
+
+    @patch('agent.nos.rmta_executar_no_banco', return_value=([{"id": 1}], None, None))
+    def test_execucao_registra_espera_e_consome_tempo_de_banco(self, mock_executar):
+        """Testa se a execução registra a espera na fila e esgota a cota de tempo de banco do inquilino."""
+        escalonador = Escalonador(cotas={"a": {"tempo_bd": 0.000001}})
+        with patch('agent.escalonador._escalonador', escalonador):
+            estado = rmta_executar_sql(self._criar_estado())
+            self.assertEqual(estado["resultados"], [{"id": 1}])
+            self.assertIn("espera_fila", estado["tempo_execucao"])
+
+            recusado = rmta_executar_sql(self._criar_estado())
+        self.assertEqual(mock_executar.call_count, 1)
+        self.assertIsNone(recusado["resultados"])
+        self.assertIn("Cota de tempo de banco excedida para o inquilino 'a'", recusado["erro"])
+        self.assertEqual(recusado["cota_excedida"]["recurso"], RECURSO_BD)
+        self.assertEqual(rmta_decidir_proximo_passo(recusado), END)
+
+    @patch('agent.nos.rmta_gerar_sql_por_regras', return_value=None)
+    @patch('agent.nos.rmta_gerar_sql_com_modelo')
+    def test_geracao_recusada_nao_escala_de_nivel(self, mock_gerar, _):
+        """Testa se a cota esgotada encerra a geração sem tentar os níveis mais caros."""
+        mock_gerar.side_effect = ErroCotaExcedida("Cota de tokens do LLM excedida", "a", RECURSO_LLM, "tokens_minuto", 30)
+        estado = rmta_gerar_sql(self._criar_estado())
+        mock_gerar.assert_called_once()
+        self.assertEqual(estado["erro"], "Cota de tokens do LLM excedida")
+        self.assertEqual(estado["cota_excedida"]["tentar_novamente_em"], 30)
+
+if __name__ == '__main__':
+    unittest.main()
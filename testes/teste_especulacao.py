@@ -0,0 +1,80 @@
+"""
+Testes unitários para a execução especulativa durante o streaming.
+
+Este módulo contém testes unitários para a extração incremental do campo
+"query" e para a validação iniciada antes do fim da resposta do modelo.
+"""
+import json
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.messages import AIMessageChunk
+from agent import cliente_llm
+from agent.especulacao import ExecucaoEspeculativa, rmta_extrair_query_parcial
+from agent.fluxo_trabalho import rmta_criar_estado_inicial
+from agent.nos import rmta_gerar_sql, rmta_validar_sql
+
+
+class ModeloStream:
+    """Modelo simulado que transmite a resposta em pedaços, com atraso entre eles."""
+
+    def __init__(self, nome, resposta, pedacos=8, atraso=0.03):
+        self.model_name = nome
+        self.resposta = resposta
+        self.pedacos = pedacos
+        self.atraso = atraso
+
+    def stream(self, mensagens):
+        tamanho = -(-len(self.resposta) // self.pedacos)
+        for inicio in range(0, len(self.resposta), tamanho):
+            time.sleep(self.atraso)
+            yield AIMessageChunk(content=self.resposta[inicio:inicio + tamanho])
+
+
+class TesteEspeculacao(unittest.TestCase):
+    """Testes para a validação especulativa do SQL."""
+
+    def setUp(self):
+        cliente_llm._disjuntores.clear()
+
+    def test_extrair_query_parcial(self):
+        """Testa se o SQL só é extraído quando a string JSON se fecha."""
+        self.assertIsNone(rmta_extrair_query_parcial('{"query": "SELECT nome FROM'))
+        self.assertIsNone(rmta_extrair_query_parcial('{"query": "SELECT \\"nome\\'))
+        self.assertEqual(
+            rmta_extrair_query_parcial('```json\n{"query": "SELECT \\"nome\\"\\nFROM c", "explanation": "Lis'),
+            'SELECT "nome"\nFROM c'
+        )
+
+    def test_especulacao_descartada_quando_sql_muda(self):
+        """Testa se a especulação de um SQL diferente do final é descartada."""
+        especulacao = ExecucaoEspeculativa(lambda sql: {"is_valid": True, "message": "ok"}, usa_plano=True)
+        especulacao.ao_receber('{"query": "SELECT 1", "expl')
+        self.assertEqual(especulacao.sql, "SELECT 1")
+        self.assertIsNone(especulacao.concluir("SELECT 2"))
+
+    @patch('agent.nos.rmta_verificar_plano')
+    @patch('agent.nos.rmta_obter_modelo_nivel')
+    def test_explain_sobreposto_ao_stream(self, mock_modelo_nivel, mock_plano):
+        """Testa se o EXPLAIN roda durante o stream e é reaproveitado na validação."""
+        resposta = json.dumps({"query": "SELECT nome FROM clientes", "explanation": "Lista os nomes " * 20})
+        mock_modelo_nivel.return_value = ModeloStream(f"stream-{self.id()}", resposta)
+
+        def explain_lento(sql):
+            time.sleep(0.05)
+            return None
+        mock_plano.side_effect = explain_lento
+
+        estado = rmta_gerar_sql(rmta_criar_estado_inicial("Qual o nome dos clientes mais antigos?"))
+        self.assertEqual(estado["nivel_modelo"], "rapido")
+        self.assertEqual(estado["especulacao"]["sql"], "SELECT nome FROM clientes")
+        self.assertGreater(estado["especulacao"]["antecedencia"], 0)
+        self.assertGreater(estado["especulacao"]["tempo_economizado"], 0)
+
+        estado = rmta_validar_sql(estado)
+        self.assertTrue(estado["validacao"]["is_valid"])
+        mock_plano.assert_called_once_with("SELECT nome FROM clientes")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+Testes unitários para a exportação do resultado completo em CSV e Parquet.
+
+Este módulo contém testes para a cópia em streaming (COPY para CSV e cursor
+no servidor para Parquet), o progresso, a limpeza de arquivos antigos e o
+tratamento de falhas.
+"""
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+from agent.escalonador import Escalonador
+from database.exportacao import (
+    ErroExportacao,
+    rmta_exportar_resultado,
+    rmta_limpar_exportacoes
+)
+
+FUSO = datetime.timezone(datetime.timedelta(hours=-3))
+
+# (nome, OID, tamanho exibido, tamanho interno, precisão, escala, aceita nulo)
+DESCRICAO = [
+    ("nome", 1043, None, None, None, None, None),
+    ("saldo", 1700, None, None, 10, 2, None),
+    ("media", 1700, None, None, None, None, None),
+    ("data", 1184, None, None, None, None, None),
+    ("ativo", 16, None, None, None, None, None)
+]
+
+
+def _criar_conexao(cursor):
+    conexao = MagicMock()
+    conexao.cursor.return_value = cursor
+    return conexao
+
+
+class TesteExportacao(unittest.TestCase):
+    """Testes para a exportação do resultado em arquivo."""
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.diretorio)
+
+    @patch('database.exportacao.rmta_abrir_conexao_bd')
+    def test_csv_por_copy(self, mock_abrir):
+        """Testa se o CSV é gerado por COPY com os parâmetros incorporados e sem ponto e vírgula."""
+        cursor = MagicMock()
+        cursor.mogrify.return_value = b"SELECT nome FROM clientes WHERE saldo > 10"
+        cursor.rowcount = 2
+
+        def copiar(sql, arquivo):
+            for bloco in (b"nome\n", b"Ana\n", b"Bruno\n"):
+                arquivo.write(bloco)
+        cursor.copy_expert.side_effect = copiar
+        mock_abrir.return_value = _criar_conexao(cursor)
+
+        progresso = []
+        exportacao = rmta_exportar_resultado(
+            "SELECT nome FROM clientes WHERE saldo > %(saldo)s;", {"saldo": 10}, "csv",
+            progresso=lambda linhas, tamanho: progresso.append((linhas, tamanho)), diretorio=self.diretorio
+        )
+
+        cursor.mogrify.assert_called_once_with("SELECT nome FROM clientes WHERE saldo > %(saldo)s", {"saldo": 10})
+        self.assertEqual(
+            cursor.copy_expert.call_args[0][0],
+            "COPY (SELECT nome FROM clientes WHERE saldo > 10) TO STDOUT WITH (FORMAT csv, HEADER true)"
+        )
+        with open(exportacao["caminho"], "rb") as arquivo:
+            self.assertEqual(arquivo.read(), b"nome\nAna\nBruno\n")
+        self.assertEqual((exportacao["linhas"], exportacao["tipo_mime"]), (2, "text/csv"))
+        self.assertEqual(progresso[-1], (2, 15))
+        mock_abrir.return_value.set_session.assert_called_once_with(readonly=True)
+        mock_abrir.return_value.close.assert_called_once()
+
+    @patch('database.exportacao.rmta_abrir_conexao_bd')
+    def test_parquet_em_lotes_pelo_cursor_no_servidor(self, mock_abrir):
+        """Testa se o Parquet é gravado lote a lote, com os tipos do PostgreSQL preservados."""
+        import pyarrow.parquet as pq
+
+        linhas = [
+            ("Cliente %s" % i, Decimal("10.50") + i, Decimal("1") / 3 if i % 2 else None,
+             datetime.datetime(2024, 1, 1, 10, tzinfo=FUSO), i % 2 == 0)
+            for i in range(5)
+        ]
+        cursor = MagicMock()
+        cursor.fetchmany.side_effect = [linhas[:2], linhas[2:4], linhas[4:], []]
+        cursor.description = DESCRICAO
+        conexao = _criar_conexao(cursor)
+        mock_abrir.return_value = conexao
+
+        progresso = []
+        exportacao = rmta_exportar_resultado(
+            "SELECT * FROM clientes", formato="parquet", tamanho_lote=2,
+            progresso=lambda linhas, tamanho: progresso.append(linhas), diretorio=self.diretorio
+        )
+
+        self.assertTrue(conexao.cursor.call_args.kwargs["name"].startswith("rmta_exportacao_"))
+        self.assertEqual(exportacao["linhas"], 5)
+        self.assertEqual(progresso, [2, 4, 5, 5])
+
+        arquivo = pq.ParquetFile(exportacao["caminho"])
+        self.assertEqual(arquivo.metadata.num_row_groups, 3)
+        tabela = arquivo.read()
+        self.assertEqual(str(tabela.schema.field("saldo").type), "decimal128(10, 2)")
+        self.assertEqual(tabela.column("saldo").to_pylist()[4], Decimal("14.50"))
+        self.assertEqual(tabela.column("media").to_pylist()[:2], [None, Decimal("0.3333333333")])
+        self.assertEqual(tabela.column("data").to_pylist()[0], datetime.datetime(2024, 1, 1, 13, tzinfo=datetime.timezone.utc))
+        self.assertEqual(tabela.column("ativo").to_pylist(), [True, False, True, False, True])
+
+    @patch('database.exportacao.rmta_abrir_conexao_bd')
+    def test_falha_na_copia_remove_arquivo_parcial(self, mock_abrir):
+        """Testa se uma falha no meio da cópia gera ErroExportacao e não deixa arquivo."""
+        cursor = MagicMock()
+        cursor.mogrify.return_value = b"SELECT 1"
+        cursor.copy_expert.side_effect = lambda sql, arquivo: (arquivo.write(b"x\n"), 1 / 0)
+        mock_abrir.return_value = _criar_conexao(cursor)
+
+        with self.assertRaises(ErroExportacao):
+            rmta_exportar_resultado("SELECT 1", diretorio=self.diretorio)
+        self.assertEqual(os.listdir(self.diretorio), [])
+        mock_abrir.return_value.close.assert_called_once()
+
+    @patch('database.exportacao.rmta_abrir_conexao_bd', side_effect=Exception("Erro de conexão"))
+    def test_banco_indisponivel(self, _):
+        """Testa se a falha de conexão vira ErroExportacao."""
+        with self.assertRaises(ErroExportacao):
+            rmta_exportar_resultado("SELECT 1", diretorio=self.diretorio)
+
+    @patch('database.exportacao.rmta_abrir_conexao_bd')
+    def test_cota_de_banco_esgotada(self, mock_abrir):
+        """Testa se a exportação passa pelo escalonador e é recusada com a cota de banco esgotada."""
+        escalonador = Escalonador(cotas={"padrao": {"tempo_bd": 0.000001}})
+        escalonador._registrar_consumo("padrao", "bd", 1.0, 0)
+        with patch('agent.escalonador._escalonador', escalonador):
+            with self.assertRaises(ErroExportacao) as contexto:
+                rmta_exportar_resultado("SELECT 1", diretorio=self.diretorio)
+        self.assertIn("Cota de tempo de banco excedida", str(contexto.exception))
+        mock_abrir.assert_not_called()
+
+    def test_formato_invalido(self):
+        """Testa se formatos não suportados são rejeitados antes de acessar o banco."""
+        with self.assertRaises(ErroExportacao):
+            rmta_exportar_resultado("SELECT 1", formato="xlsx", diretorio=self.diretorio)
+
+    def test_limpeza_de_exportacoes_antigas(self):
+        """Testa se apenas as exportações vencidas são apagadas."""
+        antiga = os.path.join(self.diretorio, "exportacao_antiga.csv")
+        recente = os.path.join(self.diretorio, "exportacao_recente.csv")
+        for caminho in (antiga, recente):
+            open(caminho, "w").close()
+        os.utime(antiga, (time.time() - 7200, time.time() - 7200))
+
+        self.assertEqual(rmta_limpar_exportacoes(self.diretorio, ttl=3600), 1)
+        self.assertEqual(os.listdir(self.diretorio), ["exportacao_recente.csv"])
+
+if __name__ == '__main__':
+    unittest.main()
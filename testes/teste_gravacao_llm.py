@@ -0,0 +1,108 @@
+"""
+Testes unitários para a gravação e reprodução das chamadas ao modelo.
+
+Este módulo contém testes para a gravação das respostas em cassetes
+endereçados pelo conteúdo e para a reprodução sem o provedor, com a latência
+original ou a configurada.
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from agent import cliente_llm
+from agent.cliente_llm import ErroCasseteAusente, rmta_invocar_modelo, rmta_obter_modelo
+from agent.gravacao_llm import ArmazemCassetes, ModeloCassete, rmta_latencia_reproducao
+
+
+class ModeloGravado:
+    """Modelo local que responde com atraso e metadados de uso, contando as chamadas."""
+
+    model_name = "simulado-cassete"
+
+    def __init__(self, atraso=0.0):
+        self.atraso = atraso
+        self.chamadas = 0
+
+    def invoke(self, mensagens):
+        self.chamadas += 1
+        time.sleep(self.atraso)
+        return AIMessage(
+            content=f"resposta para {mensagens[-1].content}",
+            response_metadata={"token_usage": {"prompt_tokens": 12, "prompt_tokens_details": {"cached_tokens": 0}}}
+        )
+
+
+class TesteCassetes(unittest.TestCase):
+    """Testes para o ciclo de gravação e reprodução."""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.armazem = ArmazemCassetes(self.diretorio.name)
+        patcher = patch('agent.cliente_llm.rmta_obter_armazem', return_value=self.armazem)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.diretorio.cleanup)
+        cliente_llm._disjuntores.clear()
+        self.mensagens = [SystemMessage(content="Gere SQL."), HumanMessage(content=f"pergunta {self.id()}")]
+
+    def _gravar(self, atraso=0.0):
+        modelo = ModeloGravado(atraso)
+        with patch('agent.cliente_llm.LLM_CASSETES_MODO', 'gravar'):
+            resposta = rmta_invocar_modelo(modelo, self.mensagens)
+        return modelo, resposta
+
+    def test_grava_um_cassete_por_conteudo(self):
+        """Testa se a mesma requisição grava sempre o mesmo arquivo, com a requisição e a latência."""
+        _, resposta = self._gravar()
+        self._gravar()
+        arquivos = [nome for _, _, nomes in os.walk(self.diretorio.name) for nome in nomes]
+        self.assertEqual(len(arquivos), 1)
+
+        cassete = self.armazem.obter(arquivos[0][:-len(".json")])
+        self.assertEqual(cassete["modelo"], "simulado-cassete")
+        self.assertEqual(cassete["mensagens"][0], {"tipo": "SystemMessage", "conteudo": "Gere SQL."})
+        self.assertEqual(cassete["resposta"]["conteudo"], resposta.content)
+
+    def test_reproduz_sem_chamar_o_provedor(self):
+        """Testa se a reprodução devolve a resposta gravada, com os metadados, na latência original."""
+        modelo, gravada = self._gravar(atraso=0.05)
+        recebidos = []
+        with patch('agent.cliente_llm.LLM_CASSETES_MODO', 'reproduzir'):
+            inicio = time.monotonic()
+            resposta = rmta_invocar_modelo(modelo, self.mensagens, ao_receber=recebidos.append)
+            decorrido = time.monotonic() - inicio
+
+        self.assertEqual(modelo.chamadas, 1)
+        self.assertEqual(resposta.content, gravada.content)
+        self.assertEqual(resposta.response_metadata["token_usage"]["prompt_tokens"], 12)
+        self.assertEqual(recebidos, [gravada.content])
+        self.assertGreaterEqual(decorrido, 0.05)
+
+    def test_latencia_configurada_e_cassete_ausente(self):
+        """Testa a latência fixa de reprodução e o erro para requisições não gravadas."""
+        modelo, _ = self._gravar(atraso=0.2)
+        self.assertEqual(rmta_latencia_reproducao({"latencia": 0.2}, "0.01"), 0.01)
+        self.assertEqual(rmta_latencia_reproducao({"latencia": 0.2}, "original"), 0.2)
+        with patch('agent.cliente_llm.LLM_CASSETES_MODO', 'reproduzir'), \
+                patch('agent.cliente_llm.rmta_latencia_reproducao', side_effect=lambda c: rmta_latencia_reproducao(c, "0")):
+            inicio = time.monotonic()
+            rmta_invocar_modelo(modelo, self.mensagens)
+            self.assertLess(time.monotonic() - inicio, 0.1)
+
+            with self.assertRaises(ErroCasseteAusente):
+                rmta_invocar_modelo(modelo, [HumanMessage(content="nunca gravada")])
+
+    def test_modelo_de_reproducao_sem_chave(self):
+        """Testa se o modo de reprodução dispensa o cliente do provedor."""
+        with patch('agent.cliente_llm.LLM_CASSETES_MODO', 'reproduzir'), \
+                patch('agent.cliente_llm._criar_cliente_modelo') as mock_criar:
+            modelo = rmta_obter_modelo("gpt-4o")
+        mock_criar.assert_not_called()
+        self.assertIsInstance(modelo, ModeloCassete)
+        self.assertEqual(modelo.model_name, "gpt-4o")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""
+Testes do orçamento de importação do SQL Agent.
+
+Este módulo verifica que a importação dos módulos do agente, da API e do banco
+não carrega dependências pesadas e cabe no orçamento de tempo do benchmark.
+"""
+import unittest
+from benchmarks.importacao import ORCAMENTO_IMPORTACAO, rmta_medir_importacao
+
+class TesteOrcamentoImportacao(unittest.TestCase):
+    """Testes para a importação preguiçosa das dependências pesadas."""
+    
+    def test_importacao_sem_dependencias_pesadas_e_dentro_do_orcamento(self):
+        """Testa se cada módulo importa rápido e sem pandas, LangGraph, LangChain ou Streamlit."""
+        for modulo, orcamento in ORCAMENTO_IMPORTACAO.items():
+            with self.subTest(modulo=modulo):
+                medicao = rmta_medir_importacao(modulo, repeticoes=3)
+                self.assertEqual(medicao["carregadas"], [])
+                self.assertLessEqual(medicao["minimo"], orcamento)
+    
+    def test_fim_do_fluxo_igual_ao_do_langgraph(self):
+        """Testa se o END local tem o mesmo valor do END do LangGraph."""
+        from langgraph.graph import END as END_LANGGRAPH
+        from agent.estado import END
+        
+        self.assertEqual(END, END_LANGGRAPH)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Testes unitários para o índice de entidades.
+
+Este módulo contém testes para a busca aproximada por trigramas, os valores
+sugeridos no prompt, a checagem dos literais do SQL, o limite de valores por
+coluna e a carga incremental em segundo plano.
+"""
+import threading
+import unittest
+from unittest.mock import patch
+from agent.nos import rmta_verificar_sql
+from agent.templates_prompt import TEMPLATE_GERAR_SQL, rmta_bloco_valores
+from database import indice_entidades
+from database.indice_entidades import (
+    IndiceEntidades,
+    rmta_literais_sem_correspondencia,
+    rmta_obter_indice_entidades,
+    rmta_valores_mencionados
+)
+
+
+def _criar_indice():
+    """Cria um índice de entidades carregado com os dados de exemplo do banco."""
+    indice = IndiceEntidades()
+    indice.adicionar("produtos", "nome", [
+        "Smartphone Galaxy S21", "Notebook Dell Inspiron", "Notebook Lenovo", "Smart TV LG 50", "Fone de Ouvido JBL"
+    ])
+    indice.adicionar("produtos", "categoria", ["Eletrônicos", "Informática", "Áudio"])
+    indice.adicionar("clientes", "nome", ["Ana Silva", "Carlos Oliveira"])
+    indice.carregado_em = float("inf")
+    return indice
+
+
+class ConexaoFalsa:
+    """Conexão que responde às consultas da carga do índice e registra as colunas lidas."""
+
+    def __init__(self, valores, versoes):
+        self.valores = valores
+        self.versoes = versoes
+        self.lidas = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, parametros=None):
+        self._sql = sql
+
+    def fetchall(self):
+        if "pg_stat_user_tables" in self._sql:
+            return list(self.versoes.items())
+        coluna = next(chave for chave in self.valores if f"{chave[1]} FROM {chave[0]} " in self._sql)
+        self.lidas.append(coluna)
+        return [(valor,) for valor in self.valores[coluna]]
+
+    def close(self):
+        pass
+
+
+class TesteIndiceEntidades(unittest.TestCase):
+    """Testes para o índice de entidades."""
+
+    def setUp(self):
+        patcher = patch.object(indice_entidades, "_indice", _criar_indice())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_busca_aproximada_e_valores_do_prompt(self):
+        """Testa se erros de digitação e acentos encontram os valores, e se o prompt recebe só eles."""
+        self.assertEqual(
+            indice_entidades._indice.buscar_aproximado("produtos", "nome", "notebok dell")[0][0],
+            "Notebook Dell Inspiron"
+        )
+        mencionados = rmta_valores_mencionados("Quais clientes compraram notebok em eletronicos?")
+        self.assertEqual(mencionados, {
+            "produtos.nome": ["Notebook Dell Inspiron", "Notebook Lenovo"],
+            "produtos.categoria": ["Eletrônicos"]
+        })
+        self.assertEqual(rmta_valores_mencionados("Quanto cada cliente gastou no total?"), {})
+
+        _, mensagem = TEMPLATE_GERAR_SQL.renderizar(consulta="pergunta", valores_conhecidos=rmta_bloco_valores(mencionados))
+        self.assertIn("- produtos.categoria: 'Eletrônicos'", mensagem)
+        self.assertNotIn("Smartphone", mensagem)
+        self.assertEqual(rmta_bloco_valores({}), "")
+
+    def test_literais_sem_correspondencia(self):
+        """Testa se apenas os literais que não existem no banco são apontados, com sugestões."""
+        sql = (
+            "SELECT c.nome FROM clientes c JOIN transacoes t ON t.cliente_id = c.id "
+            "JOIN produtos AS p ON p.id = t.produto_id "
+            "WHERE p.categoria = 'Eletronicos' AND p.nome ILIKE '%notebook%' "
+            "AND LOWER(p.nome) LIKE 'smart%' AND c.nome IN ('Ana Silva', 'Joana')"
+        )
+        self.assertEqual(rmta_literais_sem_correspondencia(sql), [
+            {"coluna": "produtos.categoria", "literal": "Eletronicos", "sugestoes": ["Eletrônicos"]},
+            {"coluna": "clientes.nome", "literal": "Joana", "sugestoes": []}
+        ])
+        # "nome" sem apelido é ambíguo entre clientes e produtos
+        self.assertEqual(rmta_literais_sem_correspondencia("SELECT 1 FROM clientes, produtos WHERE nome = 'X'"), [])
+
+        validacao = rmta_verificar_sql("SELECT * FROM produtos WHERE nome = 'Notebook'", None)
+        self.assertTrue(validacao["is_valid"])
+        self.assertEqual(validacao["literais_sem_correspondencia"][0]["sugestoes"], ["Notebook Dell Inspiron", "Notebook Lenovo"])
+
+    def test_colunas_de_alta_cardinalidade_ficam_parciais(self):
+        """Testa o limite de valores por coluna e se colunas parciais não têm literais apontados."""
+        indice = indice_entidades._indice
+        with patch.object(indice_entidades, "INDICE_ENTIDADES_MAX_VALORES", 2):
+            indice.adicionar("clientes", "nome", ["Ana Silva", "Bruno Costa", "Carlos Oliveira"])
+        self.assertEqual(indice.exportar()["clientes.nome"], ["Ana Silva", "Bruno Costa"])
+        self.assertEqual(indice.parciais(), ["clientes.nome"])
+        self.assertIsNone(indice.corresponde("clientes", "nome", "Carlos Oliveira"))
+        self.assertEqual(rmta_literais_sem_correspondencia("SELECT * FROM clientes WHERE nome = 'Carlos Oliveira'"), [])
+
+        copia = IndiceEntidades()
+        copia.importar(indice.exportar(), indice.parciais())
+        self.assertEqual(copia.parciais(), ["clientes.nome"])
+
+    def test_carga_incremental(self):
+        """Testa se só as colunas de tabelas alteradas desde a última carga são lidas de novo."""
+        indice = IndiceEntidades()
+        conexao = ConexaoFalsa(
+            {("produtos", "nome"): ["Notebook Lenovo"], ("produtos", "categoria"): ["Informática"],
+             ("clientes", "nome"): ["Ana Silva"]},
+            {"clientes": 10, "produtos": 20}
+        )
+        indice.carregar(conexao)
+        self.assertEqual(len(conexao.lidas), 3)
+
+        conexao.lidas.clear()
+        conexao.versoes["clientes"] = 11
+        conexao.valores[("clientes", "nome")] = ["Ana Silva", "Bruno Costa"]
+        indice.carregar(conexao)
+        self.assertEqual(conexao.lidas, [("clientes", "nome")])
+        self.assertEqual(indice.buscar("clientes", "nome", "bruno"), ["Bruno Costa"])
+
+    def test_carga_em_segundo_plano(self):
+        """Testa se a pergunta não espera a carga do índice, que segue em segundo plano."""
+        if indice_entidades._carga is not None:
+            indice_entidades._carga.join()
+        liberar = threading.Event()
+        conexao = ConexaoFalsa({chave: ["Valor"] for chave in indice_entidades.COLUNAS_INDEXADAS}, {})
+
+        def obter_conexao():
+            liberar.wait(5)
+            return conexao
+
+        with patch.object(indice_entidades, "_indice", IndiceEntidades()), \
+                patch('database.conexao.rmta_obter_conexao_bd', side_effect=obter_conexao):
+            self.assertTrue(rmta_obter_indice_entidades().vazio())
+            liberar.set()
+            indice = rmta_obter_indice_entidades(aguardar=True)
+            self.assertEqual(indice.buscar("produtos", "categoria", "valor"), ["Valor"])
+
+
+if __name__ == '__main__':
+    unittest.main()
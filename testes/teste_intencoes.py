@@ -0,0 +1,127 @@
+"""
+Testes unitários para o caminho rápido por intenções do SQL Agent.
+
+Este módulo contém testes unitários para o reconhecimento de intenções,
+a extração de parâmetros (produtos, categorias, períodos e limites) e
+os resumos determinísticos dos resultados.
+"""
+import unittest
+from datetime import date
+from unittest.mock import patch
+from agent.intencoes import (
+    rmta_extrair_periodo,
+    rmta_gerar_sql_por_regras,
+    rmta_resumir_resultados_intencao
+)
+from database.indice_entidades import IndiceEntidades
+from utils.texto import rmta_tokenizar
+
+
+def _criar_indice():
+    """Cria um índice de entidades com os dados de exemplo do banco."""
+    indice = IndiceEntidades()
+    indice.adicionar("produtos", "nome", [
+        "Smartphone Galaxy S21", "Notebook Dell Inspiron", "Smart TV LG 50", "Fone de Ouvido JBL"
+    ])
+    indice.adicionar("produtos", "categoria", ["Eletrônicos", "Informática", "Áudio"])
+    indice.adicionar("clientes", "nome", ["Ana Silva", "Carlos Oliveira"])
+    return indice
+
+
+class TesteIntencoes(unittest.TestCase):
+    """Testes para o reconhecimento de intenções e extração de parâmetros."""
+
+    def setUp(self):
+        patcher = patch('agent.intencoes.rmta_obter_indice_entidades', return_value=_criar_indice())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokenizar(self):
+        """Testa se a tokenização ignora acentos, palavras vazias e plurais simples."""
+        self.assertEqual(rmta_tokenizar("Os Notebooks de Informática"), ["notebook", "informatica"])
+
+    def test_extrair_periodo(self):
+        """Testa a extração de períodos absolutos e relativos."""
+        hoje = date(2024, 5, 20)
+        texto, periodo = rmta_extrair_periodo("clientes que mais gastaram em marco de 2024", hoje)
+        self.assertEqual(texto, "clientes que mais gastaram")
+        self.assertEqual(periodo, {"inicio": date(2024, 3, 1), "fim": date(2024, 4, 1)})
+
+        _, periodo = rmta_extrair_periodo("quem comprou notebook nos ultimos 30 dias", hoje)
+        self.assertEqual(periodo, {"inicio": date(2024, 4, 20), "fim": date(2024, 5, 21)})
+
+        _, periodo = rmta_extrair_periodo("vendas entre 01/02/2024 e 15/02/2024", hoje)
+        self.assertEqual(periodo, {"inicio": date(2024, 2, 1), "fim": date(2024, 2, 16)})
+
+        _, periodo = rmta_extrair_periodo("vendas desde 2024-01-10", hoje)
+        self.assertEqual(periodo, {"inicio": date(2024, 1, 10), "fim": None})
+
+        self.assertEqual(rmta_extrair_periodo("liste os clientes", hoje), ("liste os clientes", None))
+
+    def test_maiores_clientes_por_categoria(self):
+        """Testa o ranking de clientes com limite por extenso e filtro de categoria."""
+        gerado = rmta_gerar_sql_por_regras("Quais os três clientes que mais gastaram em informática em 2024?")
+        self.assertEqual(gerado["intencao"]["nome"], "maiores_clientes")
+        self.assertIn("p.categoria = ANY(%(categorias)s)", gerado["sql"])
+        self.assertIn("LIMIT %(limite)s", gerado["sql"])
+        self.assertEqual(gerado["parametros"], {
+            "limite": 3,
+            "categorias": ["Informática"],
+            "data_inicio": date(2024, 1, 1),
+            "data_fim": date(2025, 1, 1)
+        })
+
+    def test_maiores_clientes_sem_filtros(self):
+        """Testa o ranking sem filtros, que não precisa da tabela de produtos."""
+        gerado = rmta_gerar_sql_por_regras("Top 10 clientes por gasto")
+        self.assertEqual(gerado["parametros"], {"limite": 10})
+        self.assertNotIn("produtos", gerado["sql"])
+
+    def test_quem_comprou_produto(self):
+        """Testa a resolução de produtos pelo índice de entidades."""
+        gerado = rmta_gerar_sql_por_regras("Quem comprou notebook?")
+        self.assertEqual(gerado["intencao"]["nome"], "quem_comprou")
+        self.assertEqual(gerado["parametros"], {"produtos": ["Notebook Dell Inspiron"]})
+        self.assertIn("p.nome = ANY(%(produtos)s)", gerado["sql"])
+
+    def test_saldo_suficiente(self):
+        """Testa a intenção de clientes com saldo para comprar um produto."""
+        gerado = rmta_gerar_sql_por_regras("Quais clientes podem comprar o fone JBL?")
+        self.assertEqual(gerado["intencao"]["nome"], "saldo_suficiente")
+        self.assertEqual(gerado["parametros"], {"produtos": ["Fone de Ouvido JBL"]})
+        self.assertIn("c.saldo >= p.preco", gerado["sql"])
+
+    def test_entidade_desconhecida_segue_para_llm(self):
+        """Testa se entidades fora do índice não são atendidas pelas regras."""
+        self.assertIsNone(rmta_gerar_sql_por_regras("Quem comprou bicicletas?"))
+        self.assertIsNone(rmta_gerar_sql_por_regras("Qual o produto mais vendido em outubro?"))
+
+    def test_palavras_fora_das_entidades_seguem_para_llm(self):
+        """Testa se negações, quantidades e perguntas compostas não caem no template."""
+        for pergunta in (
+            "Quem comprou notebook mas não comprou mouse?",
+            "Quais clientes compraram nenhum notebook?",
+            "Quem comprou mais de 2 notebooks?",
+            "Quais clientes compraram Notebook e quanto gastaram?",
+            "Top 3 clientes que mais gastaram e quantas compras fizeram?",
+            "Quem pode comprar o fone JBL à vista?"
+        ):
+            with self.subTest(pergunta=pergunta):
+                self.assertIsNone(rmta_gerar_sql_por_regras(pergunta))
+        self.assertEqual(
+            rmta_gerar_sql_por_regras("Quais clientes compraram o Notebook Dell?")["parametros"],
+            {"produtos": ["Notebook Dell Inspiron"]}
+        )
+
+    def test_resumo_deterministico(self):
+        """Testa o resumo dos resultados sem chamada ao LLM."""
+        gerado = rmta_gerar_sql_por_regras("Quem comprou notebook?")
+        resumo = rmta_resumir_resultados_intencao(gerado["intencao"], [
+            {"nome": "Ana Silva", "email": "ana@email.com"},
+            {"nome": "Carlos Oliveira", "email": "carlos@email.com"}
+        ])
+        self.assertEqual(resumo, "2 cliente(s) compraram (produtos Notebook Dell Inspiron): Ana Silva, Carlos Oliveira.")
+        self.assertIsNone(rmta_resumir_resultados_intencao(gerado["intencao"], [{"outra": 1}]))
+
+if __name__ == '__main__':
+    unittest.main()
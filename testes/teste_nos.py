@@ -6,7 +6,6 @@ os nós do grafo de fluxo do LangGraph.
 """
 import unittest
 from unittest.mock import patch, MagicMock
-import pandas as pd
 from agent.estado import EstadoAgente
 from agent.nos import rmta_validar_sql, rmta_executar_sql, rmta_decidir_proximo_passo
 
@@ -92,21 +91,19 @@ class TesteExecutarSQL(unittest.TestCase):
         self.assertIn("Falha na conexão", resultado["erro"])
     
     @patch('agent.nos.rmta_obter_conexao_bd')
-    @patch('pandas.read_sql_query')
-    def test_execucao_bem_sucedida(self, mock_read_sql, mock_conexao):
+    def test_execucao_bem_sucedida(self, mock_conexao):
         """Testa a execução bem-sucedida de uma consulta."""
         # Mock da conexão
         mock_conn = MagicMock()
         mock_conexao.return_value = mock_conn
         
         # Mock do resultado da consulta
-        df = pd.DataFrame({
-            'id': [1, 2],
-            'nome': ['Ana Silva', 'Bruno Costa'],
-            'email': ['ana.silva@email.com', 'bruno.costa@email.com'],
-            'saldo': [5000.00, 3500.00]
-        })
-        mock_read_sql.return_value = df
+        mock_cursor = mock_conn.cursor.return_value
+        mock_cursor.description = [('id',), ('nome',), ('email',), ('saldo',)]
+        mock_cursor.fetchall.return_value = [
+            (1, 'Ana Silva', 'ana.silva@email.com', 5000.00),
+            (2, 'Bruno Costa', 'bruno.costa@email.com', 3500.00)
+        ]
         
         estado = EstadoAgente(
             consulta="Listar todos os clientes",
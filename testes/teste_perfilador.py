@@ -0,0 +1,105 @@
+"""
+Testes unitários para o perfilador dos nós do grafo.
+
+Este módulo contém testes para a escolha das requisições perfiladas, os modos
+cProfile e amostragem de pilhas, o buffer circular de perfis e os arquivos
+exportados (pstats e pilhas colapsadas).
+"""
+import json
+import os
+import pstats
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from utils import perfilador
+from utils.perfilador import (
+    MODO_AMOSTRAGEM,
+    MODO_CPROFILE,
+    rmta_contexto_perfil,
+    rmta_exportar_pilhas,
+    rmta_exportar_pstats,
+    rmta_listar_perfis,
+    rmta_perfilar_no
+)
+
+
+def serializar_por(segundos):
+    """Nó simulado que passa o tempo serializando JSON."""
+    def serializar(estado):
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < segundos:
+            json.dumps({"linhas": list(range(200))})
+        return estado
+    return serializar
+
+
+def _carregar_pstats(conteudo):
+    """Carrega o conteúdo exportado como um arquivo .pstats."""
+    with tempfile.NamedTemporaryFile(suffix=".pstats", delete=False) as arquivo:
+        arquivo.write(conteudo)
+    try:
+        return pstats.Stats(arquivo.name)
+    finally:
+        os.unlink(arquivo.name)
+
+
+class TestePerfilador(unittest.TestCase):
+    """Testes para o perfilador dos nós."""
+
+    def setUp(self):
+        perfilador._perfis.clear()
+
+    def test_sem_perfil_o_no_roda_direto(self):
+        """Testa se, fora de uma requisição escolhida, nada é registrado."""
+        no = rmta_perfilar_no("gerar_sql", serializar_por(0.01))
+        with rmta_contexto_perfil("pergunta", amostragem=0) as perfil:
+            self.assertEqual(no({"consulta": "x"}), {"consulta": "x"})
+        self.assertIsNone(perfil)
+        self.assertEqual(rmta_listar_perfis(), [])
+
+    def test_amostragem_de_requisicoes(self):
+        """Testa se 1 a cada N requisições é perfilada e se o buffer guarda só as mais recentes."""
+        no = rmta_perfilar_no("validar_sql", lambda estado: estado)
+        with patch.object(perfilador, "_contador_requisicoes", iter(range(6))), \
+                patch.object(perfilador, "_perfis", perfilador.deque(maxlen=1)):
+            escolhidas = []
+            for i in range(6):
+                with rmta_contexto_perfil(f"pergunta {i}", amostragem=3, modo=MODO_CPROFILE) as perfil:
+                    no({})
+                escolhidas.append(perfil is not None)
+            self.assertEqual(escolhidas, [True, False, False, True, False, False])
+            self.assertEqual([p.consulta for p in rmta_listar_perfis()], ["pergunta 3"])
+
+    def test_cprofile_exporta_pstats(self):
+        """Testa se o modo cProfile registra o nó e exporta um pstats com as funções chamadas."""
+        no = rmta_perfilar_no("explicar_resultados", serializar_por(0.05))
+        with rmta_contexto_perfil("pergunta", forcar=True, modo=MODO_CPROFILE) as perfil:
+            no({})
+            no({})
+
+        self.assertEqual([registro.nome for registro in perfil.nos], ["explicar_resultados"] * 2)
+        self.assertIs(rmta_listar_perfis()[0], perfil)
+        funcoes = {nome for _, _, nome in _carregar_pstats(rmta_exportar_pstats(perfil)).stats}
+        self.assertIn("serializar", funcoes)
+        self.assertIn("dumps", funcoes)
+        self.assertIsNone(rmta_exportar_pilhas(perfil))
+
+    def test_amostragem_exporta_pilhas_e_pstats(self):
+        """Testa se o modo de amostragem gera pilhas colapsadas a partir do nó e um pstats estimado."""
+        no = rmta_perfilar_no("gerar_sql", serializar_por(0.2))
+        with rmta_contexto_perfil("pergunta", forcar=True, modo=MODO_AMOSTRAGEM, intervalo=0.001) as perfil:
+            no({})
+
+        linhas = rmta_exportar_pilhas(perfil).splitlines()
+        self.assertTrue(linhas)
+        self.assertTrue(all(linha.startswith("gerar_sql;serializar (") for linha in linhas))
+        self.assertTrue(all(linha.rsplit(" ", 1)[1].isdigit() for linha in linhas))
+
+        estatisticas = _carregar_pstats(rmta_exportar_pstats(perfil))
+        tempo_no = next(ct for (_, _, nome), (_, _, _, ct, _) in estatisticas.stats.items() if nome == "serializar")
+        self.assertAlmostEqual(tempo_no, perfil.nos[0].duracao, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Testes unitários para o registro compacto de mensagens do SQL Agent.
+
+Este módulo contém testes unitários para o armazenamento das mensagens
+por referência de template e para a reidratação do texto completo.
+"""
+import unittest
+from agent.templates_prompt import TEMPLATE_GERAR_SQL, TEMPLATE_EXPLICAR_RESULTADOS
+from agent.registro_mensagens import (
+    rmta_registrar_prompt,
+    rmta_registrar_resposta,
+    rmta_reidratar_mensagens,
+    rmta_resumir_mensagem
+)
+
+class TesteRegistroMensagens(unittest.TestCase):
+    """Testes para o registro e a reidratação do histórico de mensagens."""
+
+    def test_prompt_registrado_sem_texto_completo(self):
+        """Testa se o histórico guarda o template e os parâmetros em vez do prompt."""
+        mensagens = []
+        rmta_registrar_prompt(mensagens, TEMPLATE_GERAR_SQL, {"consulta": "Listar clientes"})
+
+        self.assertEqual(len(mensagens), 2)
+        self.assertEqual(mensagens[0]["template_id"], "gerar_sql")
+        self.assertNotIn("content", mensagens[0])
+        self.assertEqual(mensagens[1]["parametros"], {"consulta": "Listar clientes"})
+        self.assertNotIn("CREATE TABLE", str(mensagens))
+
+    def test_reidratacao_reconstroi_texto(self):
+        """Testa se a reidratação reproduz exatamente os prompts enviados."""
+        mensagens = []
+        rmta_registrar_prompt(mensagens, TEMPLATE_GERAR_SQL, {"consulta": "Listar clientes"})
+        rmta_registrar_resposta(mensagens, '{"query": "SELECT 1"}')
+
+        sistema, usuario = TEMPLATE_GERAR_SQL.renderizar(consulta="Listar clientes")
+        reidratadas = rmta_reidratar_mensagens(mensagens)
+        self.assertEqual(reidratadas[0], {"role": "system", "content": sistema})
+        self.assertEqual(reidratadas[1], {"role": "user", "content": usuario})
+        self.assertEqual(reidratadas[2]["content"], '{"query": "SELECT 1"}')
+
+    def test_parametro_grande_fica_fora_do_estado(self):
+        """Testa se parâmetros grandes são substituídos por referência no estado."""
+        resultados = "[" + ", ".join(f'{{"id": {i}}}' for i in range(500)) + "]"
+        mensagens = []
+        rmta_registrar_prompt(mensagens, TEMPLATE_EXPLICAR_RESULTADOS, {"sql": "SELECT id FROM t", "resultados": resultados})
+
+        referencia = mensagens[1]["parametros"]["resultados"]
+        self.assertIn("ref", referencia)
+        self.assertIn("<ref", rmta_resumir_mensagem(mensagens[1]))
+        self.assertIn(resultados, rmta_reidratar_mensagens(mensagens)[1]["content"])
@@ -0,0 +1,60 @@
+"""
+Testes unitários para o pós-processamento local dos resultados.
+
+Este módulo contém testes unitários para filtros, ordenação, agrupamento
+e paginação aplicados sobre o resultado já executado.
+"""
+import unittest
+from decimal import Decimal
+from utils.resultados_locais import (
+    rmta_preparar_dataframe,
+    rmta_filtrar,
+    rmta_paginar,
+    rmta_aplicar_operacoes
+)
+
+RESULTADOS = [
+    {"cliente": "Ana", "categoria": "Eletrônicos", "valor_total": Decimal("3999.90")},
+    {"cliente": "Bruno", "categoria": "Informática", "valor_total": Decimal("4500.00")},
+    {"cliente": "Ana", "categoria": "Áudio", "valor_total": Decimal("299.90")},
+    {"cliente": "Carla", "categoria": "Eletrônicos", "valor_total": Decimal("2799.90")}
+]
+
+
+class TesteResultadosLocais(unittest.TestCase):
+    """Testes para as operações locais sobre o resultado."""
+    
+    def setUp(self):
+        self.df = rmta_preparar_dataframe(RESULTADOS)
+    
+    def test_decimal_convertido_para_numero(self):
+        """Testa se colunas NUMERIC (Decimal) ficam numéricas para gráficos e filtros."""
+        self.assertEqual(list(self.df.select_dtypes(include='number').columns), ["valor_total"])
+    
+    def test_filtros(self):
+        """Testa filtros numéricos e de texto."""
+        self.assertEqual(len(rmta_filtrar(self.df, "valor_total", ">", "1000,5")), 3)
+        self.assertEqual(list(rmta_filtrar(self.df, "categoria", "contém", "eletr")["cliente"]), ["Ana", "Carla"])
+        with self.assertRaises(ValueError):
+            rmta_filtrar(self.df, "valor_total", ">", "muito")
+    
+    def test_agrupar_e_ordenar(self):
+        """Testa agrupamento seguido de ordenação, com tempos por operação."""
+        df, tempos = rmta_aplicar_operacoes(self.df, {
+            "agrupamento": {"colunas": ["cliente"], "coluna_valor": "valor_total", "agregacao": "soma"},
+            "ordenacao": {"coluna": "soma_valor_total", "ascendente": False}
+        })
+        self.assertEqual(list(df["cliente"]), ["Bruno", "Ana", "Carla"])
+        self.assertAlmostEqual(df["soma_valor_total"].iloc[1], 4299.80)
+        self.assertEqual(set(tempos), {"local_agrupar", "local_ordenar"})
+    
+    def test_paginar(self):
+        """Testa a paginação e o limite de páginas."""
+        pagina, total = rmta_paginar(self.df, 2, 3)
+        self.assertEqual(total, 2)
+        self.assertEqual(list(pagina["cliente"]), ["Carla"])
+        pagina, _ = rmta_paginar(self.df, 10, 3)
+        self.assertEqual(len(pagina), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Testes unitários para o roteador de níveis de modelo do SQL Agent.
+
+Este módulo contém testes unitários para o escalonamento entre regras,
+modelo rápido e modelo completo, usando modelos simulados locais.
+"""
+import json
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+from agent import cliente_llm
+from config.configuracoes import _ler_niveis
+from agent.fluxo_trabalho import rmta_executar_fluxo
+from agent.intencoes import rmta_gerar_sql_por_regras
+from agent.roteador_modelos import (
+    rmta_proximo_nivel,
+    rmta_obter_estatisticas_roteador,
+    rmta_limpar_estatisticas_roteador
+)
+
+
+class ModeloFixo:
+    """Modelo simulado que responde sempre com a mesma consulta."""
+
+    def __init__(self, nome, sql):
+        self.model_name = nome
+        self.sql = sql
+        self.chamadas = 0
+
+    def invoke(self, mensagens):
+        self.chamadas += 1
+        if "Resultados (em formato JSON)" in mensagens[-1].content:
+            return MagicMock(content=f"Explicação de {self.model_name}")
+        return MagicMock(content=json.dumps({"query": self.sql, "explanation": self.model_name}))
+
+
+class TesteRoteadorModelos(unittest.TestCase):
+    """Testes para o escalonamento entre os níveis de modelo."""
+
+    def setUp(self):
+        rmta_limpar_estatisticas_roteador()
+        cliente_llm._disjuntores.clear()
+        self.modelos = {}
+
+    def _configurar_modelos(self, sql_rapido, sql_completo):
+        self.modelos = {
+            "rapido": ModeloFixo(f"rapido-{self.id()}", sql_rapido),
+            "completo": ModeloFixo(f"completo-{self.id()}", sql_completo)
+        }
+        return lambda nivel: self.modelos[nivel]
+
+    def test_proximo_nivel(self):
+        """Testa a ordem padrão de escalonamento."""
+        self.assertEqual(rmta_proximo_nivel("gerar_sql", "regras"), "rapido")
+        self.assertEqual(rmta_proximo_nivel("gerar_sql", "rapido"), "completo")
+        self.assertIsNone(rmta_proximo_nivel("gerar_sql", "completo"))
+
+    def test_niveis_configurados(self):
+        """Testa se espaços e entradas vazias são ignorados e nomes desconhecidos são rejeitados."""
+        validos = ("regras", "rapido", "completo")
+        with patch.dict(os.environ, {"NIVEIS_TESTE": " regras, Rapido,,completo "}):
+            self.assertEqual(_ler_niveis("NIVEIS_TESTE", "", validos), ["regras", "rapido", "completo"])
+        for valor in ("regras,rapdo", " , "):
+            with patch.dict(os.environ, {"NIVEIS_TESTE": valor}), self.assertRaises(ValueError):
+                _ler_niveis("NIVEIS_TESTE", "", validos)
+
+    def test_regra_conhecida(self):
+        """Testa se formatos conhecidos são atendidos pelas regras."""
+        gerado = rmta_gerar_sql_por_regras("Quanto cada cliente gastou no total?")
+        self.assertIn("SUM(t.valor_total)", gerado["sql"])
+        self.assertEqual(gerado["intencao"]["nome"], "gasto_por_cliente")
+        self.assertIsNone(rmta_gerar_sql_por_regras("Qual o produto mais vendido em outubro?"))
+
+    @patch('agent.nos.rmta_executar_no_banco')
+    @patch('agent.nos.rmta_obter_modelo_nivel')
+    def test_pergunta_por_regras_sem_llm_na_geracao(self, mock_modelo_nivel, mock_executar):
+        """Testa se perguntas atendidas por regras não chamam o LLM em nenhuma etapa."""
+        mock_modelo_nivel.side_effect = self._configurar_modelos("SELECT 1", "SELECT 1")
+        mock_executar.return_value = ([{"nome": "Ana", "total_gasto": 10}], None, None)
+
+        estado = rmta_executar_fluxo("Quanto cada cliente gastou?")
+        self.assertIsNone(estado["erro"])
+        self.assertEqual(estado["nivel_modelo"], "regras")
+        self.assertEqual(self.modelos["rapido"].chamadas, 0)
+        self.assertEqual(self.modelos["completo"].chamadas, 0)
+        self.assertIn("Ana (R$ 10,00)", estado["explicacao_resultados"])
+
+    @patch('agent.nos.rmta_verificar_plano')
+    @patch('agent.nos.rmta_executar_no_banco')
+    @patch('agent.nos.rmta_obter_modelo_nivel')
+    def test_escala_quando_validacao_falha(self, mock_modelo_nivel, mock_executar, mock_plano):
+        """Testa se SQL inválido do modelo rápido escala para o modelo completo."""
+        mock_modelo_nivel.side_effect = self._configurar_modelos("DROP TABLE clientes", "SELECT nome FROM clientes")
+        mock_executar.return_value = ([{"nome": "Ana"}], None, None)
+        mock_plano.return_value = None
+
+        estado = rmta_executar_fluxo("Qual o nome dos clientes mais antigos?")
+        self.assertIsNone(estado["erro"])
+        self.assertEqual(estado["nivel_modelo"], "completo")
+        self.assertEqual(estado["sql"], "SELECT nome FROM clientes")
+        self.assertIn("gerar_sql[rapido]", estado["tempo_execucao"])
+        mock_executar.assert_called_once_with("SELECT nome FROM clientes")
+
+        estatisticas = rmta_obter_estatisticas_roteador()["gerar_sql"]
+        self.assertEqual(estatisticas["rapido"]["taxa_sucesso"], 0)
+        self.assertEqual(estatisticas["completo"]["taxa_sucesso"], 1)
+
+    @patch('agent.nos.rmta_verificar_plano')
+    @patch('agent.nos.rmta_executar_no_banco')
+    @patch('agent.nos.rmta_obter_modelo_nivel')
+    def test_escala_quando_explain_falha(self, mock_modelo_nivel, mock_executar, mock_plano):
+        """Testa se um erro de planejamento no EXPLAIN escala antes de executar."""
+        mock_modelo_nivel.side_effect = self._configurar_modelos("SELECT idade FROM clientes", "SELECT nome FROM clientes")
+        mock_executar.return_value = ([{"nome": "Ana"}], None, None)
+        mock_plano.return_value = 'column "idade" does not exist'
+
+        estado = rmta_executar_fluxo("Qual a idade dos clientes?")
+        self.assertEqual(estado["nivel_modelo"], "completo")
+        mock_plano.assert_called_once_with("SELECT idade FROM clientes")
+        mock_executar.assert_called_once_with("SELECT nome FROM clientes")
+
+    @patch('agent.nos.rmta_verificar_plano')
+    @patch('agent.nos.rmta_executar_no_banco')
+    @patch('agent.nos.rmta_obter_modelo_nivel')
+    def test_falha_no_ultimo_nivel_encerra(self, mock_modelo_nivel, mock_executar, mock_plano):
+        """Testa se o fluxo termina com erro quando o modelo completo também falha."""
+        mock_modelo_nivel.side_effect = self._configurar_modelos("SELECT x", "SELECT y")
+        mock_executar.return_value = (None, "Erro ao executar a consulta: coluna inexistente", None)
+        mock_plano.return_value = None
+
+        estado = rmta_executar_fluxo("Pergunta sem resposta possível")
+        self.assertEqual(estado["nivel_modelo"], "completo")
+        self.assertIn("coluna inexistente", estado["erro"])
+        self.assertEqual(mock_executar.call_count, 2)
@@ -0,0 +1,112 @@
+"""
+Testes unitários para as sessões de conversa do SQL Agent.
+
+Este módulo contém testes unitários para as perguntas de acompanhamento:
+refinamentos respondidos localmente ou por subconsulta e o contexto
+enviado ao LLM nas demais perguntas.
+"""
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from agent.fluxo_trabalho import rmta_criar_estado_inicial, rmta_processar_consulta
+from agent.sessoes import rmta_encerrar_sessao, rmta_reescrever_sql
+from database.indice_entidades import IndiceEntidades
+
+RESULTADO_PRODUTOS = [
+    {"nome": "Smartphone Galaxy S21", "categoria": "Eletrônicos", "preco": Decimal("3999.90")},
+    {"nome": "Notebook Dell Inspiron", "categoria": "Informática", "preco": Decimal("4500.00")},
+    {"nome": "Smart TV LG 50", "categoria": "Eletrônicos", "preco": Decimal("2799.90")},
+    {"nome": "Fone de Ouvido JBL", "categoria": "Áudio", "preco": Decimal("299.90")}
+]
+
+
+def _estado_anterior(consulta, contexto_sessao=None, aproximado=False):
+    """Estado final simulado da primeira pergunta da sessão."""
+    estado = rmta_criar_estado_inicial(consulta, contexto_sessao)
+    estado["sql"] = "SELECT p.nome, p.categoria, p.preco FROM produtos p WHERE p.nome ILIKE '%a%'"
+    estado["resultados"] = [dict(linha) for linha in RESULTADO_PRODUTOS]
+    return estado
+
+
+class TesteSessoes(unittest.TestCase):
+    """Testes para perguntas de acompanhamento dentro de uma sessão."""
+    
+    def setUp(self):
+        self.id_sessao = self.id()
+        self.addCleanup(rmta_encerrar_sessao, self.id_sessao)
+        patcher = patch('agent.fluxo_trabalho.rmta_executar_fluxo', side_effect=_estado_anterior)
+        self.mock_fluxo = patcher.start()
+        self.addCleanup(patcher.stop)
+        rmta_processar_consulta("Liste os produtos", self.id_sessao)
+    
+    @patch('agent.sessoes.rmta_executar_no_banco')
+    def test_filtro_local(self, mock_executar):
+        """Testa se um filtro sobre o resultado completo é respondido sem o banco."""
+        estado = rmta_processar_consulta("E só os de Eletrônicos?", self.id_sessao)
+        self.assertIsNone(estado["erro"])
+        self.assertEqual(estado["nivel_modelo"], "sessao")
+        self.assertEqual([linha["nome"] for linha in estado["resultados"]], ["Smartphone Galaxy S21", "Smart TV LG 50"])
+        self.assertIsInstance(estado["resultados"][0]["preco"], Decimal)
+        self.assertEqual(estado["parametros_sql"], {"refinamento_0": ["Eletrônicos"]})
+        self.assertIn("refinamento_local", estado["tempo_execucao"])
+        mock_executar.assert_not_called()
+        self.assertEqual(self.mock_fluxo.call_count, 1)
+    
+    def test_refinamentos_encadeados(self):
+        """Testa comparação, ordenação e limite aplicados sobre o refinamento anterior."""
+        estado = rmta_processar_consulta("Só os com preço acima de 1.000", self.id_sessao)
+        self.assertEqual(len(estado["resultados"]), 3)
+        estado = rmta_processar_consulta("Ordene por preço decrescente", self.id_sessao)
+        self.assertEqual(estado["resultados"][0]["nome"], "Notebook Dell Inspiron")
+        estado = rmta_processar_consulta("Só os 2 primeiros", self.id_sessao)
+        self.assertEqual([linha["nome"] for linha in estado["resultados"]], ["Notebook Dell Inspiron", "Smartphone Galaxy S21"])
+        self.assertEqual(estado["sql"].count("AS anterior"), 3)
+        self.assertEqual(self.mock_fluxo.call_count, 1)
+    
+    @patch('agent.sessoes.SESSAO_MAX_LINHAS_CACHE', 2)
+    @patch('agent.sessoes.rmta_obter_indice_entidades')
+    @patch('agent.sessoes.rmta_executar_no_banco')
+    def test_subconsulta_quando_cache_incompleto(self, mock_executar, mock_indice):
+        """Testa se um resultado truncado no cache é refinado por subconsulta, com os valores do índice de entidades."""
+        rmta_processar_consulta("Liste os produtos", self.id_sessao)
+        
+        # Sem a coluna no índice, o filtro não é resolvido pelas linhas em cache: a pergunta segue para o fluxo
+        mock_indice.return_value = IndiceEntidades()
+        rmta_processar_consulta("Só os de Eletrônicos", self.id_sessao)
+        mock_executar.assert_not_called()
+        self.assertEqual(self.mock_fluxo.call_count, 3)
+        
+        indice = IndiceEntidades()
+        # "Smartphone Galaxy A54" está fora das 2 linhas em cache
+        indice.adicionar("produtos", "nome", [linha["nome"] for linha in RESULTADO_PRODUTOS] + ["Smartphone Galaxy A54"])
+        mock_indice.return_value = indice
+        mock_executar.return_value = ([RESULTADO_PRODUTOS[0]], None, None)
+        
+        estado = rmta_processar_consulta("Só o Smartphone", self.id_sessao)
+        sql, parametros = mock_executar.call_args.args
+        self.assertIn("ILIKE '%%a%%'", sql)
+        self.assertIn('WHERE anterior."nome" = ANY(%(refinamento_0)s)', sql)
+        self.assertEqual(parametros, {"refinamento_0": ["Smartphone Galaxy A54", "Smartphone Galaxy S21"]})
+        self.assertIn("refinamento_subconsulta", estado["tempo_execucao"])
+    
+    def test_acompanhamento_com_contexto(self):
+        """Testa se perguntas de acompanhamento que não são refinamentos levam o contexto ao fluxo."""
+        rmta_processar_consulta("E quais desses foram vendidos em março?", self.id_sessao)
+        _, contexto, _ = self.mock_fluxo.call_args.args
+        self.assertEqual(contexto["consulta_anterior"], "Liste os produtos")
+        self.assertIn("FROM produtos", contexto["sql_anterior"])
+        
+        rmta_processar_consulta("Quanto cada cliente gastou?", self.id_sessao)
+        self.assertIsNone(self.mock_fluxo.call_args.args[1])
+    
+    def test_reescrever_sql_com_parametros(self):
+        """Testa se novos parâmetros não colidem com os do SQL anterior."""
+        reescrita = rmta_reescrever_sql(
+            "SELECT * FROM (SELECT 1) AS anterior LIMIT %(refinamento_0)s;", {"refinamento_0": 5},
+            {"tipo": "limite", "n": 2}
+        )
+        self.assertEqual(reescrita["parametros"], {"refinamento_0": 5, "refinamento_1": 2})
+        self.assertTrue(reescrita["sql"].endswith("LIMIT %(refinamento_1)s"))
+
+if __name__ == '__main__':
+    unittest.main()
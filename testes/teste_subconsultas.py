@@ -0,0 +1,152 @@
+"""
+Testes unitários para a decomposição de perguntas compostas.
+
+Este módulo contém testes unitários para o planejamento de subconsultas,
+a execução paralela dos ramos e a mesclagem local dos resultados.
+"""
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from agent.fluxo_trabalho import rmta_criar_estado_inicial
+from agent.subconsultas import (
+    rmta_dividir_pergunta,
+    rmta_planejar_consulta,
+    rmta_executar_subconsultas,
+    rmta_mesclar_resultados
+)
+
+
+class TesteSubconsultas(unittest.TestCase):
+    """Testes para o planejamento e a execução de subconsultas."""
+
+    def test_dividir_pergunta(self):
+        """Testa se a divisão textual separa apenas novas perguntas."""
+        self.assertEqual(
+            rmta_dividir_pergunta("Liste os clientes e quanto cada cliente gastou no total?"),
+            ["Liste os clientes", "quanto cada cliente gastou no total?"]
+        )
+        self.assertEqual(rmta_dividir_pergunta("Liste os produtos; liste os clientes"), ["Liste os produtos", "liste os clientes"])
+        self.assertEqual(rmta_dividir_pergunta("Quem comprou Notebook e Smartphone?"), ["Quem comprou Notebook e Smartphone?"])
+
+    def test_parte_sem_sujeito_nao_e_dividida(self):
+        """Testa se uma parte que depende do sujeito da anterior continua na mesma pergunta."""
+        for pergunta in (
+            "Quais clientes compraram Notebook e quanto gastaram?",
+            "Quem comprou Notebook? Quanto gastaram?",
+            "Quais os 3 clientes que mais gastaram e quantas compras fizeram?"
+        ):
+            with self.subTest(pergunta=pergunta):
+                self.assertEqual(rmta_dividir_pergunta(pergunta), [pergunta])
+
+    @patch('agent.subconsultas.rmta_invocar_modelo')
+    def test_planejar_por_regras_sem_llm(self, mock_invocar):
+        """Testa se partes reconhecidas pelas regras formam o plano sem chamar o modelo."""
+        estado = rmta_criar_estado_inicial("Liste os clientes e liste os produtos")
+
+        estado = rmta_planejar_consulta(estado)
+        self.assertEqual([s["pergunta"] for s in estado["subconsultas"]], ["Liste os clientes", "liste os produtos"])
+        self.assertIn("planejar_consulta", estado["tempo_execucao"])
+        mock_invocar.assert_not_called()
+
+    @patch('agent.subconsultas.PLANEJADOR_ATIVO', True)
+    @patch('agent.subconsultas.rmta_obter_modelo_nivel')
+    @patch('agent.subconsultas.rmta_invocar_modelo')
+    def test_planejar_com_modelo(self, mock_invocar, mock_modelo):
+        """Testa se partes não reconhecidas pelas regras são planejadas pelo modelo, com a chave de junção."""
+        mock_invocar.return_value = MagicMock(
+            content='{"subconsultas": ["Qual o gasto por categoria?", "Quais os 3 maiores clientes de cada categoria?"],'
+                    ' "chave_juncao": "categoria"}',
+            response_metadata={}
+        )
+        estado = rmta_criar_estado_inicial("Compare o gasto por categoria e liste os 3 maiores clientes de cada uma")
+
+        estado = rmta_planejar_consulta(estado)
+        self.assertEqual(len(estado["subconsultas"]), 2)
+        self.assertEqual(estado["subconsultas"][0]["chave_juncao"], ["categoria"])
+        self.assertIn("planejar_consulta", estado["uso_tokens"])
+
+    @patch('agent.subconsultas.rmta_invocar_modelo')
+    def test_planejador_desligado_sem_llm(self, mock_invocar):
+        """Testa se, com o planejador desligado (padrão), divisões ambíguas seguem como consulta única sem LLM."""
+        estado = rmta_criar_estado_inicial("Compare o gasto por categoria e liste os 3 maiores clientes de cada uma")
+
+        estado = rmta_planejar_consulta(estado)
+        self.assertEqual(estado["subconsultas"], [])
+        mock_invocar.assert_not_called()
+
+    @patch('agent.subconsultas.PLANEJADOR_ATIVO', True)
+    @patch('agent.subconsultas.rmta_invocar_modelo', side_effect=Exception("Provedor indisponível"))
+    def test_planejar_falha_segue_consulta_unica(self, _):
+        """Testa se uma falha do planejador mantém a pergunta como consulta única."""
+        estado = rmta_criar_estado_inicial("Compare o gasto por categoria e liste os maiores clientes de cada uma")
+
+        estado = rmta_planejar_consulta(estado)
+        self.assertEqual(estado["subconsultas"], [])
+        self.assertIsNone(estado["erro"])
+
+    def test_mesclar_resultados_empilha_por_padrao(self):
+        """Testa se, sem chave do plano, os ramos são empilhados mesmo com colunas em comum."""
+        notebook = [{"nome": "Ana", "email": "ana@email.com"}]
+        smartphone = [{"nome": "Ana", "email": "ana@email.com"}, {"nome": "Bruno", "email": "bruno@email.com"}]
+        mesclado = rmta_mesclar_resultados([notebook, [], smartphone])
+        self.assertEqual(mesclado, [
+            {"subconsulta": 1, "nome": "Ana", "email": "ana@email.com"},
+            {"subconsulta": 3, "nome": "Ana", "email": "ana@email.com"},
+            {"subconsulta": 3, "nome": "Bruno", "email": "bruno@email.com"}
+        ])
+
+        empilhado = rmta_mesclar_resultados([[{"a": 1}], [{"b": 2}]])
+        self.assertEqual([linha["subconsulta"] for linha in empilhado], [1, 2])
+        self.assertIsNone(empilhado[0]["b"])
+        self.assertEqual(rmta_mesclar_resultados([notebook]), notebook)
+
+    def test_mesclar_resultados_pela_chave_do_plano(self):
+        """Testa a junção pela chave do plano e o empilhamento quando ela falha ou falta em um ramo."""
+        gasto = [{"categoria": "Informática", "total": 10}, {"categoria": "Áudio", "total": 5}]
+        clientes = [{"categoria": "Informática", "nome": "Ana"}]
+        mesclado = rmta_mesclar_resultados([gasto, clientes], ["categoria"])
+        self.assertEqual(mesclado[0], {"categoria": "Informática", "total": 10, "nome": "Ana"})
+        self.assertIsNone(mesclado[1]["nome"])
+
+        # Chave com tipos diferentes (inteiro e texto): a junção falha e os ramos são empilhados
+        por_id = rmta_mesclar_resultados([[{"id": 1, "total": 10}], [{"id": "1", "nome": "Ana"}]], ["id"])
+        self.assertEqual([linha["subconsulta"] for linha in por_id], [1, 2])
+
+        sem_chave = rmta_mesclar_resultados([gasto, [{"nome": "Ana"}]], ["categoria"])
+        self.assertEqual(len(sem_chave), 3)
+
+    @patch('agent.nos.rmta_executar_no_banco')
+    def test_executar_subconsultas_em_paralelo(self, mock_executar):
+        """Testa se os ramos rodam em paralelo e registram tempos por ramo."""
+        def executar_lento(sql, parametros=None):
+            time.sleep(0.2)
+            return [{"sql": sql[:20]}], None, None
+        mock_executar.side_effect = executar_lento
+
+        estado = rmta_criar_estado_inicial("Liste os clientes e liste os produtos")
+        estado["subconsultas"] = [{"pergunta": "Liste os clientes"}, {"pergunta": "liste os produtos"}]
+
+        inicio = time.time()
+        estado = rmta_executar_subconsultas(estado)
+        self.assertLess(time.time() - inicio, 0.35)
+        self.assertIsNone(estado["erro"])
+        self.assertEqual(len(estado["resultados"]), 2)
+        self.assertIn("executar_sql[subconsulta_1]", estado["tempo_execucao"])
+        self.assertIn("executar_sql[subconsulta_2]", estado["tempo_execucao"])
+        self.assertIn("-- Subconsulta 2: liste os produtos", estado["sql"])
+
+    @patch('database.amostragem.rmta_planejar_amostragem')
+    @patch('agent.nos.rmta_executar_no_banco', return_value=([{"total": 10}], None, None))
+    def test_subconsultas_exatas_no_modo_aproximado(self, mock_executar, mock_planejar):
+        """Testa se os ramos não usam amostragem, já que o resultado mesclado não leva os intervalos."""
+        estado = rmta_criar_estado_inicial("Liste os clientes e liste os produtos", aproximado=True)
+        estado["subconsultas"] = [{"pergunta": "Liste os clientes"}, {"pergunta": "liste os produtos"}]
+
+        estado = rmta_executar_subconsultas(estado)
+        mock_planejar.assert_not_called()
+        self.assertIsNone(estado["aproximacao"])
+        self.assertEqual(len(estado["resultados"]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Testes unitários para o supervisor de processos de trabalho do SQL Agent.
+
+Este módulo contém testes para a distribuição de consultas entre processos,
+o reinício gradual, a substituição de processos que morrem e o instantâneo
+compartilhado do esquema e do índice de entidades.
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from api.supervisor import Supervisor, ErroProcessoTrabalho
+from database import indice_entidades
+from database.indice_entidades import (
+    IMPRESSAO_ESQUEMA,
+    rmta_obter_indice_entidades,
+    rmta_usar_instantaneo_compartilhado
+)
+from utils.config_log import rmta_contexto_requisicao, rmta_obter_id_requisicao
+from utils.instantaneo import InstantaneoMapeado, rmta_publicar_instantaneo
+
+
+# Funções executadas nos processos de trabalho (precisam ser de nível de módulo)
+
+def rmta_ecoar(pergunta, id_sessao=None, aproximado=False):
+    """Devolve a pergunta, o PID do processo e o ID da requisição recebido."""
+    if pergunta == "morrer":
+        os._exit(1)
+    if pergunta.startswith("dormir"):
+        time.sleep(float(pergunta.split()[1]))
+    return {"consulta": pergunta, "pid": os.getpid(), "id_requisicao": rmta_obter_id_requisicao()}
+
+
+def rmta_buscar_entidade(pergunta, id_sessao=None, aproximado=False):
+    """Busca a pergunta no índice de entidades de produtos do processo."""
+    return rmta_obter_indice_entidades().buscar("produtos", "nome", pergunta)
+
+
+def _instantaneo_teste(versao=1.0, impressao=IMPRESSAO_ESQUEMA):
+    return {
+        "versao": versao,
+        "impressao_esquema": impressao,
+        "esquema": "",
+        "entidades": {"produtos.nome": ["Notebook Dell", "Notebook Lenovo", "Smartphone"]}
+    }
+
+
+class TesteSupervisor(unittest.TestCase):
+    """Testes para a distribuição e a recuperação dos processos de trabalho."""
+
+    def test_consultas_distribuidas_entre_processos(self):
+        """Testa se as consultas são respondidas e levam o ID da requisição ao processo."""
+        with Supervisor(2, funcao=rmta_ecoar, instantaneo=False) as supervisor:
+            with rmta_contexto_requisicao("req-123"):
+                futuros = [supervisor.submeter(f"dormir 0.05 {i}") for i in range(6)]
+            resultados = [futuro.result(timeout=30) for futuro in futuros]
+
+            self.assertEqual([r["consulta"] for r in resultados], [f"dormir 0.05 {i}" for i in range(6)])
+            self.assertTrue(all(r["id_requisicao"] == "req-123" for r in resultados))
+            self.assertEqual({r["pid"] for r in resultados}, set(supervisor.pids()))
+
+    def test_sessao_sempre_no_mesmo_processo(self):
+        """Testa se perguntas da mesma sessão vão sempre ao mesmo processo."""
+        with Supervisor(3, funcao=rmta_ecoar, instantaneo=False) as supervisor:
+            futuros = [supervisor.submeter(f"pergunta {i}", "sessao-a") for i in range(5)]
+            pids = {futuro.result(timeout=30)["pid"] for futuro in futuros}
+            self.assertEqual(len(pids), 1)
+
+    def test_reinicio_gradual_conclui_consulta_em_andamento(self):
+        """Testa se o reinício troca os processos sem perder a consulta em execução."""
+        with Supervisor(1, funcao=rmta_ecoar, instantaneo=False) as supervisor:
+            pids_antes = supervisor.pids()
+            futuro = supervisor.submeter("dormir 1")
+            time.sleep(0.5)
+            supervisor.reiniciar()
+
+            self.assertEqual(futuro.result(timeout=30)["pid"], pids_antes[0])
+            self.assertNotEqual(supervisor.pids(), pids_antes)
+            self.assertEqual(supervisor.submeter("depois").result(timeout=30)["pid"], supervisor.pids()[0])
+
+    def test_processo_morto_substituido(self):
+        """Testa se só a consulta do processo morto falha e se ele é substituído."""
+        with Supervisor(1, funcao=rmta_ecoar, instantaneo=False) as supervisor:
+            futuro_morte = supervisor.submeter("morrer")
+            futuro_seguinte = supervisor.submeter("seguinte")
+
+            with self.assertRaises(ErroProcessoTrabalho):
+                futuro_morte.result(timeout=30)
+            self.assertEqual(futuro_seguinte.result(timeout=30)["consulta"], "seguinte")
+            self.assertEqual(supervisor.reinicios, 1)
+
+    def test_reciclagem_apos_limite_de_consultas(self):
+        """Testa se o processo é reciclado após o número máximo de consultas."""
+        with Supervisor(1, funcao=rmta_ecoar, max_consultas_processo=2, instantaneo=False) as supervisor:
+            pids = {supervisor.submeter(f"pergunta {i}").result(timeout=30)["pid"] for i in range(4)}
+            self.assertEqual(len(pids), 2)
+
+    @patch('database.indice_entidades.rmta_exportar_instantaneo', return_value=_instantaneo_teste())
+    def test_processos_usam_indice_do_instantaneo(self, _):
+        """Testa se os processos montam o índice de entidades a partir do instantâneo publicado."""
+        with Supervisor(2, funcao=rmta_buscar_entidade) as supervisor:
+            futuros = [supervisor.submeter("notebook dell") for _ in range(4)]
+            for futuro in futuros:
+                self.assertEqual(futuro.result(timeout=30), ["Notebook Dell"])
+
+
+class TesteInstantaneoCompartilhado(unittest.TestCase):
+    """Testes para a publicação e a leitura do instantâneo compartilhado."""
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.caminho = os.path.join(self.diretorio, "instantaneo.json")
+        # Cargas em segundo plano iniciadas por outros testes não podem alcançar os mocks
+        if indice_entidades._carga is not None:
+            indice_entidades._carga.join()
+        indice_entidades._indice = indice_entidades.IndiceEntidades()
+
+    def tearDown(self):
+        rmta_usar_instantaneo_compartilhado(None)
+        indice_entidades._indice = indice_entidades.IndiceEntidades()
+        shutil.rmtree(self.diretorio)
+
+    def test_leitor_acompanha_novas_versoes(self):
+        """Testa se o leitor só decodifica de novo quando o arquivo é substituído."""
+        leitor = InstantaneoMapeado(self.caminho)
+        self.assertIsNone(leitor.ler())
+
+        rmta_publicar_instantaneo(self.caminho, {"versao": 1})
+        primeira = leitor.ler()
+        self.assertEqual(primeira, {"versao": 1})
+        self.assertIs(leitor.ler(), primeira)
+
+        rmta_publicar_instantaneo(self.caminho, {"versao": 2})
+        self.assertEqual(leitor.ler(), {"versao": 2})
+        leitor.fechar()
+
+    def test_indice_montado_a_partir_do_instantaneo(self):
+        """Testa se o índice vem do instantâneo, sem consultar o banco."""
+        rmta_publicar_instantaneo(self.caminho, _instantaneo_teste())
+        rmta_usar_instantaneo_compartilhado(self.caminho)
+
+        with patch('database.conexao.rmta_obter_conexao_bd') as mock_conexao:
+            indice = rmta_obter_indice_entidades()
+            mock_conexao.assert_not_called()
+        self.assertEqual(indice.buscar("produtos", "nome", "notebook"), ["Notebook Dell", "Notebook Lenovo"])
+
+    def test_instantaneo_de_outro_esquema_ignorado(self):
+        """Testa se um instantâneo com outra impressão do esquema não é usado."""
+        rmta_publicar_instantaneo(self.caminho, _instantaneo_teste(impressao="outro"))
+        rmta_usar_instantaneo_compartilhado(self.caminho)
+
+        with patch('database.conexao.rmta_obter_conexao_bd', return_value=None) as mock_conexao:
+            indice = rmta_obter_indice_entidades(aguardar=True)
+            mock_conexao.assert_called_once()
+        self.assertTrue(indice.vazio())
+
+if __name__ == '__main__':
+    unittest.main()
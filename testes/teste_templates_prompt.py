@@ -0,0 +1,66 @@
+"""
+Testes unitários para os templates de prompt do SQL Agent.
+
+Este módulo contém testes unitários para a estabilidade do prefixo
+dos prompts e para a contabilização de tokens em cache.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+from agent import templates_prompt
+from agent.templates_prompt import (
+    TEMPLATE_GERAR_SQL,
+    TemplatePrompt,
+    rmta_registrar_uso_prompt
+)
+
+class TesteTemplatePrompt(unittest.TestCase):
+    """Testes para a renderização dos templates de prompt."""
+
+    def test_prefixo_estavel_entre_perguntas(self):
+        """Testa se o prompt do sistema é idêntico byte a byte para perguntas diferentes."""
+        sistema_1, usuario_1 = TEMPLATE_GERAR_SQL.renderizar(consulta="Quais clientes compraram um Notebook?")
+        sistema_2, usuario_2 = TEMPLATE_GERAR_SQL.renderizar(consulta="Quanto cada cliente gastou?")
+
+        self.assertEqual(sistema_1.encode("utf-8"), sistema_2.encode("utf-8"))
+        self.assertNotEqual(usuario_1, usuario_2)
+        self.assertIn("Notebook?", usuario_1)
+        self.assertNotIn("Notebook?'", sistema_1)
+
+    def test_prefixo_contem_esquema_e_formato_json(self):
+        """Testa se o prefixo compilado contém o esquema e o formato de resposta."""
+        self.assertIn("CREATE TABLE clientes", TEMPLATE_GERAR_SQL.sistema)
+        self.assertIn('{"query": "A consulta SQL aqui"', TEMPLATE_GERAR_SQL.sistema)
+        self.assertFalse(TEMPLATE_GERAR_SQL.sistema.startswith((" ", "\n")))
+
+class TesteUsoTokens(unittest.TestCase):
+    """Testes para a contabilização de tokens de prompt."""
+
+    def setUp(self):
+        templates_prompt._prefixos_enviados.clear()
+
+    @patch('agent.templates_prompt.rmta_contar_tokens')
+    def test_estimativa_cache_local(self, mock_contar):
+        """Testa se o segundo envio de um prefixo longo é contabilizado como cache."""
+        mock_contar.side_effect = lambda texto: 1500 if texto.startswith("sistema") else 20
+        template = TemplatePrompt(id="teste", sistema="sistema longo", modelo_usuario="{pergunta}")
+
+        primeiro = rmta_registrar_uso_prompt(template, "pergunta")
+        segundo = rmta_registrar_uso_prompt(template, "pergunta")
+
+        self.assertEqual(primeiro["tokens_cache"], 0)
+        self.assertEqual(segundo["tokens_prompt"], 1520)
+        self.assertEqual(segundo["tokens_cache"], 1408)
+        self.assertEqual(segundo["tokens_sem_cache"], 112)
+        self.assertEqual(segundo["fonte"], "estimativa")
+
+    def test_uso_informado_pelo_provedor(self):
+        """Testa se o uso informado pelo provedor tem precedência sobre a estimativa."""
+        resposta = MagicMock()
+        resposta.response_metadata = {
+            "token_usage": {"prompt_tokens": 1200, "prompt_tokens_details": {"cached_tokens": 1024}}
+        }
+
+        uso = rmta_registrar_uso_prompt(TEMPLATE_GERAR_SQL, "pergunta", resposta)
+        self.assertEqual(uso["tokens_cache"], 1024)
+        self.assertEqual(uso["tokens_sem_cache"], 176)
+        self.assertEqual(uso["fonte"], "provedor")
@@ -0,0 +1,68 @@
+"""
+Testes unitários para a redução dos dados de gráficos.
+
+Este módulo contém testes unitários para o LTTB, o agrupamento top-N com
+"Outros" e a amostragem usados antes de enviar gráficos ao navegador.
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from utils.visualizacao import (
+    ROTULO_OUTROS,
+    rmta_indices_lttb,
+    rmta_top_n_com_outros,
+    rmta_amostrar,
+    rmta_reduzir_para_grafico
+)
+
+
+class TesteVisualizacao(unittest.TestCase):
+    """Testes para as funções de redução de gráficos."""
+
+    def test_lttb_preserva_extremos(self):
+        """Testa se o LTTB mantém as pontas e o pico da série."""
+        x = np.arange(10000, dtype=float)
+        y = np.zeros(10000)
+        y[5432] = 100.0
+
+        indices = rmta_indices_lttb(x, y, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 9999)
+        self.assertIn(5432, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_top_n_agrupa_restante_em_outros(self):
+        """Testa se as categorias além das N maiores são somadas em "Outros"."""
+        df = pd.DataFrame({"produto": list("abcdef"), "total": [10, 50, 5, 40, 1, 2]})
+
+        reduzido = rmta_top_n_com_outros(df, "produto", "total", 2)
+        self.assertEqual(list(reduzido["produto"]), ["b", "d", ROTULO_OUTROS])
+        self.assertEqual(list(reduzido["total"]), [50, 40, 18])
+        self.assertEqual(reduzido["total"].sum(), df["total"].sum())
+
+    def test_amostra_estratificada_mantem_estratos_raros(self):
+        """Testa se a amostra estratificada inclui ao menos uma linha de cada estrato."""
+        df = pd.DataFrame({"categoria": ["comum"] * 9990 + ["rara"] * 10, "valor": range(10000)})
+
+        amostra = rmta_amostrar(df, 100, "categoria")
+        self.assertLessEqual(len(amostra), 101)
+        self.assertIn("rara", set(amostra["categoria"]))
+
+    def test_reducao_informa_payload(self):
+        """Testa se a redução limita os pontos enviados e informa o tamanho do payload."""
+        df = pd.DataFrame({"x": range(50000), "y": np.random.default_rng(0).normal(size=50000)})
+
+        reduzido, info = rmta_reduzir_para_grafico(df, "Linha", "x", "y", max_pontos=500)
+        self.assertEqual(len(reduzido), 500)
+        self.assertEqual(info["metodo"], "lttb")
+        self.assertEqual(info["linhas_originais"], 50000)
+        self.assertGreater(info["bytes_enviados"], 0)
+
+        _, info_dispersao = rmta_reduzir_para_grafico(df, "Dispersão", "x", "y", max_pontos=500)
+        self.assertEqual(info_dispersao["metodo"], "aleatoria")
+        self.assertEqual(info_dispersao["linhas_enviadas"], 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,28 @@ Interface do usuário com Streamlit para o SQL Agent.
 Este módulo contém as funções para criar a interface do usuário
 com Streamlit e exibir os resultados do processamento.
 """
+import io
 import logging
+import os
+import time
+import uuid
 import streamlit as st
-import pandas as pd
-from config.configuracoes import TITULO_APP, DESCRICAO_APP, EXEMPLOS_CONSULTAS
+from config.configuracoes import TITULO_APP, DESCRICAO_APP, EXEMPLOS_CONSULTAS, MODO_DEBUG_MENSAGENS
 from database.conexao import rmta_configurar_banco_dados
-from agent.fluxo_trabalho import rmta_processar_consulta
+from database.exportacao import FORMATOS_EXPORTACAO, ErroExportacao, rmta_exportar_resultado
+from database.indice_entidades import rmta_obter_indice_entidades
+from agent.fluxo_trabalho import rmta_processar_consulta, rmta_refazer_exato
+from agent.registro_mensagens import rmta_reidratar_mensagens, rmta_resumir_mensagem
+from utils.codec_estado import TIPO_MIME, rmta_codificar_estado
+from utils.perfilador import rmta_estatisticas_perfil, rmta_exportar_pilhas, rmta_exportar_pstats, rmta_listar_perfis
+from utils.resultados_locais import (
+    OPERADORES_FILTRO,
+    AGREGACOES,
+    rmta_preparar_dataframe,
+    rmta_aplicar_operacoes,
+    rmta_paginar
+)
+from utils.visualizacao import rmta_reduzir_para_grafico, rmta_tamanho_payload
 
 # Obter logger
 logger = logging.getLogger('sql_agent')
@@ -19,7 +35,9 @@ def rmta_exibir_resultados(estado):
     Exibe os resultados do processamento da consulta na interface.
     
     Esta função exibe a consulta SQL gerada, os resultados da consulta,
-    explicações e visualizações na interface do Streamlit.
+    explicações e visualizações na interface do Streamlit. Filtros, ordenação,
+    agrupamento, paginação e gráficos são aplicados localmente sobre o
+    resultado guardado em st.session_state, sem chamar o LLM ou o banco.
     
     Args:
         estado (EstadoAgente): Estado final após o processamento da consulta
@@ -33,13 +51,35 @@ def rmta_exibir_resultados(estado):
     # Exibir a consulta SQL gerada
     st.markdown("### Consulta SQL Gerada")
     st.code(estado["sql"], language="sql")
+    if estado.get("nivel_modelo"):
+        st.caption(f"Gerada pelo nível: {estado['nivel_modelo']}")
+    if estado.get("parametros_sql"):
+        st.markdown("**Parâmetros:**")
+        st.json({nome: str(valor) if not isinstance(valor, (list, int, float)) else valor
+                 for nome, valor in estado["parametros_sql"].items()})
     
-    # Exibir tempos de execução
-    if "tempo_execucao" in estado:
-        with st.expander("Tempos de Execução"):
-            tempos = estado["tempo_execucao"]
-            for etapa, tempo in tempos.items():
-                st.text(f"{etapa}: {tempo:.4f}s")
+    if estado.get("aproximacao"):
+        rmta_exibir_aproximacao(estado)
+    
+    # Literais do SQL que não correspondem a nenhum valor do banco (resultado provavelmente vazio)
+    for item in (estado.get("validacao") or {}).get("literais_sem_correspondencia", []):
+        sugestoes = ", ".join(f"'{valor}'" for valor in item["sugestoes"])
+        st.warning(
+            f"O valor '{item['literal']}' não existe em {item['coluna']}"
+            + (f". Valores próximos: {sugestoes}." if sugestoes else ".")
+        )
+    
+    # Tempos de execução (preenchidos ao final, depois das operações locais)
+    area_tempos = st.container()
+    
+    # Exibir uso de tokens de prompt (em cache e sem cache)
+    if estado.get("uso_tokens"):
+        with st.expander("Uso de Tokens"):
+            for etapa, uso in estado["uso_tokens"].items():
+                st.text(
+                    f"{etapa}: {uso['tokens_prompt']} tokens de prompt "
+                    f"({uso['tokens_cache']} em cache, {uso['tokens_sem_cache']} sem cache, {uso['fonte']})"
+                )
     
     # Exibir resultados e explicações
     tab1, tab2, tab3, tab4 = st.tabs(["Resultados", "Explicação da Consulta", "Análise dos Resultados", "Debugging"])
@@ -47,27 +87,62 @@ def rmta_exibir_resultados(estado):
     with tab1:
         if estado.get("resultados"):
             st.markdown(f"### Resultados ({len(estado['resultados'])} registros)")
-            df = pd.DataFrame(estado["resultados"])
-            st.dataframe(df, use_container_width=True)
+            df = st.session_state.get("df_resultado")
+            if df is None:
+                df = rmta_preparar_dataframe(estado["resultados"], estado.get("tipos_colunas"))
+            
+            # Tempos locais desta interação substituem os da interação anterior
+            for etapa in [etapa for etapa in estado["tempo_execucao"] if etapa.startswith("local_")]:
+                del estado["tempo_execucao"][etapa]
+            df, tempos_locais = rmta_exibir_controles_locais(df)
+            estado["tempo_execucao"].update(tempos_locais)
+            
+            inicio_tabela = time.time()
+            col_tamanho, col_pagina = st.columns(2)
+            with col_tamanho:
+                tamanho_pagina = st.selectbox("Linhas por página:", [25, 50, 100, 500], key="local_tamanho_pagina")
+            with col_pagina:
+                pagina = st.number_input("Página:", min_value=1, value=1, step=1, key="local_pagina")
+            df_pagina, total_paginas = rmta_paginar(df, int(pagina), tamanho_pagina)
+            st.dataframe(df_pagina, use_container_width=True)
+            st.caption(f"{len(df)} registros após as operações locais · página {min(int(pagina), total_paginas)} de {total_paginas}")
+            estado["tempo_execucao"]["local_tabela"] = time.time() - inicio_tabela
+            logger.info(
+                "Tabela renderizada: %s de %s linhas, %s bytes em %.4fs",
+                len(df_pagina), len(df), rmta_tamanho_payload(df_pagina), estado['tempo_execucao']['local_tabela']
+            )
             
             # Adicionar visualização se houver dados numéricos
-            colunas_numericas = df.select_dtypes(include=['float64', 'int64']).columns
+            inicio_grafico = time.time()
+            colunas_numericas = df.select_dtypes(include='number').columns
             if len(colunas_numericas) > 0 and len(df) > 1:
                 st.markdown("### Visualização")
-                tipo_grafico = st.selectbox("Tipo de gráfico:", ["Barras", "Linha", "Dispersão"])
+                tipo_grafico = st.selectbox("Tipo de gráfico:", ["Barras", "Linha", "Dispersão"], key="local_tipo_grafico")
                 
                 if len(colunas_numericas) >= 2:
-                    coluna_x = st.selectbox("Eixo X:", df.columns)
-                    coluna_y = st.selectbox("Eixo Y:", colunas_numericas)
-                    
-                    if tipo_grafico == "Barras":
-                        st.bar_chart(df, x=coluna_x, y=coluna_y)
-                    elif tipo_grafico == "Linha":
-                        st.line_chart(df, x=coluna_x, y=coluna_y)
-                    else:
-                        st.scatter_chart(df, x=coluna_x, y=coluna_y)
+                    coluna_x = st.selectbox("Eixo X:", df.columns, key="local_eixo_x")
+                    coluna_y = st.selectbox("Eixo Y:", colunas_numericas, key="local_eixo_y")
+                else:
+                    # Uma única coluna numérica: barras por linha do resultado
+                    tipo_grafico, coluna_x, coluna_y = "Barras", None, colunas_numericas[0]
+                
+                # Reduzir os dados no servidor antes de enviá-los ao navegador
+                df_grafico, info_grafico = rmta_reduzir_para_grafico(df, tipo_grafico, coluna_x, coluna_y)
+                if tipo_grafico == "Barras":
+                    st.bar_chart(df_grafico, x=df_grafico.columns[0], y=coluna_y)
+                elif tipo_grafico == "Linha":
+                    st.line_chart(df_grafico, x=coluna_x, y=coluna_y)
                 else:
-                    st.bar_chart(df)
+                    st.scatter_chart(df_grafico, x=coluna_x, y=coluna_y)
+                if info_grafico["linhas_enviadas"] < info_grafico["linhas_originais"]:
+                    st.caption(
+                        f"Gráfico com {info_grafico['linhas_enviadas']} de {info_grafico['linhas_originais']} "
+                        f"pontos (redução: {info_grafico['metodo']})"
+                    )
+            estado["tempo_execucao"]["local_grafico"] = time.time() - inicio_grafico
+            logger.info("Visualização renderizada em %.4fs", estado['tempo_execucao']['local_grafico'])
+            
+            rmta_exibir_exportacao(estado)
         else:
             st.info("Nenhum resultado encontrado.")
     
@@ -86,7 +161,21 @@ def rmta_exibir_resultados(estado):
         st.markdown("### Histórico de Mensagens (Debugging)")
         
         if "mensagens" in estado and estado["mensagens"]:
-            for i, msg in enumerate(estado["mensagens"]):
+            # O estado guarda apenas referências; o texto completo é reidratado sob demanda
+            modo_debug = st.checkbox(
+                "Reidratar texto completo dos prompts",
+                value=MODO_DEBUG_MENSAGENS,
+                key="debug_reidratar"
+            )
+            if modo_debug:
+                mensagens = rmta_reidratar_mensagens(estado["mensagens"])
+            else:
+                mensagens = [
+                    {"role": msg["role"], "content": rmta_resumir_mensagem(msg)}
+                    for msg in estado["mensagens"]
+                ]
+            
+            for i, msg in enumerate(mensagens):
                 with st.expander(f"Mensagem {i+1}: {msg['role'].capitalize()}"):
                     if msg['role'] == 'system':
                         st.info(msg['content'])
@@ -95,37 +184,248 @@ def rmta_exibir_resultados(estado):
                     else:  # assistant
                         st.warning(msg['content'])
             
-            # Botão para exportar o histórico
+            # Botão para exportar o histórico (JSON) e o estado completo (codec binário, sem perdas)
             if st.button("Exportar Histórico"):
                 import json
-                json_history = json.dumps(estado["mensagens"], indent=2)
+                json_history = json.dumps(mensagens, ensure_ascii=False, separators=(",", ":"), default=str)
                 st.download_button(
                     label="Download JSON",
                     data=json_history,
                     file_name="historico_mensagens.json",
                     mime="application/json"
                 )
+                st.download_button(
+                    label="Download Estado (binário)",
+                    data=rmta_codificar_estado(estado),
+                    file_name="estado_consulta.sqlagent",
+                    mime=TIPO_MIME
+                )
         else:
             st.info("Nenhum histórico de mensagens disponível.")
+        
+        rmta_exibir_perfis()
+    
+    with area_tempos:
+        with st.expander("Tempos de Execução"):
+            for etapa, tempo in estado["tempo_execucao"].items():
+                if not etapa.startswith("local_"):
+                    st.text(f"{etapa}: {tempo:.4f}s")
+            if estado.get("especulacao"):
+                st.caption(
+                    f"Validação especulativa iniciada {estado['especulacao']['antecedencia']:.4f}s antes do fim da geração; "
+                    f"{estado['especulacao']['tempo_economizado']:.4f}s fora do caminho crítico"
+                )
+            tempos_locais = {etapa: tempo for etapa, tempo in estado["tempo_execucao"].items() if etapa.startswith("local_")}
+            if tempos_locais:
+                st.markdown("**Pós-processamento local (sem LLM e sem banco de dados):**")
+                for etapa, tempo in tempos_locais.items():
+                    st.text(f"{etapa}: {tempo:.4f}s")
     
     # Exibir o fluxo de execução
     with st.expander("Ver fluxo de execução"):
         st.markdown("### Fluxo de execução do LangGraph")
         st.mermaid("""
         graph TD
-            A[Entrada: Pergunta em Linguagem Natural] --> B[Gerar Consulta SQL]
+            A[Entrada: Pergunta em Linguagem Natural] --> B[Gerar Consulta SQL: regras, modelo rápido ou GPT-4o]
             B --> C[Validar Consulta SQL]
             C --> D{Consulta Válida?}
             D -->|Sim| E[Executar Consulta SQL]
-            D -->|Não| J[Exibir Erro]
+            D -->|Não| L{Há nível de modelo superior?}
             E --> F{Execução Bem-sucedida?}
             F -->|Sim| G[Explicar Resultados]
-            F -->|Não| J
+            F -->|Não| L
+            L -->|Sim| M[Escalar Nível do Modelo]
+            M --> B
+            L -->|Não| J[Exibir Erro]
             G --> H[Exibir Resultados e Explicações]
             J --> K[Fim]
             H --> K
         """)
 
+def rmta_exibir_perfis():
+    """
+    Exibe os perfis recentes dos nós do grafo, com os downloads para análise externa.
+    
+    Os perfis vêm do buffer circular do processo (utils.perfilador): o tempo de
+    cada nó, as funções com mais tempo próprio e os arquivos .pstats (pstats,
+    snakeviz) e de pilhas colapsadas (flamegraph.pl, speedscope).
+    """
+    st.markdown("### Perfis de Execução")
+    perfis = {perfil.id: perfil for perfil in rmta_listar_perfis()}
+    if not perfis:
+        st.info("Nenhum perfil disponível. Ative \"Perfilar esta consulta\" ou defina PERFIL_AMOSTRAGEM.")
+        return
+    
+    id_perfil = st.selectbox(
+        "Perfil",
+        list(perfis),
+        format_func=lambda id_perfil: (
+            f"{time.strftime('%H:%M:%S', time.localtime(perfis[id_perfil].inicio))} · "
+            f"{perfis[id_perfil].consulta[:60]} · {perfis[id_perfil].duracao:.2f}s ({perfis[id_perfil].modo})"
+        ),
+        key="debug_perfil"
+    )
+    perfil = perfis[id_perfil]
+    for registro in perfil.nos:
+        st.text(f"{registro.nome}: {registro.duracao:.4f}s")
+    
+    with st.expander("Funções com mais tempo próprio"):
+        saida = io.StringIO()
+        estatisticas = rmta_estatisticas_perfil(perfil)
+        estatisticas.stream = saida
+        estatisticas.sort_stats("tottime").print_stats(15)
+        st.code(saida.getvalue())
+    
+    st.download_button(
+        label="Download pstats",
+        data=rmta_exportar_pstats(perfil),
+        file_name=f"perfil_{perfil.id}.pstats",
+        mime="application/octet-stream",
+        key=f"debug_pstats_{perfil.id}"
+    )
+    pilhas = rmta_exportar_pilhas(perfil)
+    if pilhas is not None:
+        st.download_button(
+            label="Download pilhas colapsadas (flame graph)",
+            data=pilhas,
+            file_name=f"perfil_{perfil.id}.folded",
+            mime="text/plain",
+            key=f"debug_pilhas_{perfil.id}"
+        )
+
+def rmta_exibir_aproximacao(estado):
+    """
+    Sinaliza uma resposta aproximada, com os intervalos de confiança e a opção de refazê-la exata.
+    
+    Args:
+        estado (EstadoAgente): Estado final de uma resposta com estado["aproximacao"]
+    """
+    aproximacao = estado["aproximacao"]
+    st.warning(
+        f"Resultado aproximado: estimado a partir de uma amostra de {aproximacao['percentual']:.4g}% "
+        f"da tabela {aproximacao['tabela']} ({aproximacao['metodo']}). Grupos raros podem não aparecer."
+    )
+    if st.button("Calcular valor exato", key="refazer_exato"):
+        with st.spinner("Executando a consulta exata..."):
+            exato = rmta_refazer_exato(estado)
+        st.session_state["estado_atual"] = exato
+        st.session_state["df_resultado"] = rmta_preparar_dataframe(exato.get("resultados"), exato.get("tipos_colunas"))
+        for chave in [chave for chave in st.session_state if str(chave).startswith("local_")]:
+            del st.session_state[chave]
+        st.rerun()
+    
+    with st.expander(f"Intervalos de confiança ({aproximacao['confianca']:.0%})"):
+        linhas = []
+        for registro, intervalos in zip(estado.get("resultados") or [], aproximacao["intervalos"]):
+            linha = dict(registro)
+            for coluna, intervalo in intervalos.items():
+                linha[f"{coluna} (mín.)"], linha[f"{coluna} (máx.)"] = intervalo or (None, None)
+            linhas.append(linha)
+        st.dataframe(rmta_preparar_dataframe(linhas), use_container_width=True)
+        st.code(aproximacao["sql_amostrado"], language="sql")
+
+def rmta_exibir_exportacao(estado):
+    """
+    Exibe a exportação do resultado completo da consulta em CSV ou Parquet.
+    
+    O SQL validado é executado de novo e gravado em disco em lotes
+    (database.exportacao), com o progresso exibido durante a cópia. O arquivo
+    gerado fica em st.session_state até a próxima exportação ou consulta.
+    Resultados mesclados de subconsultas não são exportados: não há um SQL
+    único para executar de novo (cada ramo tem o seu SQL e parâmetros).
+    
+    Args:
+        estado (EstadoAgente): Estado final após o processamento da consulta
+    """
+    st.markdown("### Exportar resultado completo")
+    if estado.get("subconsultas"):
+        st.caption("Exportação indisponível: a pergunta foi dividida em subconsultas, mescladas localmente.")
+        return
+    col_formato, col_botao = st.columns(2)
+    with col_formato:
+        formato = st.selectbox("Formato:", list(FORMATOS_EXPORTACAO), key="exportacao_formato")
+    with col_botao:
+        exportar = st.button("Exportar", key="exportacao_iniciar")
+    
+    if exportar:
+        total_previsto = max(len(estado.get("resultados") or []), 1)
+        barra = st.progress(0.0, text="Exportando...")
+        
+        def atualizar(linhas, bytes_escritos):
+            barra.progress(min(linhas / total_previsto, 1.0), text=f"{linhas} linhas · {bytes_escritos / 1024:.0f} KB")
+        
+        try:
+            exportacao = rmta_exportar_resultado(estado["sql"], estado.get("parametros_sql"), formato, progresso=atualizar)
+        except ErroExportacao as e:
+            st.error(str(e))
+            st.session_state.pop("exportacao", None)
+        else:
+            exportacao["sql"] = estado["sql"]
+            st.session_state["exportacao"] = exportacao
+    
+    exportacao = st.session_state.get("exportacao")
+    if exportacao and exportacao["sql"] == estado["sql"] and os.path.exists(exportacao["caminho"]):
+        st.caption(f"{exportacao['linhas']} linhas · {exportacao['bytes'] / 1024:.0f} KB em {exportacao['tempo']:.2f}s")
+        with open(exportacao["caminho"], "rb") as arquivo:
+            st.download_button(
+                label=f"Download {exportacao['formato'].upper()}",
+                data=arquivo,
+                file_name=f"resultado.{exportacao['formato']}",
+                mime=exportacao["tipo_mime"],
+                key="exportacao_download"
+            )
+
+def rmta_exibir_controles_locais(df):
+    """
+    Exibe os controles de filtro, agrupamento e ordenação e os aplica ao resultado.
+    
+    Args:
+        df (pd.DataFrame): Resultado original da consulta
+        
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, float]]: Resultado processado e tempos das operações locais
+    """
+    operacoes = {}
+    with st.expander("Filtrar, agrupar e ordenar"):
+        colunas = list(df.columns)
+        colunas_numericas = list(df.select_dtypes(include='number').columns)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            coluna_filtro = st.selectbox("Filtrar coluna:", ["(nenhuma)"] + colunas, key="local_filtro_coluna")
+        with col2:
+            operador = st.selectbox("Operador:", OPERADORES_FILTRO, key="local_filtro_operador")
+        with col3:
+            valor_filtro = st.text_input("Valor:", key="local_filtro_valor")
+        if coluna_filtro != "(nenhuma)" and valor_filtro:
+            operacoes["filtro"] = {"coluna": coluna_filtro, "operador": operador, "valor": valor_filtro}
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            colunas_grupo = st.multiselect("Agrupar por:", colunas, key="local_grupo_colunas")
+        with col2:
+            coluna_valor = st.selectbox("Valor agregado:", colunas_numericas or colunas, key="local_grupo_valor")
+        with col3:
+            agregacao = st.selectbox("Agregação:", list(AGREGACOES), key="local_grupo_agregacao")
+        if colunas_grupo and coluna_valor and coluna_valor not in colunas_grupo:
+            operacoes["agrupamento"] = {"colunas": colunas_grupo, "coluna_valor": coluna_valor, "agregacao": agregacao}
+            colunas = colunas_grupo + [f"{agregacao}_{coluna_valor}"]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            coluna_ordem = st.selectbox("Ordenar por:", ["(original)"] + colunas, key="local_ordem_coluna")
+        with col2:
+            ascendente = st.radio("Ordem:", ["Crescente", "Decrescente"], horizontal=True, key="local_ordem_direcao") == "Crescente"
+        if coluna_ordem != "(original)":
+            operacoes["ordenacao"] = {"coluna": coluna_ordem, "ascendente": ascendente}
+    
+    try:
+        return rmta_aplicar_operacoes(df, operacoes)
+    except (ValueError, TypeError) as e:
+        st.warning(f"Não foi possível aplicar o filtro: {e}")
+        operacoes.pop("filtro", None)
+        return rmta_aplicar_operacoes(df, operacoes)
+
 def rmta_iniciar_interface():
     """
     Inicia a interface do usuário com Streamlit.
@@ -143,10 +443,20 @@ def rmta_iniciar_interface():
     st.title(TITULO_APP)
     st.markdown(DESCRICAO_APP)
     
+    # Sessão de conversa: perguntas de acompanhamento reaproveitam o resultado anterior
+    if "id_sessao" not in st.session_state:
+        st.session_state["id_sessao"] = uuid.uuid4().hex
+    
+    # Índice de entidades carregado em segundo plano desde a primeira visita
+    rmta_obter_indice_entidades()
+    
     # Configuração do banco de dados
     with st.expander("Configuração do Banco de Dados"):
         if st.button("Configurar Banco de Dados"):
-            rmta_configurar_banco_dados()
+            if rmta_configurar_banco_dados():
+                st.success("Banco de dados configurado com sucesso!")
+            else:
+                st.error("Erro ao configurar o banco de dados. Consulte os logs para mais detalhes.")
     
     # Entrada do usuário
     col1, col2 = st.columns([4, 1])
@@ -154,6 +464,16 @@ def rmta_iniciar_interface():
         entrada_consulta = st.text_input("Digite sua pergunta:", placeholder="Ex: Quais clientes compraram um Notebook?")
     with col2:
         botao_enviar = st.button("Consultar", type="primary")
+    modo_aproximado = st.toggle(
+        "Modo aproximado",
+        key="modo_aproximado",
+        help="Agregações sobre tabelas grandes são estimadas a partir de uma amostra, com intervalos de confiança."
+    )
+    perfilar = st.toggle(
+        "Perfilar esta consulta",
+        key="perfilar_consulta",
+        help="Registra onde cada nó gastou o tempo; o perfil fica na aba Debugging."
+    )
     
     # Exemplos clicáveis
     st.markdown("### Exemplos de perguntas")
@@ -165,13 +485,24 @@ def rmta_iniciar_interface():
             if st.button(exemplo, key=f"exemplo_{i}"):
                 exemplo_selecionado = exemplo
     
-    # Processar a consulta
+    # Processar a consulta; o resultado fica em st.session_state para que as
+    # interações seguintes (gráficos, filtros, páginas) não repitam o fluxo
+    pergunta = None
     if botao_enviar and entrada_consulta:
-        with st.spinner("Processando sua consulta..."):
-            resultado = rmta_processar_consulta(entrada_consulta)
-            rmta_exibir_resultados(resultado)
+        pergunta = entrada_consulta
     elif exemplo_selecionado:
         st.text_input("Digite sua pergunta:", value=exemplo_selecionado, key="entrada_exemplo")
+        pergunta = exemplo_selecionado
+    
+    if pergunta:
         with st.spinner("Processando sua consulta..."):
-            resultado = rmta_processar_consulta(exemplo_selecionado)
-            rmta_exibir_resultados(resultado)
\ No newline at end of file
+            resultado = rmta_processar_consulta(
+                pergunta, st.session_state["id_sessao"], modo_aproximado, perfilar=perfilar
+            )
+        st.session_state["estado_atual"] = resultado
+        st.session_state["df_resultado"] = rmta_preparar_dataframe(resultado.get("resultados"), resultado.get("tipos_colunas"))
+        for chave in [chave for chave in st.session_state if str(chave).startswith("local_")]:
+            del st.session_state[chave]
+    
+    if "estado_atual" in st.session_state:
+        rmta_exibir_resultados(st.session_state["estado_atual"])
\ No newline at end of file
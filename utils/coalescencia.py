@@ -0,0 +1,96 @@
+"""
+Coalescência de requisições idênticas em andamento (single-flight).
+
+Este módulo permite que chamadas concorrentes com a mesma chave compartilhem
+uma única execução: a primeira chamada (líder) executa a função, e as demais
+aguardam e recebem uma cópia do mesmo resultado. A chave é removida assim que
+a execução termina, então não há cache de resultados, apenas deduplicação
+do trabalho em voo.
+"""
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from utils.metricas import rmta_incrementar_contador, rmta_obter_contador, rmta_definir_medidor
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+
+class _ChamadaEmVoo:
+    """Execução em andamento compartilhada pelas chamadas com a mesma chave."""
+
+    def __init__(self):
+        self.concluida = threading.Event()
+        self.resultado = None
+        self.excecao = None
+
+
+class GrupoCoalescencia:
+    """
+    Grupo de deduplicação de chamadas concorrentes por chave.
+
+    Attributes:
+        estagio (str): Nome do estágio, usado como rótulo nas métricas
+    """
+
+    def __init__(self, estagio: str):
+        self.estagio = estagio
+        self._trava = threading.Lock()
+        self._em_voo: Dict[str, _ChamadaEmVoo] = {}
+
+    def executar(self, chave: str, funcao: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Executa a função ou aguarda a execução em andamento com a mesma chave.
+
+        Args:
+            chave (str): Chave que identifica chamadas equivalentes
+            funcao (Callable): Função a executar se não houver execução em andamento
+            *args: Argumentos posicionais da função
+            **kwargs: Argumentos nomeados da função
+
+        Returns:
+            Tuple[Any, bool]: Resultado e True se ele foi compartilhado com outra chamada
+
+        Raises:
+            Exception: A mesma exceção levantada pela execução líder
+        """
+        with self._trava:
+            chamada = self._em_voo.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = _ChamadaEmVoo()
+                self._em_voo[chave] = chamada
+
+        self._registrar_metricas(compartilhada=not lider)
+
+        if not lider:
+            logger.debug("Coalescendo chamada no estágio %s", self.estagio)
+            chamada.concluida.wait()
+            if chamada.excecao is not None:
+                raise chamada.excecao
+            return copy.deepcopy(chamada.resultado), True
+
+        try:
+            chamada.resultado = funcao(*args, **kwargs)
+            return chamada.resultado, False
+        except Exception as e:
+            chamada.excecao = e
+            raise
+        finally:
+            with self._trava:
+                del self._em_voo[chave]
+            # Cópia feita antes de liberar os seguidores, pois o líder pode alterar o resultado
+            chamada.resultado = copy.deepcopy(chamada.resultado)
+            chamada.concluida.set()
+
+    def _registrar_metricas(self, compartilhada: bool):
+        """Atualiza os contadores e a taxa de coalescência do estágio."""
+        rotulos = {"estagio": self.estagio}
+        rmta_incrementar_contador("sql_agent_coalescencia_chamadas_total", rotulos=rotulos)
+        if compartilhada:
+            rmta_incrementar_contador("sql_agent_coalescencia_compartilhadas_total", rotulos=rotulos)
+        total = rmta_obter_contador("sql_agent_coalescencia_chamadas_total", rotulos)
+        compartilhadas = rmta_obter_contador("sql_agent_coalescencia_compartilhadas_total", rotulos)
+        rmta_definir_medidor("sql_agent_coalescencia_taxa", compartilhadas / total, rotulos)
@@ -0,0 +1,305 @@
+"""
+Codec binário do estado do agente.
+
+O estado é um dicionário cujos resultados são listas de registros vindos do
+psycopg2 (com Decimal, datas e horários), e json.dumps é lento, verboso e não
+aceita esses tipos. Este módulo serializa o estado em um envelope msgpack:
+
+- Os resultados (do estado e de cada subconsulta) viram tabelas Arrow IPC,
+  colunares e decodificáveis sem cópia
+- Os demais campos vão em msgpack, com tipos de extensão para Decimal, datas,
+  horários, intervalos e tuplas
+
+A ida e volta é sem perdas: colunas que o Arrow não representa fielmente (tipos
+mistos, inteiros fora de 64 bits) e listas com registros de chaves diferentes
+são guardadas valor a valor em msgpack.
+"""
+import datetime
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+VERSAO_CODEC = 1
+TIPO_MIME = "application/x-sql-agent-estado"
+
+# Códigos de extensão do msgpack
+_EXT_DECIMAL = 1
+_EXT_DATETIME = 2
+_EXT_DATE = 3
+_EXT_TIME = 4
+_EXT_TIMEDELTA = 5
+_EXT_TUPLA = 6
+_EXT_TABELA = 7
+_EXT_INTEIRO = 8
+
+# Metadado de campo das colunas guardadas valor a valor
+_CODEC_COLUNA = b"sql_agent.codec"
+
+
+class ErroCodecEstado(Exception):
+    """O conteúdo não é um estado codificado por este módulo (ou é de outra versão)."""
+
+
+class _ReferenciaTabela:
+    """Marca, no msgpack, a posição de uma lista de registros guardada como tabela Arrow."""
+
+    def __init__(self, indice: int):
+        self.indice = indice
+
+
+def _codificar_extensao(obj: Any):
+    """Converte tipos fora do msgpack em tipos de extensão."""
+    import msgpack
+
+    if isinstance(obj, _ReferenciaTabela):
+        return msgpack.ExtType(_EXT_TABELA, obj.indice.to_bytes(4, "big"))
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode("ascii"))
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode("ascii"))
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode("ascii"))
+    if isinstance(obj, datetime.time):
+        return msgpack.ExtType(_EXT_TIME, obj.isoformat().encode("ascii"))
+    if isinstance(obj, datetime.timedelta):
+        micros = (obj.days * 86400 + obj.seconds) * 1_000_000 + obj.microseconds
+        return msgpack.ExtType(_EXT_TIMEDELTA, micros.to_bytes(8, "big", signed=True))
+    if isinstance(obj, tuple):
+        return msgpack.ExtType(_EXT_TUPLA, _empacotar(list(obj)))
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, (str, int, float)):
+        # Subclasses (ex.: enums) viram o tipo base
+        for tipo in (bool, int, float, str):
+            if isinstance(obj, tipo):
+                return tipo(obj)
+    raise TypeError(f"Tipo não suportado pelo codec do estado: {type(obj).__name__}")
+
+
+def _decodificar_extensao(tabelas: List[Any]):
+    """Cria o ext_hook do msgpack, resolvendo as referências às tabelas decodificadas."""
+    import msgpack
+
+    def decodificar(codigo: int, dados: bytes):
+        if codigo == _EXT_TABELA:
+            return tabelas[int.from_bytes(dados, "big")]
+        if codigo == _EXT_DECIMAL:
+            return Decimal(dados.decode("ascii"))
+        if codigo == _EXT_DATETIME:
+            return datetime.datetime.fromisoformat(dados.decode("ascii"))
+        if codigo == _EXT_DATE:
+            return datetime.date.fromisoformat(dados.decode("ascii"))
+        if codigo == _EXT_TIME:
+            return datetime.time.fromisoformat(dados.decode("ascii"))
+        if codigo == _EXT_TIMEDELTA:
+            return datetime.timedelta(microseconds=int.from_bytes(dados, "big", signed=True))
+        if codigo == _EXT_TUPLA:
+            return tuple(_desempacotar(dados, tabelas))
+        if codigo == _EXT_INTEIRO:
+            return int(dados.decode("ascii"))
+        return msgpack.ExtType(codigo, dados)
+
+    return decodificar
+
+
+def _empacotar(obj: Any) -> bytes:
+    import msgpack
+
+    return msgpack.packb(obj, default=_codificar_extensao, strict_types=True, use_bin_type=True)
+
+
+def _desempacotar(dados: bytes, tabelas: List[Any]) -> Any:
+    import msgpack
+
+    return msgpack.unpackb(dados, ext_hook=_decodificar_extensao(tabelas), raw=False, strict_map_key=False)
+
+
+def _empacotar_valor(valor: Any) -> bytes:
+    """Empacota um valor de coluna; inteiros fora de 64 bits, que o msgpack não aceita, vão como texto."""
+    import msgpack
+
+    if type(valor) is int and not -2**63 <= valor < 2**64:
+        return msgpack.packb(msgpack.ExtType(_EXT_INTEIRO, str(valor).encode("ascii")))
+    return _empacotar(valor)
+
+
+def _representavel_no_arrow(valores: List[Any]) -> bool:
+    """
+    Indica se os valores (não nulos) têm um tipo Arrow que os reproduz exatamente.
+
+    O decimal do Arrow tem uma única escala por coluna e o timestamp um único fuso,
+    então Decimal com expoentes diferentes e datas com fusos diferentes não são.
+    """
+    presentes = [valor for valor in valores if valor is not None]
+    tipos = {type(valor) for valor in presentes}
+    if len(tipos) > 1 or tipos & {tuple, list, dict, datetime.timedelta}:
+        return False
+    if tipos == {Decimal}:
+        return len({valor.as_tuple().exponent for valor in presentes}) == 1
+    if tipos == {datetime.datetime}:
+        return len({valor.utcoffset() for valor in presentes}) == 1
+    return True
+
+
+def _coluna_arrow(valores: List[Any]):
+    """
+    Converte os valores de uma coluna em um array Arrow que os reproduz exatamente.
+
+    Returns:
+        Tuple[Array, Optional[bytes]]: Array e o codec da coluna (None para tipo nativo do Arrow)
+    """
+    import pyarrow as pa
+
+    if _representavel_no_arrow(valores):
+        try:
+            return pa.array(valores), None
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            pass
+    # Tipos mistos ou não representáveis: cada valor em msgpack
+    return pa.array([None if valor is None else _empacotar_valor(valor) for valor in valores], type=pa.binary()), b"msgpack"
+
+
+def rmta_registros_para_arrow(registros: List[Dict[str, Any]]) -> Optional[bytes]:
+    """
+    Converte registros em uma tabela Arrow IPC (formato de stream).
+
+    Args:
+        registros (List[Dict[str, Any]]): Registros com as mesmas chaves, na mesma ordem
+
+    Returns:
+        Optional[bytes]: Tabela serializada, ou None se os registros não forem tabulares
+    """
+    import pyarrow as pa
+
+    colunas = list(registros[0]) if registros else []
+    if any(not isinstance(registro, dict) or list(registro) != colunas for registro in registros):
+        return None
+    if any(not isinstance(coluna, str) for coluna in colunas):
+        return None
+
+    arrays, campos = [], []
+    for coluna in colunas:
+        array, codec = _coluna_arrow([registro[coluna] for registro in registros])
+        arrays.append(array)
+        campos.append(pa.field(coluna, array.type, metadata={_CODEC_COLUNA: codec} if codec else None))
+    tabela = pa.Table.from_arrays(arrays, schema=pa.schema(campos, metadata={b"linhas": str(len(registros)).encode()}))
+
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue().to_pybytes()
+
+
+def _timestamps_com_fuso(coluna) -> List[Any]:
+    """
+    Converte uma coluna de timestamps com fuso em datetime com datetime.timezone.
+
+    O Arrow devolveria fusos do pytz (e bem mais devagar); o psycopg2 usa
+    datetime.timezone, e a coluna tem um único deslocamento (ver _representavel_no_arrow).
+    """
+    import pyarrow as pa
+
+    amostra = coluna.drop_null().slice(0, 1).to_pylist()
+    if not amostra:
+        return [None] * len(coluna)
+    deslocamento = amostra[0].utcoffset()
+    fuso = datetime.timezone(deslocamento)
+    return [
+        None if valor is None else (valor + deslocamento).replace(tzinfo=fuso)
+        for valor in coluna.cast(pa.timestamp(coluna.type.unit)).to_pylist()
+    ]
+
+
+def rmta_arrow_para_registros(dados: bytes, materializar: bool = True):
+    """
+    Lê uma tabela Arrow IPC gerada por rmta_registros_para_arrow.
+
+    Args:
+        dados (bytes): Tabela serializada
+        materializar (bool): Se converte a tabela em registros Python; False devolve a
+            pyarrow.Table, lida sem cópia do buffer
+
+    Returns:
+        Lista de registros ou pyarrow.Table
+    """
+    import pyarrow as pa
+
+    tabela = pa.ipc.open_stream(pa.py_buffer(dados)).read_all()
+    if not materializar:
+        return tabela
+
+    colunas = {}
+    for campo, coluna in zip(tabela.schema, tabela.columns):
+        if campo.metadata and campo.metadata.get(_CODEC_COLUNA) == b"msgpack":
+            valores = [None if valor is None else _desempacotar(valor, []) for valor in coluna.to_pylist()]
+        elif pa.types.is_timestamp(campo.type) and campo.type.tz:
+            valores = _timestamps_com_fuso(coluna)
+        else:
+            valores = coluna.to_pylist()
+        colunas[campo.name] = valores
+    linhas = int(tabela.schema.metadata[b"linhas"])
+    nomes = list(colunas)
+    return [dict(zip(nomes, valores)) for valores in zip(*colunas.values())] if nomes else [{} for _ in range(linhas)]
+
+
+def rmta_codificar_estado(estado: Dict[str, Any]) -> bytes:
+    """
+    Serializa o estado do agente: resultados em Arrow IPC e o restante em msgpack.
+
+    Args:
+        estado (Dict[str, Any]): Estado do agente (EstadoAgente)
+
+    Returns:
+        bytes: Envelope msgpack com a versão, as tabelas e os metadados
+    """
+    tabelas: List[bytes] = []
+
+    def referenciar(registros):
+        if not isinstance(registros, list) or not registros:
+            return registros
+        tabela = rmta_registros_para_arrow(registros)
+        if tabela is None:
+            return registros
+        tabelas.append(tabela)
+        return _ReferenciaTabela(len(tabelas) - 1)
+
+    metadados = dict(estado)
+    metadados["resultados"] = referenciar(estado.get("resultados"))
+    if isinstance(estado.get("subconsultas"), list):
+        metadados["subconsultas"] = [
+            {**ramo, "resultados": referenciar(ramo.get("resultados"))} if isinstance(ramo, dict) and "resultados" in ramo else ramo
+            for ramo in estado["subconsultas"]
+        ]
+    if "resultados" not in estado:
+        del metadados["resultados"]
+
+    return _empacotar({"versao": VERSAO_CODEC, "tabelas": tabelas, "estado": _empacotar(metadados)})
+
+
+def rmta_decodificar_estado(dados: bytes, materializar: bool = True) -> Dict[str, Any]:
+    """
+    Reconstrói o estado serializado por rmta_codificar_estado.
+
+    Args:
+        dados (bytes): Estado serializado
+        materializar (bool): Se os resultados voltam como registros Python; False os
+            devolve como pyarrow.Table, sem cópia
+
+    Returns:
+        Dict[str, Any]: Estado do agente
+
+    Raises:
+        ErroCodecEstado: Se o conteúdo não for um estado desta versão do codec
+    """
+    try:
+        envelope = _desempacotar(dados, [])
+    except Exception as e:
+        raise ErroCodecEstado(f"Conteúdo não é um estado codificado: {e}") from e
+    if not isinstance(envelope, dict) or envelope.get("versao") != VERSAO_CODEC:
+        raise ErroCodecEstado("Versão do codec do estado não suportada.")
+
+    tabelas = [rmta_arrow_para_registros(tabela, materializar) for tabela in envelope["tabelas"]]
+    return _desempacotar(envelope["estado"], tabelas)
@@ -3,48 +3,246 @@ Configuração do sistema de logging para o SQL Agent.
 
 Este módulo contém a função para configurar o sistema de logging
 utilizado pelo SQL Agent.
+
+As threads das requisições apenas enfileiram os registros (QueueHandler); a
+formatação e a escrita em disco e no console acontecem em uma thread de
+segundo plano (QueueListener). Os registros são gravados em JSON, com o ID da
+requisição propagado por contextvars, em arquivos rotacionados por tamanho.
+Acima de LOG_LIMITE_REGISTROS_SEGUNDO, registros DEBUG e INFO são amostrados.
 """
-import os
+import atexit
+import contextvars
+import json
 import logging
-from datetime import datetime
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from config.configuracoes import (
+    LOG_NIVEL,
+    LOG_DIRETORIO,
+    LOG_TAMANHO_MAXIMO,
+    LOG_ARQUIVOS_BACKUP,
+    LOG_LIMITE_REGISTROS_SEGUNDO,
+    LOG_TAXA_AMOSTRAGEM
+)
+
+# ID da requisição em andamento no contexto atual (thread ou tarefa)
+_id_requisicao: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("id_requisicao", default=None)
+
+_ouvinte: Optional[logging.handlers.QueueListener] = None
+_trava_configuracao = threading.Lock()
+
+# Atributos padrão de um LogRecord, que não são repassados como campos extras no JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "id_requisicao"}
+
+
+def rmta_obter_id_requisicao() -> Optional[str]:
+    """
+    Retorna o ID da requisição do contexto atual.
+
+    Returns:
+        Optional[str]: ID da requisição, ou None fora de uma requisição
+    """
+    return _id_requisicao.get()
+
+
+@contextmanager
+def rmta_contexto_requisicao(id_requisicao: Optional[str] = None) -> Iterator[str]:
+    """
+    Define o ID da requisição para os registros emitidos dentro do bloco.
+
+    Se já houver um ID no contexto e nenhum for informado, o existente é mantido.
+
+    Args:
+        id_requisicao (Optional[str]): ID a usar; None gera um novo se necessário
+
+    Yields:
+        str: ID da requisição em vigor
+    """
+    atual = _id_requisicao.get()
+    if id_requisicao is None and atual is not None:
+        yield atual
+        return
+    token = _id_requisicao.set(id_requisicao or uuid.uuid4().hex[:16])
+    try:
+        yield _id_requisicao.get()
+    finally:
+        _id_requisicao.reset(token)
+
+
+def rmta_submeter_com_contexto(executor, funcao, *args):
+    """
+    Submete uma função a um executor preservando o contexto atual (inclusive o ID da requisição).
+
+    Args:
+        executor: Executor (ThreadPoolExecutor) que executará a função
+        funcao: Função a executar
+        *args: Argumentos da função
+
+    Returns:
+        Future: Futuro da execução
+    """
+    return executor.submit(contextvars.copy_context().run, funcao, *args)
+
+
+class FiltroIdRequisicao(logging.Filter):
+    """
+    Anota cada registro com o ID da requisição, na thread que o emitiu.
+
+    Registros repassados por outro processo (processos de trabalho do
+    supervisor) já chegam anotados e mantêm o ID original.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "id_requisicao", None) is None:
+            record.id_requisicao = _id_requisicao.get()
+        return True
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Amostra registros DEBUG e INFO quando o volume passa de um limite por segundo.
+
+    WARNING e níveis acima nunca são descartados.
+
+    Attributes:
+        limite_por_segundo (int): Registros por segundo aceitos sem amostragem
+        taxa (float): Fração dos registros DEBUG/INFO mantidos acima do limite
+        descartados (int): Registros descartados desde a criação
+    """
+
+    def __init__(self, limite_por_segundo: int, taxa: float):
+        super().__init__()
+        self.limite_por_segundo = limite_por_segundo
+        self.taxa = taxa
+        self.descartados = 0
+        self._janela = int(time.monotonic())
+        self._contagem = 0
+        self._trava = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.limite_por_segundo <= 0:
+            return True
+        with self._trava:
+            janela = int(time.monotonic())
+            if janela != self._janela:
+                self._janela, self._contagem = janela, 0
+            self._contagem += 1
+            if self._contagem <= self.limite_por_segundo or random.random() < self.taxa:
+                return True
+            self.descartados += 1
+            return False
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata os registros como uma linha JSON, com os campos extras do registro."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "instante": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+            "id_requisicao": getattr(record, "id_requisicao", None),
+            "modulo": record.module,
+            "funcao": record.funcName,
+            "linha": record.lineno,
+            "thread": record.threadName
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerPreguicoso(logging.handlers.QueueHandler):
+    """
+    QueueHandler que enfileira o registro sem formatá-lo.
+
+    O QueueHandler padrão formata a mensagem na thread que emite o registro;
+    aqui a interpolação dos argumentos fica para a thread de escrita.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
 
 def rmta_configurar_logging():
     """
     Configura o sistema de logging para o aplicativo.
-    
-    Esta função configura o logger com handlers para arquivo e console,
-    definindo o formato das mensagens e o nível de logging.
-    
+
+    Esta função configura o logger com um handler de fila e inicia a thread de
+    escrita, com um arquivo JSON rotacionado por tamanho e o console. Chamadas
+    repetidas (como os reruns do Streamlit) reaproveitam a configuração existente.
+
     Returns:
         Logger: Objeto logger configurado
     """
-    # Criar diretório de logs se não existir
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # Configurar o logger
+    global _ouvinte
+
     logger = logging.getLogger('sql_agent')
-    logger.setLevel(logging.INFO)
-    
-    # Limpar handlers existentes para evitar duplicação
-    if logger.handlers:
-        logger.handlers.clear()
-    
-    # Formato do log
-    formato = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    # Handler para arquivo
-    data_atual = datetime.now().strftime('%Y-%m-%d')
-    arquivo_handler = logging.FileHandler(f'logs/sql_agent_{data_atual}.log')
-    arquivo_handler.setFormatter(formato)
-    
-    # Handler para console
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formato)
-    
-    # Adicionar handlers ao logger
-    logger.addHandler(arquivo_handler)
-    logger.addHandler(console_handler)
-    
+    with _trava_configuracao:
+        if _ouvinte is not None:
+            return logger
+
+        # Criar diretório de logs se não existir
+        os.makedirs(LOG_DIRETORIO, exist_ok=True)
+
+        logger.setLevel(LOG_NIVEL)
+
+        # Limpar handlers existentes para evitar duplicação
+        if logger.handlers:
+            logger.handlers.clear()
+
+        # Handler para arquivo, em JSON, rotacionado por tamanho
+        arquivo_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIRETORIO, 'sql_agent.log'),
+            maxBytes=LOG_TAMANHO_MAXIMO,
+            backupCount=LOG_ARQUIVOS_BACKUP,
+            encoding='utf-8'
+        )
+        arquivo_handler.setFormatter(FormatadorJSON())
+
+        # Handler para console
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(
+            logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(id_requisicao)s] %(message)s')
+        )
+
+        # As threads das requisições só enfileiram; a escrita fica com o ouvinte
+        fila = queue.SimpleQueue()
+        fila_handler = _QueueHandlerPreguicoso(fila)
+        fila_handler.addFilter(FiltroIdRequisicao())
+        fila_handler.addFilter(FiltroAmostragem(LOG_LIMITE_REGISTROS_SEGUNDO, LOG_TAXA_AMOSTRAGEM))
+        logger.addHandler(fila_handler)
+
+        _ouvinte = logging.handlers.QueueListener(fila, arquivo_handler, console_handler, respect_handler_level=True)
+        _ouvinte.start()
+        atexit.register(rmta_encerrar_logging)
+
     logger.info("Sistema de logging configurado")
-    return logger
\ No newline at end of file
+    return logger
+
+
+def rmta_encerrar_logging() -> None:
+    """Esvazia a fila de registros e encerra a thread de escrita."""
+    global _ouvinte
+
+    with _trava_configuracao:
+        if _ouvinte is None:
+            return
+        _ouvinte.stop()
+        for handler in _ouvinte.handlers:
+            handler.close()
+        _ouvinte = None
+        logging.getLogger('sql_agent').handlers.clear()
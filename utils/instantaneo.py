@@ -0,0 +1,99 @@
+"""
+Instantâneos de dados somente leitura compartilhados entre processos.
+
+Um processo (o supervisor) publica os dados em um arquivo, substituído
+atomicamente a cada nova versão; os demais processos mapeiam o arquivo em
+memória (mmap) e só o decodificam de novo quando ele muda. As páginas mapeadas
+vêm do cache de páginas do sistema operacional, então o conteúdo publicado
+existe uma única vez na memória, independentemente do número de processos.
+"""
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+
+def rmta_publicar_instantaneo(caminho: str, dados: Dict[str, Any]) -> int:
+    """
+    Grava o instantâneo em um arquivo temporário e o coloca no lugar do anterior.
+
+    Leitores que já mapearam a versão anterior continuam lendo-a até reabrir o
+    arquivo; nenhum leitor vê um arquivo parcialmente escrito.
+
+    Args:
+        caminho (str): Caminho do arquivo do instantâneo
+        dados (Dict[str, Any]): Dados serializáveis em JSON
+
+    Returns:
+        int: Tamanho publicado em bytes
+    """
+    conteudo = json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", prefix=".instantaneo_")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    except Exception:
+        os.unlink(temporario)
+        raise
+    logger.debug("Instantâneo publicado em %s (%s bytes)", caminho, len(conteudo))
+    return len(conteudo)
+
+
+class InstantaneoMapeado:
+    """
+    Leitor de um instantâneo publicado por rmta_publicar_instantaneo.
+
+    Attributes:
+        caminho (str): Caminho do arquivo do instantâneo
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._identidade: Optional[Tuple[int, int, int]] = None
+        self._mapa: Optional[mmap.mmap] = None
+        self._dados: Optional[Dict[str, Any]] = None
+        self._trava = threading.Lock()
+
+    def ler(self) -> Optional[Dict[str, Any]]:
+        """
+        Retorna os dados da versão publicada mais recente.
+
+        A verificação de mudança custa um stat do arquivo; o conteúdo só é
+        decodificado quando o arquivo foi substituído.
+
+        Returns:
+            Optional[Dict[str, Any]]: Dados do instantâneo, ou None se ainda não foi publicado
+        """
+        try:
+            status = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        identidade = (status.st_ino, status.st_mtime_ns, status.st_size)
+
+        with self._trava:
+            if identidade == self._identidade:
+                return self._dados
+            with open(self.caminho, "rb") as arquivo:
+                mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self._dados = json.loads(mapa[:].decode("utf-8"))
+            if self._mapa is not None:
+                self._mapa.close()
+            self._mapa = mapa
+            self._identidade = identidade
+            return self._dados
+
+    def fechar(self) -> None:
+        """Libera o mapeamento do arquivo."""
+        with self._trava:
+            if self._mapa is not None:
+                self._mapa.close()
+            self._mapa = None
+            self._identidade = None
+            self._dados = None
@@ -0,0 +1,129 @@
+"""
+Registro de métricas do SQL Agent.
+
+Este módulo mantém contadores, medidores e histogramas em memória,
+compartilhados pelos componentes do agente, e os exporta no formato
+texto do Prometheus para o endpoint /metrics do servidor HTTP.
+"""
+import threading
+from typing import Dict, Tuple, Optional, Any
+
+# Limites superiores (em segundos) dos buckets dos histogramas
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trava = threading.Lock()
+_contadores: Dict[Tuple[str, Tuple], float] = {}
+_medidores: Dict[Tuple[str, Tuple], float] = {}
+_histogramas: Dict[Tuple[str, Tuple], Dict[str, Any]] = {}
+
+
+def _chave(nome: str, rotulos: Optional[Dict[str, str]]) -> Tuple[str, Tuple]:
+    """Monta a chave interna de uma série a partir do nome e dos rótulos."""
+    return nome, tuple(sorted((rotulos or {}).items()))
+
+
+def rmta_incrementar_contador(nome: str, valor: float = 1, rotulos: Optional[Dict[str, str]] = None) -> None:
+    """
+    Incrementa um contador.
+
+    Args:
+        nome (str): Nome da métrica
+        valor (float): Valor a somar ao contador
+        rotulos (Optional[Dict[str, str]]): Rótulos da série
+    """
+    chave = _chave(nome, rotulos)
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def rmta_definir_medidor(nome: str, valor: float, rotulos: Optional[Dict[str, str]] = None) -> None:
+    """
+    Define o valor atual de um medidor.
+
+    Args:
+        nome (str): Nome da métrica
+        valor (float): Valor atual
+        rotulos (Optional[Dict[str, str]]): Rótulos da série
+    """
+    with _trava:
+        _medidores[_chave(nome, rotulos)] = valor
+
+
+def rmta_observar_histograma(nome: str, valor: float, rotulos: Optional[Dict[str, str]] = None) -> None:
+    """
+    Registra uma observação em um histograma.
+
+    Args:
+        nome (str): Nome da métrica
+        valor (float): Valor observado (em geral, uma duração em segundos)
+        rotulos (Optional[Dict[str, str]]): Rótulos da série
+    """
+    chave = _chave(nome, rotulos)
+    with _trava:
+        histograma = _histogramas.get(chave)
+        if histograma is None:
+            histograma = {"buckets": [0] * len(BUCKETS_PADRAO), "soma": 0.0, "contagem": 0}
+            _histogramas[chave] = histograma
+        for i, limite in enumerate(BUCKETS_PADRAO):
+            if valor <= limite:
+                histograma["buckets"][i] += 1
+        histograma["soma"] += valor
+        histograma["contagem"] += 1
+
+
+def rmta_obter_contador(nome: str, rotulos: Optional[Dict[str, str]] = None) -> float:
+    """
+    Retorna o valor atual de um contador.
+
+    Args:
+        nome (str): Nome da métrica
+        rotulos (Optional[Dict[str, str]]): Rótulos da série
+
+    Returns:
+        float: Valor do contador (0 se nunca incrementado)
+    """
+    with _trava:
+        return _contadores.get(_chave(nome, rotulos), 0)
+
+
+def _escapar_rotulo(valor: Any) -> str:
+    """Escapa barra invertida, aspas e quebra de linha no valor de um rótulo (formato texto do Prometheus)."""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(rotulos: Tuple, extra: Optional[Tuple] = None) -> str:
+    """Formata os rótulos de uma série no formato do Prometheus."""
+    itens = list(rotulos) + list(extra or ())
+    if not itens:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar_rotulo(v)}"' for k, v in itens) + "}"
+
+
+def rmta_exportar_metricas() -> str:
+    """
+    Exporta todas as métricas no formato texto do Prometheus.
+
+    Returns:
+        str: Métricas serializadas
+    """
+    linhas = []
+    with _trava:
+        for (nome, rotulos), valor in sorted(_contadores.items()):
+            linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor}")
+        for (nome, rotulos), valor in sorted(_medidores.items()):
+            linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor}")
+        for (nome, rotulos), histograma in sorted(_histogramas.items()):
+            for limite, contagem in zip(BUCKETS_PADRAO, histograma["buckets"]):
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, (('le', limite),))} {contagem}")
+            linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, (('le', '+Inf'),))} {histograma['contagem']}")
+            linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {histograma['soma']}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {histograma['contagem']}")
+    return "\n".join(linhas) + "\n"
+
+
+def rmta_limpar_metricas() -> None:
+    """Remove todas as métricas registradas (usado nos testes)."""
+    with _trava:
+        _contadores.clear()
+        _medidores.clear()
+        _histogramas.clear()
@@ -0,0 +1,369 @@
+"""
+Perfilador dos nós do grafo.
+
+O tempo_execucao diz qual nó foi lento, mas não por quê. Este módulo perfila
+os nós de uma requisição, sob demanda (ex.: "Perfilar esta consulta" na
+interface) ou em 1 a cada PERFIL_AMOSTRAGEM requisições, em um de dois modos:
+
+- "amostragem": uma thread coleta a pilha da thread do nó a cada
+  PERFIL_INTERVALO segundos (sys._current_frames), com custo baixo e
+  independente do número de chamadas; gera pilhas colapsadas para flame
+  graphs e um pstats estimado pelas amostras
+- "cprofile": cProfile determinístico na thread do nó, com contagem exata de
+  chamadas e custo maior em código com muitas chamadas pequenas; gera pstats
+
+Os perfis das últimas PERFIL_CAPACIDADE requisições ficam em um buffer circular
+do processo. Só a thread do nó é perfilada: trabalho entregue a outros pools
+(a chamada ao LLM, as subconsultas em paralelo) aparece como espera no nó.
+"""
+import contextvars
+import cProfile
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from config.configuracoes import PERFIL_AMOSTRAGEM, PERFIL_CAPACIDADE, PERFIL_INTERVALO, PERFIL_MODO
+from utils.config_log import rmta_obter_id_requisicao
+from utils.metricas import rmta_incrementar_contador
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+MODO_AMOSTRAGEM = "amostragem"
+MODO_CPROFILE = "cprofile"
+
+# Função de uma pilha: (arquivo, linha da definição, nome), a mesma chave usada pelo pstats
+Funcao = Tuple[str, int, str]
+
+
+class RegistroNo(NamedTuple):
+    """Execução perfilada de um nó (um nó pode rodar mais de uma vez, ex.: após escalonar)."""
+    nome: str
+    duracao: float
+    estatisticas: Optional[Dict[Funcao, tuple]]  # modo cprofile: dicionário do pstats
+    pilhas: Optional[Counter]  # modo amostragem: amostras por pilha (tuplas de Funcao, da raiz à folha)
+
+
+class Perfil:
+    """
+    Perfil de uma requisição: os nós executados e o que cada um fez.
+
+    Attributes:
+        id (str): Identificador do perfil
+        id_requisicao (Optional[str]): ID da requisição perfilada (o mesmo dos logs)
+        consulta (str): Pergunta da requisição
+        modo (str): MODO_AMOSTRAGEM ou MODO_CPROFILE
+        intervalo (float): Segundos entre amostras (modo amostragem)
+        inicio (float): Instante de início (time.time)
+        duracao (float): Duração da requisição em segundos
+        nos (List[RegistroNo]): Nós perfilados, na ordem de execução
+    """
+
+    def __init__(self, consulta: str, modo: str, intervalo: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.id_requisicao = rmta_obter_id_requisicao()
+        self.consulta = consulta
+        self.modo = modo
+        self.intervalo = intervalo
+        self.inicio = time.time()
+        self.duracao = 0.0
+        self.nos: List[RegistroNo] = []
+        self._trava = threading.Lock()
+
+    def registrar(self, registro: RegistroNo) -> None:
+        with self._trava:
+            self.nos.append(registro)
+
+
+class _AmostradorPilhas:
+    """
+    Thread que coleta periodicamente as pilhas das threads registradas.
+
+    A thread só fica ativa enquanto houver algum nó sendo perfilado.
+    """
+
+    def __init__(self):
+        self._alvos: Dict[int, Tuple[Counter, float]] = {}
+        self._condicao = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def registrar(self, id_thread: int, intervalo: float) -> Counter:
+        """Começa a amostrar a thread; retorna o contador que recebe as pilhas."""
+        pilhas: Counter = Counter()
+        with self._condicao:
+            self._alvos[id_thread] = (pilhas, intervalo)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="sql_agent_perfilador", daemon=True)
+                self._thread.start()
+            self._condicao.notify()
+        return pilhas
+
+    def remover(self, id_thread: int) -> None:
+        """Para de amostrar a thread; o contador não recebe mais pilhas depois disso."""
+        with self._condicao:
+            self._alvos.pop(id_thread, None)
+
+    def _executar(self) -> None:
+        while True:
+            with self._condicao:
+                while not self._alvos:
+                    self._condicao.wait()
+                intervalo = min(intervalo for _, intervalo in self._alvos.values())
+                quadros = sys._current_frames()
+                for id_thread, (pilhas, _) in self._alvos.items():
+                    pilha = _pilha(quadros.get(id_thread))
+                    if pilha:
+                        pilhas[pilha] += 1
+                del quadros
+            time.sleep(intervalo)
+
+
+def _pilha(quadro) -> Optional[Tuple[Funcao, ...]]:
+    """Pilha de um quadro, da raiz à folha, a partir do nó perfilado (None fora do nó)."""
+    funcoes = []
+    while quadro is not None and quadro.f_code is not _CODIGO_CHAMAR_NO:
+        codigo = quadro.f_code
+        funcoes.append((codigo.co_filename, codigo.co_firstlineno, codigo.co_name))
+        quadro = quadro.f_back
+    if quadro is None:
+        return None
+    funcoes.reverse()
+    return tuple(funcoes)
+
+
+_perfil_atual: contextvars.ContextVar[Optional[Perfil]] = contextvars.ContextVar("perfil_atual", default=None)
+_amostrador = _AmostradorPilhas()
+_perfis: "deque[Perfil]" = deque(maxlen=PERFIL_CAPACIDADE)
+_trava_perfis = threading.Lock()
+_contador_requisicoes = itertools.count()
+
+
+def _chamar_no(funcao: Callable, args: tuple, kwargs: dict):
+    """Chama o nó; o quadro desta função marca a raiz das pilhas amostradas."""
+    return funcao(*args, **kwargs)
+
+
+_CODIGO_CHAMAR_NO = _chamar_no.__code__
+
+
+def _executar_perfilado(perfil: Perfil, nome: str, funcao: Callable, args: tuple, kwargs: dict):
+    """Executa o nó sob o perfilador do modo do perfil e registra o resultado."""
+    inicio = time.perf_counter()
+    if perfil.modo == MODO_CPROFILE:
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        try:
+            return _chamar_no(funcao, args, kwargs)
+        finally:
+            perfilador.disable()
+            perfilador.create_stats()
+            perfil.registrar(RegistroNo(nome, time.perf_counter() - inicio, perfilador.stats, None))
+    id_thread = threading.get_ident()
+    pilhas = _amostrador.registrar(id_thread, perfil.intervalo)
+    try:
+        return _chamar_no(funcao, args, kwargs)
+    finally:
+        _amostrador.remover(id_thread)
+        perfil.registrar(RegistroNo(nome, time.perf_counter() - inicio, None, pilhas))
+
+
+def rmta_perfilar_no(nome: str, funcao: Callable) -> Callable:
+    """
+    Envolve um nó do grafo para ser perfilado quando a requisição estiver sendo perfilada.
+
+    Fora de um perfil, o nó é chamado diretamente, sem custo adicional além de
+    uma leitura de contextvar.
+
+    Args:
+        nome (str): Nome do nó no grafo
+        funcao (Callable): Função do nó
+
+    Returns:
+        Callable: Função do nó envolvida
+    """
+    @wraps(funcao)
+    def no_perfilado(*args, **kwargs):
+        perfil = _perfil_atual.get()
+        if perfil is None:
+            return funcao(*args, **kwargs)
+        return _executar_perfilado(perfil, nome, funcao, args, kwargs)
+    return no_perfilado
+
+
+@contextmanager
+def rmta_contexto_perfil(
+    consulta: str,
+    forcar: bool = False,
+    amostragem: int = PERFIL_AMOSTRAGEM,
+    modo: str = PERFIL_MODO,
+    intervalo: float = PERFIL_INTERVALO
+) -> Iterator[Optional[Perfil]]:
+    """
+    Perfila os nós executados dentro do bloco, se a requisição for escolhida.
+
+    A requisição é perfilada quando pedido explicitamente (forcar) ou quando é a
+    N-ésima desde a última perfilada (amostragem). O perfil vai para o buffer
+    circular ao sair do bloco, se algum nó tiver sido executado.
+
+    Args:
+        consulta (str): Pergunta da requisição
+        forcar (bool): Perfilar esta requisição independentemente da amostragem
+        amostragem (int): Perfilar 1 a cada N requisições (0 = só quando forçado)
+        modo (str): MODO_AMOSTRAGEM ou MODO_CPROFILE
+        intervalo (float): Segundos entre amostras de pilha
+
+    Yields:
+        Optional[Perfil]: Perfil em coleta, ou None se a requisição não foi escolhida
+    """
+    sorteada = amostragem > 0 and next(_contador_requisicoes) % amostragem == 0
+    if _perfil_atual.get() is not None or not (forcar or sorteada):
+        yield None
+        return
+
+    perfil = Perfil(consulta, modo if modo == MODO_CPROFILE else MODO_AMOSTRAGEM, intervalo)
+    token = _perfil_atual.set(perfil)
+    inicio = time.perf_counter()
+    try:
+        yield perfil
+    finally:
+        _perfil_atual.reset(token)
+        perfil.duracao = time.perf_counter() - inicio
+        if perfil.nos:
+            with _trava_perfis:
+                _perfis.append(perfil)
+            rmta_incrementar_contador("sql_agent_perfis_total", rotulos={"modo": perfil.modo})
+            logger.info("Perfil %s (%s) registrado para a consulta '%s'", perfil.id, perfil.modo, consulta)
+
+
+def rmta_listar_perfis() -> List[Perfil]:
+    """Perfis do buffer circular, do mais recente ao mais antigo."""
+    with _trava_perfis:
+        return list(reversed(_perfis))
+
+
+def rmta_obter_perfil(id_perfil: str) -> Optional[Perfil]:
+    """Perfil do buffer circular pelo ID, ou None se já saiu do buffer."""
+    with _trava_perfis:
+        return next((perfil for perfil in _perfis if perfil.id == id_perfil), None)
+
+
+def _estatisticas_das_amostras(registro: RegistroNo) -> Dict[Funcao, tuple]:
+    """
+    Monta um dicionário no formato do pstats a partir das pilhas amostradas.
+
+    Chamadas contam amostras, o tempo próprio vem das amostras em que a função
+    estava no topo e o acumulado das amostras em que estava na pilha. Cada
+    amostra vale a duração do nó dividida pelo número de amostras, já que o
+    intervalo real depende de quando a thread de amostragem obtém o GIL.
+    """
+    estatisticas: Dict[Funcao, list] = {}
+    chamadores: Dict[Funcao, Dict[Funcao, list]] = {}
+    tempo_amostra = registro.duracao / max(1, sum(registro.pilhas.values()))
+    for pilha, amostras in registro.pilhas.items():
+        tempo = amostras * tempo_amostra
+        for funcao in set(pilha):
+            entrada = estatisticas.setdefault(funcao, [0, 0, 0.0, 0.0])
+            entrada[0] += amostras
+            entrada[1] += amostras
+            entrada[3] += tempo
+        if pilha:
+            estatisticas[pilha[-1]][2] += tempo
+        for posicao, (chamador, chamada) in enumerate(zip(pilha, pilha[1:])):
+            aresta = chamadores.setdefault(chamada, {}).setdefault(chamador, [0, 0, 0.0, 0.0])
+            aresta[0] += amostras
+            aresta[1] += amostras
+            aresta[3] += tempo
+            if posicao + 2 == len(pilha):
+                aresta[2] += tempo
+    return {
+        funcao: (cc, nc, tt, ct, {chamador: tuple(valores) for chamador, valores in chamadores.get(funcao, {}).items()})
+        for funcao, (cc, nc, tt, ct) in estatisticas.items()
+    }
+
+
+class _FonteEstatisticas:
+    """Adapta um dicionário de estatísticas para o construtor do pstats.Stats."""
+
+    def __init__(self, estatisticas: Dict[Funcao, tuple]):
+        self.stats = estatisticas
+
+    def create_stats(self) -> None:
+        pass
+
+
+def rmta_estatisticas_perfil(perfil: Perfil, nome_no: Optional[str] = None) -> pstats.Stats:
+    """
+    Estatísticas do perfil (ou de um nó dele) no formato do pstats.
+
+    Args:
+        perfil (Perfil): Perfil da requisição
+        nome_no (Optional[str]): Restringe aos registros deste nó
+
+    Returns:
+        pstats.Stats: Estatísticas somadas dos nós
+    """
+    total = None
+    for registro in perfil.nos:
+        if nome_no is not None and registro.nome != nome_no:
+            continue
+        if registro.estatisticas is not None:
+            estatisticas = registro.estatisticas
+        else:
+            estatisticas = _estatisticas_das_amostras(registro)
+        parcial = pstats.Stats(_FonteEstatisticas(estatisticas))
+        if total is None:
+            total = parcial
+        else:
+            total.add(parcial)
+    return total if total is not None else pstats.Stats(_FonteEstatisticas({}))
+
+
+def rmta_exportar_pstats(perfil: Perfil, nome_no: Optional[str] = None) -> bytes:
+    """
+    Conteúdo de um arquivo .pstats do perfil, legível por pstats, snakeviz etc.
+
+    Args:
+        perfil (Perfil): Perfil da requisição
+        nome_no (Optional[str]): Restringe aos registros deste nó
+
+    Returns:
+        bytes: Estatísticas serializadas como em pstats.Stats.dump_stats
+    """
+    return marshal.dumps(rmta_estatisticas_perfil(perfil, nome_no).stats)
+
+
+def _rotulo_funcao(funcao: Funcao) -> str:
+    arquivo, linha, nome = funcao
+    return f"{nome} ({os.path.basename(arquivo)}:{linha})".replace(";", ":")
+
+
+def rmta_exportar_pilhas(perfil: Perfil) -> Optional[str]:
+    """
+    Pilhas colapsadas do perfil ("no;f1;f2 amostras" por linha), para flame graphs.
+
+    O formato é o de flamegraph.pl, também aceito pelo speedscope; cada pilha
+    começa pelo nome do nó.
+
+    Args:
+        perfil (Perfil): Perfil da requisição
+
+    Returns:
+        Optional[str]: Pilhas colapsadas, ou None se o perfil não tem amostras de pilha (modo cprofile)
+    """
+    if perfil.modo != MODO_AMOSTRAGEM:
+        return None
+    linhas: Counter = Counter()
+    for registro in perfil.nos:
+        for pilha, amostras in registro.pilhas.items():
+            linhas[";".join([registro.nome, *map(_rotulo_funcao, pilha)])] += amostras
+    return "".join(f"{pilha} {amostras}\n" for pilha, amostras in linhas.items())
@@ -0,0 +1,185 @@
+"""
+Pós-processamento local dos resultados de uma consulta.
+
+Este módulo aplica filtros, ordenação, agrupamento e paginação sobre o
+resultado já executado, com operações vetorizadas do pandas. É usado pela
+interface para que mudanças de visualização não chamem o LLM nem o banco
+de dados novamente.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from database.decodificacao import rmta_dataframe_de_registros
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+OPERADORES_FILTRO = ["=", "≠", ">", "<", ">=", "<=", "contém"]
+
+AGREGACOES = {
+    "soma": "sum",
+    "média": "mean",
+    "contagem": "count",
+    "mínimo": "min",
+    "máximo": "max"
+}
+
+
+def rmta_preparar_dataframe(resultados: Optional[List[Dict[str, Any]]],
+                            tipos: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Converte os registros de uma consulta em DataFrame pronto para operações locais.
+
+    Cada coluna é montada direto no seu dtype (database.decodificacao), dado pelo
+    OID da coluna no banco quando os tipos são informados, sem a inferência valor
+    a valor do pandas; colunas NUMERIC viram float para permitir operações
+    vetorizadas e gráficos.
+
+    Args:
+        resultados (Optional[List[Dict[str, Any]]]): Registros retornados pela consulta
+        tipos (Optional[Dict[str, str]]): Tipo de cada coluna (estado["tipos_colunas"])
+
+    Returns:
+        pd.DataFrame: Resultado em formato tabular
+    """
+    return rmta_dataframe_de_registros(resultados, tipos)
+
+
+def _converter_valor_filtro(serie: pd.Series, valor: str) -> Any:
+    """Converte o valor digitado para o tipo da coluna filtrada."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return float(str(valor).replace(",", "."))
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return pd.to_datetime(valor, dayfirst=True)
+    return valor
+
+
+def rmta_filtrar(df: pd.DataFrame, coluna: str, operador: str, valor: str) -> pd.DataFrame:
+    """
+    Filtra as linhas do resultado por uma condição sobre uma coluna.
+
+    Args:
+        df (pd.DataFrame): Resultado
+        coluna (str): Coluna filtrada
+        operador (str): Um dos OPERADORES_FILTRO
+        valor (str): Valor digitado pelo usuário
+
+    Returns:
+        pd.DataFrame: Linhas que atendem à condição
+
+    Raises:
+        ValueError: Se o operador não existir ou o valor não for compatível com a coluna
+    """
+    serie = df[coluna]
+    if operador == "contém":
+        return df[serie.astype(str).str.contains(str(valor), case=False, regex=False, na=False)]
+
+    valor = _converter_valor_filtro(serie, valor)
+    if operador == "=":
+        mascara = serie == valor
+    elif operador == "≠":
+        mascara = serie != valor
+    elif operador == ">":
+        mascara = serie > valor
+    elif operador == "<":
+        mascara = serie < valor
+    elif operador == ">=":
+        mascara = serie >= valor
+    elif operador == "<=":
+        mascara = serie <= valor
+    else:
+        raise ValueError(f"Operador de filtro desconhecido: {operador}")
+    return df[mascara.fillna(False)]
+
+
+def rmta_ordenar(df: pd.DataFrame, coluna: str, ascendente: bool = True) -> pd.DataFrame:
+    """
+    Ordena o resultado por uma coluna, mantendo a ordem original nos empates.
+
+    Args:
+        df (pd.DataFrame): Resultado
+        coluna (str): Coluna de ordenação
+        ascendente (bool): Ordem crescente (True) ou decrescente (False)
+
+    Returns:
+        pd.DataFrame: Resultado ordenado
+    """
+    return df.sort_values(coluna, ascending=ascendente, kind="stable", na_position="last")
+
+
+def rmta_agrupar(df: pd.DataFrame, colunas: List[str], coluna_valor: str, agregacao: str) -> pd.DataFrame:
+    """
+    Agrupa o resultado e agrega uma coluna.
+
+    Args:
+        df (pd.DataFrame): Resultado
+        colunas (List[str]): Colunas de agrupamento
+        coluna_valor (str): Coluna agregada
+        agregacao (str): Uma das chaves de AGREGACOES
+
+    Returns:
+        pd.DataFrame: Uma linha por grupo, com a coluna "<agregacao>_<coluna_valor>"
+    """
+    nome = f"{agregacao}_{coluna_valor}"
+    agrupado = df.groupby(colunas, sort=True, dropna=False)[coluna_valor].agg(AGREGACOES[agregacao])
+    return agrupado.reset_index(name=nome)
+
+
+def rmta_paginar(df: pd.DataFrame, pagina: int, tamanho: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Retorna uma página do resultado.
+
+    Args:
+        df (pd.DataFrame): Resultado
+        pagina (int): Número da página, a partir de 1 (limitado ao intervalo válido)
+        tamanho (int): Linhas por página
+
+    Returns:
+        Tuple[pd.DataFrame, int]: Linhas da página e o total de páginas
+    """
+    total_paginas = max(1, -(-len(df) // tamanho))
+    pagina = min(max(1, pagina), total_paginas)
+    inicio = (pagina - 1) * tamanho
+    return df.iloc[inicio:inicio + tamanho], total_paginas
+
+
+def rmta_aplicar_operacoes(df: pd.DataFrame, operacoes: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """
+    Aplica filtro, agrupamento e ordenação, nessa ordem, medindo o tempo de cada um.
+
+    Args:
+        df (pd.DataFrame): Resultado original
+        operacoes (Dict[str, Any]): Operações opcionais:
+            - "filtro": {"coluna", "operador", "valor"}
+            - "agrupamento": {"colunas", "coluna_valor", "agregacao"}
+            - "ordenacao": {"coluna", "ascendente"}
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, float]]: Resultado processado e tempos por
+        operação (chaves "local_filtrar", "local_agrupar", "local_ordenar")
+    """
+    tempos: Dict[str, float] = {}
+
+    filtro = operacoes.get("filtro")
+    if filtro:
+        inicio = time.time()
+        df = rmta_filtrar(df, filtro["coluna"], filtro["operador"], filtro["valor"])
+        tempos["local_filtrar"] = time.time() - inicio
+
+    agrupamento = operacoes.get("agrupamento")
+    if agrupamento:
+        inicio = time.time()
+        df = rmta_agrupar(df, agrupamento["colunas"], agrupamento["coluna_valor"], agrupamento["agregacao"])
+        tempos["local_agrupar"] = time.time() - inicio
+
+    ordenacao = operacoes.get("ordenacao")
+    if ordenacao and ordenacao["coluna"] in df.columns:
+        inicio = time.time()
+        df = rmta_ordenar(df, ordenacao["coluna"], ordenacao.get("ascendente", True))
+        tempos["local_ordenar"] = time.time() - inicio
+
+    logger.debug("Operações locais aplicadas: %s (%s linhas)", list(tempos), len(df))
+    return df, tempos
@@ -0,0 +1,71 @@
+"""
+Utilitários de normalização de texto do SQL Agent.
+
+Este módulo contém funções para comparar textos em português de forma
+tolerante a acentos, maiúsculas/minúsculas, espaços e plurais simples.
+"""
+import re
+import unicodedata
+from typing import List, Set
+
+# Palavras ignoradas na comparação por tokens
+PALAVRAS_VAZIAS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "e", "em", "no", "na", "nos", "nas", "para", "por", "com", "que", "algum", "alguma"
+}
+
+
+def rmta_normalizar_texto(texto: str) -> str:
+    """
+    Normaliza um texto para comparação: minúsculas, sem acentos e espaços simples.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    sem_acentos = unicodedata.normalize("NFKD", texto)
+    sem_acentos = "".join(c for c in sem_acentos if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def rmta_tokenizar(texto: str) -> List[str]:
+    """
+    Divide um texto em tokens normalizados, sem palavras vazias e sem plural simples.
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        List[str]: Tokens normalizados
+    """
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", rmta_normalizar_texto(texto)):
+        if token in PALAVRAS_VAZIAS:
+            continue
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def rmta_trigramas(texto: str) -> Set[str]:
+    """
+    Calcula os trigramas de um texto normalizado, como no pg_trgm.
+
+    Cada palavra é completada com dois espaços antes e um depois, de modo que
+    o início da palavra pese mais que o fim ("notebok" e "notebook" têm 7
+    trigramas em comum).
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        Set[str]: Trigramas distintos do texto
+    """
+    trigramas = set()
+    for palavra in re.findall(r"[a-z0-9]+", rmta_normalizar_texto(texto)):
+        palavra = f"  {palavra} "
+        trigramas.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return trigramas
@@ -0,0 +1,213 @@
+"""
+Redução dos dados enviados aos gráficos e tabelas da interface.
+
+Este módulo agrega ou amostra o resultado no servidor antes de enviá-lo ao
+navegador, para que resultados com centenas de milhares de linhas não
+congelem a página nem inflem o websocket do Streamlit:
+
+- Linhas: Largest-Triangle-Three-Buckets (LTTB), que preserva picos e vales
+- Barras: as N maiores categorias mais uma barra "Outros" com o restante
+- Dispersão: amostra aleatória ou estratificada por categoria
+"""
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.configuracoes import GRAFICO_MAX_PONTOS, GRAFICO_TOP_N
+
+# Obter logger
+logger = logging.getLogger('sql_agent')
+
+ROTULO_OUTROS = "Outros"
+MAX_ESTRATOS = 50
+
+
+def rmta_tamanho_payload(df: pd.DataFrame) -> int:
+    """
+    Estima o tamanho, em bytes, dos dados de um DataFrame enviados ao navegador.
+
+    Args:
+        df (pd.DataFrame): Dados a enviar
+
+    Returns:
+        int: Tamanho aproximado em bytes
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _valores_numericos(serie: pd.Series) -> np.ndarray:
+    """Converte um eixo (numérico ou de datas) em float para cálculos de área."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.astype("int64").to_numpy(dtype=float)
+    return serie.to_numpy(dtype=float)
+
+
+def rmta_indices_lttb(x: np.ndarray, y: np.ndarray, limite: int) -> np.ndarray:
+    """
+    Seleciona os pontos de uma série pelo algoritmo Largest-Triangle-Three-Buckets.
+
+    O primeiro e o último ponto são mantidos; os demais são divididos em
+    limite - 2 buckets e, de cada um, é escolhido o ponto que forma o maior
+    triângulo com o ponto escolhido no bucket anterior e a média do seguinte.
+
+    Args:
+        x (np.ndarray): Eixo X, ordenado
+        y (np.ndarray): Eixo Y
+        limite (int): Número de pontos desejado
+
+    Returns:
+        np.ndarray: Índices dos pontos selecionados, em ordem crescente
+    """
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    indices = np.empty(limite, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    tamanho_bucket = (n - 2) / (limite - 2)
+    anterior = 0
+    for i in range(limite - 2):
+        inicio = int(i * tamanho_bucket) + 1
+        fim = int((i + 1) * tamanho_bucket) + 1
+        fim_seguinte = min(int((i + 2) * tamanho_bucket) + 1, n)
+        media_x = x[fim:fim_seguinte].mean()
+        media_y = y[fim:fim_seguinte].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+
+def rmta_reduzir_lttb(df: pd.DataFrame, x: str, y: str, limite: int) -> pd.DataFrame:
+    """
+    Reduz uma série para gráfico de linha com LTTB.
+
+    Eixos X não numéricos são tratados pela posição da linha.
+
+    Args:
+        df (pd.DataFrame): Dados
+        x (str): Coluna do eixo X
+        y (str): Coluna do eixo Y (numérica)
+        limite (int): Número máximo de pontos
+
+    Returns:
+        pd.DataFrame: Pontos selecionados, ordenados pelo eixo X
+    """
+    dados = df[list(dict.fromkeys((x, y)))].dropna()
+    eixo_numerico = pd.api.types.is_numeric_dtype(dados[x]) or pd.api.types.is_datetime64_any_dtype(dados[x])
+    if eixo_numerico:
+        dados = dados.sort_values(x, kind="stable")
+        valores_x = _valores_numericos(dados[x])
+    else:
+        valores_x = np.arange(len(dados), dtype=float)
+    indices = rmta_indices_lttb(valores_x, dados[y].to_numpy(dtype=float), limite)
+    return dados.iloc[indices]
+
+
+def rmta_top_n_com_outros(df: pd.DataFrame, x: Optional[str], y: str, n: int) -> pd.DataFrame:
+    """
+    Agrega o eixo Y por categoria e mantém as N maiores, somando o restante em "Outros".
+
+    Args:
+        df (pd.DataFrame): Dados
+        x (Optional[str]): Coluna de categorias (None usa o índice das linhas)
+        y (str): Coluna numérica somada
+        n (int): Número de categorias mantidas
+
+    Returns:
+        pd.DataFrame: Colunas x (ou "categoria") e y, com no máximo n + 1 linhas
+    """
+    rotulo = x if x and x != y else "categoria"
+    categorias = df[x].astype(str) if x else df.index.astype(str).to_series(index=df.index)
+    somas = df[y].groupby(categorias, sort=False).sum()
+    if len(somas) <= n:
+        return somas.rename_axis(rotulo).reset_index(name=y)
+
+    maiores = somas.nlargest(n)
+    restante = somas.drop(maiores.index).sum()
+    reduzido = pd.concat([maiores, pd.Series({ROTULO_OUTROS: restante})])
+    return reduzido.rename_axis(rotulo).reset_index(name=y)
+
+
+def rmta_amostrar(df: pd.DataFrame, limite: int, coluna_estrato: Optional[str] = None, semente: int = 0) -> pd.DataFrame:
+    """
+    Amostra linhas aleatoriamente ou de forma estratificada.
+
+    Na amostra estratificada, cada estrato recebe um número de linhas
+    proporcional ao seu tamanho, com pelo menos uma linha por estrato.
+
+    Args:
+        df (pd.DataFrame): Dados
+        limite (int): Número máximo de linhas
+        coluna_estrato (Optional[str]): Coluna que define os estratos
+        semente (int): Semente do gerador, para amostras reprodutíveis entre reruns
+
+    Returns:
+        pd.DataFrame: Linhas amostradas, na ordem original
+    """
+    if len(df) <= limite:
+        return df
+    if coluna_estrato is None:
+        return df.sample(n=limite, random_state=semente).sort_index()
+
+    grupos = df.groupby(coluna_estrato, sort=False, dropna=False)
+    tamanhos = grupos.size()
+    cotas = np.maximum(1, np.floor(tamanhos * limite / len(df))).astype(int)
+    partes = [
+        grupo.sample(n=min(len(grupo), int(cotas[chave])), random_state=semente)
+        for chave, grupo in grupos
+    ]
+    return pd.concat(partes).sort_index()
+
+
+def rmta_reduzir_para_grafico(df: pd.DataFrame, tipo: str, x: Optional[str], y: str,
+                              max_pontos: int = GRAFICO_MAX_PONTOS, top_n: int = GRAFICO_TOP_N) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Prepara os dados de um gráfico, reduzindo-os conforme o tipo.
+
+    Args:
+        df (pd.DataFrame): Dados completos
+        tipo (str): "Barras", "Linha" ou "Dispersão"
+        x (Optional[str]): Coluna do eixo X (None usa o índice)
+        y (str): Coluna do eixo Y
+        max_pontos (int): Pontos máximos para linhas e dispersão
+        top_n (int): Barras mantidas antes de "Outros"
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, Any]]: Dados reduzidos e informações da redução
+        ("metodo", "linhas_originais", "linhas_enviadas", "bytes_enviados", "tempo")
+    """
+    inicio = time.time()
+    colunas = list(dict.fromkeys(c for c in (x, y) if c))
+    if tipo == "Barras":
+        metodo = "top_n"
+        reduzido = rmta_top_n_com_outros(df, x, y, top_n)
+    elif len(df) <= max_pontos:
+        metodo = "nenhum"
+        reduzido = df[colunas]
+    elif tipo == "Linha" and x:
+        metodo = "lttb"
+        reduzido = rmta_reduzir_lttb(df, x, y, max_pontos)
+    else:
+        estrato = x if x and not pd.api.types.is_numeric_dtype(df[x]) and df[x].nunique() <= MAX_ESTRATOS else None
+        metodo = "estratificada" if estrato else "aleatoria"
+        reduzido = rmta_amostrar(df[colunas], max_pontos, estrato)
+
+    info = {
+        "metodo": metodo,
+        "linhas_originais": len(df),
+        "linhas_enviadas": len(reduzido),
+        "bytes_enviados": rmta_tamanho_payload(reduzido),
+        "tempo": time.time() - inicio
+    }
+    logger.info(
+        "Gráfico %s reduzido por %s: %s -> %s linhas, %s bytes em %.4fs",
+        tipo, metodo, info['linhas_originais'], info['linhas_enviadas'], info['bytes_enviados'], info['tempo']
+    )
+    return reduzido, info